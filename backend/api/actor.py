@@ -0,0 +1,217 @@
+"""Resolución del actor de la petición: usuario, roles, residente y vivienda activa.
+
+``obtener_actor(request)`` resuelve todo una sola vez por petición y lo deja en
+``request.actor``. Entre peticiones se reutiliza una caché por proceso con TTL
+corto (``ACTOR_CACHE_TTL``), que las señales de este módulo invalidan cuando
+cambian roles, residentes o viviendas. Como esas señales solo llegan al proceso
+que hizo el cambio, cada petición lee de la base el ``token_version`` vigente
+(``version_de_peticion``) y descarta el actor en caché si la versión no
+coincide: un cambio de roles o de vivienda se ve en todos los procesos en la
+petición siguiente.
+"""
+
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .models import Residente, ResidenteVivienda, Rol, Usuario, UsuarioRol, Vivienda
+
+MAX_ENTRADAS = 2048
+
+_cache = {}
+_lock = threading.Lock()
+
+
+class Actor:
+    def __init__(self, user_id=None, usuario=None, roles=(), residente=None, vivienda=None, version=None):
+        self.user_id = user_id
+        self.version = version
+        self.usuario = usuario
+        self.roles = frozenset(roles)
+        self.residente = residente
+        self.vivienda = vivienda
+
+    @property
+    def usuario_id(self):
+        return self.usuario.pk if self.usuario else None
+
+    @property
+    def residente_id(self):
+        return self.residente.pk if self.residente else None
+
+    @property
+    def vivienda_id(self):
+        return self.vivienda.pk if self.vivienda else None
+
+    def tiene_rol(self, *roles):
+        return bool(self.roles.intersection(roles))
+
+    def copia(self):
+        # Cada petición recibe sus propias instancias para no compartir cambios.
+        return Actor(
+            user_id=self.user_id,
+            usuario=copy.copy(self.usuario),
+            roles=self.roles,
+            residente=copy.copy(self.residente),
+            vivienda=copy.copy(self.vivienda),
+            version=self.version,
+        )
+
+
+def _ttl():
+    return getattr(settings, "ACTOR_CACHE_TTL", 60)
+
+
+def _cargar_actor(user):
+    usuario = Usuario.objects.select_related("residente").filter(user=user).first()
+    if usuario is None:
+        return Actor(user_id=user.pk)
+    usuario.user = user
+
+    roles = UsuarioRol.objects.filter(usuario=usuario, estado=1).values_list(
+        "rol__nombre", flat=True
+    )
+    residente = getattr(usuario, "residente", None)
+    vivienda = None
+    if residente is not None:
+        relacion = (
+            ResidenteVivienda.objects.select_related("vivienda")
+            .filter(residente=residente, fecha_hasta__isnull=True)
+            .order_by("-fecha_desde")
+            .first()
+        )
+        vivienda = relacion.vivienda if relacion else None
+    return Actor(
+        user_id=user.pk,
+        usuario=usuario,
+        roles=roles,
+        residente=residente,
+        vivienda=vivienda,
+        version=usuario.token_version,
+    )
+
+
+def resolver_actor(user, version=None):
+    """Actor de ``user`` desde la caché del proceso o la base de datos.
+
+    Con ``version`` la entrada en caché solo se usa si tiene ese ``token_version``.
+    """
+    if user is None or not getattr(user, "is_authenticated", False):
+        return Actor()
+
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _cache.get(user.pk)
+    if entrada and entrada[0] > ahora and (version is None or entrada[1].version == version):
+        return entrada[1].copia()
+
+    actor = _cargar_actor(user)
+    with _lock:
+        if len(_cache) >= MAX_ENTRADAS:
+            _cache.clear()
+        _cache[user.pk] = (ahora + _ttl(), actor)
+    return actor.copia()
+
+
+def version_de_peticion(request):
+    """``token_version`` vigente del usuario de la petición.
+
+    Se lee de la base una sola vez por petición y queda en
+    ``request.version_token``; ``None`` si no hay usuario o perfil.
+    """
+    http_request = getattr(request, "_request", request)
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return None
+
+    leida = getattr(http_request, "version_token", None)
+    if leida is None or leida[0] != user.pk:
+        version = (
+            Usuario.objects.filter(user_id=user.pk)
+            .values_list("token_version", flat=True)
+            .first()
+        )
+        leida = (user.pk, version)
+        http_request.version_token = leida
+    return leida[1]
+
+
+def obtener_actor(request):
+    """Actor de la petición, resuelto una sola vez y guardado en ``request.actor``."""
+    http_request = getattr(request, "_request", request)
+    user = getattr(request, "user", None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+
+    actor = getattr(http_request, "actor", None)
+    if actor is None or actor.user_id != user_id:
+        actor = resolver_actor(user, version_de_peticion(request))
+        http_request.actor = actor
+    return actor
+
+
+def invalidar_actor(user_id=None, usuario_id=None, residente_id=None, vivienda_id=None, todo=False):
+    with _lock:
+        if todo:
+            _cache.clear()
+            return
+        _cache.pop(user_id, None)
+        for clave, (_expira, actor) in list(_cache.items()):
+            if (
+                (usuario_id is not None and actor.usuario_id == usuario_id)
+                or (residente_id is not None and actor.residente_id == residente_id)
+                or (vivienda_id is not None and actor.vivienda_id == vivienda_id)
+            ):
+                del _cache[clave]
+
+
+class ActorJWTAuthentication(JWTAuthentication):
+    """Autenticación JWT que además deja resuelto ``request.actor``."""
+
+    def authenticate(self, request):
+        resultado = super().authenticate(request)
+        if resultado is not None:
+            user, _token = resultado
+            request._request.user = user
+            obtener_actor(request._request)
+        return resultado
+
+
+@receiver(post_save, sender=UsuarioRol)
+@receiver(post_delete, sender=UsuarioRol)
+def _rol_usuario_cambiado(sender, instance, **kwargs):
+    invalidar_actor(usuario_id=instance.usuario_id)
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def _usuario_cambiado(sender, instance, **kwargs):
+    invalidar_actor(user_id=instance.user_id, usuario_id=instance.pk)
+
+
+@receiver(post_save, sender=Residente)
+@receiver(post_delete, sender=Residente)
+def _residente_cambiado(sender, instance, **kwargs):
+    invalidar_actor(usuario_id=instance.usuario_id, residente_id=instance.pk)
+
+
+@receiver(post_save, sender=ResidenteVivienda)
+@receiver(post_delete, sender=ResidenteVivienda)
+def _residencia_cambiada(sender, instance, **kwargs):
+    invalidar_actor(residente_id=instance.residente_id)
+
+
+@receiver(post_save, sender=Vivienda)
+@receiver(post_delete, sender=Vivienda)
+def _vivienda_cambiada(sender, instance, **kwargs):
+    invalidar_actor(vivienda_id=instance.pk)
+
+
+@receiver(post_save, sender=Rol)
+@receiver(post_delete, sender=Rol)
+def _rol_cambiado(sender, instance, **kwargs):
+    invalidar_actor(todo=True)
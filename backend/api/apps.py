@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import actor, tokens  # noqa: F401
+        from .busqueda import signals as busqueda_signals  # noqa: F401
+        from .finanzas import signals  # noqa: F401
+        from .security import signals as security_signals  # noqa: F401
@@ -0,0 +1,144 @@
+"""Documentos de búsqueda desnormalizados para viviendas y residentes.
+
+Cada ``Vivienda`` y ``Residente`` guarda en ``documento_busqueda`` un texto en
+minúsculas y sin tildes con los datos por los que se busca. En PostgreSQL con
+``pg_trgm`` la columna tiene un índice GIN de trigramas que acelera los
+``LIKE '%texto%'`` y permite ordenar por similitud; sin la extensión se filtra
+igual y el orden se calcula con ``IndiceBusquedaLocal``.
+"""
+
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q
+
+from ..models import Residente, ResidenteVivienda, Vivienda
+from .indice import IndiceBusquedaLocal
+
+_TRIGRAMAS_POR_ALIAS = {}
+
+
+def normalizar_texto(texto):
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(caracter for caracter in texto if not unicodedata.combining(caracter))
+    return " ".join(texto.lower().split())
+
+
+def _unir(*partes):
+    return normalizar_texto(" ".join(str(parte) for parte in partes if parte))
+
+
+def documento_residente(residente):
+    return _unir(
+        residente.nombres,
+        residente.apellidos,
+        residente.ci,
+        residente.correo,
+        residente.telefono,
+    )
+
+
+def documento_vivienda(vivienda, residentes=()):
+    partes = [vivienda.codigo_unidad, vivienda.bloque, vivienda.numero]
+    for residente in residentes:
+        partes.extend([residente.nombres, residente.apellidos, residente.ci])
+    return _unir(*partes)
+
+
+def refrescar_documentos_vivienda(vivienda_ids=None):
+    """Recalcula el documento de las viviendas indicadas (todas si ``None``).
+
+    Incluye a todos los residentes que estuvieron vinculados, igual que el
+    filtro por residente del listado de facturas.
+    """
+    viviendas = Vivienda.objects.only("id", "codigo_unidad", "bloque", "numero", "documento_busqueda")
+    relaciones = ResidenteVivienda.objects.select_related("residente").order_by("fecha_desde")
+    if vivienda_ids is not None:
+        vivienda_ids = list(vivienda_ids)
+        if not vivienda_ids:
+            return 0
+        viviendas = viviendas.filter(pk__in=vivienda_ids)
+        relaciones = relaciones.filter(vivienda_id__in=vivienda_ids)
+
+    residentes_por_vivienda = {}
+    for relacion in relaciones:
+        residentes_por_vivienda.setdefault(relacion.vivienda_id, []).append(relacion.residente)
+
+    cambiadas = []
+    for vivienda in viviendas:
+        documento = documento_vivienda(vivienda, residentes_por_vivienda.get(vivienda.id, ()))
+        if documento != vivienda.documento_busqueda:
+            vivienda.documento_busqueda = documento
+            cambiadas.append(vivienda)
+    Vivienda.objects.bulk_update(cambiadas, ["documento_busqueda"], batch_size=500)
+    return len(cambiadas)
+
+
+def refrescar_documentos_residente(residente_ids=None):
+    residentes = Residente.objects.only(
+        "id", "nombres", "apellidos", "ci", "correo", "telefono", "documento_busqueda"
+    )
+    if residente_ids is not None:
+        residente_ids = list(residente_ids)
+        if not residente_ids:
+            return 0
+        residentes = residentes.filter(pk__in=residente_ids)
+
+    cambiados = []
+    for residente in residentes:
+        documento = documento_residente(residente)
+        if documento != residente.documento_busqueda:
+            residente.documento_busqueda = documento
+            cambiados.append(residente)
+    Residente.objects.bulk_update(cambiados, ["documento_busqueda"], batch_size=500)
+    return len(cambiados)
+
+
+def trigramas_disponibles(using="default"):
+    """Indica si la base tiene ``pg_trgm``; se consulta una vez por conexión."""
+    if using not in _TRIGRAMAS_POR_ALIAS:
+        connection = connections[using]
+        disponible = False
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                disponible = cursor.fetchone() is not None
+        _TRIGRAMAS_POR_ALIAS[using] = disponible
+    return _TRIGRAMAS_POR_ALIAS[using]
+
+
+def filtro_documento(texto, campo="documento_busqueda"):
+    """``Q`` que exige cada término de ``texto`` dentro del documento."""
+    condicion = Q()
+    for termino in normalizar_texto(texto).split():
+        condicion &= Q(**{f"{campo}__contains": termino})
+    return condicion
+
+
+def buscar_rankeado(queryset, texto, campo="documento_busqueda", limite=20):
+    """Devuelve ``[(objeto, puntaje)]`` ordenado de mejor a peor coincidencia."""
+    consulta = normalizar_texto(texto)
+    if not consulta:
+        return []
+    queryset = queryset.filter(filtro_documento(consulta, campo))
+
+    if trigramas_disponibles(queryset.db):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = queryset.annotate(
+            puntaje_busqueda=TrigramWordSimilarity(consulta, campo)
+        ).order_by("-puntaje_busqueda")[:limite]
+        return [(objeto, float(objeto.puntaje_busqueda)) for objeto in queryset]
+
+    candidatos = {}
+    indice = IndiceBusquedaLocal()
+    for objeto in queryset:
+        valor = objeto
+        for parte in campo.split("__"):
+            valor = getattr(valor, parte)
+        candidatos[objeto.pk] = objeto
+        indice.agregar(objeto.pk, valor)
+    return [
+        (candidatos[clave], puntaje)
+        for clave, puntaje in indice.buscar(consulta, limite=limite)
+    ]
@@ -0,0 +1,52 @@
+"""Índice de trigramas en memoria.
+
+Reproduce de forma aproximada ``word_similarity`` de ``pg_trgm`` para las
+bases de datos donde la extensión no está disponible (SQLite en pruebas o un
+PostgreSQL sin ``contrib``).
+"""
+
+
+def trigramas(palabra):
+    # pg_trgm rellena cada palabra con dos espacios al inicio y uno al final.
+    relleno = f"  {palabra} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def similitud(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class IndiceBusquedaLocal:
+    """Índice ``clave -> documento`` que ordena coincidencias por similitud."""
+
+    def __init__(self, documentos=()):
+        self._palabras = {}
+        for clave, documento in documentos:
+            self.agregar(clave, documento)
+
+    def agregar(self, clave, documento):
+        self._palabras[clave] = [trigramas(palabra) for palabra in (documento or "").split()]
+
+    def puntaje(self, clave, consulta):
+        """Promedio, por término de la consulta, de la mejor palabra del documento."""
+        palabras = self._palabras.get(clave) or []
+        terminos = consulta.split()
+        if not palabras or not terminos:
+            return 0.0
+        total = 0.0
+        for termino in terminos:
+            trigramas_termino = trigramas(termino)
+            total += max(similitud(trigramas_termino, palabra) for palabra in palabras)
+        return total / len(terminos)
+
+    def buscar(self, consulta, limite=None):
+        resultados = [
+            (clave, self.puntaje(clave, consulta)) for clave in self._palabras
+        ]
+        resultados = [item for item in resultados if item[1] > 0]
+        resultados.sort(key=lambda item: item[1], reverse=True)
+        if limite is not None:
+            resultados = resultados[:limite]
+        return resultados
@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models import Condominio, Residente, ResidenteVivienda, Vivienda
+from . import refrescar_documentos_residente, refrescar_documentos_vivienda
+
+
+def _solo_documento(update_fields):
+    return update_fields is not None and set(update_fields) == {"documento_busqueda"}
+
+
+@receiver(post_save, sender=Vivienda)
+def _vivienda_guardada(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or _solo_documento(update_fields):
+        return
+    refrescar_documentos_vivienda([instance.pk])
+
+
+@receiver(post_save, sender=Residente)
+def _residente_guardado(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or _solo_documento(update_fields):
+        return
+    refrescar_documentos_residente([instance.pk])
+    refrescar_documentos_vivienda(
+        ResidenteVivienda.objects.filter(residente=instance).values_list("vivienda_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=ResidenteVivienda)
+def _relacion_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refrescar_documentos_vivienda([instance.vivienda_id])
+
+
+@receiver(post_delete, sender=ResidenteVivienda)
+def _relacion_eliminada(sender, instance, origin=None, **kwargs):
+    # Si se elimina la vivienda o el condominio completo no hay nada que refrescar.
+    if isinstance(origin, (Vivienda, Condominio)):
+        return
+    refrescar_documentos_vivienda([instance.vivienda_id])
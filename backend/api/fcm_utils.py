@@ -1,12 +1,17 @@
-﻿import base64
+﻿"""Acceso a Firebase Cloud Messaging.
+
+El SDK se importa e inicializa recién en el primer envío (``obtener_app``), de
+modo que arrancar un worker, un comando o los tests no paga ese costo ni
+necesita credenciales.
+"""
+
+import base64
 import json
 import logging
 import os
+import threading
 from pathlib import Path
 
-import firebase_admin
-from firebase_admin import credentials, messaging
-
 
 def _load_firebase_credentials(raw_value: str) -> dict:
     """Return credentials dict from JSON, base64 JSON, or file path."""
@@ -43,25 +48,53 @@ def _ensure_private_key_format(cred_dict: dict) -> dict:
     return cred_dict
 
 
-# Initialize Firebase Admin only once
-if not firebase_admin._apps:
-    cred_raw = os.environ.get("FIREBASE_ADMIN_CREDENTIALS")
-    if cred_raw:
+_app = None
+_app_lock = threading.Lock()
+
+
+class FirebaseNoConfigurado(Exception):
+    pass
+
+
+def firebase_configurado():
+    return bool(os.environ.get("FIREBASE_ADMIN_CREDENTIALS"))
+
+
+def obtener_app():
+    """Inicializa Firebase Admin la primera vez que se necesita (thread-safe)."""
+    global _app
+    if _app is not None:
+        return _app
+    with _app_lock:
+        if _app is not None:
+            return _app
+        import firebase_admin
+        from firebase_admin import credentials
+
+        if firebase_admin._apps:
+            _app = firebase_admin.get_app()
+            return _app
+
+        cred_raw = os.environ.get("FIREBASE_ADMIN_CREDENTIALS")
+        if not cred_raw:
+            logging.error("FIREBASE_ADMIN_CREDENTIALS not configured")
+            raise FirebaseNoConfigurado("FIREBASE_ADMIN_CREDENTIALS not configured")
+
         logging.info("Inicializando Firebase Admin SDK...")
         try:
             cred_dict = _ensure_private_key_format(_load_firebase_credentials(cred_raw))
         except ValueError as exc:
             logging.error("Could not parse FIREBASE_ADMIN_CREDENTIALS: %s", exc)
             raise
-        cred = credentials.Certificate(cred_dict)
-        firebase_admin.initialize_app(cred)
+        _app = firebase_admin.initialize_app(credentials.Certificate(cred_dict))
         logging.info("Firebase Admin SDK inicializado correctamente.")
-    else:
-        logging.error("FIREBASE_ADMIN_CREDENTIALS not configured")
-        raise Exception("FIREBASE_ADMIN_CREDENTIALS not configured")
+        return _app
 
 
 def send_fcm_notification(token, title, body, data=None):
+    from firebase_admin import messaging
+
+    app = obtener_app()
     logging.info("Preparando mensaje FCM para token: %s", token)
     message = messaging.Message(
         notification=messaging.Notification(
@@ -71,6 +104,53 @@ def send_fcm_notification(token, title, body, data=None):
         token=token,
         data=data or {},
     )
-    response = messaging.send(message)
+    response = messaging.send(message, app=app)
     logging.info("Respuesta de FCM: %s", response)
     return response
+
+
+def _codigo_error_fcm(exc):
+    from firebase_admin import messaging
+
+    # Errores propios de FCM; el resto usa el código canónico de Firebase.
+    errores_fcm = (
+        (messaging.UnregisteredError, "UNREGISTERED"),
+        (messaging.SenderIdMismatchError, "SENDER_ID_MISMATCH"),
+        (messaging.QuotaExceededError, "QUOTA_EXCEEDED"),
+        (messaging.ThirdPartyAuthError, "THIRD_PARTY_AUTH_ERROR"),
+    )
+    for clase, codigo in errores_fcm:
+        if isinstance(exc, clase):
+            return codigo
+    return getattr(exc, "code", None) or exc.__class__.__name__
+
+
+def send_fcm_multicast(tokens, title, body, data=None):
+    """Envía un mensaje a varios tokens (máximo 500) en una sola llamada a FCM.
+
+    Devuelve una tupla ``(token, message_id, error)`` por token, en el mismo
+    orden; ``error`` es el código de FCM (``UNREGISTERED``, ``INVALID_ARGUMENT``...)
+    o ``None`` si el envío fue aceptado.
+    """
+    from firebase_admin import messaging
+
+    app = obtener_app()
+    message = messaging.MulticastMessage(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        tokens=list(tokens),
+        data=data or {},
+    )
+    batch = messaging.send_each_for_multicast(message, app=app)
+    resultados = []
+    for token, response in zip(message.tokens, batch.responses):
+        if response.success:
+            resultados.append((token, response.message_id, None))
+        else:
+            resultados.append((token, None, _codigo_error_fcm(response.exception)))
+    logging.info(
+        "FCM multicast: %s enviados, %s fallidos", batch.success_count, batch.failure_count
+    )
+    return resultados
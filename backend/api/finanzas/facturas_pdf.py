@@ -0,0 +1,189 @@
+"""Generación y caché en disco de los PDF de facturas.
+
+Un PDF se identifica por ``(factura.id, huella)``, donde la huella es un hash
+del contenido que se imprime (estado, montos, detalles, residentes...). Si
+algo cambia la huella es otra y el archivo anterior deja de usarse: el nombre
+del archivo es la versión, así que nunca hace falta borrar para no servir un
+PDF viejo. Las señales de ``Factura`` y ``FacturaDetalle`` solo liberan los
+archivos anteriores; la carpeta se conserva para no romper una generación en
+curso.
+"""
+
+import hashlib
+import os
+import tempfile
+import zipfile
+
+from django.conf import settings
+
+from ..models import ResidenteVivienda
+from ..pdf import DocumentoPDF
+
+# Cambiar si se modifica el formato del PDF, para no servir archivos viejos.
+VERSION_PLANTILLA = "2"
+CARPETA_CACHE = os.path.join("finanzas", "facturas_pdf")
+TAMANO_BLOQUE = 64 * 1024
+
+
+def lineas_factura(factura):
+    """Texto de la factura, una entrada por renglón."""
+    # Se usa el prefetch de "detalles" si la vista lo cargó ordenado.
+    detalles = sorted(factura.detalles.all(), key=lambda detalle: (detalle.tipo, detalle.descripcion))
+    vivienda_prefetch = getattr(factura, "vivienda", None)
+    residentes = []
+    if vivienda_prefetch is not None:
+        residentes = getattr(vivienda_prefetch, "_residentes_activos", [])
+    if not residentes:
+        residentes = (
+            ResidenteVivienda.objects.select_related("residente")
+            .filter(vivienda=factura.vivienda, fecha_hasta__isnull=True)
+            .order_by("-fecha_desde")
+        )
+
+    nombres_residentes = [
+        f"{rel.residente.nombres} {rel.residente.apellidos}".strip()
+        for rel in residentes
+    ]
+    bloque = factura.vivienda.bloque or "-"
+
+    lineas = [
+        f"Factura periodo {factura.periodo}",
+        f"Condominio: {factura.vivienda.condominio.nombre}",
+        f"Vivienda: {factura.vivienda.codigo_unidad} (Bloque {bloque})",
+        "Residentes: " + (", ".join(nombres_residentes) or "-"),
+        f"Estado: {factura.estado}",
+        f"Monto total: Bs {factura.monto}",
+        "",
+        "Detalle:",
+    ]
+
+    if detalles:
+        for detalle in detalles:
+            lineas.append(
+                f"- {detalle.descripcion} ({detalle.tipo}) Bs {detalle.monto}"
+            )
+    else:
+        lineas.append("(Sin detalles registrados)")
+
+    if factura.fecha_vencimiento:
+        lineas.append("")
+        lineas.append(f"Fecha de vencimiento: {factura.fecha_vencimiento}")
+    if factura.fecha_pago:
+        lineas.append(f"Fecha de pago: {factura.fecha_pago}")
+    return lineas
+
+
+def construir_pdf(lineas, destino=None):
+    """Escribe el PDF en ``destino`` o, si no se indica, devuelve los bytes."""
+    documento = DocumentoPDF(destino)
+    titulo, *resto = lineas
+    documento.add_text(titulo, font="F2", size=16, leading=26)
+    for linea in resto:
+        if not linea:
+            documento.add_spacing(8)
+        elif linea == "Detalle:":
+            documento.add_text(linea, font="F2", size=12, leading=18)
+        else:
+            documento.add_text(linea, size=11, leading=16, wrap=True)
+    return documento.cerrar()
+
+
+def huella(lineas):
+    contenido = "\n".join([VERSION_PLANTILLA, *lineas]).encode("utf-8")
+    return hashlib.sha256(contenido).hexdigest()[:32]
+
+
+def _carpeta_factura(factura_id):
+    return os.path.join(settings.MEDIA_ROOT, CARPETA_CACHE, str(factura_id))
+
+
+def nombre_archivo(factura):
+    nombre = f"factura-{factura.vivienda.codigo_unidad}-{factura.periodo}"
+    if factura.tipo and factura.tipo != "expensa":
+        nombre += f"-{factura.tipo}"
+    return nombre.replace(" ", "_") + ".pdf"
+
+
+def ruta_pdf_factura(factura):
+    """Devuelve la ruta del PDF en caché, generándolo si no existe."""
+    lineas = lineas_factura(factura)
+    carpeta = _carpeta_factura(factura.id)
+    ruta = os.path.join(carpeta, f"{huella(lineas)}.pdf")
+    if os.path.exists(ruta):
+        return ruta
+
+    os.makedirs(carpeta, exist_ok=True)
+    # Se escribe en un temporal y se renombra para que nadie lea un archivo a medias.
+    descriptor, temporal = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as archivo:
+            construir_pdf(lineas, archivo)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return ruta
+
+
+def abrir_pdf_factura(factura):
+    """Abre el PDF en caché de la factura, generándolo si no existe.
+
+    Si una invalidación borra el archivo entre que se ubica y se abre, se
+    genera de nuevo. Una vez abierto se puede leer aunque se borre.
+    """
+    try:
+        return open(ruta_pdf_factura(factura), "rb")
+    except FileNotFoundError:
+        return open(ruta_pdf_factura(factura), "rb")
+
+
+def invalidar_pdf_factura(factura_id):
+    """Borra los PDF terminados de la factura, sin tocar la carpeta ni los temporales."""
+    carpeta = _carpeta_factura(factura_id)
+    try:
+        nombres = os.listdir(carpeta)
+    except FileNotFoundError:
+        return
+    for nombre in nombres:
+        if not nombre.endswith(".pdf"):
+            continue
+        try:
+            os.remove(os.path.join(carpeta, nombre))
+        except FileNotFoundError:
+            pass
+
+
+class _SalidaZip:
+    """Destino no posicionable para ``zipfile``: acumula bytes hasta que se retiran."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def zip_facturas(facturas):
+    """Genera el ZIP por partes; solo hay un bloque de un PDF en memoria a la vez."""
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, mode="w", compression=zipfile.ZIP_STORED) as archivo_zip:
+        for factura in facturas:
+            with abrir_pdf_factura(factura) as origen, archivo_zip.open(nombre_archivo(factura), "w") as destino:
+                while True:
+                    bloque = origen.read(TAMANO_BLOQUE)
+                    if not bloque:
+                        break
+                    destino.write(bloque)
+                    yield salida.retirar()
+            yield salida.retirar()
+    yield salida.retirar()
@@ -0,0 +1,153 @@
+"""Generación de facturas en segundo plano, con la base de datos como cola.
+
+El worker toma un job pendiente con ``select_for_update(skip_locked=True)`` y
+lo pasa a ``EN_PROCESO``. Cada bloque confirmado actualiza ``actualizado_en``,
+que sirve de latido: si un job sigue ``EN_PROCESO`` sin latir durante
+``FINANZAS_GENERACION_TIMEOUT`` segundos (el worker murió a mitad), otro
+worker lo retoma desde el principio. La generación es idempotente, así que
+repetir los bloques ya hechos deja las mismas facturas. Si el worker original
+seguía vivo, deja de avanzar en cuanto nota que el job ya no es suyo.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import GeneracionFacturasJob
+
+logger = logging.getLogger(__name__)
+
+
+def encolar_generacion_facturas(periodo, solicitado_por=None):
+    """Registra un job pendiente; el worker lo tomará en su siguiente ciclo."""
+    return GeneracionFacturasJob.objects.create(
+        periodo=periodo,
+        solicitado_por=solicitado_por,
+    )
+
+
+def _timeout():
+    return getattr(settings, "FINANZAS_GENERACION_TIMEOUT", 900)
+
+
+def _tomar_siguiente_job():
+    ahora = timezone.now()
+    with transaction.atomic():
+        job = (
+            GeneracionFacturasJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(estado=GeneracionFacturasJob.ESTADO_PENDIENTE)
+                | Q(
+                    estado=GeneracionFacturasJob.ESTADO_EN_PROCESO,
+                    actualizado_en__lt=ahora - timedelta(seconds=_timeout()),
+                )
+            )
+            .order_by("creado_en")
+            .first()
+        )
+        if job is None:
+            return None
+        if job.estado == GeneracionFacturasJob.ESTADO_EN_PROCESO:
+            logger.warning(
+                "Job %s sin actividad desde %s: se retoma desde el principio",
+                job.pk,
+                job.actualizado_en,
+            )
+            job.procesadas = job.creadas = job.actualizadas = job.sin_cambios = 0
+            job.errores = []
+        job.estado = GeneracionFacturasJob.ESTADO_EN_PROCESO
+        job.iniciado_en = ahora
+        job.save(
+            update_fields=[
+                "estado",
+                "iniciado_en",
+                "procesadas",
+                "creadas",
+                "actualizadas",
+                "sin_cambios",
+                "errores",
+                "actualizado_en",
+            ]
+        )
+    return job
+
+
+def procesar_job(job, chunk_size=None):
+    """Genera las facturas del job por bloques de viviendas.
+
+    Cada bloque se confirma en su propia transacción y actualiza el progreso,
+    de modo que un error solo descarta las viviendas de ese bloque. Si otro
+    worker retomó el job (cambió ``iniciado_en``), se deja de procesar.
+    """
+    from .views import _generar_facturas_para_periodo, _viviendas_facturables
+
+    chunk_size = chunk_size or getattr(settings, "FINANZAS_GENERACION_CHUNK", 500)
+    # Las actualizaciones solo valen mientras el job siga tomado por este worker.
+    propio = GeneracionFacturasJob.objects.filter(pk=job.pk, iniciado_en=job.iniciado_en)
+    vivienda_ids = list(
+        _viviendas_facturables().order_by("id").values_list("id", flat=True)
+    )
+    if not propio.update(total_viviendas=len(vivienda_ids), actualizado_en=timezone.now()):
+        return _abandonar(job)
+
+    errores = []
+    inicios = range(0, len(vivienda_ids), chunk_size)
+    for inicio in inicios:
+        bloque = vivienda_ids[inicio:inicio + chunk_size]
+        try:
+            resumen = _generar_facturas_para_periodo(job.periodo, vivienda_ids=bloque)
+        except Exception as exc:  # noqa: BLE001 - se registra en el job y se continúa
+            logger.exception("Error generando facturas del job %s: %s", job.pk, exc)
+            errores.append(
+                {
+                    "desde": inicio,
+                    "viviendas": len(bloque),
+                    "detalle": str(exc),
+                }
+            )
+            if not propio.update(
+                procesadas=F("procesadas") + len(bloque),
+                errores=errores,
+                actualizado_en=timezone.now(),
+            ):
+                return _abandonar(job)
+            continue
+
+        if not propio.update(
+            procesadas=F("procesadas") + len(bloque),
+            creadas=F("creadas") + resumen.get("creadas", 0),
+            actualizadas=F("actualizadas") + resumen.get("actualizadas", 0),
+            sin_cambios=F("sin_cambios") + resumen.get("sin_cambios", 0),
+            actualizado_en=timezone.now(),
+        ):
+            return _abandonar(job)
+
+    fallido = bool(errores) and len(errores) == len(inicios)
+    propio.update(
+        estado=(
+            GeneracionFacturasJob.ESTADO_FALLIDO
+            if fallido
+            else GeneracionFacturasJob.ESTADO_COMPLETADO
+        ),
+        finalizado_en=timezone.now(),
+        actualizado_en=timezone.now(),
+    )
+    job.refresh_from_db()
+    return job
+
+
+def _abandonar(job):
+    logger.warning("Otro worker retomó el job %s; se deja de procesar aquí", job.pk)
+    job.refresh_from_db()
+    return job
+
+
+def procesar_siguiente_job(chunk_size=None):
+    job = _tomar_siguiente_job()
+    if job is None:
+        return None
+    return procesar_job(job, chunk_size=chunk_size)
@@ -0,0 +1,87 @@
+"""Paginación por cursor (keyset) para el listado de facturas del administrador.
+
+El orden es ``fecha_vencimiento DESC NULLS FIRST, fecha_emision DESC, id DESC``;
+el cursor guarda esos tres valores de la última fila entregada y la página
+siguiente se obtiene filtrando "estrictamente después" de ella, sin OFFSET.
+"""
+
+import base64
+import binascii
+import json
+import uuid
+from datetime import date
+
+from django.conf import settings
+from django.db.models import F, Q
+
+ORDEN_FACTURAS = (
+    F("fecha_vencimiento").desc(nulls_first=True),
+    F("fecha_emision").desc(),
+    F("id").desc(),
+)
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def tamano_pagina(valor):
+    por_defecto = getattr(settings, "FINANZAS_FACTURAS_PAGE_SIZE", 50)
+    maximo = getattr(settings, "FINANZAS_FACTURAS_MAX_PAGE_SIZE", 500)
+    if valor in (None, ""):
+        return por_defecto
+    try:
+        return max(1, min(int(valor), maximo))
+    except (TypeError, ValueError):
+        return por_defecto
+
+
+def codificar_cursor(factura):
+    datos = [
+        factura.fecha_vencimiento.isoformat() if factura.fecha_vencimiento else None,
+        factura.fecha_emision.isoformat(),
+        str(factura.id),
+    ]
+    crudo = json.dumps(datos, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        vencimiento, emision, pk = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return (
+            date.fromisoformat(vencimiento) if vencimiento else None,
+            date.fromisoformat(emision),
+            uuid.UUID(pk),
+        )
+    except (binascii.Error, TypeError, ValueError) as error:
+        raise CursorInvalido("El cursor no es válido.") from error
+
+
+def despues_del_cursor(queryset, cursor):
+    """Filtra las filas que van después del cursor según ``ORDEN_FACTURAS``."""
+    vencimiento, emision, pk = decodificar_cursor(cursor)
+    desempate = Q(fecha_emision__lt=emision) | Q(fecha_emision=emision, id__lt=pk)
+    if vencimiento is None:
+        # Las facturas sin vencimiento van primero; luego vienen todas las demás.
+        condicion = Q(fecha_vencimiento__isnull=True) & desempate
+        condicion |= Q(fecha_vencimiento__isnull=False)
+    else:
+        condicion = Q(fecha_vencimiento__lt=vencimiento)
+        condicion |= Q(fecha_vencimiento=vencimiento) & desempate
+    return queryset.filter(condicion)
+
+
+def paginar(queryset, cursor=None, page_size=None):
+    """Devuelve ``(filas, siguiente_cursor)`` para una página del listado."""
+    page_size = tamano_pagina(page_size)
+    queryset = queryset.order_by(*ORDEN_FACTURAS)
+    if cursor:
+        queryset = despues_del_cursor(queryset, cursor)
+    filas = list(queryset[: page_size + 1])
+    siguiente = None
+    if len(filas) > page_size:
+        filas = filas[:page_size]
+        siguiente = codificar_cursor(filas[-1])
+    return filas, siguiente
@@ -0,0 +1,20 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils import encoders
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Permite negociar ``?format=ndjson``; la vista responde con un stream propio."""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Solo se usa para respuestas de error, que no se transmiten por partes.
+        if data is None:
+            return b""
+        return (json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False) + "\n").encode(
+            self.charset
+        )
@@ -0,0 +1,259 @@
+"""Mantenimiento del resumen financiero mensual por condominio.
+
+Cada fila de ``ResumenFinanzasMensual`` guarda, para un condominio y un mes:
+
+* ``facturado_total`` / ``facturas_emitidas`` / ``facturas_pagadas``: facturas
+  cuyo ``periodo`` es ese mes.
+* ``pagado_total``: pagos confirmados cuya ``fecha_pago`` (hora local) cae en ese mes.
+* ``vencido_pendiente``: facturas pendientes cuyo vencimiento cae en ese mes.
+
+Cuando cambia una factura o un pago solo se recalculan los meses afectados, en
+``transaction.on_commit`` y bajo un advisory lock por mes para que dos
+escrituras concurrentes no dejen el mes con los totales de una sola de ellas.
+"""
+
+import zlib
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from ..models import Factura, ResumenFinanzasMensual, Vivienda
+
+CAMPOS_RESUMEN = (
+    "facturado_total",
+    "facturas_emitidas",
+    "facturas_pagadas",
+    "pagado_total",
+    "vencido_pendiente",
+)
+
+ESPACIO_LOCK = 4301
+
+
+def _periodo_de_fecha(value):
+    if value is None:
+        return None
+    if hasattr(value, "hour"):
+        value = timezone.localtime(value) if timezone.is_aware(value) else value
+    return f"{value.year:04d}-{value.month:02d}"
+
+
+def _rango_periodo(periodo):
+    year, month = (int(parte) for parte in periodo.split("-", 1))
+    inicio = date(year, month, 1)
+    fin = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return inicio, fin
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _condominio_de_vivienda(vivienda_id):
+    return (
+        Vivienda.objects.filter(pk=vivienda_id)
+        .values_list("condominio_id", flat=True)
+        .first()
+    )
+
+
+def buckets_de_factura(factura, condominio_id=None):
+    """Devuelve los pares ``(condominio_id, periodo)`` a los que aporta la factura."""
+    if not factura.vivienda_id:
+        return set()
+    if condominio_id is None:
+        condominio_id = _condominio_de_vivienda(factura.vivienda_id)
+    if condominio_id is None:
+        return set()
+    buckets = {(condominio_id, factura.periodo)}
+    periodo_vencimiento = _periodo_de_fecha(factura.fecha_vencimiento)
+    if periodo_vencimiento:
+        buckets.add((condominio_id, periodo_vencimiento))
+    return buckets
+
+
+def buckets_de_pago(pago):
+    periodo = _periodo_de_fecha(pago.fecha_pago)
+    if not periodo or not pago.factura_id:
+        return set()
+    condominio_id = (
+        Factura.objects.filter(pk=pago.factura_id)
+        .values_list("vivienda__condominio_id", flat=True)
+        .first()
+    )
+    if condominio_id is None:
+        return set()
+    return {(condominio_id, periodo)}
+
+
+def _valores_vacios():
+    return {
+        "facturado_total": Decimal("0"),
+        "facturas_emitidas": 0,
+        "facturas_pagadas": 0,
+        "pagado_total": Decimal("0"),
+        "vencido_pendiente": Decimal("0"),
+    }
+
+
+def calcular_resumen(buckets=None):
+    """Calcula los totales desde las tablas de origen.
+
+    Si ``buckets`` es ``None`` se calcula todo el histórico; en otro caso solo
+    los pares ``(condominio_id, periodo)`` indicados. Devuelve un dict
+    ``{(condominio_id, periodo): {campo: valor}}``.
+    """
+    from .views import _pagos_confirmados_queryset
+
+    resultado = defaultdict(_valores_vacios)
+
+    facturas = Factura.objects.order_by()
+    pendientes = Factura.objects.filter(
+        estado=Factura.ESTADO_PENDIENTE, fecha_vencimiento__isnull=False
+    ).order_by()
+    pagos = _pagos_confirmados_queryset()
+
+    if buckets is not None:
+        if not buckets:
+            return {}
+        filtro_periodo = Q()
+        filtro_vencimiento = Q()
+        filtro_pago = Q()
+        for condominio_id, periodo in buckets:
+            inicio, fin = _rango_periodo(periodo)
+            filtro_periodo |= Q(vivienda__condominio_id=condominio_id, periodo=periodo)
+            filtro_vencimiento |= Q(
+                vivienda__condominio_id=condominio_id,
+                fecha_vencimiento__gte=inicio,
+                fecha_vencimiento__lt=fin,
+            )
+            filtro_pago |= Q(
+                factura__vivienda__condominio_id=condominio_id,
+                fecha_pago__gte=_inicio_del_dia(inicio),
+                fecha_pago__lt=_inicio_del_dia(fin),
+            )
+        facturas = facturas.filter(filtro_periodo)
+        pendientes = pendientes.filter(filtro_vencimiento)
+        pagos = pagos.filter(filtro_pago)
+        for bucket in buckets:
+            resultado[bucket]
+
+    for row in (
+        facturas.values("vivienda__condominio_id", "periodo")
+        .annotate(
+            total=Sum("monto"),
+            emitidas=Count("id"),
+            pagadas=Count("id", filter=Q(estado__in=Factura.ESTADOS_SALDADOS)),
+        )
+    ):
+        valores = resultado[(row["vivienda__condominio_id"], row["periodo"])]
+        valores["facturado_total"] = row["total"] or Decimal("0")
+        valores["facturas_emitidas"] = row["emitidas"]
+        valores["facturas_pagadas"] = row["pagadas"]
+
+    for row in (
+        pendientes.annotate(mes=TruncMonth("fecha_vencimiento"))
+        .values("vivienda__condominio_id", "mes")
+        .annotate(total=Sum("monto"))
+    ):
+        clave = (row["vivienda__condominio_id"], _periodo_de_fecha(row["mes"]))
+        resultado[clave]["vencido_pendiente"] = row["total"] or Decimal("0")
+
+    for row in (
+        pagos.annotate(mes=TruncMonth("fecha_pago"))
+        .values("factura__vivienda__condominio_id", "mes")
+        .annotate(total=Sum("monto_pagado"))
+    ):
+        clave = (row["factura__vivienda__condominio_id"], _periodo_de_fecha(row["mes"]))
+        resultado[clave]["pagado_total"] = row["total"] or Decimal("0")
+
+    return dict(resultado)
+
+
+def _guardar(valores_por_bucket):
+    filas = [
+        ResumenFinanzasMensual(condominio_id=condominio_id, periodo=periodo, **valores)
+        for (condominio_id, periodo), valores in valores_por_bucket.items()
+    ]
+    if filas:
+        ResumenFinanzasMensual.objects.bulk_create(
+            filas,
+            update_conflicts=True,
+            unique_fields=["condominio", "periodo"],
+            update_fields=[*CAMPOS_RESUMEN, "actualizado_en"],
+        )
+
+
+def _clave_lock(bucket):
+    condominio_id, periodo = bucket
+    # pg_advisory_xact_lock(int, int) recibe claves de 32 bits con signo.
+    clave = zlib.crc32(f"{condominio_id}:{periodo}".encode())
+    return clave - (1 << 32) if clave >= (1 << 31) else clave
+
+
+def _bloquear_buckets(buckets):
+    if connection.vendor != "postgresql":
+        # SQLite serializa las escrituras con el lock de toda la base.
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, clave) FROM "
+            "(SELECT unnest(%s::integer[]) AS clave ORDER BY 1) AS claves",
+            [ESPACIO_LOCK, sorted({_clave_lock(bucket) for bucket in buckets})],
+        )
+
+
+def _recalcular_buckets(buckets):
+    with transaction.atomic():
+        # La suma se hace después de obtener el lock, así que ve lo que
+        # confirmó el recálculo anterior del mismo mes.
+        _bloquear_buckets(buckets)
+        _guardar(calcular_resumen(buckets))
+
+
+def actualizar_resumen_finanzas(buckets):
+    """Programa el recálculo de los meses indicados para después del commit."""
+    buckets = {bucket for bucket in buckets if bucket[0] and bucket[1]}
+    if buckets:
+        transaction.on_commit(partial(_recalcular_buckets, buckets))
+
+
+def reconstruir_resumen_finanzas(aplicar=True):
+    """Recalcula todo el resumen y devuelve las diferencias con lo almacenado.
+
+    Cada diferencia es ``(condominio_id, periodo, campo, almacenado, calculado)``.
+    Con ``aplicar`` se reemplaza el contenido de la tabla por lo calculado.
+    """
+    calculado = calcular_resumen()
+    almacenado = {
+        (fila.condominio_id, fila.periodo): {campo: getattr(fila, campo) for campo in CAMPOS_RESUMEN}
+        for fila in ResumenFinanzasMensual.objects.all()
+    }
+
+    diferencias = []
+    for clave in sorted(set(calculado) | set(almacenado), key=lambda item: (str(item[0]), item[1])):
+        esperado = calculado.get(clave, _valores_vacios())
+        actual = almacenado.get(clave, _valores_vacios())
+        for campo in CAMPOS_RESUMEN:
+            if Decimal(actual[campo]) != Decimal(esperado[campo]):
+                diferencias.append((clave[0], clave[1], campo, actual[campo], esperado[campo]))
+
+    if aplicar:
+        obsoletas = [
+            pk
+            for pk, condominio_id, periodo in ResumenFinanzasMensual.objects.values_list(
+                "pk", "condominio_id", "periodo"
+            )
+            if (condominio_id, periodo) not in calculado
+        ]
+        if obsoletas:
+            ResumenFinanzasMensual.objects.filter(pk__in=obsoletas).delete()
+        _guardar(calculado)
+
+    return diferencias
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import serializers
 
 from ..models import (
@@ -8,6 +9,7 @@ from ..models import (
     Factura,
     FacturaDetalle,
     FinanzasCodigoQR,
+    GeneracionFacturasJob,
     MultaAplicada,
     MultaConfig,
     NotificacionDirecta,
@@ -288,3 +290,34 @@ class NotificacionDirectaSerializer(serializers.ModelSerializer):
         if obj.enviado_por and hasattr(obj.enviado_por, "user"):
             return obj.enviado_por.user.get_full_name() or obj.enviado_por.user.username
         return None
+
+
+class GeneracionFacturasJobSerializer(serializers.ModelSerializer):
+    eta_segundos = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GeneracionFacturasJob
+        fields = [
+            "id",
+            "periodo",
+            "estado",
+            "total_viviendas",
+            "procesadas",
+            "creadas",
+            "actualizadas",
+            "sin_cambios",
+            "errores",
+            "eta_segundos",
+            "creado_en",
+            "iniciado_en",
+            "finalizado_en",
+        ]
+
+    def get_eta_segundos(self, obj):
+        if obj.estado != GeneracionFacturasJob.ESTADO_EN_PROCESO:
+            return 0 if obj.finalizado_en else None
+        if not obj.iniciado_en or not obj.procesadas:
+            return None
+        transcurrido = (timezone.now() - obj.iniciado_en).total_seconds()
+        restantes = max(obj.total_viviendas - obj.procesadas, 0)
+        return round(transcurrido / obj.procesadas * restantes, 1)
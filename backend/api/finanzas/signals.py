@@ -0,0 +1,76 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from ..models import Condominio, Factura, FacturaDetalle, Pago
+from .facturas_pdf import invalidar_pdf_factura
+from .resumen import actualizar_resumen_finanzas, buckets_de_factura, buckets_de_pago
+
+
+@receiver(pre_save, sender=Factura)
+def _factura_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    anterior = Factura.objects.filter(pk=instance.pk).only(
+        "vivienda_id", "periodo", "fecha_vencimiento"
+    ).first()
+    instance._resumen_buckets_previos = buckets_de_factura(anterior) if anterior else set()
+
+
+@receiver(post_save, sender=Factura)
+def _factura_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    buckets = getattr(instance, "_resumen_buckets_previos", set())
+    instance._resumen_buckets_previos = set()
+    actualizar_resumen_finanzas(buckets | buckets_de_factura(instance))
+
+
+@receiver(post_delete, sender=Factura)
+def _factura_post_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Condominio):
+        return
+    actualizar_resumen_finanzas(buckets_de_factura(instance))
+
+
+@receiver(pre_save, sender=Pago)
+def _pago_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    anterior = Pago.objects.filter(pk=instance.pk).only("factura_id", "fecha_pago").first()
+    instance._resumen_buckets_previos = buckets_de_pago(anterior) if anterior else set()
+
+
+@receiver(post_save, sender=Pago)
+def _pago_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    buckets = getattr(instance, "_resumen_buckets_previos", set())
+    instance._resumen_buckets_previos = set()
+    actualizar_resumen_finanzas(buckets | buckets_de_pago(instance))
+
+
+@receiver(post_delete, sender=Pago)
+def _pago_post_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Condominio):
+        return
+    actualizar_resumen_finanzas(buckets_de_pago(instance))
+
+
+# La huella del PDF ya cambia con el contenido; aquí solo se liberan los archivos viejos.
+@receiver(post_save, sender=Factura)
+@receiver(post_delete, sender=Factura)
+def _factura_invalidar_pdf(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(partial(invalidar_pdf_factura, instance.pk))
+
+
+@receiver(post_save, sender=FacturaDetalle)
+@receiver(post_delete, sender=FacturaDetalle)
+def _detalle_invalidar_pdf(sender, instance, raw=False, **kwargs):
+    if raw or not instance.factura_id:
+        return
+    transaction.on_commit(partial(invalidar_pdf_factura, instance.factura_id))
@@ -1,54 +1,71 @@
 from calendar import monthrange
 from datetime import date, datetime, time
 from decimal import Decimal, InvalidOperation
+from functools import partial
+import json
+import logging
 import mimetypes
 
 from django.db import transaction
 from django.conf import settings
 from django.db.models import Exists, OuterRef, Prefetch, Q, Sum
-from django.db.models.functions import TruncMonth, Upper
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
 
-from ..fcm_utils import send_fcm_notification
-from ..models import FCMDevice
+from ..actor import obtener_actor
+from ..busqueda import buscar_rankeado, filtro_documento
+from ..flujo import en_flujo
 from ..models import (
     ExpensaConfig,
     Factura,
     FacturaDetalle,
     FinanzasCodigoQR,
+    GeneracionFacturasJob,
     MultaAplicada,
     MultaConfig,
     NotificacionDirecta,
     Pago,
     Residente,
     ResidenteVivienda,
+    ResumenFinanzasMensual,
     Usuario,
     Vivienda,
 )
+from ..permissions import IsAdmin
+from ..push import programar_push
+from .facturas_pdf import abrir_pdf_factura, invalidar_pdf_factura, nombre_archivo, zip_facturas
+from .jobs import encolar_generacion_facturas
+from .paginacion import ORDEN_FACTURAS, CursorInvalido, paginar, tamano_pagina
+from .renderers import NDJSONRenderer
+from .resumen import actualizar_resumen_finanzas, buckets_de_pago
 from .serializers import (
     ExpensaConfigSerializer,
     FacturaAdminSerializer,
     FacturaDetalleSerializer,
     FinanzasQRSerializer,
     FacturaSerializer,
+    GeneracionFacturasJobSerializer,
     MultaAplicadaSerializer,
     MultaConfigSerializer,
     NotificacionDirectaSerializer,
     PagoSerializer,
 )
 
+logger = logging.getLogger(__name__)
 
-VALID_PAYMENT_STATES = {"APROBADO", "CONFIRMADO", "COMPLETADO", "PAGADO"}
-FACTURA_PAID_STATES = {"PAGADO", "PAGADA", "CANCELADO", "CANCELADA"}
-FACTURA_REVISION_STATE = "REVISION"
-PAGO_REVISION_STATE = "REVISION"
-PAGO_RECHAZADO_STATE = "RECHAZADO"
+GENERACION_BATCH_SIZE = 500
 MONTH_SHORT_LABELS = {
     1: "ene",
     2: "feb",
@@ -75,33 +92,21 @@ def _decimal_to_str(value):
 
 def _pagos_confirmados_queryset():
     return (
-        Pago.objects.annotate(estado_upper=Upper("estado"))
-        .filter(estado_upper__in=VALID_PAYMENT_STATES)
-        .order_by()
+        Pago.objects.filter(estado=Pago.ESTADO_CONFIRMADO).order_by()
     )
 
 
-def _obtener_vivienda_actual(usuario_auth):
-    if not usuario_auth or not getattr(usuario_auth, 'is_authenticated', False):
+def _obtener_vivienda_actual(request):
+    actor = obtener_actor(request)
+    if actor.user_id is None:
         raise ValueError('Usuario no autenticado')
-
-    try:
-        usuario = Usuario.objects.select_related("residente").get(user=usuario_auth)
-    except Usuario.DoesNotExist as exc:
-        raise ValueError("El usuario autenticado no tiene perfil asociado") from exc
-
-    if not hasattr(usuario, "residente") or usuario.residente is None:
+    if actor.usuario is None:
+        raise ValueError("El usuario autenticado no tiene perfil asociado")
+    if actor.residente is None:
         raise ValueError("El usuario autenticado no tiene residente vinculado")
-
-    relacion = (
-        ResidenteVivienda.objects.select_related("vivienda")
-        .filter(residente=usuario.residente, fecha_hasta__isnull=True)
-        .order_by("-fecha_desde")
-        .first()
-    )
-    if not relacion:
+    if actor.vivienda is None:
         raise ValueError("El residente no tiene una vivienda activa asignada")
-    return relacion.vivienda
+    return actor.vivienda
 
 
 def _parse_periodo(periodo):
@@ -137,6 +142,14 @@ def _prefetch_residentes_activos():
     )
 
 
+def _prefetch_pagos():
+    # ``PagoSerializer`` lee quién registró cada pago.
+    return Prefetch(
+        "pagos",
+        queryset=Pago.objects.select_related("registrado_por__user").order_by("-fecha_pago"),
+    )
+
+
 def _obtener_residente_principal(vivienda):
     relaciones = getattr(vivienda, "_residentes_activos", None)
     if relaciones:
@@ -180,12 +193,12 @@ def _crear_notificacion_residente(
 
     if residente is None:
         if vivienda_obj is None:
-            print("[FCM-FINANZAS] No se pudo determinar un residente objetivo para la notificación.")
+            logger.warning("No se pudo determinar un residente objetivo para la notificación.")
             return None
         residente = _obtener_residente_principal(vivienda_obj)
 
     if residente is None:
-        print(f"[FCM-FINANZAS] No se encontró residente principal para vivienda {vivienda_obj}")
+        logger.warning("No se encontró residente principal para la vivienda %s.", vivienda_obj)
         return None
 
     if isinstance(enviado_por, Usuario):
@@ -218,158 +231,62 @@ def _crear_notificacion_residente(
     payload.setdefault("tipo", "notificacion_directa")
 
     if residente and hasattr(residente, 'usuario') and residente.usuario:
-        devices = FCMDevice.objects.filter(usuario=residente.usuario)
-        if not devices:
-            print(f"[FCM-FINANZAS] Residente {residente} no tiene dispositivos FCM registrados.")
-        for device in devices:
-            try:
-                print(f"[FCM-FINANZAS] Intentando enviar push a token: {device.token} | title: {titulo} | data: {payload}")
-                resp = send_fcm_notification(device.token, titulo, mensaje, data=payload)
-                print(f"[FCM-FINANZAS] Push enviado correctamente a {device.token}: {resp}")
-            except Exception as e:
-                print(f"[FCM-FINANZAS] Error enviando push a {device.token}: {e}")
+        if not programar_push([residente.usuario], titulo, mensaje, data=payload):
+            logger.info("Residente %s no tiene dispositivos FCM registrados.", residente)
     else:
-        print(f"[FCM-FINANZAS] Residente {residente} no tiene usuario asociado o usuario es None.")
+        logger.info("Residente %s no tiene usuario asociado.", residente)
     return notificacion
 
 
-def _pdf_escape(text):
-    if text is None:
-        return ""
-    return (
-        str(text)
-        .replace("\\", "\\\\")
-        .replace("(", "\\(")
-        .replace(")", "\\)")
-    )
-
-
-def _build_factura_pdf(factura):
-    detalles = list(
-        factura.detalles.all().order_by("tipo", "descripcion")
+def _viviendas_facturables():
+    residentes_activos = ResidenteVivienda.objects.filter(
+        vivienda=OuterRef("pk"), fecha_hasta__isnull=True
     )
-    vivienda_prefetch = getattr(factura, "vivienda", None)
-    residentes = []
-    if vivienda_prefetch is not None:
-        residentes = getattr(vivienda_prefetch, "_residentes_activos", [])
-    if not residentes:
-        residentes = (
-            ResidenteVivienda.objects.select_related("residente")
-            .filter(vivienda=factura.vivienda, fecha_hasta__isnull=True)
-            .order_by("-fecha_desde")
-        )
-
-    nombres_residentes = [
-        f"{rel.residente.nombres} {rel.residente.apellidos}".strip()
-        for rel in residentes
-    ]
-    bloque = factura.vivienda.bloque or "-"
-
-    lineas = [
-        f"Factura periodo {factura.periodo}",
-        f"Condominio: {factura.vivienda.condominio.nombre}",
-        f"Vivienda: {factura.vivienda.codigo_unidad} (Bloque {bloque})",
-        "Residentes: " + (", ".join(nombres_residentes) or "-"),
-        f"Estado: {factura.estado}",
-        f"Monto total: Bs {factura.monto}",
-        "",
-        "Detalle:",
-    ]
-
-    if detalles:
-        for detalle in detalles:
-            lineas.append(
-                f"- {detalle.descripcion} ({detalle.tipo}) Bs {detalle.monto}"
-            )
-    else:
-        lineas.append("(Sin detalles registrados)")
-
-    if factura.fecha_vencimiento:
-        lineas.append("")
-        lineas.append(f"Fecha de vencimiento: {factura.fecha_vencimiento}")
-    if factura.fecha_pago:
-        lineas.append(f"Fecha de pago: {factura.fecha_pago}")
-
-    from io import BytesIO
-
-    buffer = BytesIO()
-    write = buffer.write
-    write(b"%PDF-1.4\n")
-    offsets = {}
-
-    def add_object(obj_id, body):
-        offsets[obj_id] = buffer.tell()
-        write(f"{obj_id} 0 obj\n".encode("latin-1"))
-        if isinstance(body, bytes):
-            write(body)
-        else:
-            write(body.encode("latin-1"))
-        write(b"\nendobj\n")
-
-    add_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
-    add_object(2, "<< /Type /Pages /Kids [3 0 R] /Count 1 >>")
-
-    content_lines = ["BT", "/F1 12 Tf"]
-    start_y = 780
-    for index, linea in enumerate(lineas):
-        y = start_y - index * 18
-        content_lines.append(
-            f"1 0 0 1 72 {y} Tm ({_pdf_escape(linea)}) Tj"
-        )
-    content_lines.append("ET")
-
-    content_stream = "\n".join(content_lines).encode("latin-1")
-
-    stream_header = f"<< /Length {len(content_stream)} >>\nstream\n".encode("latin-1")
-    offsets[4] = buffer.tell()
-    write(b"4 0 obj\n")
-    write(stream_header)
-    write(content_stream)
-    write(b"\nendstream\nendobj\n")
+    return Vivienda.objects.annotate(
+        tiene_residentes_activos=Exists(residentes_activos)
+    ).filter(estado=1, tiene_residentes_activos=True)
 
-    add_object(
-        3,
-        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
-        "/Resources << /Font << /F1 5 0 R >> >> >>",
-    )
-    add_object(5, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
-
-    xref_position = buffer.tell()
-    write(b"xref\n")
-    max_obj = max(offsets.keys()) if offsets else 0
-    write(f"0 {max_obj + 1}\n".encode("latin-1"))
-    write(b"0000000000 65535 f \n")
-    for obj_id in range(1, max_obj + 1):
-        offset = offsets.get(obj_id, 0)
-        write(f"{offset:010d} 00000 n \n".encode("latin-1"))
-    size_value = max_obj + 1
-    write(
-        (
-            "trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{pos}\n%%EOF".format(
-                size=size_value, pos=xref_position
-            )
-        ).encode("latin-1")
-    )
 
-    return buffer.getvalue()
 @transaction.atomic
-def _generar_facturas_para_periodo(periodo):
+def _generar_facturas_para_periodo(periodo, vivienda_ids=None):
+    """Genera o actualiza las facturas de expensa del periodo en bloque.
+
+    Todas las lecturas y escrituras se hacen por conjuntos, de modo que la
+    cantidad de sentencias no depende del número de viviendas. Si se indica
+    ``vivienda_ids`` solo se procesa ese subconjunto de viviendas.
+    """
     year, month = _parse_periodo(periodo)
     _, last_day = monthrange(year, month)
     fecha_vencimiento = date(year, month, last_day)
 
     expensas_map = _expensa_config_por_bloque()
-    residentes_activos = ResidenteVivienda.objects.filter(
-        vivienda=OuterRef("pk"), fecha_hasta__isnull=True
-    )
+    viviendas = _viviendas_facturables().only("id", "condominio_id", "bloque")
+    if vivienda_ids is not None:
+        viviendas = viviendas.filter(id__in=vivienda_ids)
+    viviendas = list(viviendas)
+    vivienda_ids = [vivienda.id for vivienda in viviendas]
+    condominios_por_vivienda = {vivienda.id: vivienda.condominio_id for vivienda in viviendas}
+
+    multas_por_vivienda = {}
+    for multa in (
+        MultaAplicada.objects.select_related("multa_config")
+        .filter(vivienda_id__in=vivienda_ids, factura__isnull=True)
+        .order_by("vivienda_id", "fecha_aplicacion")
+    ):
+        multas_por_vivienda.setdefault(multa.vivienda_id, []).append(multa)
 
-    viviendas = (
-        Vivienda.objects.select_related("condominio")
-        .annotate(tiene_residentes_activos=Exists(residentes_activos))
-        .filter(estado=1, tiene_residentes_activos=True)
-    )
+    facturas_existentes = {
+        factura.vivienda_id: factura
+        for factura in Factura.objects.filter(
+            vivienda_id__in=vivienda_ids, periodo=periodo, tipo="expensa"
+        )
+    }
 
     resumen = {"creadas": 0, "actualizadas": 0, "sin_cambios": 0}
+    facturas_nuevas = []
+    facturas_actualizadas = []
+    detalles_nuevos = []
+    multas_facturadas = []
 
     for vivienda in viviendas:
         clave = (vivienda.condominio_id, (vivienda.bloque or "").strip().upper())
@@ -380,11 +297,7 @@ def _generar_facturas_para_periodo(periodo):
             expensa_monto = Decimal(expensa_config.monto)
             expensa_descripcion = f"Expensa bloque {expensa_config.bloque}"
 
-        multas_pendientes = list(
-            MultaAplicada.objects.select_related("multa_config")
-            .filter(vivienda=vivienda, factura__isnull=True)
-            .order_by("fecha_aplicacion")
-        )
+        multas_pendientes = multas_por_vivienda.get(vivienda.id, [])
         total_multas = sum((Decimal(multa.monto) for multa in multas_pendientes), Decimal("0"))
 
         total_factura = expensa_monto + total_multas
@@ -392,52 +305,54 @@ def _generar_facturas_para_periodo(periodo):
             resumen["sin_cambios"] += 1
             continue
 
-        factura, creada = Factura.objects.get_or_create(
-            vivienda=vivienda,
-            periodo=periodo,
-            tipo="expensa",
-            defaults={
-                "monto": total_factura,
-                "estado": "PENDIENTE",
-                "fecha_vencimiento": fecha_vencimiento,
-            },
-        )
-
-        if not creada and factura.estado.upper() in FACTURA_PAID_STATES:
+        factura = facturas_existentes.get(vivienda.id)
+        creada = factura is None
+        if creada:
+            factura = Factura(
+                vivienda_id=vivienda.id,
+                periodo=periodo,
+                tipo="expensa",
+                monto=total_factura,
+                estado=Factura.ESTADO_PENDIENTE,
+                fecha_vencimiento=fecha_vencimiento,
+            )
+            facturas_nuevas.append(factura)
+        elif factura.estado in Factura.ESTADOS_SALDADOS:
             resumen["sin_cambios"] += 1
             continue
-
-        if not creada:
-            factura.detalles.all().delete()
+        else:
+            factura.monto = total_factura
+            if not factura.fecha_vencimiento:
+                factura.fecha_vencimiento = fecha_vencimiento
+            facturas_actualizadas.append(factura)
 
         detalles_creados = 0
         if expensa_descripcion and expensa_monto > 0:
-            FacturaDetalle.objects.create(
-                factura=factura,
-                descripcion=expensa_descripcion,
-                tipo=FacturaDetalle.TIPO_EXPENSA,
-                monto=expensa_monto,
+            detalles_nuevos.append(
+                FacturaDetalle(
+                    factura=factura,
+                    descripcion=expensa_descripcion,
+                    tipo=FacturaDetalle.TIPO_EXPENSA,
+                    monto=expensa_monto,
+                )
             )
             detalles_creados += 1
 
         for multa in multas_pendientes:
-            FacturaDetalle.objects.create(
-                factura=factura,
-                descripcion=multa.descripcion or multa.multa_config.descripcion or multa.multa_config.nombre,
-                tipo=FacturaDetalle.TIPO_MULTA,
-                monto=multa.monto,
-                multa_aplicada=multa,
+            detalles_nuevos.append(
+                FacturaDetalle(
+                    factura=factura,
+                    descripcion=multa.descripcion or multa.multa_config.descripcion or multa.multa_config.nombre,
+                    tipo=FacturaDetalle.TIPO_MULTA,
+                    monto=multa.monto,
+                    multa_aplicada=multa,
+                )
             )
             multa.factura = factura
             multa.periodo_facturado = periodo
-            multa.save(update_fields=["factura", "periodo_facturado"])
+            multas_facturadas.append(multa)
             detalles_creados += 1
 
-        factura.monto = total_factura
-        if not factura.fecha_vencimiento:
-            factura.fecha_vencimiento = fecha_vencimiento
-        factura.save(update_fields=["monto", "fecha_vencimiento"])
-
         if creada:
             resumen["creadas"] += 1
         else:
@@ -446,6 +361,30 @@ def _generar_facturas_para_periodo(periodo):
         if detalles_creados == 0:
             resumen["sin_cambios"] += 1
 
+    resumen_buckets = set()
+    for factura in facturas_nuevas + facturas_actualizadas:
+        condominio_id = condominios_por_vivienda[factura.vivienda_id]
+        resumen_buckets.add((condominio_id, factura.periodo))
+        if factura.fecha_vencimiento:
+            resumen_buckets.add((condominio_id, factura.fecha_vencimiento.strftime("%Y-%m")))
+
+    if facturas_actualizadas:
+        FacturaDetalle.objects.filter(factura__in=facturas_actualizadas).delete()
+        for factura in facturas_actualizadas:
+            transaction.on_commit(partial(invalidar_pdf_factura, factura.pk))
+        Factura.objects.bulk_update(
+            facturas_actualizadas, ["monto", "fecha_vencimiento"], batch_size=GENERACION_BATCH_SIZE
+        )
+    if facturas_nuevas:
+        Factura.objects.bulk_create(facturas_nuevas, batch_size=GENERACION_BATCH_SIZE)
+    if detalles_nuevos:
+        FacturaDetalle.objects.bulk_create(detalles_nuevos, batch_size=GENERACION_BATCH_SIZE)
+    if multas_facturadas:
+        MultaAplicada.objects.bulk_update(
+            multas_facturadas, ["factura", "periodo_facturado"], batch_size=GENERACION_BATCH_SIZE
+        )
+    actualizar_resumen_finanzas(resumen_buckets)
+
     return resumen
 
 
@@ -455,30 +394,6 @@ def resumen_finanzas_admin(request):
     today = timezone.localdate()
     current_period = today.strftime("%Y-%m")
 
-    ingresos_mes_total = (
-        Factura.objects.filter(periodo=current_period).aggregate(total=Sum("monto"))["total"]
-        or Decimal("0")
-    )
-
-    pagos_confirmados = _pagos_confirmados_queryset()
-
-    pagado_mes_total = (
-        pagos_confirmados
-        .filter(fecha_pago__year=today.year, fecha_pago__month=today.month)
-        .aggregate(total=Sum("monto_pagado"))["total"]
-        or Decimal("0")
-    )
-
-    pendiente_mes_total = ingresos_mes_total - pagado_mes_total
-    if pendiente_mes_total < Decimal("0"):
-        pendiente_mes_total = Decimal("0")
-
-    morosidad_total = (
-        Factura.objects.filter(estado__iexact="PENDIENTE", fecha_vencimiento__lt=today)
-        .aggregate(total=Sum("monto"))["total"]
-        or Decimal("0")
-    )
-
     months_to_return = 7
     month_keys = []
     year = today.year
@@ -491,36 +406,59 @@ def resumen_finanzas_admin(request):
             year -= 1
     month_keys.reverse()
 
-    pagos_por_mes = {
-        (row["month"].date() if hasattr(row["month"], "date") else row["month"]): row["total"]
-        or Decimal("0")
-        for row in (
-            pagos_confirmados
-            .annotate(month=TruncMonth("fecha_pago"))
-            .values("month")
-            .annotate(total=Sum("monto_pagado"))
+    resumenes = ResumenFinanzasMensual.objects.all()
+    condominio_param = request.query_params.get("condominio")
+    if condominio_param:
+        resumenes = resumenes.filter(condominio_id=condominio_param)
+
+    por_periodo = {
+        row["periodo"]: row
+        for row in resumenes.values("periodo").annotate(
+            facturado=Sum("facturado_total"),
+            pagado=Sum("pagado_total"),
+            vencido=Sum("vencido_pendiente"),
+            emitidas=Sum("facturas_emitidas"),
+            pagadas=Sum("facturas_pagadas"),
         )
-        if row["month"] is not None
     }
 
+    mes_actual = por_periodo.get(current_period, {})
+    ingresos_mes_total = mes_actual.get("facturado") or Decimal("0")
+    pagado_mes_total = mes_actual.get("pagado") or Decimal("0")
+
+    pendiente_mes_total = ingresos_mes_total - pagado_mes_total
+    if pendiente_mes_total < Decimal("0"):
+        pendiente_mes_total = Decimal("0")
+
+    # Los meses cerrados salen del resumen; del mes en curso solo cuenta lo ya vencido.
+    morosidad_total = sum(
+        (row["vencido"] or Decimal("0") for periodo, row in por_periodo.items() if periodo < current_period),
+        Decimal("0"),
+    )
+    vencidas_mes = Factura.objects.filter(
+        estado=Factura.ESTADO_PENDIENTE,
+        fecha_vencimiento__gte=today.replace(day=1),
+        fecha_vencimiento__lt=today,
+    )
+    if condominio_param:
+        vencidas_mes = vencidas_mes.filter(vivienda__condominio_id=condominio_param)
+    morosidad_total += vencidas_mes.aggregate(total=Sum("monto"))["total"] or Decimal("0")
+
     ingresos_mensuales = []
     for year, month in month_keys:
         first_day = date(year, month, 1)
-        total_mes = pagos_por_mes.get(first_day, Decimal("0"))
+        periodo = first_day.strftime("%Y-%m")
+        total_mes = por_periodo.get(periodo, {}).get("pagado") or Decimal("0")
         ingresos_mensuales.append(
             {
-                "periodo": first_day.strftime("%Y-%m"),
+                "periodo": periodo,
                 "label": MONTH_SHORT_LABELS.get(month, first_day.strftime("%b")).lower(),
                 "total": _decimal_to_str(total_mes),
             }
         )
 
-    total_facturas = Factura.objects.count()
-    facturas_pagadas = (
-        Factura.objects.annotate(estado_upper=Upper("estado"))
-        .filter(estado_upper__in=FACTURA_PAID_STATES)
-        .count()
-    )
+    total_facturas = sum((row["emitidas"] or 0 for row in por_periodo.values()), 0)
+    facturas_pagadas = sum((row["pagadas"] or 0 for row in por_periodo.values()), 0)
     porcentaje_pagadas = 0.0
     if total_facturas:
         porcentaje_pagadas = round((facturas_pagadas / total_facturas) * 100, 2)
@@ -541,56 +479,150 @@ def resumen_finanzas_admin(request):
     return Response(data)
 
 
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def facturas_admin(request):
-    queryset = (
-        Factura.objects.select_related("vivienda", "vivienda__condominio")
-        .prefetch_related(_prefetch_residentes_activos())
-        .order_by("-fecha_vencimiento", "-fecha_emision", "-periodo")
-    )
-
-    periodo = request.query_params.get("periodo")
+def _filtrar_facturas_admin(queryset, params):
+    periodo = params.get("periodo")
     if periodo:
         queryset = queryset.filter(periodo__icontains=periodo.strip())
 
-    estado = request.query_params.get("estado")
+    estado = params.get("estado")
     if estado:
-        queryset = queryset.filter(estado__iexact=estado.strip())
+        queryset = queryset.filter(estado=Factura.normalizar_estado(estado))
 
-    vivienda_param = request.query_params.get("vivienda")
+    vivienda_param = params.get("vivienda")
     if vivienda_param:
         queryset = queryset.filter(
             vivienda__codigo_unidad__icontains=vivienda_param.strip()
         )
 
-    residente_param = request.query_params.get("residente")
+    # Código de unidad y residentes viven en el documento de búsqueda de la vivienda,
+    # así el filtro no necesita joins ni DISTINCT y usa el índice de trigramas.
+    residente_param = params.get("residente")
     if residente_param:
         queryset = queryset.filter(
-            Q(vivienda__residentevivienda__residente__nombres__icontains=residente_param)
-            | Q(
-                vivienda__residentevivienda__residente__apellidos__icontains=
-                residente_param
-            )
+            filtro_documento(residente_param, "vivienda__documento_busqueda")
         )
 
-    search = request.query_params.get("search")
+    search = params.get("search")
     if search:
         queryset = queryset.filter(
-            Q(periodo__icontains=search)
-            | Q(vivienda__codigo_unidad__icontains=search)
-            | Q(vivienda__residentevivienda__residente__nombres__icontains=search)
-            | Q(vivienda__residentevivienda__residente__apellidos__icontains=search)
+            Q(periodo__icontains=search.strip())
+            | filtro_documento(search, "vivienda__documento_busqueda")
         )
 
-    tipo = request.query_params.get("tipo")
+    tipo = params.get("tipo")
     if tipo:
         queryset = queryset.filter(tipo__iexact=tipo.strip())
 
-    queryset = queryset.distinct()
+    return queryset
 
-    serializer = FacturaAdminSerializer(queryset, many=True)
-    return Response(serializer.data)
+
+def _stream_facturas_ndjson(queryset):
+    chunk_size = getattr(settings, "FINANZAS_EXPORT_CHUNK", 2000)
+    for factura in queryset.iterator(chunk_size=chunk_size):
+        fila = FacturaAdminSerializer(factura).data
+        yield json.dumps(fila, cls=encoders.JSONEncoder, ensure_ascii=False) + "\n"
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer])
+def facturas_admin(request):
+    queryset = _filtrar_facturas_admin(
+        Factura.objects.select_related("vivienda", "vivienda__condominio")
+        .prefetch_related(_prefetch_residentes_activos()),
+        request.query_params,
+    )
+
+    if request.accepted_renderer.format == NDJSONRenderer.format:
+        response = StreamingHttpResponse(
+            _stream_facturas_ndjson(queryset.order_by(*ORDEN_FACTURAS)),
+            content_type=NDJSONRenderer.media_type,
+        )
+        response["Content-Disposition"] = 'attachment; filename="facturas.ndjson"'
+        return en_flujo(request, response, lote=500)
+
+    cursor = request.query_params.get("cursor")
+    page_size = request.query_params.get("page_size")
+    if not cursor and not page_size:
+        # Respuesta histórica (lista completa) para clientes que aún no paginan.
+        queryset = queryset.order_by(*ORDEN_FACTURAS)
+        return Response(FacturaAdminSerializer(queryset, many=True).data)
+
+    try:
+        facturas, siguiente = paginar(queryset, cursor=cursor, page_size=page_size)
+    except CursorInvalido as error:
+        return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        {
+            "results": FacturaAdminSerializer(facturas, many=True).data,
+            "next_cursor": siguiente,
+            "page_size": tamano_pagina(page_size),
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAdmin])
+def busqueda_admin(request):
+    """Búsqueda global del administrador, ordenada por similitud."""
+    consulta = (request.query_params.get("q") or "").strip()
+    if not consulta:
+        return Response(
+            {"detail": "Debe indicar el texto a buscar en 'q'."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        limite = max(1, min(int(request.query_params.get("limite", 20)), 100))
+    except (TypeError, ValueError):
+        limite = 20
+
+    viviendas = buscar_rankeado(
+        Vivienda.objects.select_related("condominio"), consulta, limite=limite
+    )
+    residentes = buscar_rankeado(Residente.objects.all(), consulta, limite=limite)
+
+    puntaje_vivienda = {vivienda.id: puntaje for vivienda, puntaje in viviendas}
+    facturas = list(
+        Factura.objects.select_related("vivienda", "vivienda__condominio")
+        .prefetch_related(_prefetch_residentes_activos())
+        .filter(
+            Q(vivienda_id__in=puntaje_vivienda.keys())
+            | Q(periodo__startswith=consulta)
+        )
+        .order_by(*ORDEN_FACTURAS)[: limite * 5]
+    )
+    facturas.sort(key=lambda factura: puntaje_vivienda.get(factura.vivienda_id, 0), reverse=True)
+    facturas = facturas[:limite]
+
+    data = {
+        "viviendas": [
+            {
+                "id": str(vivienda.id),
+                "codigo_unidad": vivienda.codigo_unidad,
+                "condominio_nombre": vivienda.condominio.nombre,
+                "puntaje": round(puntaje, 4),
+            }
+            for vivienda, puntaje in viviendas
+        ],
+        "residentes": [
+            {
+                "id": str(residente.id),
+                "nombre": f"{residente.nombres} {residente.apellidos}".strip(),
+                "ci": residente.ci,
+                "puntaje": round(puntaje, 4),
+            }
+            for residente, puntaje in residentes
+        ],
+        "facturas": [
+            {
+                **FacturaAdminSerializer(factura).data,
+                "puntaje": round(puntaje_vivienda.get(factura.vivienda_id, 0), 4),
+            }
+            for factura in facturas
+        ],
+    }
+    return Response(data)
 
 
 @api_view(["GET"])
@@ -604,7 +636,7 @@ def factura_admin_detalle(request, pk):
                 "detalles",
                 queryset=FacturaDetalle.objects.order_by("tipo", "descripcion"),
             ),
-            Prefetch("pagos", queryset=Pago.objects.order_by("-fecha_pago")),
+            _prefetch_pagos(),
         ),
         pk=pk,
     )
@@ -637,14 +669,41 @@ def factura_admin_pdf(request, pk):
         pk=pk,
     )
 
-    pdf_bytes = _build_factura_pdf(factura)
-    filename = (
-        f"factura-{factura.vivienda.codigo_unidad}-{factura.periodo}".replace(" ", "_")
-        + ".pdf"
+    response = FileResponse(
+        abrir_pdf_factura(factura),
+        as_attachment=True,
+        filename=nombre_archivo(factura),
+        content_type="application/pdf",
     )
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
+    return en_flujo(request, response)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def facturas_admin_pdf_lote(request):
+    periodo = (request.query_params.get("periodo") or "").strip()
+    try:
+        _parse_periodo(periodo)
+    except ValueError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    facturas = (
+        Factura.objects.filter(periodo=periodo)
+        .select_related("vivienda", "vivienda__condominio")
+        .prefetch_related(_prefetch_residentes_activos(), "detalles")
+        .order_by("vivienda__codigo_unidad", "tipo")
+    )
+    condominio_param = request.query_params.get("condominio")
+    if condominio_param:
+        facturas = facturas.filter(vivienda__condominio_id=condominio_param)
+
+    chunk_size = getattr(settings, "FINANZAS_EXPORT_CHUNK", 2000)
+    response = StreamingHttpResponse(
+        zip_facturas(facturas.iterator(chunk_size=chunk_size)),
+        content_type="application/zip",
+    )
+    response["Content-Disposition"] = f'attachment; filename="facturas-{periodo}.zip"'
+    return en_flujo(request, response)
 
 
 @api_view(["POST"])
@@ -652,7 +711,7 @@ def factura_admin_pdf(request, pk):
 def registrar_pago_manual(request, pk):
     factura = get_object_or_404(Factura, pk=pk)
 
-    if factura.estado and factura.estado.upper() in FACTURA_PAID_STATES:
+    if factura.estado in Factura.ESTADOS_SALDADOS:
         return Response(
             {"detail": "La factura ya se encuentra registrada como pagada."},
             status=status.HTTP_400_BAD_REQUEST,
@@ -694,7 +753,7 @@ def registrar_pago_manual(request, pk):
 
     fecha_pago_final = fecha_pago_date or timezone.localdate()
 
-    usuario_actor = Usuario.objects.filter(user=request.user).first()
+    usuario_actor = obtener_actor(request).usuario
     comentario = request.data.get("comentario")
     if comentario:
         comentario = str(comentario)
@@ -706,22 +765,24 @@ def registrar_pago_manual(request, pk):
             factura=factura,
             metodo=metodo,
             monto_pagado=monto_dec,
-            estado="CONFIRMADO",
+            estado=Pago.ESTADO_CONFIRMADO,
             referencia_externa=referencia,
             registrado_por=usuario_actor,
             comentario=comentario,
         )
 
         if fecha_pago_date:
+            resumen_buckets = buckets_de_pago(pago)
             pago_fecha = datetime.combine(fecha_pago_date, time(hour=12, minute=0))
             if timezone.is_naive(pago_fecha):
                 pago_fecha = timezone.make_aware(pago_fecha)
             Pago.objects.filter(pk=pago.pk).update(fecha_pago=pago_fecha)
             pago.refresh_from_db()
+            actualizar_resumen_finanzas(resumen_buckets | buckets_de_pago(pago))
         else:
             pago.refresh_from_db()
 
-        factura.estado = "PAGADA"
+        factura.estado = Factura.ESTADO_PAGADA
         factura.fecha_pago = fecha_pago_final
         factura.save(update_fields=["estado", "fecha_pago"])
 
@@ -733,7 +794,7 @@ def registrar_pago_manual(request, pk):
                 "detalles",
                 queryset=FacturaDetalle.objects.order_by("tipo", "descripcion"),
             ),
-            Prefetch("pagos", queryset=Pago.objects.order_by("-fecha_pago")),
+            _prefetch_pagos(),
         )
         .get(pk=factura.pk)
     )
@@ -785,7 +846,7 @@ def codigo_qr_admin(request):
     if descripcion:
         descripcion = str(descripcion)[:140]
 
-    usuario_actor = Usuario.objects.filter(user=request.user).first()
+    usuario_actor = obtener_actor(request).usuario
 
     with transaction.atomic():
         if actual:
@@ -852,13 +913,13 @@ def codigo_qr_publico(request):
 @permission_classes([IsAuthenticated])
 def resumen_finanzas(request):
     try:
-        vivienda = _obtener_vivienda_actual(request.user)
+        vivienda = _obtener_vivienda_actual(request)
     except ValueError as error:
         return Response({"detail": str(error)}, status=400)
 
-    facturas_vivienda = Factura.objects.filter(vivienda=vivienda)
+    facturas_vivienda = Factura.objects.select_related("vivienda").filter(vivienda=vivienda)
     pendientes = facturas_vivienda.filter(
-        estado__in=["PENDIENTE", FACTURA_REVISION_STATE]
+        estado__in=[Factura.ESTADO_PENDIENTE, Factura.ESTADO_REVISION]
     )
 
     total_pendiente = pendientes.aggregate(total=Sum("monto"))['total'] or Decimal("0")
@@ -879,15 +940,15 @@ def resumen_finanzas(request):
 @permission_classes([IsAuthenticated])
 def lista_facturas(request):
     try:
-        vivienda = _obtener_vivienda_actual(request.user)
+        vivienda = _obtener_vivienda_actual(request)
     except ValueError as error:
         return Response({"detail": str(error)}, status=400)
 
     estado = request.query_params.get("estado")
-    facturas = Factura.objects.filter(vivienda=vivienda)
+    facturas = Factura.objects.select_related("vivienda").filter(vivienda=vivienda)
 
     if estado:
-        facturas = facturas.filter(estado__iexact=estado)
+        facturas = facturas.filter(estado=Factura.normalizar_estado(estado))
 
     facturas = facturas.order_by("-fecha_vencimiento", "-fecha_emision", "-periodo")
     serializer = FacturaSerializer(facturas, many=True)
@@ -898,16 +959,21 @@ def lista_facturas(request):
 @permission_classes([IsAuthenticated])
 def detalle_factura(request, pk):
     try:
-        vivienda = _obtener_vivienda_actual(request.user)
+        vivienda = _obtener_vivienda_actual(request)
     except ValueError as error:
         return Response({"detail": str(error)}, status=400)
 
-    factura = get_object_or_404(Factura, pk=pk, vivienda=vivienda)
-    pagos = Pago.objects.filter(factura=factura).order_by("-fecha_pago")
+    factura = get_object_or_404(
+        Factura.objects.select_related("vivienda").prefetch_related(
+            _prefetch_residentes_activos(), _prefetch_pagos()
+        ),
+        pk=pk,
+        vivienda=vivienda,
+    )
 
     data = {
         "factura": FacturaSerializer(factura).data,
-        "pagos": PagoSerializer(pagos, many=True).data,
+        "pagos": PagoSerializer(factura.pagos.all(), many=True).data,
     }
     return Response(data)
 
@@ -916,7 +982,7 @@ def detalle_factura(request, pk):
 @permission_classes([IsAuthenticated])
 def factura_residente_pdf(request, pk):
     try:
-        vivienda = _obtener_vivienda_actual(request.user)
+        vivienda = _obtener_vivienda_actual(request)
     except ValueError as error:
         return Response({"detail": str(error)}, status=400)
 
@@ -933,39 +999,36 @@ def factura_residente_pdf(request, pk):
         vivienda=vivienda,
     )
 
-    pdf_bytes = _build_factura_pdf(factura)
-    filename = (
-        f"factura-{factura.vivienda.codigo_unidad}-{factura.periodo}".replace(" ", "_")
-        + ".pdf"
+    response = FileResponse(
+        abrir_pdf_factura(factura),
+        as_attachment=True,
+        filename=nombre_archivo(factura),
+        content_type="application/pdf",
     )
-
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
+    return en_flujo(request, response)
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def confirmar_pago_factura(request, pk):
     try:
-        vivienda = _obtener_vivienda_actual(request.user)
+        vivienda = _obtener_vivienda_actual(request)
     except ValueError as error:
         return Response({"detail": str(error)}, status=400)
 
     factura = get_object_or_404(Factura, pk=pk, vivienda=vivienda)
-    estado_actual = (factura.estado or "").upper()
-    if estado_actual in FACTURA_PAID_STATES:
+    if factura.estado in Factura.ESTADOS_SALDADOS:
         return Response(
             {"detail": "La factura ya se encuentra registrada como pagada."},
             status=status.HTTP_400_BAD_REQUEST,
         )
-    if estado_actual == FACTURA_REVISION_STATE:
+    if factura.estado == Factura.ESTADO_REVISION:
         return Response(
             {"detail": "Ya existe un pago en revisión para esta factura."},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    if factura.pagos.filter(estado__iexact=PAGO_REVISION_STATE).exists():
+    if factura.pagos.filter(estado=Pago.ESTADO_REVISION).exists():
         return Response(
             {"detail": "Ya existe un pago en revisión para esta factura."},
             status=status.HTTP_400_BAD_REQUEST,
@@ -998,21 +1061,19 @@ def confirmar_pago_factura(request, pk):
     else:
         comentario = ""
 
-    usuario_registra = (
-        Usuario.objects.select_related("residente").filter(user=request.user).first()
-    )
+    usuario_registra = obtener_actor(request).usuario
 
     with transaction.atomic():
         pago = Pago.objects.create(
             factura=factura,
             metodo="QR",
             monto_pagado=monto_dec,
-            estado=PAGO_REVISION_STATE,
+            estado=Pago.ESTADO_REVISION,
             referencia_externa=referencia,
             registrado_por=usuario_registra,
             comentario=comentario,
         )
-        factura.estado = FACTURA_REVISION_STATE
+        factura.estado = Factura.ESTADO_REVISION
         factura.save(update_fields=["estado"])
 
     residente_destino = None
@@ -1051,9 +1112,8 @@ def resolver_pago_revision(request, factura_pk, pago_pk):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    estado_pago = (pago.estado or "").upper()
-    if estado_pago not in {PAGO_REVISION_STATE, "PENDIENTE"} and not (
-        accion == "rechazar" and estado_pago == PAGO_RECHAZADO_STATE
+    if pago.estado not in {Pago.ESTADO_REVISION, Pago.ESTADO_PENDIENTE} and not (
+        accion == "rechazar" and pago.estado == Pago.ESTADO_RECHAZADO
     ):
         return Response(
             {"detail": "El pago ya fue procesado."},
@@ -1066,37 +1126,37 @@ def resolver_pago_revision(request, factura_pk, pago_pk):
     else:
         comentario = ""
 
-    usuario_actor = (
-        Usuario.objects.select_related("residente").filter(user=request.user).first()
-    )
+    usuario_actor = obtener_actor(request).usuario
 
+    resumen_buckets = buckets_de_pago(pago)
     with transaction.atomic():
         if accion == "aprobar":
             Pago.objects.filter(pk=pago.pk).update(
-                estado="CONFIRMADO",
+                estado=Pago.ESTADO_CONFIRMADO,
                 comentario=comentario,
                 registrado_por=pago.registrado_por or usuario_actor,
                 fecha_pago=timezone.now(),
             )
             pago.refresh_from_db()
-            factura.estado = "PAGADA"
+            factura.estado = Factura.ESTADO_PAGADA
             factura.fecha_pago = timezone.localdate()
             factura.save(update_fields=["estado", "fecha_pago"])
             mensaje = "Tu pago fue confirmado y la factura quedó registrada como pagada."
         else:
             Pago.objects.filter(pk=pago.pk).update(
-                estado=PAGO_RECHAZADO_STATE,
+                estado=Pago.ESTADO_RECHAZADO,
                 comentario=comentario,
                 registrado_por=pago.registrado_por or usuario_actor,
             )
             pago.refresh_from_db()
-            factura.estado = "PENDIENTE"
+            factura.estado = Factura.ESTADO_PENDIENTE
             factura.fecha_pago = None
             factura.save(update_fields=["estado", "fecha_pago"])
             mensaje = (
                 "El pago fue rechazado. "
                 + ("Motivo: " + comentario if comentario else "Revisa los datos e inténtalo nuevamente.")
             )
+        actualizar_resumen_finanzas(resumen_buckets | buckets_de_pago(pago))
 
     residente_destino = None
     if pago.registrado_por and hasattr(pago.registrado_por, "residente"):
@@ -1121,7 +1181,7 @@ def resolver_pago_revision(request, factura_pk, pago_pk):
                 "detalles",
                 queryset=FacturaDetalle.objects.order_by("tipo", "descripcion"),
             ),
-            Prefetch("pagos", queryset=Pago.objects.order_by("-fecha_pago")),
+            _prefetch_pagos(),
         )
         .get(pk=factura.pk)
     )
@@ -1261,7 +1321,7 @@ def notificaciones_directas_admin(request):
     serializer = NotificacionDirectaSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
 
-    usuario_actor = Usuario.objects.filter(user=request.user).first()
+    usuario_actor = obtener_actor(request).usuario
     data_validada = serializer.validated_data
 
     residente = data_validada.get("residente")
@@ -1303,9 +1363,7 @@ def notificaciones_directas_admin(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def notificaciones_residente(request):
-    usuario = (
-        Usuario.objects.select_related("residente").filter(user=request.user).first()
-    )
+    usuario = obtener_actor(request).usuario
     if not usuario or not getattr(usuario, "residente", None):
         return Response(
             {"detail": "El usuario autenticado no tiene un residente asociado."},
@@ -1313,7 +1371,9 @@ def notificaciones_residente(request):
         )
 
     queryset = (
-        NotificacionDirecta.objects.select_related("factura", "pago")
+        NotificacionDirecta.objects.select_related(
+            "residente", "enviado_por__user", "factura", "pago"
+        )
         .filter(residente=usuario.residente)
         .order_by("-creado_en")
     )
@@ -1324,9 +1384,7 @@ def notificaciones_residente(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def marcar_notificacion_leida(request, pk):
-    usuario = (
-        Usuario.objects.select_related("residente").filter(user=request.user).first()
-    )
+    usuario = obtener_actor(request).usuario
     if not usuario or not getattr(usuario, "residente", None):
         return Response(
             {"detail": "El usuario autenticado no tiene un residente asociado."},
@@ -1351,14 +1409,20 @@ def generar_facturas_admin(request):
         periodo = timezone.localdate().strftime("%Y-%m")
 
     try:
-        resumen = _generar_facturas_para_periodo(periodo)
+        _parse_periodo(periodo)
     except ValueError as exc:
         return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-    data = {
-        "periodo": periodo,
-        "creadas": resumen.get("creadas", 0),
-        "actualizadas": resumen.get("actualizadas", 0),
-        "sin_cambios": resumen.get("sin_cambios", 0),
-    }
-    return Response(data, status=status.HTTP_200_OK)
+    usuario_actor = obtener_actor(request).usuario
+    job = encolar_generacion_facturas(periodo, solicitado_por=usuario_actor)
+
+    serializer = GeneracionFacturasJobSerializer(job)
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def generar_facturas_admin_estado(request, pk):
+    job = get_object_or_404(GeneracionFacturasJob, pk=pk)
+    serializer = GeneracionFacturasJobSerializer(job)
+    return Response(serializer.data)
@@ -0,0 +1,43 @@
+"""Respuestas en flujo que no se acumulan en memoria, con ASGI o con WSGI.
+
+Con ASGI, Django consume de una sola vez (``sync_to_async(list)``) el
+iterador síncrono de un ``StreamingHttpResponse`` o ``FileResponse`` antes de
+enviar el primer byte, así que una exportación grande queda entera en memoria.
+Con WSGI pasa lo mismo con los iteradores asíncronos. ``en_flujo`` deja el
+iterador de la respuesta en la forma que sirve al manejador de la petición:
+con ASGI lo recorre de a ``lote`` partes en el hilo de la petición, de modo que
+las consultas del iterador usan siempre la misma conexión.
+"""
+
+import itertools
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+LOTE = 16
+
+
+def es_asgi(request):
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+def _tomar(iterador, cantidad):
+    return list(itertools.islice(iterador, cantidad))
+
+
+async def _asincrono(iterable, lote):
+    iterador = iter(iterable)
+    tomar = sync_to_async(_tomar, thread_sensitive=True)
+    while True:
+        partes = await tomar(iterador, lote)
+        if not partes:
+            return
+        for parte in partes:
+            yield parte
+
+
+def en_flujo(request, response, lote=LOTE):
+    """Adapta el iterador de ``response`` al manejador de ``request`` y la devuelve."""
+    if es_asgi(request) and not response.is_async:
+        response.streaming_content = _asincrono(response.streaming_content, lote)
+    return response
@@ -0,0 +1,219 @@
+"""Versiones reducidas de las imágenes subidas.
+
+Por cada imagen se generan dos rendiciones en ``IMAGENES_FORMATO`` (WebP o
+JPEG): ``miniatura`` (lado mayor ``IMAGENES_MINIATURA`` px) para listados y
+``media`` (``IMAGENES_MEDIA`` px) para pantallas de detalle en el celular. Se
+guardan bajo ``rendiciones/`` con el nombre completo del original (extensión
+incluida, para que ``foto.jpg`` y ``foto.png`` no compartan rendición), así que
+no hace falta guardar nada en la base.
+
+Los modelos se registran con ``registrar(modelo, *campos)``. Al guardar uno,
+las rendiciones que faltan se generan tras el commit en un pool de
+``IMAGENES_MAX_WORKERS`` hilos (con 0, en el mismo hilo). Mientras no existen,
+``url`` devuelve la del original. ``generar_rendiciones`` completa las
+imágenes subidas antes de activar esto.
+
+Las vistas que incluyen ``RendicionesMixin`` ponen ``rendicion`` en el
+contexto del serializer: ``miniatura`` en los listados y ``original`` en el
+resto, salvo que la petición pida otra con ``?rendicion=``.
+"""
+
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO = "rendiciones"
+ORIGINAL = "original"
+RENDICIONES = ("miniatura", "media")
+MAX_ENTRADAS = 8192
+
+# (modelo, campo) de las imágenes con rendiciones.
+CAMPOS = []
+
+_existentes = set()
+_existentes_lock = threading.Lock()
+
+
+def _tamanos():
+    return {
+        "miniatura": getattr(settings, "IMAGENES_MINIATURA", 320),
+        "media": getattr(settings, "IMAGENES_MEDIA", 1024),
+    }
+
+
+def _formato():
+    return "JPEG" if getattr(settings, "IMAGENES_FORMATO", "webp").lower() in ("jpg", "jpeg") else "WEBP"
+
+
+def nombre_rendicion(nombre, rendicion):
+    """``areas/foto.png`` -> ``rendiciones/areas/foto.png.miniatura.webp``."""
+    extension = "jpg" if _formato() == "JPEG" else "webp"
+    return f"{DIRECTORIO}/{nombre}.{rendicion}.{extension}"
+
+
+def _existe(nombre, storage):
+    # Solo se recuerdan las que existen: una vez generada, una rendición no cambia.
+    if nombre in _existentes:
+        return True
+    if not storage.exists(nombre):
+        return False
+    with _existentes_lock:
+        if len(_existentes) >= MAX_ENTRADAS:
+            _existentes.clear()
+        _existentes.add(nombre)
+    return True
+
+
+def faltantes(nombre, storage=None):
+    storage = storage or default_storage
+    return [rendicion for rendicion in RENDICIONES if not _existe(nombre_rendicion(nombre, rendicion), storage)]
+
+
+def _codificar(imagen):
+    formato = _formato()
+    opciones = {"quality": getattr(settings, "IMAGENES_CALIDAD", 80)}
+    if formato == "JPEG":
+        imagen = imagen.convert("RGB")
+        opciones["optimize"] = True
+    else:
+        if imagen.mode not in ("RGB", "RGBA"):
+            transparente = "A" in imagen.getbands() or "transparency" in imagen.info
+            imagen = imagen.convert("RGBA" if transparente else "RGB")
+        opciones["method"] = 4
+    salida = io.BytesIO()
+    imagen.save(salida, formato, **opciones)
+    return salida.getvalue()
+
+
+def generar(nombre, storage=None):
+    """Genera las rendiciones que faltan de ``nombre``; devuelve las creadas.
+
+    La imagen se decodifica una sola vez (en JPEG, ya reducida con ``draft``)
+    y cada rendición se obtiene de la anterior, de mayor a menor.
+    """
+    storage = storage or default_storage
+    pendientes = faltantes(nombre, storage)
+    if not pendientes:
+        return []
+    tamanos = _tamanos()
+    try:
+        with storage.open(nombre, "rb") as archivo, Image.open(archivo) as original:
+            original.draft("RGB", (max(tamanos.values()),) * 2)
+            imagen = ImageOps.exif_transpose(original)
+            imagen.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        logger.warning("No se pudieron generar las rendiciones de %s: %r", nombre, exc)
+        return []
+
+    creadas = []
+    for rendicion in sorted(RENDICIONES, key=tamanos.get, reverse=True):
+        lado = tamanos[rendicion]
+        imagen.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        if rendicion not in pendientes:
+            continue
+        destino = nombre_rendicion(nombre, rendicion)
+        guardado = storage.save(destino, ContentFile(_codificar(imagen)))
+        if guardado != destino:
+            # Otro hilo la generó primero.
+            storage.delete(guardado)
+        creadas.append(destino)
+    return creadas
+
+
+def url(archivo, rendicion=ORIGINAL):
+    """URL de la rendición de ``archivo`` (un ``FieldFile``), o la del original si aún no existe."""
+    if rendicion != ORIGINAL:
+        nombre = nombre_rendicion(archivo.name, rendicion)
+        if _existe(nombre, archivo.storage):
+            return archivo.storage.url(nombre)
+    return archivo.url
+
+
+def rendicion_solicitada(request, por_defecto=ORIGINAL):
+    valor = request.query_params.get("rendicion") if request is not None else None
+    return valor if valor in (ORIGINAL, *RENDICIONES) else por_defecto
+
+
+class RendicionesMixin:
+    """Pone en el contexto del serializer la rendición a devolver en los campos de imagen."""
+
+    acciones_listado = ("list",)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["rendicion"] = rendicion_solicitada(
+            self.request, "miniatura" if self.action in self.acciones_listado else ORIGINAL
+        )
+        return context
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=max(getattr(settings, "IMAGENES_MAX_WORKERS", 2), 1),
+                thread_name_prefix="rendiciones",
+            )
+        return _pool
+
+
+def reiniciar_pool():
+    """Espera las rendiciones en curso, descarta el pool y olvida las rendiciones vistas."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+    with _existentes_lock:
+        _existentes.clear()
+
+
+def _generar_en_segundo_plano(nombre):
+    try:
+        generar(nombre)
+    except Exception:  # noqa: BLE001 - generar_rendiciones la completa
+        logger.exception("Error generando las rendiciones de %s", nombre)
+
+
+def programar(nombre):
+    """Genera las rendiciones de ``nombre`` cuando la transacción actual confirma."""
+
+    def enviar():
+        if getattr(settings, "IMAGENES_MAX_WORKERS", 2) <= 0:
+            _generar_en_segundo_plano(nombre)
+        else:
+            obtener_pool().submit(_generar_en_segundo_plano, nombre)
+
+    transaction.on_commit(enviar)
+
+
+def registrar(modelo, *campos):
+    """Genera rendiciones para los ``campos`` de imagen de ``modelo`` al guardarlo."""
+    CAMPOS.extend((modelo, campo) for campo in campos)
+
+    def _guardado(sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        for campo in campos:
+            archivo = getattr(instance, campo)
+            if archivo and faltantes(archivo.name, archivo.storage):
+                programar(archivo.name)
+
+    post_save.connect(
+        _guardado, sender=modelo, weak=False, dispatch_uid=f"rendiciones_{modelo._meta.label}_{'_'.join(campos)}"
+    )
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.finanzas.facturas_pdf import construir_pdf
+
+
+class _Contador:
+    """Destino que solo cuenta bytes, para medir el render sin E/S."""
+
+    def __init__(self):
+        self.total = 0
+
+    def write(self, datos):
+        self.total += len(datos)
+        return len(datos)
+
+
+def _lineas_de_prueba(indice, detalles):
+    lineas = [
+        "Factura periodo 2025-01",
+        "Condominio: Condominio de prueba",
+        f"Vivienda: B-{indice:04d} (Bloque B)",
+        "Residentes: Ana Rojas, Juan Pérez",
+        "Estado: PENDIENTE",
+        "Monto total: Bs 1250.00",
+        "",
+        "Detalle:",
+    ]
+    lineas.extend(
+        f"- Concepto {numero} del mes con descripción extensa (expensa) Bs 25.00"
+        for numero in range(detalles)
+    )
+    lineas.extend(["", "Fecha de vencimiento: 2025-01-10"])
+    return lineas
+
+
+class Command(BaseCommand):
+    help = "Mide el tiempo de generar PDF de facturas sin tocar la base de datos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cantidad", type=int, default=1000)
+        parser.add_argument(
+            "--detalles",
+            type=int,
+            default=12,
+            help="Renglones de detalle por factura (más de ~40 genera varias páginas).",
+        )
+
+    def handle(self, *args, **options):
+        cantidad = options["cantidad"]
+        lotes = [_lineas_de_prueba(indice, options["detalles"]) for indice in range(cantidad)]
+
+        contador = _Contador()
+        inicio = time.perf_counter()
+        for lineas in lotes:
+            construir_pdf(lineas, contador)
+        duracion = time.perf_counter() - inicio
+
+        self.stdout.write(
+            f"{cantidad} facturas en {duracion:.3f} s "
+            f"({duracion / cantidad * 1000:.3f} ms/factura), "
+            f"{contador.total / cantidad / 1024:.1f} KiB promedio"
+        )
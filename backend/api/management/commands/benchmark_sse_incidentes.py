@@ -0,0 +1,315 @@
+import asyncio
+import json
+import multiprocessing
+import resource
+import socket
+import statistics
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+RUTA_STREAM = "/api/seguridad/incidentes/stream/"
+PREFIJO = "bench:"
+
+
+# --- Clientes (corren en un proceso aparte para no sumar su memoria al servidor) ---
+
+
+async def _leer_chunks(reader):
+    """Cuerpo de una respuesta HTTP/1.1 con ``Transfer-Encoding: chunked``."""
+    while True:
+        linea = await reader.readline()
+        if not linea:
+            return
+        tamano = int(linea.split(b";")[0].strip() or b"0", 16)
+        if tamano == 0:
+            return
+        datos = await reader.readexactly(tamano)
+        await reader.readexactly(2)
+        yield datos
+
+
+async def _cliente(host, puerto, token, latencias, listos, cerrar):
+    reader, writer = await asyncio.open_connection(host, puerto)
+    writer.write(
+        f"GET {RUTA_STREAM}?token={token} HTTP/1.1\r\nHost: {host}\r\n"
+        "Accept: text/event-stream\r\n\r\n".encode("ascii")
+    )
+    await writer.drain()
+
+    estado = await reader.readline()
+    if b" 200 " not in estado:
+        raise RuntimeError(f"El stream respondió {estado!r}")
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+
+    pendiente = b""
+    primer_evento = True
+    try:
+        async for datos in _leer_chunks(reader):
+            recibido = time.time()
+            pendiente += datos
+            while b"\n\n" in pendiente:
+                bloque, pendiente = pendiente.split(b"\n\n", 1)
+                campos = dict(
+                    linea.split(": ", 1)
+                    for linea in bloque.decode("utf-8").splitlines()
+                    if ": " in linea
+                )
+                if campos.get("event") != "incidents":
+                    continue
+                if primer_evento:
+                    primer_evento = False
+                    listos.release()
+                    continue
+                carga = json.loads(campos["data"])
+                for incidente in carga["incidents"]:
+                    if incidente["id"] == carga.get("incidente_id"):
+                        descripcion = incidente.get("descripcion") or ""
+                        if descripcion.startswith(PREFIJO):
+                            latencias.append(recibido - float(descripcion[len(PREFIJO):]))
+            if cerrar.is_set():
+                break
+    finally:
+        writer.close()
+
+
+def _correr_clientes(host, puerto, token, cantidad, conexion):
+    """Proceso hijo: abre ``cantidad`` streams y devuelve las latencias por ``conexion``."""
+
+    async def principal():
+        latencias = []
+        listos = asyncio.Semaphore(0)
+        cerrar = asyncio.Event()
+        tareas = [
+            asyncio.create_task(_cliente(host, puerto, token, latencias, listos, cerrar))
+            for _ in range(cantidad)
+        ]
+        for _ in range(cantidad):
+            await listos.acquire()
+        conexion.send("listos")
+
+        await asyncio.get_running_loop().run_in_executor(None, conexion.recv)
+        cerrar.set()
+        for tarea in tareas:
+            tarea.cancel()
+        resultados = await asyncio.gather(*tareas, return_exceptions=True)
+        errores = [
+            repr(resultado)
+            for resultado in resultados
+            if isinstance(resultado, BaseException) and not isinstance(resultado, asyncio.CancelledError)
+        ]
+        conexion.send({"latencias": latencias, "errores": errores})
+
+    asyncio.run(principal())
+
+
+# --- Servidor y mediciones ---
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/status", encoding="ascii") as archivo:
+            for linea in archivo:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss es el pico (KiB en Linux); sirve como aproximación.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _ContadorConsultas:
+    """Cuenta las consultas de todas las conexiones a la base de datos del proceso."""
+
+    def __init__(self):
+        self.lecturas = 0
+        self.escrituras = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            if sql.lstrip().upper().startswith("SELECT"):
+                self.lecturas += 1
+            else:
+                self.escrituras += 1
+        return execute(sql, params, many, context)
+
+    def reiniciar(self):
+        with self._lock:
+            self.lecturas = self.escrituras = 0
+
+    def instalar(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        def al_conectar(sender, connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+        connection_created.connect(al_conectar, weak=False)
+        for conexion in connections.all():
+            conexion.execute_wrappers.append(self)
+
+
+def _percentil(valores, porcentaje):
+    if not valores:
+        return float("nan")
+    indice = min(len(valores) - 1, max(0, round(porcentaje / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def _puerto_libre():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Abre N clientes del stream SSE de incidentes contra un servidor ASGI local, "
+        "inyecta incidentes a una tasa fija y mide latencia, memoria y consultas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clientes", type=int, default=200)
+        parser.add_argument("--tasa", type=float, default=2.0, help="Incidentes por segundo.")
+        parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de inyección.")
+        parser.add_argument("--puerto", type=int, default=0, help="0 elige uno libre.")
+        parser.add_argument("--json", action="store_true", help="Imprime el resultado en JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn
+        except ImportError as exc:
+            raise CommandError("Se necesita uvicorn para levantar el servidor ASGI.") from exc
+
+        from django.core.asgi import get_asgi_application
+        from django.db import close_old_connections
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        from api.models import ReporteIncidenteSeguridad, Residente, Rol, Usuario, UsuarioRol
+        from django.contrib.auth.models import User
+
+        clientes = options["clientes"]
+        puerto = options["puerto"] or _puerto_libre()
+        sufijo = uuid.uuid4().hex[:8]
+
+        # Lo sembrado se borra en el finally aunque el servidor o los clientes no arranquen.
+        user = residente = servidor = hilo = proceso = None
+        try:
+            user = User.objects.create_user(username=f"bench_sse_{sufijo}")
+            usuario = Usuario.objects.create(user=user)
+            rol, _ = Rol.objects.get_or_create(nombre="GUA")
+            UsuarioRol.objects.create(usuario=usuario, rol=rol, estado=1)
+            residente = Residente.objects.create(ci=f"B{sufijo}", nombres="Bench", apellidos="SSE")
+            token = str(RefreshToken.for_user(user).access_token)
+
+            servidor = uvicorn.Server(
+                uvicorn.Config(
+                    get_asgi_application(),
+                    host="127.0.0.1",
+                    port=puerto,
+                    log_level="warning",
+                    lifespan="off",
+                )
+            )
+            hilo = threading.Thread(target=servidor.run, name="bench-uvicorn", daemon=True)
+            hilo.start()
+            while not servidor.started:
+                if not hilo.is_alive():
+                    raise CommandError("No se pudo iniciar el servidor ASGI.")
+                time.sleep(0.05)
+
+            contador = _ContadorConsultas()
+            contador.instalar()
+            contexto = multiprocessing.get_context("spawn")
+            extremo, extremo_hijo = contexto.Pipe()
+            rss_inicial = _rss_bytes()
+            proceso = contexto.Process(
+                target=_correr_clientes,
+                args=("127.0.0.1", puerto, token, clientes, extremo_hijo),
+                daemon=True,
+            )
+            inicio_conexion = time.perf_counter()
+            proceso.start()
+            if not extremo.poll(120) or extremo.recv() != "listos":
+                raise CommandError("Los clientes no lograron conectarse.")
+            tiempo_conexion = time.perf_counter() - inicio_conexion
+            rss_conectados = _rss_bytes()
+
+            contador.reiniciar()
+            intervalo = 1 / options["tasa"]
+            inyectados = 0
+            inicio = time.perf_counter()
+            while time.perf_counter() - inicio < options["duracion"]:
+                ReporteIncidenteSeguridad.objects.create(
+                    residente=residente,
+                    ubicacion="Benchmark",
+                    descripcion=f"{PREFIJO}{time.time():.6f}",
+                )
+                inyectados += 1
+                time.sleep(max(0.0, inicio + inyectados * intervalo - time.perf_counter()))
+            time.sleep(2)
+            segundos = time.perf_counter() - inicio
+            lecturas, escrituras = contador.lecturas, contador.escrituras
+
+            extremo.send("cerrar")
+            if not extremo.poll(60):
+                raise CommandError("Los clientes no devolvieron resultados.")
+            resultado = extremo.recv()
+        finally:
+            if proceso is not None:
+                proceso.join(timeout=10)
+                if proceso.is_alive():
+                    proceso.terminate()
+            if servidor is not None:
+                servidor.should_exit = True
+                hilo.join(timeout=10)
+            close_old_connections()
+            if residente is not None:
+                ReporteIncidenteSeguridad.objects.filter(residente=residente).delete()
+                residente.delete()
+            if user is not None:
+                user.delete()
+
+        latencias = sorted(valor * 1000 for valor in resultado["latencias"])
+        esperados = inyectados * clientes
+        reporte = {
+            "clientes": clientes,
+            "incidentes": inyectados,
+            "entregados": len(latencias),
+            "esperados": esperados,
+            "errores_clientes": len(resultado["errores"]),
+            "conexion_s": round(tiempo_conexion, 3),
+            "latencia_ms": {
+                "p50": round(_percentil(latencias, 50), 2),
+                "p90": round(_percentil(latencias, 90), 2),
+                "p99": round(_percentil(latencias, 99), 2),
+                "max": round(latencias[-1], 2) if latencias else None,
+                "media": round(statistics.fmean(latencias), 2) if latencias else None,
+            },
+            "memoria_por_conexion_kib": round((rss_conectados - rss_inicial) / clientes / 1024, 1),
+            "lecturas_por_segundo": round(lecturas / segundos, 2),
+            "escrituras_por_segundo": round(escrituras / segundos, 2),
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(reporte))
+            return
+
+        latencia = reporte["latencia_ms"]
+        self.stdout.write(
+            f"{clientes} clientes conectados en {reporte['conexion_s']} s, "
+            f"{reporte['memoria_por_conexion_kib']} KiB por conexión en el servidor\n"
+            f"{inyectados} incidentes: {len(latencias)}/{esperados} entregas, "
+            f"{reporte['errores_clientes']} clientes con error\n"
+            f"Latencia ms: p50 {latencia['p50']}, p90 {latencia['p90']}, "
+            f"p99 {latencia['p99']}, máx {latencia['max']}\n"
+            f"Consultas/s: {reporte['lecturas_por_segundo']} lecturas, "
+            f"{reporte['escrituras_por_segundo']} escrituras (incluye la inyección)"
+        )
+        for error in resultado["errores"][:5]:
+            self.stderr.write(error)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api import imagenes
+
+
+class Command(BaseCommand):
+    help = "Genera las rendiciones (miniatura y media) que faltan de las imágenes subidas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Solo informa cuántas imágenes no tienen todas sus rendiciones.",
+        )
+
+    def handle(self, *args, **options):
+        pendientes = generadas = 0
+        for modelo, campo in imagenes.CAMPOS:
+            nombres = (
+                modelo.objects.exclude(Q(**{f"{campo}__isnull": True}) | Q(**{campo: ""}))
+                .order_by()
+                .values_list(campo, flat=True)
+                .distinct()
+            )
+            for nombre in nombres.iterator():
+                if not imagenes.faltantes(nombre):
+                    continue
+                pendientes += 1
+                if options["check"]:
+                    self.stdout.write(f"{modelo._meta.label}.{campo}: {nombre}")
+                elif imagenes.generar(nombre):
+                    generadas += 1
+
+        if not pendientes:
+            self.stdout.write(self.style.SUCCESS("Todas las imágenes tienen sus rendiciones."))
+        elif options["check"]:
+            self.stdout.write(self.style.WARNING(f"{pendientes} imágenes sin rendiciones."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rendiciones generadas para {generadas} de {pendientes} imágenes."))
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.security.identificacion import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = "Worker que reconoce las capturas de acceso que quedaron pendientes (p. ej. tras reiniciar el proceso web)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--antiguedad",
+            type=int,
+            default=120,
+            help="Solo toma pendientes creados hace más de N segundos (0 = todos).",
+        )
+        parser.add_argument(
+            "--limite",
+            type=int,
+            default=100,
+            help="Cantidad máxima de capturas por pasada.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Procesa las pendientes y termina en lugar de quedar escuchando.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=None,
+            help="Segundos de espera entre pasadas (por defecto PLACAS_PENDIENTES_INTERVALO).",
+        )
+
+    def handle(self, *args, **options):
+        intervalo = options["intervalo"]
+        if intervalo is None:
+            intervalo = getattr(settings, "PLACAS_PENDIENTES_INTERVALO", 30)
+
+        while True:
+            resueltos = procesar_pendientes(antiguedad=options["antiguedad"], limite=options["limite"])
+            if resueltos or options["once"]:
+                self.stdout.write(self.style.SUCCESS(f"{resueltos} capturas pendientes procesadas."))
+            if resueltos == options["limite"]:
+                continue
+            if options["once"]:
+                break
+            time.sleep(intervalo)
+            close_old_connections()
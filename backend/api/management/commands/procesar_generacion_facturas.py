@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.finanzas.jobs import procesar_siguiente_job
+
+
+class Command(BaseCommand):
+    help = "Worker que procesa los jobs pendientes de generación de facturas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Procesa los jobs pendientes y termina en lugar de quedar escuchando.",
+        )
+        parser.add_argument(
+            "--chunk",
+            type=int,
+            default=None,
+            help="Cantidad de viviendas por bloque (por defecto FINANZAS_GENERACION_CHUNK).",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=None,
+            help="Segundos de espera entre consultas cuando no hay jobs pendientes.",
+        )
+
+    def handle(self, *args, **options):
+        intervalo = options["intervalo"]
+        if intervalo is None:
+            intervalo = getattr(settings, "FINANZAS_GENERACION_INTERVALO", 5)
+
+        while True:
+            job = procesar_siguiente_job(chunk_size=options["chunk"])
+            if job is not None:
+                self.stdout.write(
+                    f"Job {job.id} ({job.periodo}) {job.estado}: "
+                    f"{job.creadas} creadas, {job.actualizadas} actualizadas, "
+                    f"{job.sin_cambios} sin cambios, {len(job.errores)} errores"
+                )
+                continue
+            if options["once"]:
+                break
+            time.sleep(intervalo)
+            close_old_connections()
@@ -0,0 +1,70 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.push.outbox import metricas_outbox, procesar_lote, purgar_outbox
+
+
+class Command(BaseCommand):
+    help = "Worker que envía las notificaciones push pendientes de la cola persistente"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Vacía la cola de pendientes vencidos y termina en lugar de quedar escuchando.",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=None,
+            help="Filas por lote (por defecto PUSH_OUTBOX_LOTE).",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=None,
+            help="Segundos de espera entre consultas cuando la cola está vacía.",
+        )
+        parser.add_argument(
+            "--purgar-dias",
+            type=int,
+            default=None,
+            help="Antes de empezar borra filas enviadas, fallidas u omitidas con más de N días.",
+        )
+        parser.add_argument(
+            "--metricas",
+            action="store_true",
+            help="Muestra la profundidad de la cola en JSON y termina.",
+        )
+
+    def handle(self, *args, **options):
+        if options["metricas"]:
+            self.stdout.write(json.dumps(metricas_outbox()))
+            return
+
+        if options["purgar_dias"] is not None:
+            borradas = purgar_outbox(options["purgar_dias"])
+            self.stdout.write(f"{borradas} filas antiguas eliminadas")
+
+        intervalo = options["intervalo"]
+        if intervalo is None:
+            intervalo = getattr(settings, "PUSH_OUTBOX_INTERVALO", 5)
+
+        while True:
+            resumen = procesar_lote(limite=options["lote"])
+            if resumen is not None:
+                self.stdout.write(
+                    f"{resumen['enviados']} enviados, {resumen['omitidos']} omitidos, "
+                    f"{resumen['reintentos']} reintentos, "
+                    f"{resumen['descartados']} descartados, "
+                    f"{resumen['tokens_eliminados']} tokens eliminados"
+                )
+                continue
+            if options["once"]:
+                break
+            time.sleep(intervalo)
+            close_old_connections()
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.busqueda import refrescar_documentos_residente, refrescar_documentos_vivienda
+
+
+class Command(BaseCommand):
+    help = "Recalcula los documentos de búsqueda de viviendas y residentes"
+
+    def handle(self, *args, **options):
+        residentes = refrescar_documentos_residente()
+        viviendas = refrescar_documentos_vivienda()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Documentos actualizados: {residentes} residentes, {viviendas} viviendas."
+            )
+        )
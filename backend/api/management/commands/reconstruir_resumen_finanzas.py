@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.finanzas.resumen import reconstruir_resumen_finanzas
+
+
+class Command(BaseCommand):
+    help = "Recalcula el resumen financiero mensual desde facturas y pagos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Solo informa las diferencias con lo almacenado, sin escribir.",
+        )
+
+    def handle(self, *args, **options):
+        aplicar = not options["check"]
+        with transaction.atomic():
+            diferencias = reconstruir_resumen_finanzas(aplicar=aplicar)
+
+        for condominio_id, periodo, campo, almacenado, calculado in diferencias:
+            self.stdout.write(
+                f"{condominio_id} {periodo} {campo}: almacenado={almacenado} calculado={calculado}"
+            )
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("El resumen financiero está al día."))
+        elif aplicar:
+            self.stdout.write(
+                self.style.SUCCESS(f"Resumen reconstruido ({len(diferencias)} diferencias corregidas).")
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"{len(diferencias)} diferencias encontradas.")
+            )
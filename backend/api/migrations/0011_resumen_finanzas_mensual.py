@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:08
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_generacion_facturas_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenFinanzasMensual',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('periodo', models.CharField(max_length=7)),
+                ('facturado_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('facturas_emitidas', models.PositiveIntegerField(default=0)),
+                ('facturas_pagadas', models.PositiveIntegerField(default=0)),
+                ('pagado_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vencido_pendiente', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('condominio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_finanzas', to='api.condominio')),
+            ],
+            options={
+                'db_table': 'resumen_finanzas_mensual',
+                'ordering': ('periodo',),
+                'unique_together': {('condominio', 'periodo')},
+            },
+        ),
+    ]
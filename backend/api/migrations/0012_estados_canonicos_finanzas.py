@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:11
+
+from django.db import migrations, models
+from django.db.models.functions import Trim, Upper
+
+FACTURA_ESTADOS = ["PENDIENTE", "REVISION", "PAGADA", "CANCELADA"]
+PAGO_ESTADOS = ["PENDIENTE", "REVISION", "CONFIRMADO", "RECHAZADO"]
+FACTURA_ALIAS = {
+    "PAGADA": ["PAGADO"],
+    "CANCELADA": ["CANCELADO"],
+    "REVISION": ["EN_REVISION"],
+}
+PAGO_ALIAS = {
+    "CONFIRMADO": ["APROBADO", "COMPLETADO", "PAGADO"],
+    "REVISION": ["EN_REVISION"],
+    "RECHAZADO": ["RECHAZADA"],
+}
+
+
+def _normalizar(modelo, canonicos, alias):
+    modelo.objects.exclude(estado__in=canonicos).update(estado=Upper(Trim("estado")))
+    for canonico, variantes in alias.items():
+        modelo.objects.filter(estado__in=variantes).update(estado=canonico)
+
+
+def normalizar_estados(apps, schema_editor):
+    _normalizar(apps.get_model("api", "Factura"), FACTURA_ESTADOS, FACTURA_ALIAS)
+    _normalizar(apps.get_model("api", "Pago"), PAGO_ESTADOS, PAGO_ALIAS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_resumen_finanzas_mensual'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_estados, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='factura',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('REVISION', 'En revisión'), ('PAGADA', 'Pagada'), ('CANCELADA', 'Cancelada')], default='PENDIENTE', max_length=15),
+        ),
+        migrations.AlterField(
+            model_name='pago',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('REVISION', 'En revisión'), ('CONFIRMADO', 'Confirmado'), ('RECHAZADO', 'Rechazado')], default='PENDIENTE', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['vivienda', 'estado', 'fecha_vencimiento'], name='factura_viv_estado_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='factura_estado_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['estado', 'fecha_pago'], name='pago_estado_fecha_idx'),
+        ),
+    ]
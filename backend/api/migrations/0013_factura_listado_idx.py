@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_estados_canonicos_finanzas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['fecha_vencimiento', 'fecha_emision', 'id'], name='factura_listado_idx'),
+        ),
+    ]
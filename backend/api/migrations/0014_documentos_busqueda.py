@@ -0,0 +1,94 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:15
+
+import unicodedata
+
+from django.db import migrations, models, transaction
+
+INDICES_TRIGRAMAS = (
+    ("vivienda_doc_busqueda_trgm", "vivienda"),
+    ("residente_doc_busqueda_trgm", "residente"),
+)
+
+
+def _normalizar(*partes):
+    texto = unicodedata.normalize("NFKD", " ".join(str(p) for p in partes if p))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+def poblar_documentos(apps, schema_editor):
+    Residente = apps.get_model("api", "Residente")
+    Vivienda = apps.get_model("api", "Vivienda")
+    ResidenteVivienda = apps.get_model("api", "ResidenteVivienda")
+
+    residentes = list(Residente.objects.all())
+    for residente in residentes:
+        residente.documento_busqueda = _normalizar(
+            residente.nombres, residente.apellidos, residente.ci, residente.correo, residente.telefono
+        )
+    Residente.objects.bulk_update(residentes, ["documento_busqueda"], batch_size=500)
+
+    partes_por_vivienda = {}
+    for relacion in ResidenteVivienda.objects.select_related("residente").order_by("fecha_desde"):
+        residente = relacion.residente
+        partes_por_vivienda.setdefault(relacion.vivienda_id, []).extend(
+            [residente.nombres, residente.apellidos, residente.ci]
+        )
+    viviendas = list(Vivienda.objects.all())
+    for vivienda in viviendas:
+        vivienda.documento_busqueda = _normalizar(
+            vivienda.codigo_unidad,
+            vivienda.bloque,
+            vivienda.numero,
+            *partes_por_vivienda.get(vivienda.id, []),
+        )
+    Vivienda.objects.bulk_update(viviendas, ["documento_busqueda"], batch_size=500)
+
+
+def crear_indices_trigramas(apps, schema_editor):
+    """Crea los índices GIN si la base es PostgreSQL y ``pg_trgm`` está instalable."""
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception:  # noqa: BLE001 - sin la extensión se usa el índice en memoria
+        return
+    with connection.cursor() as cursor:
+        for nombre, tabla in INDICES_TRIGRAMAS:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} "
+                "USING gin (documento_busqueda gin_trgm_ops)"
+            )
+
+
+def eliminar_indices_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for nombre, _tabla in INDICES_TRIGRAMAS:
+            cursor.execute(f"DROP INDEX IF EXISTS {nombre}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_factura_listado_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='residente',
+            name='documento_busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='vivienda',
+            name='documento_busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(poblar_documentos, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices_trigramas, eliminar_indices_trigramas),
+    ]
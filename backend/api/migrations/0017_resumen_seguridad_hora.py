@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:49
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_push_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenAccesosHora',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('hora', models.DateTimeField(unique=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('aprobados', models.PositiveIntegerField(default=0)),
+                ('rechazados', models.PositiveIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'seguridad_resumen_accesos_hora',
+                'ordering': ('hora',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenIncidentesHora',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('hora', models.DateTimeField(unique=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('pendientes', models.PositiveIntegerField(default=0)),
+                ('atendidos', models.PositiveIntegerField(default=0)),
+                ('emergencias', models.PositiveIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'seguridad_resumen_incidentes_hora',
+                'ordering': ('hora',),
+            },
+        ),
+    ]
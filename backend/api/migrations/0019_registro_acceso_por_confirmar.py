@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_registro_acceso_pendiente'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registroaccesovehicular',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('aprobado', 'Aprobado'), ('rechazado', 'Rechazado'), ('por_confirmar', 'Por confirmar')], max_length=16),
+        ),
+    ]
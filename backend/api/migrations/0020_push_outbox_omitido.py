@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_registro_acceso_por_confirmar'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pushoutbox',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('ENVIADO', 'Enviado'), ('FALLIDO', 'Fallido'), ('OMITIDO', 'Omitido (sin transporte)')], default='PENDIENTE', max_length=10),
+        ),
+    ]
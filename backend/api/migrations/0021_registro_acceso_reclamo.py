@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_push_outbox_omitido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registroaccesovehicular',
+            name='reclamado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='registroaccesovehicular',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('aprobado', 'Aprobado'), ('rechazado', 'Rechazado'), ('por_confirmar', 'Por confirmar')], max_length=16),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 from django.contrib.auth.models import User
 # =====================
@@ -9,6 +10,8 @@ class Usuario(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE)  # vínculo con auth_user
     estado = models.SmallIntegerField(default=1)  # 0 = inactivo, 1 = activo
+    # Se incrementa al cambiar roles o vivienda; invalida los claims de los JWT emitidos.
+    token_version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -89,6 +92,8 @@ class Vivienda(models.Model):
     bloque = models.CharField(max_length=20, null=True, blank=True)
     numero = models.CharField(max_length=20, null=True, blank=True)
     estado = models.SmallIntegerField(default=1)  # 1 = activo, 0 = inactivo
+    # Texto normalizado para búsqueda (ver api.busqueda); se mantiene con señales
+    documento_busqueda = models.TextField(blank=True, default="", editable=False)
 
     def __str__(self):
         return self.codigo_unidad
@@ -109,6 +114,7 @@ class Residente(models.Model):
     correo = models.EmailField(max_length=120, null=True, blank=True)
     estado = models.SmallIntegerField(default=1)
     usuario = models.OneToOneField(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    documento_busqueda = models.TextField(blank=True, default="", editable=False)
 
     def __str__(self):
         return f"{self.nombres} {self.apellidos}"
@@ -146,11 +152,19 @@ class Vehiculo(models.Model):
 
 
 class RegistroAccesoVehicular(models.Model):
+    ESTADO_PENDIENTE = "pendiente"
+    # Un hilo o el worker la reclamó y está llamando al servicio de placas.
+    ESTADO_PROCESANDO = "procesando"
     ESTADO_APROBADO = "aprobado"
     ESTADO_RECHAZADO = "rechazado"
+    # El reconocimiento sugiere un vehículo, pero el guardia debe confirmarlo.
+    ESTADO_POR_CONFIRMAR = "por_confirmar"
     ESTADO_CHOICES = (
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_PROCESANDO, "Procesando"),
         (ESTADO_APROBADO, "Aprobado"),
         (ESTADO_RECHAZADO, "Rechazado"),
+        (ESTADO_POR_CONFIRMAR, "Por confirmar"),
     )
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -162,11 +176,13 @@ class RegistroAccesoVehicular(models.Model):
     )
     placa_detectada = models.CharField(max_length=20)
     confianza = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
-    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES)
+    estado = models.CharField(max_length=16, choices=ESTADO_CHOICES)
     imagen = models.ImageField(upload_to="seguridad/accesos/", null=True, blank=True)
     respuesta_api = models.JSONField(null=True, blank=True)
     comentario = models.TextField(null=True, blank=True)
     creado_en = models.DateTimeField(auto_now_add=True)
+    # Inicio del reclamo en curso; vencido PLACAS_RECLAMO_TIMEOUT, otro proceso la retoma.
+    reclamado_en = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = "seguridad_registro_acceso_vehicular"
@@ -234,6 +250,43 @@ class ReporteIncidenteSeguridad(models.Model):
         if self.categoria_otro:
             return self.categoria_otro
         return "Sin categoría"
+
+
+class ResumenAccesosHora(models.Model):
+    """Conteo de accesos vehiculares por hora (UTC), mantenido de forma incremental."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    hora = models.DateTimeField(unique=True)
+    total = models.PositiveIntegerField(default=0)
+    aprobados = models.PositiveIntegerField(default=0)
+    rechazados = models.PositiveIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "seguridad_resumen_accesos_hora"
+        ordering = ("hora",)
+
+    def __str__(self):
+        return f"{self.hora:%Y-%m-%d %H}:00 - {self.total}"
+
+
+class ResumenIncidentesHora(models.Model):
+    """Conteo de incidentes por hora de creación (UTC), mantenido de forma incremental."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    hora = models.DateTimeField(unique=True)
+    total = models.PositiveIntegerField(default=0)
+    pendientes = models.PositiveIntegerField(default=0)
+    atendidos = models.PositiveIntegerField(default=0)
+    emergencias = models.PositiveIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "seguridad_resumen_incidentes_hora"
+        ordering = ("hora",)
+
+    def __str__(self):
+        return f"{self.hora:%Y-%m-%d %H}:00 - {self.total}"
 # =====================
 # CU11 - Avisos
 # =====================
@@ -284,13 +337,37 @@ class NotificacionUsuario(models.Model):
 # Finanzas - Facturas y Pagos
 # =====================
 
+def _normalizar_estado(valor, alias):
+    """Pasa a mayúsculas y traduce variantes históricas al estado canónico."""
+    estado = (valor or "").strip().upper()
+    return alias.get(estado, estado)
+
+
 class Factura(models.Model):
+    ESTADO_PENDIENTE = "PENDIENTE"
+    ESTADO_REVISION = "REVISION"
+    ESTADO_PAGADA = "PAGADA"
+    ESTADO_CANCELADA = "CANCELADA"
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_REVISION, "En revisión"),
+        (ESTADO_PAGADA, "Pagada"),
+        (ESTADO_CANCELADA, "Cancelada"),
+    ]
+    # Estados que ya no admiten nuevos pagos
+    ESTADOS_SALDADOS = (ESTADO_PAGADA, ESTADO_CANCELADA)
+    ESTADO_ALIAS = {
+        "PAGADO": ESTADO_PAGADA,
+        "CANCELADO": ESTADO_CANCELADA,
+        "EN_REVISION": ESTADO_REVISION,
+    }
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     vivienda = models.ForeignKey(Vivienda, on_delete=models.CASCADE)
     periodo = models.CharField(max_length=7)
     monto = models.DecimalField(max_digits=10, decimal_places=2)
     tipo = models.CharField(max_length=30, default="expensa")
-    estado = models.CharField(max_length=15, default="PENDIENTE")
+    estado = models.CharField(max_length=15, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
     fecha_emision = models.DateField(auto_now_add=True)
     fecha_vencimiento = models.DateField(null=True, blank=True)
     fecha_pago = models.DateField(null=True, blank=True)
@@ -298,16 +375,54 @@ class Factura(models.Model):
     class Meta:
         db_table = "factura"
         unique_together = ("vivienda", "periodo", "tipo")
+        indexes = [
+            models.Index(
+                fields=["vivienda", "estado", "fecha_vencimiento"],
+                name="factura_viv_estado_venc_idx",
+            ),
+            models.Index(fields=["estado", "fecha_vencimiento"], name="factura_estado_venc_idx"),
+            # Orden del listado paginado por cursor (recorrido en sentido inverso).
+            models.Index(
+                fields=["fecha_vencimiento", "fecha_emision", "id"],
+                name="factura_listado_idx",
+            ),
+        ]
+
+    @classmethod
+    def normalizar_estado(cls, valor):
+        return _normalizar_estado(valor, cls.ESTADO_ALIAS)
+
+    def save(self, *args, **kwargs):
+        self.estado = self.normalizar_estado(self.estado)
+        super().save(*args, **kwargs)
 
 
 class Pago(models.Model):
+    ESTADO_PENDIENTE = "PENDIENTE"
+    ESTADO_REVISION = "REVISION"
+    ESTADO_CONFIRMADO = "CONFIRMADO"
+    ESTADO_RECHAZADO = "RECHAZADO"
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_REVISION, "En revisión"),
+        (ESTADO_CONFIRMADO, "Confirmado"),
+        (ESTADO_RECHAZADO, "Rechazado"),
+    ]
+    ESTADO_ALIAS = {
+        "APROBADO": ESTADO_CONFIRMADO,
+        "COMPLETADO": ESTADO_CONFIRMADO,
+        "PAGADO": ESTADO_CONFIRMADO,
+        "EN_REVISION": ESTADO_REVISION,
+        "RECHAZADA": ESTADO_RECHAZADO,
+    }
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     factura = models.ForeignKey(Factura, on_delete=models.CASCADE, related_name="pagos")
     metodo = models.CharField(max_length=20)
     monto_pagado = models.DecimalField(max_digits=10, decimal_places=2)
     fecha_pago = models.DateTimeField(auto_now_add=True)
     comprobante_url = models.CharField(max_length=200, null=True, blank=True)
-    estado = models.CharField(max_length=20, default="PENDIENTE")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
     referencia_externa = models.CharField(max_length=100, null=True, blank=True)
     registrado_por = models.ForeignKey(
         Usuario,
@@ -320,6 +435,17 @@ class Pago(models.Model):
 
     class Meta:
         db_table = "pago"
+        indexes = [
+            models.Index(fields=["estado", "fecha_pago"], name="pago_estado_fecha_idx"),
+        ]
+
+    @classmethod
+    def normalizar_estado(cls, valor):
+        return _normalizar_estado(valor, cls.ESTADO_ALIAS)
+
+    def save(self, *args, **kwargs):
+        self.estado = self.normalizar_estado(self.estado)
+        super().save(*args, **kwargs)
 
 
 class FinanzasCodigoQR(models.Model):
@@ -365,6 +491,68 @@ class NotificacionDirecta(models.Model):
         db_table = "notificacion_directa"
         ordering = ("-creado_en",)
 
+class GeneracionFacturasJob(models.Model):
+    ESTADO_PENDIENTE = "PENDIENTE"
+    ESTADO_EN_PROCESO = "EN_PROCESO"
+    ESTADO_COMPLETADO = "COMPLETADO"
+    ESTADO_FALLIDO = "FALLIDO"
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_EN_PROCESO, "En proceso"),
+        (ESTADO_COMPLETADO, "Completado"),
+        (ESTADO_FALLIDO, "Fallido"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    periodo = models.CharField(max_length=7)
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+    total_viviendas = models.PositiveIntegerField(default=0)
+    procesadas = models.PositiveIntegerField(default=0)
+    creadas = models.PositiveIntegerField(default=0)
+    actualizadas = models.PositiveIntegerField(default=0)
+    sin_cambios = models.PositiveIntegerField(default=0)
+    errores = models.JSONField(default=list, blank=True)
+    solicitado_por = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name="generaciones_facturas"
+    )
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    finalizado_en = models.DateTimeField(null=True, blank=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "generacion_facturas_job"
+        ordering = ("creado_en",)
+        indexes = [models.Index(fields=["estado", "creado_en"])]
+
+    def __str__(self):
+        return f"Generación {self.periodo} ({self.estado})"
+
+
+class ResumenFinanzasMensual(models.Model):
+    """Totales financieros por condominio y mes, mantenidos de forma incremental."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    condominio = models.ForeignKey(
+        Condominio, on_delete=models.CASCADE, related_name="resumenes_finanzas"
+    )
+    periodo = models.CharField(max_length=7)
+    facturado_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    facturas_emitidas = models.PositiveIntegerField(default=0)
+    facturas_pagadas = models.PositiveIntegerField(default=0)
+    pagado_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vencido_pendiente = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "resumen_finanzas_mensual"
+        unique_together = ("condominio", "periodo")
+        ordering = ("periodo",)
+
+    def __str__(self):
+        return f"{self.condominio_id} - {self.periodo}"
+
+
 class ExpensaConfig(models.Model):
     PERIODICIDAD_MENSUAL = "MENSUAL"
     PERIODICIDAD_TRIMESTRAL = "TRIMESTRAL"
@@ -492,3 +680,40 @@ class FCMDevice(models.Model):
     class Meta:
         db_table = "fcm_device"
         unique_together = ("usuario", "token")
+
+
+class PushOutbox(models.Model):
+    """Notificación push pendiente para un token; la procesa ``procesar_push_outbox``."""
+
+    ESTADO_PENDIENTE = "PENDIENTE"
+    ESTADO_ENVIADO = "ENVIADO"
+    ESTADO_FALLIDO = "FALLIDO"
+    ESTADO_OMITIDO = "OMITIDO"
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_ENVIADO, "Enviado"),
+        (ESTADO_FALLIDO, "Fallido"),
+        (ESTADO_OMITIDO, "Omitido (sin transporte)"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    token = models.CharField(max_length=255)
+    titulo = models.CharField(max_length=200)
+    mensaje = models.TextField(blank=True, default="")
+    data = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    # También funciona como reserva: el worker la mueve hacia adelante al tomar la fila.
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.CharField(max_length=120, blank=True, default="")
+    creado_en = models.DateTimeField(auto_now_add=True)
+    enviado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "push_outbox"
+        indexes = [
+            models.Index(fields=["estado", "proximo_intento"], name="push_outbox_cola_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.titulo} -> {self.token[:12]}... ({self.estado})"
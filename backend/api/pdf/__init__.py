@@ -0,0 +1,14 @@
+"""Generación de PDF compartida por finanzas y seguridad.
+
+Uso típico::
+
+    documento = DocumentoPDF(archivo)   # o sin destino: cerrar() da los bytes
+    documento.add_text("Título", font="F2", size=16)
+    documento.add_text(texto_largo, wrap=True)
+    documento.cerrar()
+"""
+
+from .documento import DocumentoPDF
+from .escritor import EscritorPDF
+
+__all__ = ["DocumentoPDF", "EscritorPDF"]
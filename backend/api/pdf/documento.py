@@ -0,0 +1,114 @@
+"""Composición de documentos de texto con paginación automática."""
+
+import textwrap
+from io import BytesIO
+
+from .escritor import EscritorPDF
+
+FUENTES = {
+    "F1": "Helvetica",
+    "F2": "Helvetica-Bold",
+}
+# Ancho medio de un carácter de Helvetica en proporción al tamaño de la fuente;
+# alcanza para cortar líneas sin medir cada glifo.
+ANCHO_MEDIO_CARACTER = 0.5
+
+
+def _escapar(texto):
+    texto = str(texto)
+    return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class DocumentoPDF:
+    """Documento que baja cada página al destino en cuanto se completa.
+
+    Sin ``destino`` se escribe en un ``BytesIO`` interno y ``cerrar()`` devuelve
+    los bytes; con un archivo como destino el documento no queda en memoria.
+    Las fuentes y el diccionario de recursos se escriben una vez y todas las
+    páginas los referencian.
+    """
+
+    ancho = 612
+    alto = 792
+    margen = 54
+
+    def __init__(self, destino=None, *, comprimir=True):
+        self._buffer = None
+        if destino is None:
+            self._buffer = destino = BytesIO()
+        self._escritor = EscritorPDF(destino, comprimir=comprimir)
+        self._paginas_id = self._escritor.reservar()
+        fuentes = {
+            nombre: self._escritor.objeto(
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>"
+            )
+            for nombre, base in FUENTES.items()
+        }
+        referencias = " ".join(f"/{nombre} {obj_id} 0 R" for nombre, obj_id in fuentes.items())
+        self._recursos_id = self._escritor.objeto(f"<< /Font << {referencias} >> >>")
+        self._paginas = []
+        self._operaciones = []
+        self.y_position = self.alto - self.margen
+
+    def add_text(self, text, *, font="F1", size=11, leading=None, indent=0.0, wrap=False):
+        if leading is None:
+            leading = size * 1.4
+        lineas = [text]
+        if wrap:
+            disponible = self.ancho - 2 * self.margen - indent
+            caracteres = max(10, int(disponible / (size * ANCHO_MEDIO_CARACTER)))
+            lineas = textwrap.wrap(str(text), caracteres) or [""]
+        for linea in lineas:
+            if self.y_position < self.margen:
+                self._new_page()
+            x = self.margen + indent
+            self._operaciones.append(
+                f"/{font} {size:.2f} Tf 1 0 0 1 {x:.2f} {self.y_position:.2f} Tm ({_escapar(linea)}) Tj"
+            )
+            self.y_position -= leading
+
+    def add_spacing(self, amount):
+        if self.y_position - amount < self.margen:
+            self._new_page()
+        else:
+            self.y_position -= amount
+
+    def ensure_space(self, amount):
+        if self.y_position - amount < self.margen:
+            self._new_page()
+
+    def _new_page(self):
+        self._emitir_pagina()
+        self.y_position = self.alto - self.margen
+
+    def _emitir_pagina(self):
+        contenido = "BT\n" + "\n".join(self._operaciones) + "\nET"
+        stream_id = self._escritor.stream(contenido.encode("cp1252", errors="replace"))
+        pagina_id = self._escritor.objeto(
+            f"<< /Type /Page /Parent {self._paginas_id} 0 R "
+            f"/MediaBox [0 0 {self.ancho} {self.alto}] /Contents {stream_id} 0 R "
+            f"/Resources {self._recursos_id} 0 R >>"
+        )
+        self._paginas.append(pagina_id)
+        self._operaciones = []
+
+    @property
+    def total_paginas(self):
+        return len(self._paginas) + (1 if self._operaciones else 0)
+
+    def cerrar(self):
+        """Escribe la última página, el árbol de páginas y el trailer."""
+        if self._operaciones or not self._paginas:
+            self._emitir_pagina()
+        kids = " ".join(f"{pagina_id} 0 R" for pagina_id in self._paginas)
+        self._escritor.objeto(
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self._paginas)} >>",
+            obj_id=self._paginas_id,
+        )
+        catalogo_id = self._escritor.objeto(
+            f"<< /Type /Catalog /Pages {self._paginas_id} 0 R >>"
+        )
+        self._escritor.cerrar(catalogo_id)
+        if self._buffer is not None:
+            return self._buffer.getvalue()
+        return None
@@ -0,0 +1,60 @@
+"""Escritura incremental de objetos PDF sobre cualquier destino con ``write``."""
+
+import zlib
+
+
+class EscritorPDF:
+    """Escribe objetos a medida que se generan y al final la tabla ``xref``.
+
+    No necesita ``seek`` ni ``tell``: los desplazamientos se calculan contando
+    los bytes escritos, así que sirve igual para un archivo, un ``BytesIO`` o
+    un ``HttpResponse``.
+    """
+
+    def __init__(self, destino, comprimir=True):
+        self._destino = destino
+        self._posicion = 0
+        self._offsets = {}
+        self._siguiente_id = 1
+        self.comprimir = comprimir
+        self._escribir(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _escribir(self, datos):
+        self._destino.write(datos)
+        self._posicion += len(datos)
+
+    def reservar(self):
+        """Reserva un número de objeto para escribirlo más adelante."""
+        obj_id = self._siguiente_id
+        self._siguiente_id += 1
+        return obj_id
+
+    def objeto(self, cuerpo, obj_id=None):
+        if obj_id is None:
+            obj_id = self.reservar()
+        if isinstance(cuerpo, str):
+            cuerpo = cuerpo.encode("latin-1")
+        self._offsets[obj_id] = self._posicion
+        self._escribir(f"{obj_id} 0 obj\n".encode("ascii"))
+        self._escribir(cuerpo)
+        self._escribir(b"\nendobj\n")
+        return obj_id
+
+    def stream(self, datos, obj_id=None):
+        filtro = ""
+        if self.comprimir:
+            datos = zlib.compress(datos)
+            filtro = " /Filter /FlateDecode"
+        cabecera = f"<< /Length {len(datos)}{filtro} >>\nstream\n".encode("ascii")
+        return self.objeto(cabecera + datos + b"\nendstream", obj_id=obj_id)
+
+    def cerrar(self, raiz_id):
+        total = self._siguiente_id
+        xref = self._posicion
+        partes = [f"xref\n0 {total}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, total):
+            partes.append(f"{self._offsets.get(obj_id, 0):010d} 00000 n \n")
+        partes.append(
+            f"trailer\n<< /Size {total} /Root {raiz_id} 0 R >>\nstartxref\n{xref}\n%%EOF"
+        )
+        self._escribir("".join(partes).encode("ascii"))
@@ -1,22 +1,36 @@
 from rest_framework.permissions import BasePermission
-from .models import Usuario, UsuarioRol
+from .actor import obtener_actor
+from .tokens import roles_del_token
 
-class IsAdmin(BasePermission):
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        try:
-            usuario = Usuario.objects.get(user=request.user)
-            return UsuarioRol.objects.filter(usuario=usuario, rol__nombre="ADM", estado=1).exists()
-        except Usuario.DoesNotExist:
-            return False
 
-class IsResidente(BasePermission):
+def roles_de_peticion(request, token=None):
+    """Roles del usuario: de los claims del JWT si siguen vigentes, si no del actor."""
+    roles = roles_del_token(token if token is not None else getattr(request, "auth", None), request)
+    if roles is None:
+        roles = obtener_actor(request).roles
+    return roles
+
+
+class RolPermission(BasePermission):
+    """Permite el acceso si el usuario tiene alguno de ``roles``.
+
+    Con un token emitido por ``/api/token/`` el chequeo solo compara sus claims
+    con el ``token_version`` que la autenticación ya leyó; con tokens viejos o
+    ``force_authenticate`` se resuelve el actor.
+    """
+
+    roles = ()
+
     def has_permission(self, request, view):
         if not request.user or not request.user.is_authenticated:
             return False
-        try:
-            usuario = Usuario.objects.get(user=request.user)
-            return UsuarioRol.objects.filter(usuario=usuario, rol__nombre="RES", estado=1).exists()
-        except Usuario.DoesNotExist:
-            return False
+        return bool(roles_de_peticion(request).intersection(self.roles))
+
+class IsAdmin(RolPermission):
+    roles = ("ADM",)
+
+class IsResidente(RolPermission):
+    roles = ("RES",)
+
+class IsGuardiaOAdmin(RolPermission):
+    roles = ("ADM", "GUA")
@@ -0,0 +1,31 @@
+"""Notificaciones push (FCM)."""
+
+from .despachador import ResultadoPush, despachar, programar_push, tokens_de_usuarios
+from .outbox import drenar_outbox, encolar_push, metricas_outbox, procesar_lote
+from .transportes import (
+    ERRORES_PERMANENTES,
+    SIN_TRANSPORTE,
+    TransporteFalso,
+    TransporteFCM,
+    TransporteNulo,
+    obtener_transporte,
+    reiniciar_transporte,
+)
+
+__all__ = [
+    "ERRORES_PERMANENTES",
+    "ResultadoPush",
+    "SIN_TRANSPORTE",
+    "TransporteFCM",
+    "TransporteFalso",
+    "TransporteNulo",
+    "despachar",
+    "drenar_outbox",
+    "encolar_push",
+    "metricas_outbox",
+    "obtener_transporte",
+    "procesar_lote",
+    "programar_push",
+    "reiniciar_transporte",
+    "tokens_de_usuarios",
+]
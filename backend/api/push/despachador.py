@@ -0,0 +1,135 @@
+"""Envío de notificaciones push por lotes y fuera del ciclo de la petición.
+
+Los tokens de destino se obtienen con una sola consulta; el envío se parte en
+lotes de ``TAMANO_LOTE`` (el máximo que acepta FCM por llamada) que se mandan
+en paralelo desde un pool de hilos. ``programar_push`` guarda el envío en la
+cola persistente (``outbox``) y la vacía en segundo plano después del commit,
+así que la vista responde sin esperar a FCM.
+"""
+
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from ..models import FCMDevice
+from .transportes import obtener_transporte
+
+logger = logging.getLogger("fcm")
+
+TAMANO_LOTE = 500
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ResultadoPush(NamedTuple):
+    token: str
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _max_workers():
+    return getattr(settings, "PUSH_MAX_WORKERS", 4)
+
+
+def tokens_de_usuarios(usuarios):
+    """Tokens registrados para ``usuarios`` (ids, instancias o queryset) en una consulta."""
+    if hasattr(usuarios, "values"):
+        filtro = {"usuario__in": usuarios.values("pk")}
+    else:
+        filtro = {"usuario_id__in": [getattr(usuario, "pk", usuario) for usuario in usuarios]}
+    return list(
+        FCMDevice.objects.filter(**filtro).order_by().values_list("token", flat=True).distinct()
+    )
+
+
+def normalizar_data(data):
+    # FCM solo acepta valores de texto en ``data``.
+    return {str(clave): str(valor) for clave, valor in (data or {}).items() if valor is not None}
+
+
+def despachar(tokens, titulo, mensaje, data=None, enviar_lote=None, max_workers=None):
+    """Envía a todos los ``tokens`` y devuelve un ``ResultadoPush`` por token.
+
+    ``enviar_lote(tokens, titulo, mensaje, data)`` debe devolver tuplas
+    ``(token, message_id, error)``; por defecto usa ``obtener_transporte()``. Si un lote entero
+    falla, todos sus tokens quedan con el error de la excepción.
+    """
+    enviar_lote = enviar_lote or obtener_transporte()
+    data = normalizar_data(data)
+    lotes = [tokens[i:i + TAMANO_LOTE] for i in range(0, len(tokens), TAMANO_LOTE)]
+    if not lotes:
+        return []
+
+    def enviar(lote):
+        try:
+            return [ResultadoPush(*fila) for fila in enviar_lote(lote, titulo, mensaje, data)]
+        except Exception as exc:  # noqa: BLE001 - un lote caído no debe frenar los demás
+            logger.exception("Error enviando lote de %s tokens", len(lote))
+            return [ResultadoPush(token, None, exc.__class__.__name__) for token in lote]
+
+    workers = min(max_workers or _max_workers(), len(lotes))
+    if workers <= 1:
+        respuestas = [enviar(lote) for lote in lotes]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="push-lote") as pool:
+            respuestas = list(pool.map(enviar, lotes))
+
+    resultados = [resultado for respuesta in respuestas for resultado in respuesta]
+    errores = Counter(resultado.error for resultado in resultados if not resultado.ok)
+    logger.info(
+        "Push '%s': %s tokens, %s enviados, errores: %s",
+        titulo,
+        len(resultados),
+        len(resultados) - sum(errores.values()),
+        dict(errores) or "-",
+    )
+    for resultado in resultados:
+        if not resultado.ok:
+            logger.debug("Push fallido para %s: %s", resultado.token, resultado.error)
+    return resultados
+
+
+def _executor_push():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="push")
+        return _executor
+
+
+def _drenar_en_segundo_plano():
+    from .outbox import drenar_outbox
+
+    try:
+        drenar_outbox()
+    except Exception:  # noqa: BLE001 - el worker retomará las filas pendientes
+        logger.exception("Error drenando la cola de push")
+    finally:
+        connection.close()
+
+
+def programar_push(usuarios, titulo, mensaje, data=None):
+    """Encola el push en ``PushOutbox`` y lo despacha en segundo plano tras el commit.
+
+    Las filas se guardan en la transacción actual; si el envío inmediato falla,
+    el worker ``procesar_push_outbox`` las reintenta. Devuelve la cantidad de
+    tokens encolados.
+    """
+    from .outbox import encolar_push
+
+    tokens = tokens_de_usuarios(usuarios)
+    if not tokens:
+        return 0
+    encolar_push(tokens, titulo, mensaje, data)
+    transaction.on_commit(lambda: _executor_push().submit(_drenar_en_segundo_plano))
+    return len(tokens)
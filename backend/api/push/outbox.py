@@ -0,0 +1,210 @@
+"""Cola persistente de notificaciones push.
+
+Cada push se guarda como una fila por token en ``PushOutbox`` dentro de la
+misma transacción que lo origina, así que no se pierde si FCM falla o el
+proceso se reinicia. ``procesar_lote`` toma filas vencidas, las envía agrupadas
+por contenido y decide por token:
+
+- aceptado: ``ENVIADO``;
+- sin transporte (``PUSH_TRANSPORTE="nulo"``): ``OMITIDO``, no se reintenta;
+- error permanente (``UNREGISTERED``, ``INVALID_ARGUMENT``...): ``FALLIDO`` y
+  se borra el ``FCMDevice`` del token;
+- cualquier otro error: se reintenta con espera exponencial hasta
+  ``PUSH_OUTBOX_MAX_INTENTOS``.
+
+Al tomar un lote, ``proximo_intento`` se adelanta ``PUSH_OUTBOX_RESERVA``
+segundos: si el worker muere a mitad del envío, las filas vuelven a quedar
+disponibles cuando vence la reserva.
+"""
+
+import json
+import logging
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from ..models import FCMDevice, PushOutbox
+from .despachador import despachar, normalizar_data
+from .transportes import ERRORES_PERMANENTES, SIN_TRANSPORTE
+
+logger = logging.getLogger("fcm")
+
+CONTADORES = ("enviados", "omitidos", "descartados", "reintentos", "tokens_eliminados")
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def encolar_push(tokens, titulo, mensaje, data=None):
+    """Guarda una fila pendiente por token y devuelve cuántas se crearon."""
+    data = normalizar_data(data)
+    filas = [
+        PushOutbox(token=token, titulo=titulo[:200], mensaje=mensaje or "", data=data)
+        for token in tokens
+    ]
+    PushOutbox.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def espera_reintento(intentos):
+    """Segundos hasta el siguiente intento tras ``intentos`` fallos (con algo de azar)."""
+    base = _config("PUSH_OUTBOX_BACKOFF_BASE", 30)
+    maximo = _config("PUSH_OUTBOX_BACKOFF_MAX", 3600)
+    espera = min(base * 2 ** max(intentos - 1, 0), maximo)
+    return espera + random.uniform(0, espera * 0.1)
+
+
+def _tomar_lote(limite):
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            PushOutbox.objects.select_for_update(skip_locked=True)
+            .filter(estado=PushOutbox.ESTADO_PENDIENTE, proximo_intento__lte=ahora)
+            .order_by("proximo_intento")
+            .values_list("id", flat=True)[:limite]
+        )
+        if not ids:
+            return []
+        PushOutbox.objects.filter(id__in=ids).update(
+            proximo_intento=ahora + timedelta(seconds=_config("PUSH_OUTBOX_RESERVA", 120))
+        )
+    return list(PushOutbox.objects.filter(id__in=ids))
+
+
+def _registrar_resultados(filas, resultados):
+    ahora = timezone.now()
+    max_intentos = _config("PUSH_OUTBOX_MAX_INTENTOS", 6)
+    enviados, omitidos, permanentes, reintentos = [], [], defaultdict(list), []
+    for fila, resultado in zip(filas, resultados):
+        if resultado.ok:
+            enviados.append(fila.id)
+        elif resultado.error == SIN_TRANSPORTE:
+            omitidos.append(fila.id)
+        elif resultado.error in ERRORES_PERMANENTES:
+            permanentes[resultado.error].append(fila)
+        else:
+            reintentos.append((fila, resultado.error))
+
+    resumen = {
+        "enviados": len(enviados),
+        "omitidos": len(omitidos),
+        "descartados": 0,
+        "reintentos": 0,
+        "tokens_eliminados": 0,
+    }
+    with transaction.atomic():
+        if enviados:
+            PushOutbox.objects.filter(id__in=enviados).update(
+                estado=PushOutbox.ESTADO_ENVIADO,
+                enviado_en=ahora,
+                intentos=F("intentos") + 1,
+                ultimo_error="",
+            )
+        if omitidos:
+            PushOutbox.objects.filter(id__in=omitidos).update(
+                estado=PushOutbox.ESTADO_OMITIDO,
+                ultimo_error=SIN_TRANSPORTE,
+            )
+
+        tokens_muertos = set()
+        for error, filas_error in permanentes.items():
+            tokens_muertos.update(fila.token for fila in filas_error)
+            PushOutbox.objects.filter(id__in=[fila.id for fila in filas_error]).update(
+                estado=PushOutbox.ESTADO_FALLIDO,
+                intentos=F("intentos") + 1,
+                ultimo_error=error,
+            )
+            resumen["descartados"] += len(filas_error)
+        if tokens_muertos:
+            # Otros pushes pendientes para esos tokens tampoco van a llegar.
+            resumen["descartados"] += PushOutbox.objects.filter(
+                estado=PushOutbox.ESTADO_PENDIENTE, token__in=tokens_muertos
+            ).update(estado=PushOutbox.ESTADO_FALLIDO, ultimo_error="TOKEN_ELIMINADO")
+            resumen["tokens_eliminados"], _ = FCMDevice.objects.filter(
+                token__in=tokens_muertos
+            ).delete()
+
+        for fila, error in reintentos:
+            fila.intentos += 1
+            fila.ultimo_error = (error or "")[:120]
+            if fila.intentos >= max_intentos:
+                fila.estado = PushOutbox.ESTADO_FALLIDO
+                resumen["descartados"] += 1
+            else:
+                fila.proximo_intento = ahora + timedelta(seconds=espera_reintento(fila.intentos))
+                resumen["reintentos"] += 1
+        if reintentos:
+            PushOutbox.objects.bulk_update(
+                [fila for fila, _error in reintentos],
+                ["intentos", "ultimo_error", "estado", "proximo_intento"],
+            )
+    return resumen
+
+
+def procesar_lote(transporte=None, limite=None):
+    """Envía un lote de filas vencidas; devuelve contadores o ``None`` si no había nada."""
+    filas = _tomar_lote(limite or _config("PUSH_OUTBOX_LOTE", 500))
+    if not filas:
+        return None
+
+    grupos = defaultdict(list)
+    for fila in filas:
+        grupos[(fila.titulo, fila.mensaje, json.dumps(fila.data, sort_keys=True))].append(fila)
+
+    resumen = dict.fromkeys(CONTADORES, 0)
+    for (titulo, mensaje, _data), filas_grupo in grupos.items():
+        resultados = despachar(
+            [fila.token for fila in filas_grupo],
+            titulo,
+            mensaje,
+            filas_grupo[0].data,
+            enviar_lote=transporte,
+        )
+        for clave, valor in _registrar_resultados(filas_grupo, resultados).items():
+            resumen[clave] += valor
+    return resumen
+
+
+def drenar_outbox(transporte=None, limite=None):
+    """Procesa lotes hasta que no queden filas vencidas y devuelve los totales."""
+    totales = dict.fromkeys(CONTADORES, 0)
+    while True:
+        resumen = procesar_lote(transporte=transporte, limite=limite)
+        if resumen is None:
+            return totales
+        for clave, valor in resumen.items():
+            totales[clave] += valor
+
+
+def metricas_outbox():
+    """Profundidad de la cola y antigüedad del pendiente más viejo."""
+    ahora = timezone.now()
+    pendientes = Q(estado=PushOutbox.ESTADO_PENDIENTE)
+    datos = PushOutbox.objects.aggregate(
+        pendientes=Count("id", filter=pendientes),
+        listos=Count("id", filter=pendientes & Q(proximo_intento__lte=ahora)),
+        en_reintento=Count("id", filter=pendientes & Q(intentos__gt=0)),
+        fallidos=Count("id", filter=Q(estado=PushOutbox.ESTADO_FALLIDO)),
+        enviados=Count("id", filter=Q(estado=PushOutbox.ESTADO_ENVIADO)),
+        omitidos=Count("id", filter=Q(estado=PushOutbox.ESTADO_OMITIDO)),
+        pendiente_mas_antiguo=Min("creado_en", filter=pendientes),
+    )
+    antiguo = datos.pop("pendiente_mas_antiguo")
+    datos["antiguedad_max_segundos"] = int((ahora - antiguo).total_seconds()) if antiguo else 0
+    return datos
+
+
+def purgar_outbox(dias):
+    """Borra filas enviadas, fallidas u omitidas de hace más de ``dias`` días."""
+    limite = timezone.now() - timedelta(days=dias)
+    borradas, _ = PushOutbox.objects.filter(
+        Q(estado=PushOutbox.ESTADO_ENVIADO, enviado_en__lt=limite)
+        | Q(estado__in=[PushOutbox.ESTADO_FALLIDO, PushOutbox.ESTADO_OMITIDO], creado_en__lt=limite)
+    ).delete()
+    return borradas
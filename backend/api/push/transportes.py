@@ -0,0 +1,117 @@
+"""Transportes de push.
+
+Un transporte es un invocable ``(tokens, titulo, mensaje, data)`` que devuelve
+una tupla ``(token, message_id, error)`` por token, en el mismo orden.
+``obtener_transporte()`` devuelve el configurado en ``PUSH_TRANSPORTE``:
+
+- ``"fcm"``: Firebase Cloud Messaging (el SDK se inicializa en el primer envío);
+- ``"memoria"``: ``TransporteFalso``, registra los envíos en memoria;
+- ``"nulo"``: no envía nada y responde ``SIN_TRANSPORTE`` para cada token;
+- una ruta ``"paquete.modulo.Clase"`` a cualquier otro transporte.
+
+Sin valor se usa ``"fcm"`` si hay credenciales de Firebase y ``"nulo"`` si no.
+"""
+
+import itertools
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger("fcm")
+
+_transporte = None
+_transporte_lock = threading.Lock()
+
+# Respuesta del transporte nulo: el push no salió, pero no es un error del token.
+SIN_TRANSPORTE = "SIN_TRANSPORTE"
+
+# Errores de FCM que indican que el token ya no sirve: reintentar no ayuda.
+ERRORES_PERMANENTES = frozenset({"UNREGISTERED", "INVALID_ARGUMENT", "SENDER_ID_MISMATCH"})
+
+
+class TransporteFCM:
+    def __call__(self, tokens, titulo, mensaje, data):
+        from ..fcm_utils import send_fcm_multicast
+
+        return send_fcm_multicast(tokens, titulo, mensaje, data=data)
+
+
+class TransporteNulo:
+    """No envía nada; para entornos sin credenciales de Firebase.
+
+    Las filas de la cola quedan ``OMITIDO``, no ``ENVIADO``.
+    """
+
+    def __call__(self, tokens, titulo, mensaje, data):
+        return [(token, None, SIN_TRANSPORTE) for token in tokens]
+
+
+class TransporteFalso:
+    """FCM local para pruebas: registra los envíos y responde lo configurado.
+
+    ``errores`` asocia tokens a un código de error (``"UNREGISTERED"``,
+    ``"UNAVAILABLE"``...). Con ``fallar_con`` cada llamada lanza esa excepción,
+    como cuando no hay red.
+    """
+
+    def __init__(self, errores=None, fallar_con=None):
+        self.errores = dict(errores or {})
+        self.fallar_con = fallar_con
+        self.enviados = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __call__(self, tokens, titulo, mensaje, data):
+        if self.fallar_con is not None:
+            raise self.fallar_con
+        resultados = []
+        with self._lock:
+            for token in tokens:
+                error = self.errores.get(token)
+                if error:
+                    resultados.append((token, None, error))
+                    continue
+                self.enviados.append({"token": token, "titulo": titulo, "mensaje": mensaje, "data": data})
+                resultados.append((token, f"fake-{next(self._ids)}", None))
+        return resultados
+
+    def tokens_enviados(self):
+        return [envio["token"] for envio in self.enviados]
+
+
+TRANSPORTES = {
+    "fcm": TransporteFCM,
+    "memoria": TransporteFalso,
+    "nulo": TransporteNulo,
+}
+
+
+def _crear_transporte():
+    from ..fcm_utils import firebase_configurado
+
+    nombre = getattr(settings, "PUSH_TRANSPORTE", "")
+    if not nombre:
+        nombre = "fcm" if firebase_configurado() else "nulo"
+        if nombre == "nulo":
+            logger.warning("FIREBASE_ADMIN_CREDENTIALS no configurado: los push no se enviarán.")
+    clase = TRANSPORTES.get(nombre) or import_string(nombre)
+    return clase()
+
+
+def obtener_transporte():
+    """Transporte configurado, creado una sola vez por proceso."""
+    global _transporte
+    if _transporte is None:
+        with _transporte_lock:
+            if _transporte is None:
+                _transporte = _crear_transporte()
+    return _transporte
+
+
+def reiniciar_transporte():
+    """Descarta el transporte creado; el siguiente envío vuelve a leer la configuración."""
+    global _transporte
+    with _transporte_lock:
+        _transporte = None
@@ -0,0 +1,258 @@
+"""Difusión de cambios de incidentes a las conexiones SSE.
+
+Cada cambio de un ``ReporteIncidenteSeguridad`` genera un único evento: se
+consulta y serializa una vez y ``HubIncidentes`` lo reparte a todas las
+conexiones abiertas del proceso. El hub guarda los últimos eventos para que un
+cliente que reconecta con ``Last-Event-ID`` reciba solo lo que se perdió; si
+pide algo que ya no está en memoria recibe una foto completa.
+
+Con ``SEGURIDAD_SSE_NOTIFY`` activo (solo PostgreSQL) el cambio se publica con
+``NOTIFY`` y cada proceso lo recibe con ``LISTEN`` en un hilo propio, así que
+todas las réplicas ven todos los eventos.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from rest_framework.utils import encoders
+
+from ..models import ReporteIncidenteSeguridad
+from ..serializers import ReporteIncidenteSeguridadSerializer, prefetch_vivienda_activa
+
+logger = logging.getLogger(__name__)
+
+CANAL_NOTIFY = "incidentes_seguridad"
+CANTIDAD_FOTO = 6
+KEEPALIVE = b"event: keepalive\ndata: {}\n\n"
+RESINCRONIZAR = object()
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+class Evento:
+    __slots__ = ("id", "mensaje")
+
+    def __init__(self, evento_id, nombre, datos):
+        self.id = evento_id
+        # Se codifica una sola vez; todas las conexiones envían los mismos bytes.
+        self.mensaje = f"id: {evento_id}\nevent: {nombre}\ndata: {datos}\n\n".encode("utf-8")
+
+
+class Suscripcion:
+    """Cola de eventos de una conexión, atada al event loop que la atiende."""
+
+    def __init__(self, hub, loop, maximo):
+        self.hub = hub
+        self.loop = loop
+        self.cola = asyncio.Queue(maxsize=maximo)
+        self.desbordada = False
+
+    def _entregar(self, evento):
+        if self.desbordada:
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta lo encolado y se le manda una foto nueva.
+            self.desbordada = True
+
+    async def siguiente(self, timeout):
+        """Próximo evento, ``None`` si vence ``timeout`` o ``RESINCRONIZAR``."""
+        if self.desbordada:
+            self.desbordada = False
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            return RESINCRONIZAR
+        try:
+            return await asyncio.wait_for(self.cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def cerrar(self):
+        self.hub.desuscribir(self)
+
+
+class HubIncidentes:
+    def __init__(self, historial=256):
+        self._lock = threading.Lock()
+        self._suscripciones = set()
+        self._historial = deque(maxlen=historial)
+        self._ultimo_id = 0
+        # Eventos con id menor o igual a este ya no están en el historial.
+        self._perdidos_hasta = self._nuevo_id_sin_lock()
+
+    def _nuevo_id_sin_lock(self):
+        self._ultimo_id = max(time.time_ns() // 1000, self._ultimo_id + 1)
+        return self._ultimo_id
+
+    def nuevo_id(self):
+        """Id creciente en microsegundos; comparable entre procesos."""
+        with self._lock:
+            return self._nuevo_id_sin_lock()
+
+    @property
+    def hay_suscriptores(self):
+        return bool(self._suscripciones)
+
+    def suscribir(self, loop, desde=None):
+        """Registra una conexión y devuelve ``(suscripcion, eventos_a_reenviar)``.
+
+        ``eventos_a_reenviar`` es ``None`` cuando no se puede reanudar desde
+        ``desde`` y hay que enviar una foto completa.
+        """
+        suscripcion = Suscripcion(self, loop, _config("SEGURIDAD_SSE_COLA", 100))
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            if desde is None or desde < self._perdidos_hasta:
+                return suscripcion, None
+            return suscripcion, [evento for evento in self._historial if evento.id > desde]
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def descartar(self, evento_id):
+        """Registra un evento que no se construyó (no había conexiones)."""
+        with self._lock:
+            self._perdidos_hasta = max(self._perdidos_hasta, evento_id)
+            self._ultimo_id = max(self._ultimo_id, evento_id)
+
+    def publicar(self, evento):
+        with self._lock:
+            if len(self._historial) == self._historial.maxlen:
+                self._perdidos_hasta = max(self._perdidos_hasta, self._historial[0].id)
+            self._historial.append(evento)
+            self._ultimo_id = max(self._ultimo_id, evento.id)
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+            except RuntimeError:
+                # El loop de esa conexión ya se cerró.
+                self.desuscribir(suscripcion)
+
+
+hub = HubIncidentes(historial=_config("SEGURIDAD_SSE_HISTORIAL", 256))
+
+
+def incidentes_recientes(limite=CANTIDAD_FOTO, desde=None, hasta=None):
+    incidentes = ReporteIncidenteSeguridad.objects.all()
+    if desde:
+        incidentes = incidentes.filter(creado_en__gte=desde)
+    if hasta:
+        incidentes = incidentes.filter(creado_en__lt=hasta)
+    return list(
+        incidentes.select_related(
+            "residente",
+            "categoria",
+            "guardia_asignado__user",
+        )
+        .prefetch_related(prefetch_vivienda_activa("residente"))
+        .order_by("-creado_en")[:limite]
+    )
+
+
+def construir_evento(evento_id, incidente_id=None, accion=None):
+    """Serializa los incidentes recientes (el formato histórico del stream)."""
+    datos = {
+        "incidents": ReporteIncidenteSeguridadSerializer(incidentes_recientes(), many=True).data
+    }
+    if incidente_id is not None:
+        datos["incidente_id"] = str(incidente_id)
+        datos["accion"] = accion
+    return Evento(evento_id, "incidents", json.dumps(datos, cls=encoders.JSONEncoder))
+
+
+def foto_actual():
+    return construir_evento(hub.nuevo_id())
+
+
+def emitir_evento(evento_id, incidente_id, accion):
+    """Construye el evento y lo entrega a las conexiones de este proceso."""
+    if not hub.hay_suscriptores:
+        hub.descartar(evento_id)
+        return
+    hub.publicar(construir_evento(evento_id, incidente_id, accion))
+
+
+def _notify_habilitado():
+    return _config("SEGURIDAD_SSE_NOTIFY", False) and connection.vendor == "postgresql"
+
+
+def publicar_cambio_incidente(incidente_id, accion):
+    """Avisa del cambio a todas las conexiones cuando la transacción confirma."""
+    evento_id = hub.nuevo_id()
+    if _notify_habilitado():
+        # NOTIFY es transaccional: se entrega al confirmar.
+        carga = json.dumps({"id": evento_id, "incidente": str(incidente_id), "accion": accion})
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CANAL_NOTIFY, carga])
+        return
+    transaction.on_commit(lambda: emitir_evento(evento_id, incidente_id, accion))
+
+
+class _OyenteNotify(threading.Thread):
+    """Hilo que recibe los ``NOTIFY`` de otros procesos y los publica en el hub."""
+
+    def __init__(self):
+        super().__init__(name="incidentes-listen", daemon=True)
+
+    def run(self):
+        espera = 1
+        while True:
+            try:
+                self._escuchar()
+                espera = 1
+            except Exception:  # noqa: BLE001 - se reconecta tras una pausa
+                logger.exception("Se perdió la conexión LISTEN de incidentes")
+                time.sleep(espera)
+                espera = min(espera * 2, 60)
+
+    def _escuchar(self):
+        wrapper = connections["default"]
+        conexion = wrapper.get_new_connection(wrapper.get_connection_params())
+        conexion.autocommit = True
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute(f"LISTEN {CANAL_NOTIFY}")
+            while True:
+                if select.select([conexion], [], [], 30) == ([], [], []):
+                    continue
+                conexion.poll()
+                while conexion.notifies:
+                    self._procesar(conexion.notifies.pop(0).payload)
+        finally:
+            conexion.close()
+
+    def _procesar(self, carga):
+        try:
+            datos = json.loads(carga)
+            emitir_evento(datos["id"], datos["incidente"], datos["accion"])
+        except Exception:  # noqa: BLE001 - un evento malo no corta la escucha
+            logger.exception("No se pudo publicar el evento de incidente %s", carga)
+        finally:
+            close_old_connections()
+
+
+_oyente = None
+_oyente_lock = threading.Lock()
+
+
+def asegurar_oyente():
+    """Arranca el hilo ``LISTEN`` la primera vez que un proceso atiende un stream."""
+    global _oyente
+    if _oyente is not None or not _notify_habilitado():
+        return
+    with _oyente_lock:
+        if _oyente is None:
+            _oyente = _OyenteNotify()
+            _oyente.start()
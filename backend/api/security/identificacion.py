@@ -0,0 +1,253 @@
+"""Identificación de placas fuera del ciclo de la petición.
+
+En modo asíncrono la vista guarda la captura como un
+``RegistroAccesoVehicular`` en estado ``pendiente`` y responde de inmediato.
+Tras el commit, el reconocimiento corre en un pool de
+``PLACAS_MAX_WORKERS`` hilos. Si ya hay ``PLACAS_COLA_MAXIMA`` capturas en
+curso, la vista rechaza la nueva en lugar de acumular trabajo; así un
+servicio lento nunca ocupa los workers web. El guardia consulta el resultado
+en ``GET /api/seguridad/accesos/<id>/``.
+
+Cada captura se reclama en una transacción corta
+(``select_for_update(skip_locked=True)``) que la pasa a ``procesando`` y anota
+``reclamado_en``. El servicio se llama fuera de toda transacción y el
+resultado se guarda en otra transacción corta, solo si el reclamo sigue siendo
+el mismo. Si el proceso se reinicia con capturas en curso, el proceso
+``capturas`` del ``Procfile`` (``procesar_capturas_pendientes``) retoma las
+pendientes y las que llevan más de ``PLACAS_RECLAMO_TIMEOUT`` segundos en
+``procesando``.
+"""
+
+import logging
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import RegistroAccesoVehicular
+from . import placas
+
+logger = logging.getLogger(__name__)
+
+PLACA_NO_IDENTIFICADA = "NO_IDENTIFICADA"
+
+
+def aplicar_reconocimiento(registro, reconocimiento):
+    """Completa ``registro`` con el resultado; devuelve la distancia de la coincidencia."""
+    vehiculo, distancia, por_confirmar = placas.buscar_vehiculo(reconocimiento.placa)
+    confianza = None
+    if reconocimiento.score is not None:
+        confianza = Decimal(str(reconocimiento.score * 100)).quantize(
+            Decimal("0.01"), rounding=ROUND_HALF_UP
+        )
+    registro.vehiculo = vehiculo
+    registro.placa_detectada = (reconocimiento.placa or PLACA_NO_IDENTIFICADA).upper()
+    registro.confianza = confianza
+    if vehiculo is None:
+        registro.estado = RegistroAccesoVehicular.ESTADO_RECHAZADO
+    elif por_confirmar or reconocimiento.desde_cache:
+        # Una placa parecida o un resultado reutilizado no abren el portón sin
+        # que el guardia lo vea.
+        registro.estado = RegistroAccesoVehicular.ESTADO_POR_CONFIRMAR
+    else:
+        registro.estado = RegistroAccesoVehicular.ESTADO_APROBADO
+    registro.respuesta_api = reconocimiento.respuesta
+    return distancia
+
+
+def _timeout_reclamo():
+    return getattr(settings, "PLACAS_RECLAMO_TIMEOUT", 120)
+
+
+def _reclamables():
+    """Pendientes y las que quedaron en proceso sin resultado más allá del timeout."""
+    return RegistroAccesoVehicular.objects.filter(
+        Q(estado=RegistroAccesoVehicular.ESTADO_PENDIENTE)
+        | Q(
+            estado=RegistroAccesoVehicular.ESTADO_PROCESANDO,
+            reclamado_en__lt=timezone.now() - timedelta(seconds=_timeout_reclamo()),
+        )
+    )
+
+
+def _reclamar(registro_id):
+    with transaction.atomic():
+        registro = _reclamables().select_for_update(skip_locked=True).filter(pk=registro_id).first()
+        if registro is None:
+            return None
+        if registro.estado == RegistroAccesoVehicular.ESTADO_PROCESANDO:
+            logger.warning("Captura %s sin resultado desde %s: se retoma", registro_id, registro.reclamado_en)
+        registro.estado = RegistroAccesoVehicular.ESTADO_PROCESANDO
+        registro.reclamado_en = timezone.now()
+        # Con update() no se disparan las señales: el resumen no cuenta este estado.
+        RegistroAccesoVehicular.objects.filter(pk=registro_id).update(
+            estado=registro.estado, reclamado_en=registro.reclamado_en
+        )
+    return registro
+
+
+def procesar_captura(registro_id):
+    """Reconoce la captura de un registro pendiente y guarda el resultado.
+
+    Un error del servicio deja el registro rechazado, con el motivo en
+    ``respuesta_api["error"]``, para que el guardia decida en persona.
+    Devuelve ``None`` si el registro ya no está pendiente, lo está procesando
+    otro hilo o proceso, o este perdió el reclamo antes de guardar.
+    """
+    registro = _reclamar(registro_id)
+    if registro is None:
+        return None
+    campos = _identificar(registro)
+    return _guardar_resultado(registro, campos)
+
+
+def _identificar(registro):
+    """Completa ``registro`` con el reconocimiento; devuelve los campos a guardar."""
+    if not registro.imagen:
+        return _rechazar(registro, "El registro no tiene captura.")
+
+    with registro.imagen.open("rb") as archivo:
+        imagen = archivo.read()
+    try:
+        reconocimiento = placas.reconocer(imagen, mimetypes.guess_type(registro.imagen.name)[0])
+    except placas.PlateRecognizerError as exc:
+        logger.warning("No se pudo reconocer la captura %s: %r", registro.pk, exc)
+        return _rechazar(registro, str(exc) or "No se pudo contactar al servicio de reconocimiento de placas.")
+
+    aplicar_reconocimiento(registro, reconocimiento)
+    return ["vehiculo", "placa_detectada", "confianza", "estado", "respuesta_api"]
+
+
+def _rechazar(registro, motivo):
+    registro.placa_detectada = PLACA_NO_IDENTIFICADA
+    registro.estado = RegistroAccesoVehicular.ESTADO_RECHAZADO
+    registro.respuesta_api = {"error": motivo}
+    return ["placa_detectada", "estado", "respuesta_api"]
+
+
+def _guardar_resultado(registro, campos):
+    with transaction.atomic():
+        vigente = (
+            RegistroAccesoVehicular.objects.select_for_update()
+            .filter(
+                pk=registro.pk,
+                estado=RegistroAccesoVehicular.ESTADO_PROCESANDO,
+                reclamado_en=registro.reclamado_en,
+            )
+            .exists()
+        )
+        if not vigente:
+            logger.warning("La captura %s fue retomada por otro proceso: se descarta este resultado", registro.pk)
+            return None
+        registro.save(update_fields=campos)
+    return registro
+
+
+class PoolIdentificacion:
+    """Pool de hilos con un tope de capturas en curso (en cola o procesándose)."""
+
+    def __init__(self, workers, maximo):
+        self.maximo = maximo
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="placas")
+        self._en_curso = 0
+        self._lock = threading.Lock()
+
+    @property
+    def en_curso(self):
+        with self._lock:
+            return self._en_curso
+
+    @property
+    def lleno(self):
+        return self.en_curso >= self.maximo
+
+    def enviar(self, funcion, *args):
+        """Programa ``funcion(*args)``; devuelve ``False`` si el pool está lleno."""
+        with self._lock:
+            if self._en_curso >= self.maximo:
+                return False
+            self._en_curso += 1
+        try:
+            futuro = self._executor.submit(funcion, *args)
+        except RuntimeError:
+            self._terminar(None)
+            return False
+        futuro.add_done_callback(self._terminar)
+        return True
+
+    def cerrar(self):
+        self._executor.shutdown(wait=False)
+
+    def _terminar(self, _futuro):
+        with self._lock:
+            self._en_curso -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolIdentificacion(
+                workers=getattr(settings, "PLACAS_MAX_WORKERS", 4),
+                maximo=getattr(settings, "PLACAS_COLA_MAXIMA", 32),
+            )
+        return _pool
+
+
+def reiniciar_pool():
+    """Descarta el pool; el siguiente envío vuelve a leer la configuración."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.cerrar()
+
+
+def _procesar_en_segundo_plano(registro_id):
+    try:
+        procesar_captura(registro_id)
+    except Exception:  # noqa: BLE001 - procesar_capturas_pendientes la retoma
+        logger.exception("Error identificando la captura %s", registro_id)
+    finally:
+        connection.close()
+
+
+def hay_capacidad():
+    return not obtener_pool().lleno
+
+
+def programar_identificacion(registro_id):
+    """Envía el registro al pool cuando la transacción actual confirma."""
+
+    def enviar():
+        if not obtener_pool().enviar(_procesar_en_segundo_plano, registro_id):
+            logger.warning("Pool de identificación lleno: la captura %s queda pendiente", registro_id)
+
+    transaction.on_commit(enviar)
+
+
+def procesar_pendientes(antiguedad=None, limite=100):
+    """Procesa en este hilo los pendientes creados hace más de ``antiguedad``.
+
+    También retoma los que quedaron en proceso más de ``PLACAS_RECLAMO_TIMEOUT``
+    segundos. Los que está procesando otro hilo o proceso se saltan. Devuelve
+    la cantidad de registros resueltos.
+    """
+    pendientes = _reclamables()
+    if antiguedad:
+        pendientes = pendientes.filter(creado_en__lt=timezone.now() - timedelta(seconds=antiguedad))
+    resueltos = 0
+    for registro_id in pendientes.order_by("creado_en").values_list("pk", flat=True)[:limite]:
+        if procesar_captura(registro_id) is not None:
+            resueltos += 1
+    return resueltos
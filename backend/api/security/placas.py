@@ -0,0 +1,501 @@
+"""Reconocimiento de placas para el control de acceso vehicular.
+
+``reconocer(imagen, mime_type)`` pasa cada captura por dos etapas:
+
+1. Una caché por proceso de las capturas vistas en los últimos
+   ``PLACAS_CACHE_TTL`` segundos, indexada por un hash de los bytes exactos de
+   la imagen: solo una captura reenviada tal cual (un reintento de la app del
+   guardia) reutiliza el resultado sin llamar al servicio. Un resultado de la
+   caché nunca aprueba el acceso por sí solo; queda por confirmar.
+2. El reconocedor configurado en ``PLACAS_RECONOCEDOR``:
+
+   - ``"platerecognizer"``: la API de Plate Recognizer (``PLATE_RECOGNIZER_*``);
+   - ``"memoria"``: ``ReconocedorFalso``, responde una placa fija y registra
+     las llamadas, para pruebas y desarrollo;
+   - una ruta ``"paquete.modulo.Clase"`` a cualquier otro reconocedor.
+
+   Un reconocedor es un invocable ``(imagen, mime_type)`` que devuelve la
+   respuesta con el formato de Plate Recognizer (``{"results": [...]}``).
+
+``buscar_vehiculo(placa)`` compara la placa leída contra un índice en memoria
+(árbol BK) de las placas registradas, normalizadas a letras y dígitos en
+mayúscula, y tolera hasta ``PLACAS_DISTANCIA_MAXIMA`` ediciones. Solo las
+confusiones del OCR como 0/O o 1/I aprueban el acceso; cualquier otra
+diferencia lo deja por confirmar. El índice se reconstruye al vencer
+``PLACAS_INDICE_TTL`` o cuando las señales avisan que cambió un vehículo.
+"""
+
+import hashlib
+import itertools
+import logging
+import re
+import threading
+import time
+from typing import NamedTuple
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from ..models import Vehiculo
+
+logger = logging.getLogger(__name__)
+
+MAX_CAPTURAS = 512
+
+# Pares que el OCR suele intercambiar. Una placa que difiere de la registrada
+# solo en estos pares se da por leída; con otras diferencias, por confirmar.
+CONFUSIONES_OCR = frozenset(
+    frozenset(par)
+    for par in (
+        ("0", "O"), ("0", "D"), ("0", "Q"), ("1", "I"), ("1", "L"),
+        ("2", "Z"), ("5", "S"), ("6", "G"), ("8", "B"),
+    )
+)
+
+_reconocedor = None
+_circuito = None
+_reconocedor_lock = threading.Lock()
+
+_capturas = {}
+_capturas_lock = threading.Lock()
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+class PlateRecognizerError(Exception):
+    """Error genérico al invocar Plate Recognizer."""
+
+
+class PlateRecognizerConnectionError(PlateRecognizerError):
+    """Error al conectar con el servicio externo."""
+
+
+class PlateRecognizerNotConfigured(PlateRecognizerError):
+    """Se lanza cuando falta el token de autenticación."""
+
+
+class Reconocimiento(NamedTuple):
+    respuesta: dict
+    placa: str | None
+    score: float | None
+    desde_cache: bool
+
+
+class ReconocedorPlateRecognizer:
+    """Cliente de Plate Recognizer con una sesión HTTP persistente.
+
+    La sesión mantiene hasta ``PLACAS_MAX_WORKERS`` conexiones keep-alive, así
+    que cada captura reutiliza una conexión TLS abierta en lugar de negociar
+    una nueva. ``PLATE_RECOGNIZER_TIMEOUT_CONEXION`` y
+    ``PLATE_RECOGNIZER_TIMEOUT`` acotan la conexión y la lectura.
+    """
+
+    def __init__(self):
+        self._sesion = None
+        self._lock = threading.Lock()
+
+    def _obtener_sesion(self):
+        if self._sesion is None:
+            with self._lock:
+                if self._sesion is None:
+                    conexiones = max(getattr(settings, "PLACAS_MAX_WORKERS", 4), 1)
+                    sesion = requests.Session()
+                    sesion.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=conexiones))
+                    sesion.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=conexiones))
+                    self._sesion = sesion
+        return self._sesion
+
+    def __call__(self, imagen, mime_type):
+        token = getattr(settings, "PLATE_RECOGNIZER_TOKEN", "").strip()
+        if not token:
+            raise PlateRecognizerNotConfigured
+
+        endpoint = getattr(
+            settings,
+            "PLATE_RECOGNIZER_ENDPOINT",
+            "https://api.platerecognizer.com/v1/plate-reader/",
+        )
+        timeout = (
+            getattr(settings, "PLATE_RECOGNIZER_TIMEOUT_CONEXION", 5),
+            getattr(settings, "PLATE_RECOGNIZER_TIMEOUT", 20),
+        )
+
+        try:
+            response = self._obtener_sesion().post(
+                endpoint,
+                headers={"Authorization": f"Token {token}"},
+                files={"upload": ("captura.jpg", imagen, mime_type or "image/jpeg")},
+                timeout=timeout,
+            )
+        except requests.RequestException as exc:
+            logger.warning("Error de conexión con Plate Recognizer: %s", exc)
+            raise PlateRecognizerConnectionError from exc
+
+        if response.status_code >= 500:
+            logger.error("Plate Recognizer respondió con %s: %s", response.status_code, response.text[:500])
+            raise PlateRecognizerConnectionError
+        if not response.ok:
+            logger.error("Plate Recognizer respondió con %s: %s", response.status_code, response.text[:500])
+            raise PlateRecognizerError(
+                "No fue posible reconocer la placa. Revise la captura e intente nuevamente."
+            )
+
+        try:
+            return response.json()
+        except ValueError as exc:
+            logger.error("Respuesta inválida de Plate Recognizer: %s", exc)
+            raise PlateRecognizerError("Respuesta inválida del servicio de reconocimiento.") from exc
+
+
+class Circuito:
+    """Corta las llamadas a un servicio que viene fallando.
+
+    Tras ``fallos`` errores de conexión seguidos el circuito se abre y durante
+    ``enfriamiento`` segundos cada llamada falla al instante sin ocupar un hilo
+    esperando el timeout. Al vencer deja pasar una llamada de prueba: si
+    funciona se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, fallos=5, enfriamiento=30):
+        self.fallos = fallos
+        self.enfriamiento = enfriamiento
+        self._seguidos = 0
+        self._abierto_hasta = 0.0
+        self._probando = False
+        self._lock = threading.Lock()
+
+    @property
+    def abierto(self):
+        with self._lock:
+            return self._seguidos >= self.fallos and time.monotonic() < self._abierto_hasta
+
+    def permitir(self):
+        with self._lock:
+            if self._seguidos < self.fallos:
+                return True
+            if time.monotonic() < self._abierto_hasta or self._probando:
+                return False
+            self._probando = True
+            return True
+
+    def exito(self):
+        with self._lock:
+            self._seguidos = 0
+            self._probando = False
+
+    def fallo(self):
+        with self._lock:
+            self._seguidos += 1
+            self._probando = False
+            if self._seguidos >= self.fallos:
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+
+
+class ReconocedorFalso:
+    """Plate Recognizer local: responde ``placa`` con ``score`` y registra las llamadas.
+
+    Sin ``placa`` responde sin resultados. Con ``fallar_con`` cada llamada
+    lanza esa excepción, como cuando el servicio no responde.
+    """
+
+    def __init__(self, placa=None, score=0.9, fallar_con=None):
+        self.placa = placa
+        self.score = score
+        self.fallar_con = fallar_con
+        self.llamadas = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __call__(self, imagen, mime_type):
+        with self._lock:
+            self.llamadas += 1
+            numero = next(self._ids)
+        if self.fallar_con is not None:
+            raise self.fallar_con
+        if not self.placa:
+            return {"results": []}
+        return {
+            "processing_time": 0,
+            "filename": f"falso-{numero}.jpg",
+            "results": [{"plate": self.placa.lower(), "score": self.score}],
+        }
+
+
+RECONOCEDORES = {
+    "platerecognizer": ReconocedorPlateRecognizer,
+    "memoria": ReconocedorFalso,
+}
+
+
+def obtener_reconocedor():
+    """Reconocedor configurado, creado una sola vez por proceso."""
+    global _reconocedor, _circuito
+    if _reconocedor is None:
+        with _reconocedor_lock:
+            if _reconocedor is None:
+                nombre = getattr(settings, "PLACAS_RECONOCEDOR", "") or "platerecognizer"
+                clase = RECONOCEDORES.get(nombre) or import_string(nombre)
+                _circuito = Circuito(
+                    fallos=getattr(settings, "PLACAS_CIRCUITO_FALLOS", 5),
+                    enfriamiento=getattr(settings, "PLACAS_CIRCUITO_ENFRIAMIENTO", 30),
+                )
+                _reconocedor = clase()
+    return _reconocedor
+
+
+def obtener_circuito():
+    obtener_reconocedor()
+    return _circuito
+
+
+def reiniciar_reconocedor():
+    """Descarta el reconocedor, su circuito y las capturas que resolvió.
+
+    La próxima captura vuelve a leer la configuración.
+    """
+    global _reconocedor, _circuito
+    with _reconocedor_lock:
+        _reconocedor = None
+        _circuito = None
+    limpiar_capturas()
+
+
+def mejor_placa(respuesta):
+    """``(placa, score)`` del resultado con mayor score, o ``(None, None)``."""
+    resultados = respuesta.get("results") or []
+    if not resultados:
+        return None, None
+
+    mejor = max(resultados, key=lambda item: item.get("score") or 0)
+    placa = mejor.get("plate")
+    if placa:
+        placa = placa.upper()
+    return placa, mejor.get("score")
+
+
+# --- Caché de capturas reenviadas ------------------------------------------
+
+
+def huella(imagen):
+    """Hash de los bytes exactos de la captura."""
+    return hashlib.blake2b(imagen, digest_size=16).digest()
+
+
+def buscar_captura(clave):
+    """Respuesta guardada para la misma captura, si sigue vigente."""
+    with _capturas_lock:
+        guardada = _capturas.get(clave)
+        if guardada is None:
+            return None
+        if guardada[0] <= time.monotonic():
+            del _capturas[clave]
+            return None
+        return guardada[1]
+
+
+def guardar_captura(clave, respuesta):
+    ttl = getattr(settings, "PLACAS_CACHE_TTL", 30)
+    if ttl <= 0:
+        return
+    with _capturas_lock:
+        _capturas.pop(clave, None)
+        while len(_capturas) >= MAX_CAPTURAS:
+            # Todas viven lo mismo: la primera insertada es la que vence antes.
+            del _capturas[next(iter(_capturas))]
+        _capturas[clave] = (time.monotonic() + ttl, respuesta)
+
+
+def limpiar_capturas():
+    with _capturas_lock:
+        _capturas.clear()
+
+
+def _llamar_reconocedor(imagen, mime_type):
+    reconocedor = obtener_reconocedor()
+    circuito = obtener_circuito()
+    if not circuito.permitir():
+        raise PlateRecognizerConnectionError("Circuito abierto: el servicio viene fallando.")
+    try:
+        respuesta = reconocedor(imagen, mime_type)
+    except PlateRecognizerConnectionError:
+        circuito.fallo()
+        raise
+    except Exception:
+        # El servicio respondió o el problema es local: no cuenta como caída.
+        circuito.exito()
+        raise
+    circuito.exito()
+    return respuesta
+
+
+def reconocer(imagen, mime_type=None):
+    """Placa de la captura, desde la caché de capturas o el reconocedor configurado.
+
+    Solo se guardan en caché las respuestas que traen una placa; los errores
+    del reconocedor (``PlateRecognizerError``) se propagan. Los errores de
+    conexión abren el circuito (``PLACAS_CIRCUITO_*``).
+    """
+    clave = huella(imagen)
+    respuesta = buscar_captura(clave)
+    desde_cache = respuesta is not None
+    if not desde_cache:
+        respuesta = _llamar_reconocedor(imagen, mime_type)
+
+    placa, score = mejor_placa(respuesta)
+    if placa and not desde_cache:
+        guardar_captura(clave, respuesta)
+    return Reconocimiento(respuesta, placa, score, desde_cache)
+
+
+# --- Índice de placas registradas ------------------------------------------
+
+
+def normalizar_placa(placa):
+    return re.sub(r"[^0-9A-Z]", "", (placa or "").upper())
+
+
+def distancia_edicion(a, b):
+    """Distancia de Levenshtein entre ``a`` y ``b``."""
+    if len(a) < len(b):
+        a, b = b, a
+    anterior = list(range(len(b) + 1))
+    for i, caracter_a in enumerate(a, 1):
+        actual = [i]
+        for j, caracter_b in enumerate(b, 1):
+            actual.append(
+                min(
+                    anterior[j] + 1,
+                    actual[j - 1] + 1,
+                    anterior[j - 1] + (caracter_a != caracter_b),
+                )
+            )
+        anterior = actual
+    return anterior[-1]
+
+
+def _solo_confusiones(a, b):
+    return len(a) == len(b) and all(
+        x == y or frozenset((x, y)) in CONFUSIONES_OCR for x, y in zip(a, b)
+    )
+
+
+class ArbolBK:
+    """Árbol BK sobre la distancia de edición: cada hijo cuelga de la distancia a su padre.
+
+    Por la desigualdad triangular, una búsqueda con tolerancia ``d`` desde un
+    nodo a distancia ``n`` solo baja por los hijos con clave en ``[n - d, n + d]``.
+    """
+
+    def __init__(self, palabras=()):
+        self.raiz = None
+        for palabra in palabras:
+            self.agregar(palabra)
+
+    def agregar(self, palabra):
+        if self.raiz is None:
+            self.raiz = (palabra, {})
+            return
+        nodo = self.raiz
+        while True:
+            distancia = distancia_edicion(palabra, nodo[0])
+            if distancia == 0:
+                return
+            hijo = nodo[1].get(distancia)
+            if hijo is None:
+                nodo[1][distancia] = (palabra, {})
+                return
+            nodo = hijo
+
+    def buscar(self, palabra, tolerancia):
+        """``[(distancia, palabra)]`` a distancia ``tolerancia`` o menor, de menor a mayor."""
+        encontrados = []
+        pendientes = [self.raiz] if self.raiz else []
+        while pendientes:
+            actual, hijos = pendientes.pop()
+            distancia = distancia_edicion(palabra, actual)
+            if distancia <= tolerancia:
+                encontrados.append((distancia, actual))
+            for clave in range(distancia - tolerancia, distancia + tolerancia + 1):
+                hijo = hijos.get(clave)
+                if hijo is not None:
+                    pendientes.append(hijo)
+        return sorted(encontrados)
+
+
+class IndicePlacas:
+    def __init__(self, vehiculos):
+        self.por_placa = {}
+        for pk, placa in vehiculos:
+            self.por_placa.setdefault(normalizar_placa(placa), pk)
+        self.arbol = ArbolBK(placa for placa in self.por_placa if placa)
+
+    def buscar(self, placa, tolerancia):
+        """``(pk, distancia, por_confirmar)`` del vehículo más cercano sin ambigüedad.
+
+        Una coincidencia inexacta solo se acepta sin más si las diferencias
+        son confusiones del OCR (``CONFUSIONES_OCR``). Si la placa más cercana
+        difiere en otra cosa (ABC124 frente a ABC123) puede ser otro vehículo,
+        así que se devuelve con ``por_confirmar``. Sin candidato, o con
+        empate, devuelve ``(None, None, False)``.
+        """
+        placa = normalizar_placa(placa)
+        if not placa:
+            return None, None, False
+        if placa in self.por_placa:
+            return self.por_placa[placa], 0, False
+        if tolerancia <= 0:
+            return None, None, False
+
+        candidatos = self.arbol.buscar(placa, tolerancia)
+        confundibles = [
+            (distancia, encontrada)
+            for distancia, encontrada in candidatos
+            if _solo_confusiones(placa, encontrada)
+        ]
+        por_confirmar = not confundibles
+        if confundibles:
+            candidatos = confundibles
+        if not candidatos:
+            return None, None, False
+        minima = candidatos[0][0]
+        cercanas = [encontrada for distancia, encontrada in candidatos if distancia == minima]
+        if len(cercanas) != 1:
+            # Dos placas registradas igual de cerca: no se adivina cuál es.
+            return None, None, False
+        return self.por_placa[cercanas[0]], minima, por_confirmar
+
+
+def _indice_vigente():
+    global _indice
+    ahora = time.monotonic()
+    with _indice_lock:
+        if _indice is not None and _indice[0] > ahora:
+            return _indice[1]
+    indice = IndicePlacas(Vehiculo.objects.values_list("pk", "placa"))
+    with _indice_lock:
+        _indice = (ahora + getattr(settings, "PLACAS_INDICE_TTL", 300), indice)
+    return indice
+
+
+def invalidar_indice():
+    global _indice
+    with _indice_lock:
+        _indice = None
+
+
+def buscar_vehiculo(placa):
+    """``(vehiculo, distancia, por_confirmar)`` para la placa leída, o ``(None, None, False)``."""
+    tolerancia = getattr(settings, "PLACAS_DISTANCIA_MAXIMA", 1)
+    for _intento in range(2):
+        pk, distancia, por_confirmar = _indice_vigente().buscar(placa, tolerancia)
+        if pk is None:
+            return None, None, False
+        vehiculo = Vehiculo.objects.select_related("residente").filter(pk=pk).first()
+        if vehiculo is not None:
+            return vehiculo, distancia, por_confirmar
+        # El vehículo se borró en otro proceso: se reconstruye el índice una vez.
+        invalidar_indice()
+    return None, None, False
@@ -0,0 +1,264 @@
+"""Resumen de seguridad por hora.
+
+``ResumenAccesosHora`` y ``ResumenIncidentesHora`` guardan una fila por hora
+(UTC) con los conteos de accesos vehiculares e incidentes creados en esa hora.
+Cuando se guarda o elimina un acceso o un incidente solo se recalcula su hora,
+después del commit y con un lock por hora (``pg_advisory_xact_lock``): los
+recálculos concurrentes de una misma hora se ejecutan uno tras otro y el último
+cuenta todo lo confirmado, así que ninguno deja conteos viejos.
+
+Una ventana ``[desde, hasta)`` se resuelve sumando las horas completas de estas
+tablas; solo las fracciones de hora de los bordes se cuentan sobre las tablas
+de origen. Los histogramas por hora o por día (hora local) salen únicamente de
+las tablas de resumen.
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+from functools import partial
+from typing import Callable, NamedTuple
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from ..models import (
+    RegistroAccesoVehicular,
+    ReporteIncidenteSeguridad,
+    ResumenAccesosHora,
+    ResumenIncidentesHora,
+)
+
+UNA_HORA = timedelta(hours=1)
+AGRUPACIONES = ("hora", "dia")
+
+
+def _conteos_accesos():
+    return {
+        "total": Count("id"),
+        "aprobados": Count("id", filter=Q(estado=RegistroAccesoVehicular.ESTADO_APROBADO)),
+        "rechazados": Count("id", filter=Q(estado=RegistroAccesoVehicular.ESTADO_RECHAZADO)),
+    }
+
+
+def _conteos_incidentes():
+    return {
+        "total": Count("id"),
+        "pendientes": Count("id", filter=Q(estado=ReporteIncidenteSeguridad.ESTADO_PENDIENTE)),
+        "atendidos": Count("id", filter=Q(estado=ReporteIncidenteSeguridad.ESTADO_ATENDIDO)),
+        "emergencias": Count("id", filter=Q(es_emergencia=True)),
+    }
+
+
+class Fuente(NamedTuple):
+    modelo: type
+    resumen: type
+    conteos: Callable[[], dict]
+    espacio_lock: int
+
+    @property
+    def campos(self):
+        return tuple(self.conteos())
+
+
+FUENTES = {
+    "accesos": Fuente(RegistroAccesoVehicular, ResumenAccesosHora, _conteos_accesos, 4201),
+    "incidentes": Fuente(ReporteIncidenteSeguridad, ResumenIncidentesHora, _conteos_incidentes, 4202),
+}
+
+
+def hora_de(valor):
+    """Inicio de la hora UTC que contiene ``valor``."""
+    return valor.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _filtro_rangos(rangos):
+    filtro = Q()
+    for inicio, fin in rangos:
+        filtro |= Q(creado_en__gte=inicio, creado_en__lt=fin)
+    return filtro
+
+
+def _vacios(fuente):
+    return dict.fromkeys(fuente.campos, 0)
+
+
+def calcular_horas(fuente, horas=None):
+    """Cuenta las filas de origen agrupadas por hora.
+
+    Si ``horas`` es ``None`` se calcula todo el histórico; en otro caso solo
+    esas horas (las que ya no tienen filas quedan en cero). Devuelve
+    ``{hora: {campo: valor}}``.
+    """
+    consulta = fuente.modelo.objects.order_by()
+    resultado = {}
+    if horas is not None:
+        if not horas:
+            return {}
+        consulta = consulta.filter(_filtro_rangos((hora, hora + UNA_HORA) for hora in horas))
+        resultado = {hora: _vacios(fuente) for hora in horas}
+
+    for valores in consulta.values(
+        hora_utc=TruncHour("creado_en", tzinfo=dt_timezone.utc)
+    ).annotate(**fuente.conteos()):
+        resultado[valores.pop("hora_utc")] = valores
+    return resultado
+
+
+def _guardar(fuente, valores_por_hora):
+    filas = [
+        fuente.resumen(hora=hora, **valores)
+        for hora, valores in valores_por_hora.items()
+        if valores["total"]
+    ]
+    if filas:
+        fuente.resumen.objects.bulk_create(
+            filas,
+            update_conflicts=True,
+            unique_fields=["hora"],
+            update_fields=[*fuente.campos, "actualizado_en"],
+        )
+    vacias = [hora for hora, valores in valores_por_hora.items() if not valores["total"]]
+    if vacias:
+        fuente.resumen.objects.filter(hora__in=vacias).delete()
+
+
+def _bloquear_horas(fuente, horas):
+    if connection.vendor != "postgresql":
+        # SQLite serializa las escrituras con el lock de toda la base.
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, clave) FROM "
+            "(SELECT unnest(%s::integer[]) AS clave ORDER BY 1) AS claves",
+            [fuente.espacio_lock, sorted(int(hora.timestamp()) // 3600 for hora in horas)],
+        )
+
+
+def _recalcular_horas(fuente, horas):
+    with transaction.atomic():
+        # El conteo se hace después de obtener el lock, así que ve lo que
+        # confirmó el recálculo anterior de la misma hora.
+        _bloquear_horas(fuente, horas)
+        _guardar(fuente, calcular_horas(fuente, horas))
+
+
+def actualizar_horas(nombre, horas):
+    """Recalcula y persiste las horas indicadas de ``accesos`` o ``incidentes``.
+
+    Se ejecuta al confirmarse la transacción en curso, cuando el cambio ya es
+    visible para los demás recálculos.
+    """
+    horas = {hora_de(hora) for hora in horas if hora}
+    if horas:
+        transaction.on_commit(partial(_recalcular_horas, FUENTES[nombre], horas))
+
+
+def reconstruir_resumen_seguridad(aplicar=True):
+    """Recalcula todas las horas y devuelve las diferencias con lo almacenado.
+
+    Cada diferencia es ``(fuente, hora, campo, almacenado, calculado)``. Con
+    ``aplicar`` se reemplaza el contenido de las tablas por lo calculado.
+    """
+    diferencias = []
+    for nombre, fuente in FUENTES.items():
+        calculado = calcular_horas(fuente)
+        almacenado = {
+            valores.pop("hora"): valores
+            for valores in fuente.resumen.objects.values("hora", *fuente.campos)
+        }
+        for hora in sorted(set(calculado) | set(almacenado)):
+            esperado = calculado.get(hora, _vacios(fuente))
+            actual = almacenado.get(hora, _vacios(fuente))
+            for campo in fuente.campos:
+                if actual[campo] != esperado[campo]:
+                    diferencias.append((nombre, hora, campo, actual[campo], esperado[campo]))
+
+        if aplicar:
+            obsoletas = [hora for hora in almacenado if hora not in calculado]
+            if obsoletas:
+                fuente.resumen.objects.filter(hora__in=obsoletas).delete()
+            _guardar(fuente, calculado)
+
+    return diferencias
+
+
+def _techo_hora(valor):
+    hora = hora_de(valor)
+    return hora if hora == valor else hora + UNA_HORA
+
+
+def contar(nombre, desde=None, hasta=None):
+    """Conteos de ``[desde, hasta)``; cualquiera de los extremos puede ser ``None``.
+
+    Usa a lo sumo dos consultas: la suma de las horas completas y un conteo
+    condicional de las fracciones de hora de los bordes.
+    """
+    fuente = FUENTES[nombre]
+    inicio_horas = _techo_hora(desde) if desde else None
+    fin_horas = hora_de(hasta) if hasta else None
+
+    bordes = []
+    if inicio_horas and fin_horas and inicio_horas >= fin_horas:
+        # La ventana no contiene ninguna hora completa.
+        bordes.append((desde, hasta))
+        horas = None
+    else:
+        if desde and desde < inicio_horas:
+            bordes.append((desde, inicio_horas))
+        if hasta and fin_horas < hasta:
+            bordes.append((fin_horas, hasta))
+        horas = fuente.resumen.objects.order_by()
+        if inicio_horas:
+            horas = horas.filter(hora__gte=inicio_horas)
+        if fin_horas:
+            horas = horas.filter(hora__lt=fin_horas)
+
+    resultado = _vacios(fuente)
+    if horas is not None:
+        sumas = horas.aggregate(**{campo: Sum(campo) for campo in fuente.campos})
+        for campo in fuente.campos:
+            resultado[campo] += sumas[campo] or 0
+    if bordes:
+        conteos = (
+            fuente.modelo.objects.order_by()
+            .filter(_filtro_rangos(bordes))
+            .aggregate(**fuente.conteos())
+        )
+        for campo in fuente.campos:
+            resultado[campo] += conteos[campo]
+    return resultado
+
+
+def histograma(desde=None, hasta=None, agrupar="hora"):
+    """Conteos por hora (UTC) o por día (hora local) de accesos e incidentes.
+
+    Toma las horas que se superponen con la ventana, así que el primer y el
+    último intervalo pueden incluir registros de la hora completa.
+    """
+    if agrupar not in AGRUPACIONES:
+        raise ValueError(f"agrupar debe ser uno de: {', '.join(AGRUPACIONES)}.")
+
+    intervalos = {}
+    for nombre, fuente in FUENTES.items():
+        horas = fuente.resumen.objects.order_by()
+        if desde:
+            horas = horas.filter(hora__gte=hora_de(desde))
+        if hasta:
+            horas = horas.filter(hora__lt=hasta)
+        if agrupar == "dia":
+            horas = horas.values(inicio=TruncDay("hora", tzinfo=timezone.get_current_timezone()))
+        else:
+            horas = horas.values(inicio=TruncHour("hora", tzinfo=dt_timezone.utc))
+        for valores in horas.annotate(**{campo: Sum(campo) for campo in fuente.campos}):
+            inicio = valores.pop("inicio")
+            intervalo = intervalos.setdefault(
+                inicio,
+                {nombre: _vacios(fuente) for nombre, fuente in FUENTES.items()},
+            )
+            intervalo[nombre] = valores
+
+    return [
+        {"inicio": inicio.isoformat(), **intervalos[inicio]}
+        for inicio in sorted(intervalos)
+    ]
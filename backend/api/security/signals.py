@@ -0,0 +1,42 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .. import imagenes
+from ..models import RegistroAccesoVehicular, ReporteIncidenteSeguridad, Vehiculo
+from .eventos import publicar_cambio_incidente
+from .placas import invalidar_indice
+from .resumen import actualizar_horas
+
+imagenes.registrar(RegistroAccesoVehicular, "imagen")
+
+
+@receiver(post_save, sender=ReporteIncidenteSeguridad)
+def _incidente_guardado(sender, instance, created, **kwargs):
+    publicar_cambio_incidente(instance.pk, "creado" if created else "actualizado")
+
+
+@receiver(post_delete, sender=ReporteIncidenteSeguridad)
+def _incidente_eliminado(sender, instance, **kwargs):
+    publicar_cambio_incidente(instance.pk, "eliminado")
+
+
+@receiver(post_save, sender=ReporteIncidenteSeguridad)
+@receiver(post_delete, sender=ReporteIncidenteSeguridad)
+def _incidente_actualizar_resumen(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    actualizar_horas("incidentes", [instance.creado_en])
+
+
+@receiver(post_save, sender=RegistroAccesoVehicular)
+@receiver(post_delete, sender=RegistroAccesoVehicular)
+def _acceso_actualizar_resumen(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    actualizar_horas("accesos", [instance.creado_en])
+
+
+@receiver(post_save, sender=Vehiculo)
+@receiver(post_delete, sender=Vehiculo)
+def _vehiculo_invalidar_indice(sender, **kwargs):
+    invalidar_indice()
@@ -1,51 +1,64 @@
+import asyncio
 import base64
-import json
 import logging
-import time
+import tempfile
 import uuid
-from datetime import timedelta
-from decimal import Decimal, ROUND_HALF_UP
-from io import BytesIO
-from urllib import error as urllib_error, request as urllib_request
+from datetime import datetime, time, timedelta
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import connection, transaction
 from django.db.models import Count
-from django.http import HttpResponse, StreamingHttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.utils.dateparse import parse_datetime
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.http import require_GET
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from ..models import (
     RegistroAccesoVehicular,
-    Vehiculo,
-    Usuario,
-    UsuarioRol,
     CategoriaIncidenteSeguridad,
     ReporteIncidenteSeguridad,
-    ResidenteVivienda,
 )
+from .. import imagenes
+from ..actor import obtener_actor
+from ..flujo import en_flujo
+from ..pdf import DocumentoPDF
+from ..permissions import IsGuardiaOAdmin, roles_de_peticion
 from ..serializers import (
     RegistroAccesoVehicularSerializer,
     CategoriaIncidenteSeguridadSerializer,
     ReporteIncidenteSeguridadSerializer,
+    prefetch_vivienda_activa,
 )
+from . import eventos
+from . import identificacion, placas
+from .placas import (
+    PlateRecognizerConnectionError,
+    PlateRecognizerError,
+    PlateRecognizerNotConfigured,
+)
+from . import resumen as resumen_seguridad_horas
 
 logger = logging.getLogger(__name__)
 
 
-class RegistroAccesoVehicularViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class RegistroAccesoVehicularViewSet(
+    imagenes.RendicionesMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
     queryset = (
         RegistroAccesoVehicular.objects.select_related(
             "vehiculo__residente", "guardia__user"
         )
-        .all()
+        .prefetch_related(prefetch_vivienda_activa("vehiculo__residente"))
         .order_by("-creado_en")
     )
     serializer_class = RegistroAccesoVehicularSerializer
@@ -79,8 +92,12 @@ class RegistroAccesoVehicularViewSet(mixins.ListModelMixin, viewsets.GenericView
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        registro = RegistroAccesoVehicular(guardia=obtener_actor(request).usuario)
+        if _to_bool(request.data.get("asincrono")):
+            return self._identificar_en_segundo_plano(registro, filename, image_bytes)
+
         try:
-            response_payload = _call_plate_recognizer(image_bytes, mime_type)
+            reconocimiento = placas.reconocer(image_bytes, mime_type)
         except PlateRecognizerNotConfigured:
             return Response(
                 {"detail": "El servicio de reconocimiento de placas no está configurado."},
@@ -99,38 +116,8 @@ class RegistroAccesoVehicularViewSet(mixins.ListModelMixin, viewsets.GenericView
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        plate, score = _extract_best_plate(response_payload)
-        if not plate:
-            plate = "NO_IDENTIFICADA"
-
-        vehiculo = (
-            Vehiculo.objects.select_related("residente")
-            .filter(placa__iexact=plate)
-            .first()
-        )
-
-        estado = (
-            RegistroAccesoVehicular.ESTADO_APROBADO
-            if vehiculo
-            else RegistroAccesoVehicular.ESTADO_RECHAZADO
-        )
-
-        confianza = None
-        if score is not None:
-            confianza = Decimal(str(score * 100)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-        registro = RegistroAccesoVehicular(
-            guardia=_usuario_actual(request.user),
-            vehiculo=vehiculo,
-            placa_detectada=plate.upper(),
-            confianza=confianza,
-            estado=estado,
-            respuesta_api=response_payload,
-        )
-
-        if image_bytes:
-            registro.imagen.save(filename, ContentFile(image_bytes), save=False)
-
+        distancia = identificacion.aplicar_reconocimiento(registro, reconocimiento)
+        registro.imagen.save(filename, ContentFile(image_bytes), save=False)
         registro.save()
 
         serializer = self.get_serializer(registro)
@@ -141,11 +128,67 @@ class RegistroAccesoVehicularViewSet(mixins.ListModelMixin, viewsets.GenericView
             {
                 "registro": serializer.data,
                 "historial": historial,
-                "coincide": bool(vehiculo),
+                "coincide": bool(registro.vehiculo),
+                "requiere_confirmacion": registro.estado == RegistroAccesoVehicular.ESTADO_POR_CONFIRMAR,
+                "distancia": distancia,
+                "desde_cache": reconocimiento.desde_cache,
             },
             status=status.HTTP_201_CREATED,
         )
 
+    @action(detail=True, methods=["post"], permission_classes=[IsGuardiaOAdmin])
+    def confirmar(self, request, pk=None):
+        """El guardia aprueba o rechaza un acceso que quedó por confirmar."""
+        if "aprobado" not in request.data:
+            return Response(
+                {"detail": "Indique 'aprobado': true o false."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        with transaction.atomic():
+            registro = get_object_or_404(
+                RegistroAccesoVehicular.objects.select_for_update(), pk=pk
+            )
+            if registro.estado != RegistroAccesoVehicular.ESTADO_POR_CONFIRMAR:
+                return Response(
+                    {"detail": "El acceso no está pendiente de confirmación."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            registro.estado = (
+                RegistroAccesoVehicular.ESTADO_APROBADO
+                if _to_bool(request.data.get("aprobado"))
+                else RegistroAccesoVehicular.ESTADO_RECHAZADO
+            )
+            registro.guardia = obtener_actor(request).usuario or registro.guardia
+            campos = ["estado", "guardia"]
+            comentario = (request.data.get("comentario") or "").strip()
+            if comentario:
+                registro.comentario = comentario
+                campos.append("comentario")
+            registro.save(update_fields=campos)
+
+        return Response(self.get_serializer(self.get_object()).data)
+
+    def _identificar_en_segundo_plano(self, registro, filename, image_bytes):
+        if not identificacion.hay_capacidad():
+            return Response(
+                {"detail": "Hay demasiadas capturas en proceso. Intente nuevamente en unos segundos."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "5"},
+            )
+
+        registro.placa_detectada = identificacion.PLACA_NO_IDENTIFICADA
+        registro.estado = RegistroAccesoVehicular.ESTADO_PENDIENTE
+        registro.imagen.save(filename, ContentFile(image_bytes), save=False)
+        registro.save()
+        identificacion.programar_identificacion(registro.pk)
+        return Response(
+            {
+                "registro": self.get_serializer(registro).data,
+                "url": reverse("seguridad-accesos-detail", args=[registro.pk], request=self.request),
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
 
 class CategoriaIncidenteSeguridadViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = CategoriaIncidenteSeguridad.objects.filter(activo=True).order_by("nombre")
@@ -158,37 +201,35 @@ class ReporteIncidenteSeguridadViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        usuario = _usuario_actual(self.request.user)
+        actor = obtener_actor(self.request)
         queryset = (
             ReporteIncidenteSeguridad.objects.select_related(
                 "residente",
                 "categoria",
                 "guardia_asignado__user",
             )
-            .all()
+            .prefetch_related(prefetch_vivienda_activa("residente"))
             .order_by("-creado_en")
         )
 
-        if not usuario:
+        if not actor.usuario:
             return queryset.none()
 
-        if _usuario_tiene_rol(usuario, {"ADM", "GUA"}):
+        if actor.tiene_rol("ADM", "GUA"):
             estado_param = self.request.query_params.get("estado")
             if estado_param:
                 queryset = queryset.filter(estado=estado_param)
             return queryset
 
-        residente = getattr(usuario, "residente", None)
-        if residente:
-            return queryset.filter(residente=residente)
+        if actor.residente:
+            return queryset.filter(residente=actor.residente)
 
         return queryset.none()
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         if self.action == "create":
-            usuario = _usuario_actual(self.request.user)
-            residente = getattr(usuario, "residente", None) if usuario else None
+            residente = obtener_actor(self.request).residente
             if residente:
                 context["residente"] = residente
         return context
@@ -206,8 +247,8 @@ class ReporteIncidenteSeguridadViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
-        usuario = _usuario_actual(request.user)
-        residente = getattr(usuario, "residente", None) if usuario else None
+        actor = obtener_actor(request)
+        residente = actor.residente
         if not residente:
             return Response(
                 {"detail": "Solo los residentes pueden reportar incidentes."},
@@ -221,9 +262,8 @@ class ReporteIncidenteSeguridadViewSet(viewsets.ModelViewSet):
             data["categoria_otro"] = data["categoria_otro"].strip()
 
         if es_emergencia and not data.get("ubicacion"):
-            ubicacion_default = _ubicacion_residente(residente)
-            if ubicacion_default:
-                data["ubicacion"] = ubicacion_default
+            if actor.vivienda:
+                data["ubicacion"] = actor.vivienda.codigo_unidad
 
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
@@ -233,8 +273,8 @@ class ReporteIncidenteSeguridadViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["post"], url_path="resolver")
     def resolver(self, request, pk=None):
-        usuario = _usuario_actual(request.user)
-        if not usuario or not _usuario_tiene_rol(usuario, {"ADM", "GUA"}):
+        actor = obtener_actor(request)
+        if not actor.tiene_rol("ADM", "GUA"):
             return Response(status=status.HTTP_403_FORBIDDEN)
 
         incidente = self.get_object()
@@ -254,7 +294,7 @@ class ReporteIncidenteSeguridadViewSet(viewsets.ModelViewSet):
             ReporteIncidenteSeguridad.ESTADO_ATENDIDO,
             ReporteIncidenteSeguridad.ESTADO_DESCARTADO,
         }:
-            incidente.guardia_asignado = usuario
+            incidente.guardia_asignado = actor.usuario
             incidente.atendido_en = timezone.now()
         incidente.save(update_fields=["estado", "guardia_asignado", "atendido_en", "actualizado_en"])
 
@@ -266,7 +306,10 @@ class ReporteIncidenteSeguridadViewSet(viewsets.ModelViewSet):
 @permission_classes([IsAuthenticated])
 def resumen_seguridad(request):
     period = request.query_params.get("period", "total")
-    data = _build_resumen(period, request)
+    try:
+        data = _build_resumen(period, request)
+    except ValueError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
     return Response(data)
 
 
@@ -274,78 +317,71 @@ def resumen_seguridad(request):
 @permission_classes([IsAuthenticated])
 def exportar_resumen_pdf(request):
     period = request.query_params.get("period", "total")
-    resumen = _build_resumen(period, request)
-
-    pdf_bytes = _render_resumen_pdf(resumen)
+    try:
+        resumen = _build_resumen(period, request)
+    except ValueError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-    filename = f"reporte-seguridad-{timezone.now().strftime('%Y%m%d-%H%M%S')}.pdf"
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    response["Content-Disposition"] = f"attachment; filename={filename}"
-    return response
+    # Se arma en un archivo temporal (en disco, no en memoria) y se transmite
+    # desde ahí; FileResponse lo cierra y el sistema lo borra al terminar.
+    archivo = tempfile.TemporaryFile()
+    try:
+        _render_resumen_pdf(resumen, archivo)
+        archivo.seek(0)
+    except BaseException:
+        archivo.close()
+        raise
+    response = FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f"reporte-seguridad-{timezone.now().strftime('%Y%m%d-%H%M%S')}.pdf",
+        content_type="application/pdf",
+    )
+    return en_flujo(request, response)
 
 
 @require_GET
-def incidentes_event_stream(request):
-    """Server-sent events stream with recent security incidents."""
+async def incidentes_event_stream(request):
+    """Server-sent events con los incidentes recientes.
+
+    Al conectar se envía la foto actual (o, con ``Last-Event-ID``, los eventos
+    que el cliente se perdió) y luego un evento por cada cambio publicado en
+    el hub. La conexión no ocupa un hilo mientras espera.
+    """
 
-    user = _authenticate_event_stream(request)
+    user, token = await _sin_retener_conexion(_authenticate_event_stream, request)
     if not user:
         return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
 
     request.user = user
-    usuario = _usuario_actual(user)
-    if not usuario or not _usuario_tiene_rol(usuario, {"ADM", "GUA"}):
+    roles = await _sin_retener_conexion(roles_de_peticion, request, token)
+    if not roles.intersection({"ADM", "GUA"}):
         return HttpResponse(status=status.HTTP_403_FORBIDDEN)
 
-    last_seen = _parse_last_event_id(request)
-
-    def stream():
-        nonlocal last_seen
-        sleep_seconds = 5
-
-        while True:
-            try:
-                queryset = (
-                    ReporteIncidenteSeguridad.objects.select_related(
-                        "residente",
-                        "categoria",
-                        "guardia_asignado__user",
-                    )
-                    .order_by("-creado_en")
-                )
-                limit = 6
-                items = list(queryset[:limit])
+    eventos.asegurar_oyente()
+    suscripcion, pendientes = eventos.hub.suscribir(
+        asyncio.get_running_loop(), _parse_last_event_id(request)
+    )
+    keepalive = getattr(settings, "SEGURIDAD_SSE_KEEPALIVE", 15)
 
-                if items:
-                    latest_timestamp = max(item.actualizado_en for item in items)
+    async def stream():
+        try:
+            if pendientes is None:
+                yield (await _sin_retener_conexion(eventos.foto_actual)).mensaje
+            else:
+                for evento in pendientes:
+                    yield evento.mensaje
+
+            while True:
+                evento = await suscripcion.siguiente(keepalive)
+                if evento is None:
+                    yield eventos.KEEPALIVE
+                elif evento is eventos.RESINCRONIZAR:
+                    yield (await _sin_retener_conexion(eventos.foto_actual)).mensaje
                 else:
-                    latest_timestamp = None
-
-                if latest_timestamp and (
-                    not last_seen or latest_timestamp > last_seen
-                ):
-                    serializer = ReporteIncidenteSeguridadSerializer(
-                        items,
-                        many=True,
-                        context={"request": request},
-                    )
-                    payload = json.dumps({"incidents": serializer.data})
-                    last_seen = latest_timestamp
-
-                    yield f"id: {latest_timestamp.isoformat() }\n"
-                    yield "event: incidents\n"
-                    yield f"data: {payload}\n\n"
-
-                yield "event: keepalive\n"
-                yield "data: {}\n\n"
-                time.sleep(sleep_seconds)
-            except GeneratorExit:
-                break
-            except Exception as exc:  # pragma: no cover - logged for observability
-                logger.exception("Error en stream de incidentes: %s", exc)
-                yield "event: error\n"
-                yield "data: \"stream_error\"\n\n"
-                time.sleep(sleep_seconds)
+                    yield evento.mensaje
+        finally:
+            suscripcion.cerrar()
 
     response = StreamingHttpResponse(stream(), content_type="text/event-stream")
     response["Cache-Control"] = "no-cache"
@@ -353,6 +389,21 @@ def incidentes_event_stream(request):
     return response
 
 
+@sync_to_async
+def _sin_retener_conexion(funcion, *args):
+    """Ejecuta ``funcion`` y libera la conexión a la base de datos del hilo.
+
+    Con ASGI cada petición tiene su propio hilo para el código síncrono y un
+    stream vive minutos: si la conexión quedara abierta (``CONN_MAX_AGE``)
+    cada cliente SSE ocuparía una conexión de PostgreSQL.
+    """
+    try:
+        return funcion(*args)
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+
+
 def _authenticate_event_stream(request):
     authenticator = JWTAuthentication()
 
@@ -361,38 +412,33 @@ def _authenticate_event_stream(request):
         if header:
             raw_token = authenticator.get_raw_token(header)
             validated_token = authenticator.get_validated_token(raw_token)
-            return authenticator.get_user(validated_token)
+            return authenticator.get_user(validated_token), validated_token
     except AuthenticationFailed:
-        return None
+        return None, None
 
     token_param = request.GET.get("token")
     if not token_param:
-        return None
+        return None, None
 
     try:
         validated_token = authenticator.get_validated_token(token_param)
     except AuthenticationFailed:
-        return None
+        return None, None
 
-    return authenticator.get_user(validated_token)
+    return authenticator.get_user(validated_token), validated_token
 
 
 def _parse_last_event_id(request):
     candidate = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
-    if not candidate:
-        return None
-
-    value = parse_datetime(candidate)
-    if not value:
+    try:
+        return int(candidate)
+    except (TypeError, ValueError):
+        # Ids viejos (fechas) o ausentes: el cliente recibe la foto completa.
         return None
 
-    if timezone.is_naive(value):
-        value = timezone.make_aware(value, timezone=timezone.utc)
-    return value
 
-
-def _render_resumen_pdf(resumen: dict) -> bytes:
-    composer = _PDFComposer()
+def _render_resumen_pdf(resumen: dict, destino=None) -> bytes | None:
+    composer = DocumentoPDF(destino)
 
     composer.add_text("Reporte de Seguridad", font="F2", size=18, leading=26)
     composer.add_text(
@@ -408,6 +454,13 @@ def _render_resumen_pdf(resumen: dict) -> bytes:
             size=11,
             leading=18,
         )
+    if resumen.get("hasta"):
+        composer.add_text(
+            f"Hasta: {resumen['hasta']}",
+            font="F1",
+            size=11,
+            leading=18,
+        )
 
     composer.add_spacing(8)
 
@@ -469,161 +522,15 @@ def _render_resumen_pdf(resumen: dict) -> bytes:
                 indent=12,
             )
             composer.add_text(
-                descripcion[:90],
+                descripcion,
                 font="F1",
                 size=10,
                 leading=14,
                 indent=18,
+                wrap=True,
             )
 
-    return composer.render()
-
-
-def _pdf_escape(value: str) -> str:
-    return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
-
-
-class _PDFComposer:
-    width = 612
-    height = 792
-    margin = 54
-
-    def __init__(self) -> None:
-        self.pages: list[list[tuple[str, float, float, float, str]]] = [[]]
-        self.y_position = self.height - self.margin
-
-    def add_text(
-        self,
-        text: str,
-        *,
-        font: str,
-        size: float,
-        leading: float,
-        indent: float = 0.0,
-    ) -> None:
-        if self.y_position < self.margin:
-            self._new_page()
-        x = self.margin + indent
-        self.pages[-1].append((font, size, x, self.y_position, text))
-        self.y_position -= leading
-
-    def add_spacing(self, amount: float) -> None:
-        if self.y_position - amount < self.margin:
-            self._new_page()
-        else:
-            self.y_position -= amount
-
-    def ensure_space(self, amount: float) -> None:
-        if self.y_position - amount < self.margin:
-            self._new_page()
-
-    def _new_page(self) -> None:
-        self.pages.append([])
-        self.y_position = self.height - self.margin
-
-    def render(self) -> bytes:
-        if not any(self.pages):
-            self.pages = [[]]
-
-        objects: list[bytes] = []
-
-        def add_object(content: bytes | str) -> int:
-            if isinstance(content, str):
-                content_bytes = content.encode("utf-8")
-            else:
-                content_bytes = content
-            objects.append(content_bytes)
-            return len(objects)
-
-        font_regular = add_object("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
-        font_bold = add_object(
-            "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>"
-        )
-
-        page_object_indices: list[int] = []
-
-        for page in self.pages:
-            if not page:
-                stream_content = "BT\nET"
-            else:
-                parts: list[str] = []
-                for font, size, x, y, text in page:
-                    parts.append("BT")
-                    parts.append(f"/{font} {size:.2f} Tf")
-                    parts.append(f"1 0 0 1 {x:.2f} {y:.2f} Tm")
-                    parts.append(f"({_pdf_escape(text)}) Tj")
-                    parts.append("ET")
-                stream_content = "\n".join(parts)
-
-            stream_bytes = stream_content.encode("utf-8")
-            stream_obj = (
-                f"<< /Length {len(stream_bytes)} >>\nstream\n".encode("utf-8")
-                + stream_bytes
-                + b"\nendstream"
-            )
-            stream_id = add_object(stream_obj)
-
-            page_obj = (
-                "<< /Type /Page /Parent __PARENT__ /MediaBox [0 0 {width} {height}] "
-                "/Contents {stream} 0 R /Resources << /Font << /F1 {font_regular} 0 R "
-                "/F2 {font_bold} 0 R >> >> >>"
-            ).format(
-                width=self.width,
-                height=self.height,
-                stream=stream_id,
-                font_regular=font_regular,
-                font_bold=font_bold,
-            )
-            page_obj_id = add_object(page_obj)
-            page_object_indices.append(page_obj_id)
-
-        kids = " ".join(f"{idx} 0 R" for idx in page_object_indices) or ""
-        pages_obj_id = add_object(
-            f"<< /Type /Pages /Kids [{kids}] /Count {len(page_object_indices)} >>"
-        )
-        catalog_id = add_object(f"<< /Type /Catalog /Pages {pages_obj_id} 0 R >>")
-
-        parent_ref = f"{pages_obj_id} 0 R".encode("utf-8")
-        for idx in page_object_indices:
-            objects[idx - 1] = objects[idx - 1].replace(b"__PARENT__", parent_ref)
-
-        buffer = BytesIO()
-        buffer.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
-
-        offsets: list[int] = []
-        for i, content in enumerate(objects, start=1):
-            offsets.append(buffer.tell())
-            buffer.write(f"{i} 0 obj\n".encode("utf-8"))
-            buffer.write(content)
-            buffer.write(b"\nendobj\n")
-
-        xref_position = buffer.tell()
-        buffer.write(f"xref\n0 {len(objects) + 1}\n".encode("utf-8"))
-        buffer.write(b"0000000000 65535 f \n")
-        for offset in offsets:
-            buffer.write(f"{offset:010} 00000 n \n".encode("ascii"))
-
-        buffer.write(b"trailer\n")
-        buffer.write(
-            f"<< /Size {len(objects) + 1} /Root {catalog_id} 0 R >>\n".encode("utf-8")
-        )
-        buffer.write(b"startxref\n")
-        buffer.write(f"{xref_position}\n".encode("ascii"))
-        buffer.write(b"%%EOF")
-
-        return buffer.getvalue()
-
-
-class PlateRecognizerError(Exception):
-    """Error genérico al invocar Plate Recognizer."""
-
-
-class PlateRecognizerConnectionError(PlateRecognizerError):
-    """Error al conectar con el servicio externo."""
-
-
-class PlateRecognizerNotConfigured(PlateRecognizerError):
-    """Se lanza cuando falta el token de autenticación."""
+    return composer.cerrar()
 
 
 def _decode_base64_image(data: str):
@@ -647,116 +554,6 @@ def _decode_base64_image(data: str):
         return None, None, None
 
 
-def _call_plate_recognizer(image_bytes: bytes, mime_type: str | None):
-    token = getattr(settings, "PLATE_RECOGNIZER_TOKEN", "").strip()
-    if not token:
-        raise PlateRecognizerNotConfigured
-
-    endpoint = getattr(
-        settings,
-        "PLATE_RECOGNIZER_ENDPOINT",
-        "https://api.platerecognizer.com/v1/plate-reader/",
-    )
-
-    boundary = f"----PlateRecognizer{uuid.uuid4().hex}"
-    mime = mime_type or "image/jpeg"
-    body = (
-        b"--"
-        + boundary.encode()
-        + b"\r\n"
-        + b'Content-Disposition: form-data; name="upload"; filename="captura.jpg"\r\n'
-        + b"Content-Type: "
-        + mime.encode()
-        + b"\r\n\r\n"
-        + image_bytes
-        + b"\r\n--"
-        + boundary.encode()
-        + b"--\r\n"
-    )
-
-    request = urllib_request.Request(
-        endpoint,
-        data=body,
-        method="POST",
-        headers={
-            "Authorization": f"Token {token}",
-            "Content-Type": f"multipart/form-data; boundary={boundary}",
-            "Content-Length": str(len(body)),
-        },
-    )
-
-    try:
-        with urllib_request.urlopen(request, timeout=20) as response:
-            charset = response.headers.get_content_charset("utf-8")
-            payload = response.read().decode(charset)
-    except urllib_error.HTTPError as exc:  # noqa: BLE001
-        try:
-            error_body = exc.read().decode("utf-8", errors="ignore")
-        except Exception:  # noqa: BLE001
-            error_body = exc.reason if isinstance(exc.reason, str) else ""
-        logger.error(
-            "Plate Recognizer respondió con %s: %s",
-            getattr(exc, "code", "desconocido"),
-            error_body,
-        )
-        raise PlateRecognizerError(
-            "No fue posible reconocer la placa. Revise la captura e intente nuevamente."
-        ) from exc
-    except urllib_error.URLError as exc:  # noqa: BLE001
-        logger.exception("Error de conexión con Plate Recognizer: %s", exc)
-        raise PlateRecognizerConnectionError from exc
-
-    try:
-        return json.loads(payload)
-    except json.JSONDecodeError as exc:  # noqa: BLE001
-        logger.error("Respuesta inválida de Plate Recognizer: %s", exc)
-        raise PlateRecognizerError("Respuesta inválida del servicio de reconocimiento.") from exc
-
-
-def _extract_best_plate(payload: dict):
-    results = payload.get("results") or []
-    if not results:
-        return None, None
-
-    best = max(results, key=lambda item: item.get("score") or 0)
-    plate = best.get("plate")
-    score = best.get("score")
-    if plate:
-        plate = plate.upper()
-    return plate, score
-
-
-def _usuario_actual(auth_user):
-    if not auth_user or not auth_user.is_authenticated:
-        return None
-    return (
-        Usuario.objects.select_related("user")
-        .filter(user=auth_user)
-        .first()
-    )
-
-
-def _usuario_tiene_rol(usuario: Usuario, roles: set[str]) -> bool:
-    if not usuario:
-        return False
-    return UsuarioRol.objects.filter(
-        usuario=usuario,
-        rol__nombre__in=roles,
-        estado=1,
-    ).exists()
-
-
-def _ubicacion_residente(residente):
-    relacion = (
-        ResidenteVivienda.objects.select_related("vivienda")
-        .filter(residente=residente, fecha_hasta__isnull=True)
-        .first()
-    )
-    if relacion and relacion.vivienda:
-        return relacion.vivienda.codigo_unidad
-    return None
-
-
 def _to_bool(value) -> bool:
     if isinstance(value, bool):
         return value
@@ -767,37 +564,63 @@ def _to_bool(value) -> bool:
     return False
 
 
-def _build_resumen(period: str, request):
+def _parse_fecha_resumen(value, nombre, fin=False):
+    """Acepta fecha u hora ISO; una fecha sola como ``hasta`` incluye ese día."""
+    if not value:
+        return None
+    fecha_hora = parse_datetime(value)
+    if fecha_hora is None:
+        fecha = parse_date(value)
+        if fecha is None:
+            raise ValueError(f"'{nombre}' debe ser una fecha u hora ISO (YYYY-MM-DD[THH:MM]).")
+        if fin:
+            fecha += timedelta(days=1)
+        fecha_hora = datetime.combine(fecha, time.min)
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora
+
+
+def _ventana_resumen(period: str, query_params):
+    desde = _parse_fecha_resumen(query_params.get("desde"), "desde")
+    hasta = _parse_fecha_resumen(query_params.get("hasta"), "hasta", fin=True)
+    if desde or hasta:
+        if desde and hasta and desde >= hasta:
+            raise ValueError("'desde' debe ser anterior a 'hasta'.")
+        partes = []
+        if desde:
+            partes.append(f"desde {timezone.localtime(desde):%d/%m/%Y %H:%M}")
+        if hasta:
+            partes.append(f"hasta {timezone.localtime(hasta):%d/%m/%Y %H:%M}")
+        return desde, hasta, "Rango: " + " ".join(partes), "custom"
+
     normalized = (period or "").strip().lower()
     ahora = timezone.now()
     if normalized == "daily" or normalized == "dia":
-        inicio = ahora - timedelta(days=1)
-        label = "Últimas 24 horas"
-        periodo = "daily"
-    elif normalized == "monthly" or normalized == "mes":
-        inicio = ahora - timedelta(days=30)
-        label = "Últimos 30 días"
-        periodo = "monthly"
-    else:
-        inicio = None
-        label = "Histórico"
-        periodo = "total"
-
-    accesos_qs = RegistroAccesoVehicular.objects.all()
-    incidentes_qs = ReporteIncidenteSeguridad.objects.select_related("residente", "categoria")
-    if inicio:
-        accesos_qs = accesos_qs.filter(creado_en__gte=inicio)
-        incidentes_qs = incidentes_qs.filter(creado_en__gte=inicio)
+        return ahora - timedelta(days=1), None, "Últimas 24 horas", "daily"
+    if normalized == "monthly" or normalized == "mes":
+        return ahora - timedelta(days=30), None, "Últimos 30 días", "monthly"
+    return None, None, "Histórico", "total"
+
+
+def _build_resumen(period: str, request):
+    """Resumen de accesos e incidentes de la ventana pedida.
 
-    accesos_total = accesos_qs.count()
-    accesos_aprobados = accesos_qs.filter(estado=RegistroAccesoVehicular.ESTADO_APROBADO).count()
-    accesos_rechazados = accesos_qs.filter(estado=RegistroAccesoVehicular.ESTADO_RECHAZADO).count()
+    Los conteos salen de las tablas por hora de ``resumen``; acepta ``desde`` y
+    ``hasta`` (ISO) en lugar de ``period`` y ``agrupar=hora|dia`` para incluir
+    un histograma. Lanza ``ValueError`` si los parámetros son inválidos.
+    """
+    inicio, fin, label, periodo = _ventana_resumen(period, request.query_params)
+    agrupar = request.query_params.get("agrupar")
 
-    incidentes_total = incidentes_qs.count()
-    incidentes_pendientes = incidentes_qs.filter(estado=ReporteIncidenteSeguridad.ESTADO_PENDIENTE).count()
-    incidentes_atendidos = incidentes_qs.filter(estado=ReporteIncidenteSeguridad.ESTADO_ATENDIDO).count()
-    incidentes_emergencias = incidentes_qs.filter(es_emergencia=True).count()
+    accesos = resumen_seguridad_horas.contar("accesos", inicio, fin)
+    incidentes = resumen_seguridad_horas.contar("incidentes", inicio, fin)
 
+    incidentes_qs = ReporteIncidenteSeguridad.objects.order_by()
+    if inicio:
+        incidentes_qs = incidentes_qs.filter(creado_en__gte=inicio)
+    if fin:
+        incidentes_qs = incidentes_qs.filter(creado_en__lt=fin)
     categorias_data = []
     categorias_raw = (
         incidentes_qs.values("categoria__nombre", "categoria_otro")
@@ -808,27 +631,23 @@ def _build_resumen(period: str, request):
         nombre = item.get("categoria__nombre") or (item.get("categoria_otro") or "Sin categoría")
         categorias_data.append({"nombre": nombre, "total": item.get("total", 0)})
 
-    recientes_qs = incidentes_qs.order_by("-creado_en")[:5]
     serializer_context = {"request": request}
     recientes_serializados = ReporteIncidenteSeguridadSerializer(
-        recientes_qs, many=True, context=serializer_context
+        eventos.incidentes_recientes(5, desde=inicio, hasta=fin), many=True, context=serializer_context
     ).data
 
-    return {
+    data = {
         "periodo": periodo,
         "periodo_label": label,
         "desde": inicio.isoformat() if inicio else None,
-        "accesos": {
-            "total": accesos_total,
-            "aprobados": accesos_aprobados,
-            "rechazados": accesos_rechazados,
-        },
+        "hasta": fin.isoformat() if fin else None,
+        "accesos": accesos,
         "incidentes": {
-            "total": incidentes_total,
-            "pendientes": incidentes_pendientes,
-            "atendidos": incidentes_atendidos,
-            "emergencias": incidentes_emergencias,
+            **incidentes,
             "por_categoria": categorias_data,
             "recientes": recientes_serializados,
         },
     }
+    if agrupar:
+        data["histograma"] = resumen_seguridad_horas.histograma(inicio, fin, agrupar)
+    return data
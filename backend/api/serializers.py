@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import Prefetch
 from django.utils import timezone
+from . import imagenes
 from .models import (
     Rol,
     Usuario,
@@ -17,6 +20,87 @@ from .models import (
     FCMDevice,
 )
 
+def prefetch_vivienda_activa(relacion_residente=""):
+    """``Prefetch`` de la vivienda activa de los residentes alcanzados por ``relacion_residente``
+    (vacío si el queryset ya es de residentes).
+
+    Deja la lista en ``residente.viviendas_activas``, que es lo que leen
+    ``vivienda_activa`` y los serializadores de residentes, accesos e incidentes.
+    """
+    return Prefetch(
+        f"{relacion_residente}__residentevivienda_set" if relacion_residente else "residentevivienda_set",
+        queryset=ResidenteVivienda.objects.filter(fecha_hasta__isnull=True)
+        .select_related("vivienda")
+        .order_by("-fecha_desde"),
+        to_attr="viviendas_activas",
+    )
+
+
+def vivienda_activa(residente):
+    """``ResidenteVivienda`` activa del residente; usa el prefetch si lo hay."""
+    prefetch = getattr(residente, "viviendas_activas", None)
+    if prefetch is not None:
+        return prefetch[0] if prefetch else None
+    return (
+        ResidenteVivienda.objects.filter(residente=residente, fecha_hasta__isnull=True)
+        .select_related("vivienda")
+        .order_by("-fecha_desde")
+        .first()
+    )
+
+
+def _url_absoluta(context, url):
+    request = context.get("request")
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class ImagenRendicionField(serializers.ImageField):
+    """``ImageField`` que al leer devuelve la rendición de ``context["rendicion"]``.
+
+    Sin rendición en el contexto, o si todavía no se generó, devuelve el original.
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return _url_absoluta(self.context, imagenes.url(value, self.context.get("rendicion", imagenes.ORIGINAL)))
+
+
+class RendicionesField(serializers.Field):
+    """URLs del original y de cada rendición de una imagen (solo lectura)."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return {
+            rendicion: _url_absoluta(self.context, imagenes.url(value, rendicion))
+            for rendicion in (imagenes.ORIGINAL, *imagenes.RENDICIONES)
+        }
+
+
+class RendicionesSerializerMixin:
+    """Los ``ImageField`` del modelo se serializan con ``ImagenRendicionField``."""
+
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: ImagenRendicionField,
+    }
+
+
+def relaciones_usuario(queryset, prefijo=""):
+    """Precarga lo que lee ``UsuarioSerializer`` (user, residente y roles).
+
+    ``prefijo`` es el camino hasta el usuario, p. ej. ``"autor_usuario__"``.
+    """
+    return queryset.select_related(f"{prefijo}user", f"{prefijo}residente").prefetch_related(
+        Prefetch(f"{prefijo}usuariorol_set", queryset=UsuarioRol.objects.select_related("rol"))
+    )
+
+
 # --- Rol ---
 class RolSerializer(serializers.ModelSerializer):
     class Meta:
@@ -119,6 +203,9 @@ class UsuarioSerializer(serializers.ModelSerializer):
 
     # ---------- CAMPOS EXTRA ----------
     def get_roles(self, obj):
+        # Con ``relaciones_usuario`` los roles ya vienen precargados.
+        if "usuariorol_set" in getattr(obj, "_prefetched_objects_cache", {}):
+            return [usuario_rol.rol.nombre for usuario_rol in obj.usuariorol_set.all()]
         return list(
             UsuarioRol.objects.filter(usuario=obj).values_list("rol__nombre", flat=True)
         )
@@ -196,9 +283,7 @@ class ResidenteSerializer(serializers.ModelSerializer):
         return residente
 
     def get_vivienda(self, obj):
-        rv = ResidenteVivienda.objects.filter(
-            residente=obj, fecha_hasta__isnull=True
-        ).first()
+        rv = vivienda_activa(obj)
         if rv:
             return {
                 "id": rv.vivienda.id,
@@ -258,8 +343,9 @@ class CondominioSerializer(serializers.ModelSerializer):
         fields = ["id", "nombre", "direccion"]
 
 
-class RegistroAccesoVehicularSerializer(serializers.ModelSerializer):
+class RegistroAccesoVehicularSerializer(RendicionesSerializerMixin, serializers.ModelSerializer):
     vehiculo = VehiculoSerializer(read_only=True)
+    imagen_rendiciones = RendicionesField(source="imagen")
     residente = serializers.SerializerMethodField()
     guardia = serializers.SerializerMethodField()
     estado_display = serializers.CharField(source="get_estado_display", read_only=True)
@@ -276,6 +362,7 @@ class RegistroAccesoVehicularSerializer(serializers.ModelSerializer):
             "residente",
             "guardia",
             "imagen",
+            "imagen_rendiciones",
             "creado_en",
         ]
 
@@ -285,9 +372,7 @@ class RegistroAccesoVehicularSerializer(serializers.ModelSerializer):
             return None
 
         residente = vehiculo.residente
-        vivienda = ResidenteVivienda.objects.filter(
-            residente=residente, fecha_hasta__isnull=True
-        ).select_related("vivienda").first()
+        vivienda = vivienda_activa(residente)
 
         return {
             "id": str(residente.id),
@@ -358,9 +443,7 @@ class ReporteIncidenteSeguridadSerializer(serializers.ModelSerializer):
 
     def get_residente(self, obj):
         residente = obj.residente
-        vivienda = ResidenteVivienda.objects.filter(
-            residente=residente, fecha_hasta__isnull=True
-        ).select_related("vivienda").first()
+        vivienda = vivienda_activa(residente)
 
         return {
             "id": str(residente.id),
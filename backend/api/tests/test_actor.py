@@ -0,0 +1,147 @@
+import uuid
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from ..actor import invalidar_actor, obtener_actor
+from ..models import (
+    Condominio,
+    Residente,
+    ResidenteVivienda,
+    Rol,
+    Usuario,
+    UsuarioRol,
+    Vivienda,
+)
+from ..permissions import IsAdmin, IsResidente
+from ..tokens import roles_del_token
+
+
+class ActorTests(APITestCase):
+    def setUp(self):
+        invalidar_actor(todo=True)
+        self.auth_user = User.objects.create_user(
+            username="residente_actor", email="actor@example.com", password="pass1234"
+        )
+        self.usuario = Usuario.objects.create(user=self.auth_user)
+        self.rol_res, _ = Rol.objects.get_or_create(nombre="RES")
+        self.rol_adm, _ = Rol.objects.get_or_create(nombre="ADM")
+        UsuarioRol.objects.create(usuario=self.usuario, rol=self.rol_res, estado=1)
+
+        condominio = Condominio.objects.create(nombre="Las Lomas")
+        self.vivienda = Vivienda.objects.create(
+            condominio=condominio, codigo_unidad="LL-01", bloque="A", numero="01"
+        )
+        self.residente = Residente.objects.create(
+            ci="9911", nombres="Ana", apellidos="Rojas", usuario=self.usuario
+        )
+        self.relacion = ResidenteVivienda.objects.create(
+            residente=self.residente, vivienda=self.vivienda, fecha_desde=timezone.localdate()
+        )
+        self.factory = RequestFactory()
+
+    def _request(self):
+        request = self.factory.get("/")
+        request.user = self.auth_user
+        return request
+
+    def test_permisos_resuelven_el_actor_una_vez(self):
+        request = self._request()
+        with self.assertNumQueries(4):
+            self.assertTrue(IsResidente().has_permission(request, None))
+            self.assertFalse(IsAdmin().has_permission(request, None))
+            actor = obtener_actor(request)
+        self.assertEqual(actor.vivienda.pk, self.vivienda.pk)
+
+        # La siguiente petición usa la caché del proceso y solo lee token_version.
+        with self.assertNumQueries(1):
+            self.assertTrue(IsResidente().has_permission(self._request(), None))
+
+    def test_cambio_hecho_en_otro_proceso_descarta_la_cache(self):
+        self.assertFalse(obtener_actor(self._request()).tiene_rol("ADM"))
+        # Sin señales, como lo vería otro proceso: solo cambia token_version.
+        UsuarioRol.objects.bulk_create([UsuarioRol(usuario=self.usuario, rol=self.rol_adm, estado=1)])
+        self.assertFalse(obtener_actor(self._request()).tiene_rol("ADM"))
+        Usuario.objects.filter(pk=self.usuario.pk).update(token_version=F("token_version") + 1)
+        self.assertTrue(obtener_actor(self._request()).tiene_rol("ADM"))
+
+    def test_cambios_de_roles_y_vivienda_invalidan_la_cache(self):
+        self.assertFalse(obtener_actor(self._request()).tiene_rol("ADM"))
+        UsuarioRol.objects.create(usuario=self.usuario, rol=self.rol_adm, estado=1)
+        self.assertTrue(obtener_actor(self._request()).tiene_rol("ADM"))
+
+        self.relacion.fecha_hasta = timezone.localdate()
+        self.relacion.save()
+        self.assertIsNone(obtener_actor(self._request()).vivienda)
+
+    def test_autenticacion_jwt_deja_el_actor_resuelto(self):
+        token = RefreshToken.for_user(self.auth_user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        url = f"/api/avisos/{uuid.uuid4()}/"
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 403)
+
+        UsuarioRol.objects.create(usuario=self.usuario, rol=self.rol_adm, estado=1)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(response.wsgi_request.actor.tiene_rol("ADM", "RES"))
+
+
+class ClaimsTokenTests(APITestCase):
+    def setUp(self):
+        invalidar_actor(todo=True)
+        self.auth_user = User.objects.create_user(
+            username="guardia_claims", email="claims@example.com", password="pass1234"
+        )
+        self.usuario = Usuario.objects.create(user=self.auth_user)
+        self.rol_adm, _ = Rol.objects.get_or_create(nombre="ADM")
+        self.rol_gua, _ = Rol.objects.get_or_create(nombre="GUA")
+        UsuarioRol.objects.create(usuario=self.usuario, rol=self.rol_gua, estado=1)
+
+    def _login(self):
+        response = self.client.post(
+            "/api/token/", {"username": "guardia_claims", "password": "pass1234"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _request(self, access):
+        request = RequestFactory().get("/")
+        request.user = self.auth_user
+        request.auth = AccessToken(access)
+        return request
+
+    def test_token_lleva_claims_y_permisos_solo_leen_la_version(self):
+        tokens = self._login()
+        access = AccessToken(tokens["access"])
+        self.assertEqual(access["usuario_id"], str(self.usuario.id))
+        self.assertEqual(access["roles"], ["GUA"])
+        self.assertIsNone(access["vivienda_id"])
+
+        request = self._request(tokens["access"])
+        with self.assertNumQueries(1):
+            self.assertFalse(IsAdmin().has_permission(request, None))
+            self.assertFalse(IsResidente().has_permission(request, None))
+
+    def test_cambio_de_roles_revoca_claims_y_refresh_los_renueva(self):
+        tokens = self._login()
+        UsuarioRol.objects.create(usuario=self.usuario, rol=self.rol_adm, estado=1)
+
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.token_version, 2)
+        self.assertIsNone(roles_del_token(AccessToken(tokens["access"])))
+        # Con claims vencidos se resuelve el actor y el permiso refleja el cambio.
+        self.assertTrue(IsAdmin().has_permission(self._request(tokens["access"]), None))
+
+        response = self.client.post(
+            "/api/token/refresh/", {"refresh": tokens["refresh"]}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.json()["access"])
+        self.assertEqual(access["roles"], ["ADM", "GUA"])
+        self.assertEqual(roles_del_token(access), frozenset({"ADM", "GUA"}))
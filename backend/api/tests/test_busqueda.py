@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ..actor import invalidar_actor
+from ..busqueda import normalizar_texto
+from ..busqueda.indice import IndiceBusquedaLocal
+from ..models import (
+    Condominio,
+    Factura,
+    Residente,
+    ResidenteVivienda,
+    Rol,
+    Usuario,
+    UsuarioRol,
+    Vivienda,
+)
+
+
+class DocumentosBusquedaTests(APITestCase):
+    def setUp(self):
+        self.auth_user = User.objects.create_user(
+            username="admin_busqueda", email="busqueda@example.com", password="pass1234"
+        )
+        usuario = Usuario.objects.create(user=self.auth_user)
+        UsuarioRol.objects.create(usuario=usuario, rol=Rol.objects.get_or_create(nombre="ADM")[0])
+        invalidar_actor(todo=True)
+        self.client.force_authenticate(user=self.auth_user)
+
+        condominio = Condominio.objects.create(nombre="Los Pinos")
+        self.vivienda_a = Vivienda.objects.create(
+            condominio=condominio, codigo_unidad="PN-101", bloque="A", numero="101"
+        )
+        self.vivienda_b = Vivienda.objects.create(
+            condominio=condominio, codigo_unidad="PN-202", bloque="B", numero="202"
+        )
+        self.residente = Residente.objects.create(
+            ci="5544", nombres="José María", apellidos="Gutiérrez"
+        )
+        self.otro = Residente.objects.create(ci="7788", nombres="Josefina", apellidos="Mendez")
+        ResidenteVivienda.objects.create(
+            residente=self.residente, vivienda=self.vivienda_a, fecha_desde=timezone.localdate()
+        )
+        ResidenteVivienda.objects.create(
+            residente=self.otro, vivienda=self.vivienda_b, fecha_desde=timezone.localdate()
+        )
+        periodo = timezone.localdate().strftime("%Y-%m")
+        self.factura_a = Factura.objects.create(
+            vivienda=self.vivienda_a,
+            periodo=periodo,
+            monto="100.00",
+            fecha_vencimiento=timezone.localdate() + timedelta(days=5),
+        )
+        self.factura_b = Factura.objects.create(
+            vivienda=self.vivienda_b,
+            periodo=periodo,
+            monto="100.00",
+            fecha_vencimiento=timezone.localdate() + timedelta(days=5),
+        )
+
+    def test_documentos_se_mantienen_al_cambiar_residentes(self):
+        self.vivienda_a.refresh_from_db()
+        self.assertIn("jose maria gutierrez", self.vivienda_a.documento_busqueda)
+        self.assertIn("pn-101", self.vivienda_a.documento_busqueda)
+
+        self.residente.apellidos = "Quiroga"
+        self.residente.save()
+        self.vivienda_a.refresh_from_db()
+        self.residente.refresh_from_db()
+        self.assertIn("quiroga", self.vivienda_a.documento_busqueda)
+        self.assertNotIn("gutierrez", self.residente.documento_busqueda)
+
+        ResidenteVivienda.objects.filter(residente=self.residente).delete()
+        self.vivienda_a.refresh_from_db()
+        self.assertNotIn("quiroga", self.vivienda_a.documento_busqueda)
+
+    def test_facturas_admin_busca_sin_tildes(self):
+        response = self.client.get("/api/finanzas/admin/facturas/", {"search": "GUTIERREZ"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in response.json()], [str(self.factura_a.id)])
+
+        response = self.client.get("/api/finanzas/admin/facturas/", {"residente": "josé"})
+        self.assertEqual(len(response.json()), 2)
+
+    def test_busqueda_admin_devuelve_resultados_rankeados(self):
+        response = self.client.get("/api/finanzas/admin/busqueda/", {"q": "jose"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        nombres = [item["nombre"] for item in data["residentes"]]
+        self.assertEqual(nombres, ["José María Gutiérrez", "Josefina Mendez"])
+        puntajes = [item["puntaje"] for item in data["residentes"]]
+        self.assertGreater(puntajes[0], puntajes[1])
+
+        self.assertEqual(data["viviendas"][0]["codigo_unidad"], "PN-101")
+        self.assertEqual(data["facturas"][0]["id"], str(self.factura_a.id))
+
+        response = self.client.get("/api/finanzas/admin/busqueda/")
+        self.assertEqual(response.status_code, 400)
+
+    def test_busqueda_admin_rechaza_a_quien_no_es_administrador(self):
+        vecino = User.objects.create_user(username="vecino_busqueda", password="pass1234")
+        Usuario.objects.create(user=vecino)
+        self.client.force_authenticate(user=vecino)
+        response = self.client.get("/api/finanzas/admin/busqueda/", {"q": "jose"})
+        self.assertEqual(response.status_code, 403)
+
+
+class IndiceBusquedaLocalTests(APITestCase):
+    def test_ordena_por_similitud(self):
+        indice = IndiceBusquedaLocal(
+            [
+                (1, normalizar_texto("Ana Rojas")),
+                (2, normalizar_texto("Anabel Rojas")),
+                (3, normalizar_texto("Carlos Pérez")),
+            ]
+        )
+        resultados = indice.buscar("ana")
+        self.assertEqual([clave for clave, _ in resultados], [1, 2])
@@ -0,0 +1,239 @@
+"""Regresión de consultas por endpoint.
+
+Se siembran 1, 10 y 100 filas de cada entidad y se comprueba que los listados
+hacen la misma cantidad de consultas en los tres casos. Con la variable de
+entorno ``CONSULTAS_REPORTE=<archivo>`` se escribe además una tabla Markdown
+con las consultas y la latencia de cada endpoint::
+
+    CONSULTAS_REPORTE=consultas.md python manage.py test api.tests.test_consultas_endpoints
+"""
+
+import os
+import time
+from datetime import date, time as dt_time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from areas.models import AreaComun, ImagenArea, Reserva
+from mantenimiento.models import Mantenimiento
+from visitantes.models import HistorialVisita, Visitante
+
+from ..actor import invalidar_actor
+from ..models import (
+    Aviso,
+    Condominio,
+    ExpensaConfig,
+    Factura,
+    MultaAplicada,
+    MultaConfig,
+    NotificacionDirecta,
+    Pago,
+    RegistroAccesoVehicular,
+    ReporteIncidenteSeguridad,
+    Residente,
+    ResidenteVivienda,
+    Rol,
+    Usuario,
+    UsuarioRol,
+    Vehiculo,
+    Vivienda,
+)
+
+CANTIDADES = (1, 10, 100)
+
+# (endpoint, quién consulta); ``{factura}`` es la factura con un pago por fila.
+ENDPOINTS = (
+    ("/api/roles/", "admin"),
+    ("/api/usuarios/", "admin"),
+    ("/api/viviendas/", "admin"),
+    ("/api/residentes/", "admin"),
+    ("/api/vehiculos/", "admin"),
+    ("/api/avisos/", "admin"),
+    ("/api/condominios/", "admin"),
+    ("/api/perfil/", "residente"),
+    ("/api/seguridad/accesos/", "admin"),
+    ("/api/seguridad/incidentes/", "admin"),
+    ("/api/seguridad/categorias/", "admin"),
+    ("/api/seguridad/reportes/resumen/", "admin"),
+    ("/api/finanzas/resumen/", "residente"),
+    ("/api/finanzas/facturas/", "residente"),
+    ("/api/finanzas/notificaciones/", "residente"),
+    ("/api/finanzas/facturas/{factura}/", "residente"),
+    ("/api/finanzas/admin/facturas/{factura}/", "admin"),
+    ("/api/finanzas/admin/resumen/", "admin"),
+    ("/api/finanzas/admin/busqueda/?q=unidad", "admin"),
+    ("/api/finanzas/admin/facturas/", "admin"),
+    ("/api/finanzas/admin/notificaciones/", "admin"),
+    ("/api/finanzas/config/expensas/", "admin"),
+    ("/api/finanzas/config/multas/", "admin"),
+    ("/api/finanzas/config/multas/catalogo/", "admin"),
+    ("/api/push/outbox/metricas/", "admin"),
+    ("/api/areas/", "admin"),
+    ("/api/reservas/?page_size=50", "admin"),
+    ("/api/reservas/mis_reservas/", "residente"),
+    ("/api/reservas/reporte_uso/", "admin"),
+    ("/api/historial-visitas/", "admin"),
+    ("/api/mantenimientos/?page_size=50", "admin"),
+    ("/api/responsables/", "admin"),
+)
+
+
+def _usuario(username, rol):
+    # Sin contraseña: las peticiones usan ``force_authenticate`` y el hash haría lenta la siembra.
+    user = User.objects.create(username=username, first_name="Nombre")
+    usuario = Usuario.objects.create(user=user)
+    UsuarioRol.objects.create(usuario=usuario, rol=rol, estado=1)
+    return user, usuario
+
+
+class ConsultasPorEndpointTests(APITestCase):
+    reporte = []
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        destino = os.environ.get("CONSULTAS_REPORTE")
+        if destino and cls.reporte:
+            encabezado = " | ".join(f"{n} filas" for n in CANTIDADES)
+            lineas = [
+                f"| Endpoint | Consultas ({encabezado}) | ms ({encabezado}) |",
+                "|---|---|---|",
+            ]
+            for endpoint, consultas, milisegundos in cls.reporte:
+                lineas.append(
+                    f"| `{endpoint}` | {' / '.join(map(str, consultas))} "
+                    f"| {' / '.join(f'{ms:.1f}' for ms in milisegundos)} |"
+                )
+            with open(destino, "w", encoding="utf-8") as archivo:
+                archivo.write("\n".join(lineas) + "\n")
+
+    def setUp(self):
+        cache.clear()
+        invalidar_actor(todo=True)
+        self.roles = {
+            nombre: Rol.objects.get_or_create(nombre=nombre)[0] for nombre in ("ADM", "RES", "GUA", "MAN")
+        }
+        self.admin_user, self.admin = _usuario("admin_consultas", self.roles["ADM"])
+        self.residente_user, usuario = _usuario("residente_consultas", self.roles["RES"])
+        self.condominio = Condominio.objects.create(nombre="Consultas")
+        self.vivienda = Vivienda.objects.create(
+            condominio=self.condominio, codigo_unidad="unidad-propia", bloque="P", numero="0"
+        )
+        self.residente = Residente.objects.create(
+            ci="C-PROPIO", nombres="Propio", apellidos="Residente", usuario=usuario
+        )
+        ResidenteVivienda.objects.create(
+            residente=self.residente, vivienda=self.vivienda, fecha_desde=date(2024, 1, 1)
+        )
+        self.factura = Factura.objects.create(vivienda=self.vivienda, periodo="1999-01", monto=Decimal("500"))
+        self.sembradas = 0
+
+    def _sembrar_hasta(self, cantidad):
+        while self.sembradas < cantidad:
+            self._sembrar(self.sembradas)
+            self.sembradas += 1
+
+    def _sembrar(self, i):
+        """Una fila de cada entidad que listan los endpoints."""
+        condominio = Condominio.objects.create(nombre=f"Condominio {i}")
+        vivienda = Vivienda.objects.create(
+            condominio=condominio, codigo_unidad=f"unidad-{i}", bloque=f"B{i}", numero=str(i)
+        )
+        _, usuario = _usuario(f"residente_{i}", self.roles["RES"])
+        _, responsable = _usuario(f"mantenimiento_{i}", self.roles["MAN"])
+        residente = Residente.objects.create(
+            ci=f"C{i}", nombres="Residente", apellidos=str(i), usuario=usuario
+        )
+        ResidenteVivienda.objects.create(residente=residente, vivienda=vivienda, fecha_desde=date(2024, 1, 1))
+        vehiculo = Vehiculo.objects.create(residente=residente, placa=f"PL{i:04d}")
+        Aviso.objects.create(
+            autor_usuario=self.admin, titulo=f"Aviso {i}", contenido="...", estado=Aviso.ESTADO_PUBLICADO
+        )
+
+        periodo = f"{2000 + i // 12}-{i % 12 + 1:02d}"
+        factura = Factura.objects.create(vivienda=vivienda, periodo=periodo, monto=Decimal("100"))
+        propia = Factura.objects.create(vivienda=self.vivienda, periodo=periodo, monto=Decimal("50"))
+        pago = Pago.objects.create(
+            factura=factura, metodo="efectivo", monto_pagado=Decimal("10"), registrado_por=self.admin
+        )
+        # Pagos registrados por un usuario y pagos del propio residente (sin ``registrado_por``).
+        Pago.objects.create(
+            factura=self.factura,
+            metodo="qr",
+            monto_pagado=Decimal("1"),
+            registrado_por=responsable if i % 2 else None,
+        )
+        NotificacionDirecta.objects.create(
+            residente=self.residente,
+            titulo="Aviso de cobro",
+            mensaje="...",
+            enviado_por=self.admin,
+            factura=propia,
+            pago=pago,
+        )
+        multa = MultaConfig.objects.create(nombre=f"Multa {i}", monto=Decimal("20"))
+        MultaAplicada.objects.create(vivienda=vivienda, multa_config=multa, monto=Decimal("20"), factura=factura)
+        ExpensaConfig.objects.create(condominio=condominio, bloque=f"B{i}", monto=Decimal("300"))
+
+        area = AreaComun.objects.create(nombre=f"Área {i}", costo=Decimal("15"))
+        ImagenArea.objects.create(area_comun=area, imagen=f"areas/{i}.jpg")
+        for dueno in (usuario, self.residente.usuario):
+            Reserva.objects.create(
+                area_comun=area,
+                usuario=dueno,
+                fecha=date(2025, 1, 1),
+                hora_inicio=dt_time(10),
+                hora_fin=dt_time(11),
+                factura=factura if dueno is usuario else None,
+            )
+        visitante = Visitante.objects.create(nombre=f"Visitante {i}", ci=f"V{i}")
+        HistorialVisita.objects.create(visitante=visitante, residente=usuario, motivo="Visita")
+        Mantenimiento.objects.create(
+            titulo=f"Mantenimiento {i}",
+            descripcion="...",
+            tipo="correctivo",
+            residente=usuario,
+            responsable=responsable,
+            area_comun=area,
+        )
+        RegistroAccesoVehicular.objects.create(
+            guardia=self.admin,
+            vehiculo=vehiculo,
+            placa_detectada=vehiculo.placa,
+            estado=RegistroAccesoVehicular.ESTADO_APROBADO,
+        )
+        ReporteIncidenteSeguridad.objects.create(residente=residente, ubicacion="Portón")
+
+    def _medir(self, endpoint, quien):
+        endpoint = endpoint.format(factura=self.factura.pk)
+        self.client.force_authenticate(user=self.admin_user if quien == "admin" else self.residente_user)
+        # La primera petición resuelve el actor y llena cachés de proceso.
+        self.assertEqual(self.client.get(endpoint).status_code, 200, endpoint)
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            response = self.client.get(endpoint)
+            milisegundos = (time.perf_counter() - inicio) * 1000
+        self.assertEqual(response.status_code, 200, endpoint)
+        return len(consultas), milisegundos
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        mediciones = {endpoint: ([], []) for endpoint, _ in ENDPOINTS}
+        for cantidad in CANTIDADES:
+            self._sembrar_hasta(cantidad)
+            for endpoint, quien in ENDPOINTS:
+                consultas, milisegundos = self._medir(endpoint, quien)
+                mediciones[endpoint][0].append(consultas)
+                mediciones[endpoint][1].append(milisegundos)
+
+        crecen = {}
+        for endpoint, _ in ENDPOINTS:
+            consultas, milisegundos = mediciones[endpoint]
+            type(self).reporte.append((endpoint, consultas, milisegundos))
+            if len(set(consultas)) > 1:
+                crecen[endpoint] = consultas
+        self.assertEqual(crecen, {}, "Endpoints cuyas consultas crecen con las filas (1/10/100)")
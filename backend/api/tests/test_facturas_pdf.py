@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ..finanzas import facturas_pdf
+from ..finanzas.facturas_pdf import ruta_pdf_factura
+from ..flujo import en_flujo
+from ..models import Condominio, Factura, FacturaDetalle, Usuario, Vivienda
+
+MEDIA_TEMPORAL = tempfile.mkdtemp(prefix="facturas-pdf-")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEMPORAL)
+class FacturasPdfCacheTests(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_TEMPORAL, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.auth_user = User.objects.create_user(
+            username="admin_pdf", email="pdf@example.com", password="pass1234"
+        )
+        Usuario.objects.create(user=self.auth_user)
+        self.client.force_authenticate(user=self.auth_user)
+
+        condominio = Condominio.objects.create(nombre="Altos")
+        self.periodo = timezone.localdate().strftime("%Y-%m")
+        self.facturas = []
+        for indice in range(3):
+            vivienda = Vivienda.objects.create(
+                condominio=condominio,
+                codigo_unidad=f"AL-{indice}",
+                bloque="A",
+                numero=str(indice),
+            )
+            factura = Factura.objects.create(
+                vivienda=vivienda, periodo=self.periodo, monto="100.00"
+            )
+            FacturaDetalle.objects.create(
+                factura=factura,
+                descripcion="Expensa",
+                tipo=FacturaDetalle.TIPO_EXPENSA,
+                monto="100.00",
+            )
+            self.facturas.append(factura)
+
+    def test_pdf_se_reutiliza_y_se_invalida_al_cambiar_detalles(self):
+        factura = self.facturas[0]
+        ruta = ruta_pdf_factura(factura)
+        self.assertTrue(os.path.exists(ruta))
+        self.assertEqual(ruta_pdf_factura(Factura.objects.get(pk=factura.pk)), ruta)
+
+        response = self.client.get(f"/api/finanzas/admin/facturas/{factura.id}/pdf/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), open(ruta, "rb").read())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FacturaDetalle.objects.create(
+                factura=factura,
+                descripcion="Multa ruido",
+                tipo=FacturaDetalle.TIPO_MULTA,
+                monto="20.00",
+            )
+        self.assertFalse(os.path.exists(ruta))
+        self.assertNotEqual(ruta_pdf_factura(Factura.objects.get(pk=factura.pk)), ruta)
+
+    def test_invalidar_conserva_la_carpeta_y_las_generaciones_en_curso(self):
+        factura = self.facturas[0]
+        ruta = ruta_pdf_factura(factura)
+        carpeta = os.path.dirname(ruta)
+        # Un temporal de otra petición que todavía no hizo os.replace.
+        temporal = os.path.join(carpeta, "en-curso.tmp")
+        with open(temporal, "wb") as archivo:
+            archivo.write(b"%PDF")
+
+        facturas_pdf.invalidar_pdf_factura(factura.pk)
+        self.assertFalse(os.path.exists(ruta))
+        # La carpeta sigue ahí: el os.replace de la otra petición no falla.
+        os.replace(temporal, os.path.join(carpeta, "otra.pdf"))
+
+        # Si el archivo desaparece entre ubicarlo y abrirlo, se genera de nuevo.
+        ubicar = facturas_pdf.ruta_pdf_factura
+        ubicadas = []
+
+        def ubicar_e_invalidar(factura):
+            ruta = ubicar(factura)
+            if not ubicadas:
+                facturas_pdf.invalidar_pdf_factura(factura.pk)
+            ubicadas.append(ruta)
+            return ruta
+
+        with mock.patch.object(facturas_pdf, "ruta_pdf_factura", ubicar_e_invalidar):
+            with facturas_pdf.abrir_pdf_factura(factura) as archivo:
+                self.assertTrue(archivo.read().startswith(b"%PDF"))
+        self.assertEqual(ubicadas, [ruta, ruta])
+
+    def test_zip_del_periodo_incluye_todas_las_facturas(self):
+        response = self.client.get(
+            "/api/finanzas/admin/facturas/pdf-lote/", {"periodo": self.periodo}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+
+        contenido = BytesIO(b"".join(response.streaming_content))
+        with zipfile.ZipFile(contenido) as archivo_zip:
+            self.assertIsNone(archivo_zip.testzip())
+            nombres = sorted(archivo_zip.namelist())
+            self.assertEqual(
+                nombres, [f"factura-AL-{indice}-{self.periodo}.pdf" for indice in range(3)]
+            )
+            self.assertTrue(archivo_zip.read(nombres[0]).startswith(b"%PDF"))
+
+        response = self.client.get("/api/finanzas/admin/facturas/pdf-lote/")
+        self.assertEqual(response.status_code, 400)
+
+
+class EnFlujoTests(SimpleTestCase):
+    def _respuesta(self, consumidas):
+        def partes():
+            for numero in range(100):
+                consumidas.append(numero)
+                yield b"parte"
+
+        return StreamingHttpResponse(partes())
+
+    def test_con_asgi_se_consume_por_lotes(self):
+        consumidas = []
+        response = en_flujo(AsyncRequestFactory().get("/"), self._respuesta(consumidas), lote=4)
+        self.assertTrue(response.is_async)
+
+        async def primera_parte():
+            async for parte in response.streaming_content:
+                return parte
+
+        self.assertEqual(async_to_sync(primera_parte)(), b"parte")
+        # Django no la convirtió en lista: solo se leyó el primer lote.
+        self.assertEqual(len(consumidas), 4)
+
+    def test_con_wsgi_queda_igual(self):
+        consumidas = []
+        response = en_flujo(RequestFactory().get("/"), self._respuesta(consumidas))
+        self.assertFalse(response.is_async)
+        self.assertEqual(next(iter(response)), b"parte")
+        self.assertEqual(len(consumidas), 1)
@@ -1,8 +1,20 @@
+import json
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from decimal import Decimal
 
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
 from django.utils import timezone
 from rest_framework.test import APIClient, APITestCase
 
@@ -15,9 +27,14 @@ from ..models import (
     Pago,
     Residente,
     ResidenteVivienda,
+    ResumenFinanzasMensual,
     Usuario,
     Vivienda,
 )
+from ..finanzas import resumen
+from ..finanzas.resumen import calcular_resumen, reconstruir_resumen_finanzas
+
+MEDIA_TEMPORAL = tempfile.mkdtemp(prefix="finanzas-admin-")
 
 
 class FinanzasAdminSummaryTests(APITestCase):
@@ -28,13 +45,19 @@ class FinanzasAdminSummaryTests(APITestCase):
         self.usuario = Usuario.objects.create(user=self.auth_user)
         self.client.force_authenticate(user=self.auth_user)
 
-        condominio = Condominio.objects.create(nombre="Condominio Central")
+        self.condominio = Condominio.objects.create(nombre="Condominio Central")
         self.vivienda = Vivienda.objects.create(
-            condominio=condominio,
+            condominio=self.condominio,
             codigo_unidad="A-101",
             bloque="A",
             numero="101",
         )
+        self.vivienda_b = Vivienda.objects.create(
+            condominio=self.condominio,
+            codigo_unidad="A-102",
+            bloque="A",
+            numero="102",
+        )
 
         today = timezone.localdate()
         self.current_period = today.strftime("%Y-%m")
@@ -49,7 +72,7 @@ class FinanzasAdminSummaryTests(APITestCase):
             fecha_vencimiento=today + timedelta(days=5),
         )
         self.factura_mes_pagada = Factura.objects.create(
-            vivienda=self.vivienda,
+            vivienda=self.vivienda_b,
             periodo=self.current_period,
             monto=Decimal("800.00"),
             estado="PAGADO",
@@ -78,6 +101,8 @@ class FinanzasAdminSummaryTests(APITestCase):
         Pago.objects.filter(id=pago_prev.id).update(
             fecha_pago=timezone.now() - timedelta(days=30)
         )
+        # El update directo no dispara señales; se reconstruye el resumen.
+        reconstruir_resumen_finanzas()
 
     def test_admin_summary_returns_expected_metrics(self):
         response = self.client.get("/api/finanzas/admin/resumen/")
@@ -108,8 +133,122 @@ class FinanzasAdminSummaryTests(APITestCase):
         self.assertIsNotNone(prev_period_entry)
         self.assertAlmostEqual(float(prev_period_entry["total"]), 400.0)
 
+    def test_resumen_se_actualiza_al_guardar_facturas_y_pagos(self):
+        fila = ResumenFinanzasMensual.objects.get(
+            condominio=self.condominio, periodo=self.current_period
+        )
+        self.assertEqual(fila.facturas_emitidas, 2)
+        self.assertEqual(fila.facturas_pagadas, 1)
+
+        # El resumen se recalcula en on_commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.factura_mes_pendiente.estado = "PAGADA"
+            self.factura_mes_pendiente.save()
+            Pago.objects.create(
+                factura=self.factura_mes_pendiente,
+                metodo="efectivo",
+                monto_pagado=Decimal("1500.00"),
+                estado="CONFIRMADO",
+            )
 
+        fila.refresh_from_db()
+        self.assertEqual(fila.facturas_pagadas, 2)
+        self.assertEqual(fila.pagado_total, Decimal("2300.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.factura_mes_pendiente.delete()
+        fila.refresh_from_db()
+        self.assertEqual(fila.facturas_emitidas, 1)
+        self.assertEqual(fila.facturado_total, Decimal("800.00"))
+        self.assertEqual(fila.pagado_total, Decimal("800.00"))
+        self.assertEqual(reconstruir_resumen_finanzas(aplicar=False), [])
+
+    def test_reconstruir_resumen_detecta_y_corrige_diferencias(self):
+        ResumenFinanzasMensual.objects.filter(
+            condominio=self.condominio, periodo=self.current_period
+        ).update(facturado_total=Decimal("0"))
+
+        salida = StringIO()
+        call_command("reconstruir_resumen_finanzas", "--check", stdout=salida)
+        self.assertIn("facturado_total", salida.getvalue())
+        self.assertEqual(len(reconstruir_resumen_finanzas(aplicar=False)), 1)
+
+        call_command("reconstruir_resumen_finanzas", stdout=StringIO())
+        self.assertEqual(reconstruir_resumen_finanzas(aplicar=False), [])
+        fila = ResumenFinanzasMensual.objects.get(
+            condominio=self.condominio, periodo=self.current_period
+        )
+        self.assertEqual(fila.facturado_total, Decimal("2300.00"))
+
+
+class ResumenPagosConcurrentesTests(TransactionTestCase):
+    """Pagos simultáneos del mismo mes no dejan el resumen con un total viejo."""
+
+    HILOS = 8
+
+    def setUp(self):
+        self.condominio = Condominio.objects.create(nombre="Condominio Concurrente")
+        self.periodo = timezone.localdate().strftime("%Y-%m")
+        self.facturas = []
+        for indice in range(self.HILOS):
+            vivienda = Vivienda.objects.create(
+                condominio=self.condominio,
+                codigo_unidad=f"C-{indice}",
+                bloque="C",
+                numero=str(indice),
+            )
+            self.facturas.append(
+                Factura.objects.create(
+                    vivienda=vivienda,
+                    periodo=self.periodo,
+                    monto=Decimal("100.00"),
+                    estado="PENDIENTE",
+                )
+            )
+        self.calculado = threading.Event()
+
+    def _calcular_y_demorar(self, buckets):
+        # El primer recálculo se demora entre la suma y el upsert: sin el lock
+        # los demás pagos escribirían sus totales y este los pisaría.
+        resultado = calcular_resumen(buckets)
+        if not self.calculado.is_set():
+            self.calculado.set()
+            time.sleep(0.5)
+        return resultado
+
+    def _pagar(self, indice):
+        try:
+            if indice:
+                self.calculado.wait(timeout=10)
+            Pago.objects.create(
+                factura=self.facturas[indice],
+                metodo="transferencia",
+                monto_pagado=Decimal("100.00"),
+                estado="CONFIRMADO",
+            )
+        finally:
+            connection.close()
+
+    def test_pagos_concurrentes_del_mismo_mes(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("El advisory lock es de PostgreSQL")
+
+        with mock.patch.object(resumen, "calcular_resumen", self._calcular_y_demorar):
+            with ThreadPoolExecutor(max_workers=self.HILOS) as pool:
+                list(pool.map(self._pagar, range(self.HILOS)))
+
+        fila = ResumenFinanzasMensual.objects.get(condominio=self.condominio, periodo=self.periodo)
+        self.assertEqual(fila.pagado_total, Decimal("100.00") * self.HILOS)
+        self.assertEqual(reconstruir_resumen_finanzas(aplicar=False), [])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEMPORAL)
 class FinanzasAdminInvoiceTests(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_TEMPORAL, ignore_errors=True)
+        super().tearDownClass()
+
     def setUp(self):
         self.auth_user = User.objects.create_user(
             username="admin2", email="admin2@example.com", password="pass1234"
@@ -235,6 +374,81 @@ class FinanzasAdminInvoiceTests(APITestCase):
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]["id"], str(self.factura_pagada.id))
 
+    def test_facturas_admin_paginacion_por_cursor(self):
+        sin_vencimiento = Factura.objects.create(
+            vivienda=self.vivienda_b,
+            periodo="2020-02",
+            monto="75.00",
+        )
+        esperado = [
+            str(sin_vencimiento.id),
+            str(self.factura_pendiente.id),
+            str(self.factura_pagada.id),
+        ]
+
+        recibidos = []
+        params = {"page_size": 1}
+        while True:
+            response = self.client.get("/api/finanzas/admin/facturas/", params)
+            self.assertEqual(response.status_code, 200)
+            payload = response.json()
+            self.assertLessEqual(len(payload["results"]), 1)
+            recibidos.extend(item["id"] for item in payload["results"])
+            if not payload["next_cursor"]:
+                break
+            params = {"page_size": 1, "cursor": payload["next_cursor"]}
+        self.assertEqual(recibidos, esperado)
+
+        response = self.client.get(
+            "/api/finanzas/admin/facturas/", {"cursor": "no-es-un-cursor"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_facturas_admin_filtro_residente_sin_duplicados(self):
+        otro = Residente.objects.create(ci="789", nombres="Juan", apellidos="Rojas")
+        ResidenteVivienda.objects.create(
+            residente=otro,
+            vivienda=self.vivienda_a,
+            fecha_desde=timezone.localdate(),
+        )
+        response = self.client.get("/api/finanzas/admin/facturas/", {"search": "Juan"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item["id"] for item in response.json()], [str(self.factura_pendiente.id)]
+        )
+
+    def test_facturas_admin_exporta_ndjson(self):
+        response = self.client.get(
+            "/api/finanzas/admin/facturas/", {"format": "ndjson", "estado": "pendiente"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lineas = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lineas), 1)
+        self.assertEqual(json.loads(lineas[0])["id"], str(self.factura_pendiente.id))
+
+    def test_estados_se_guardan_canonicos_y_filtran_exacto(self):
+        factura = Factura.objects.create(
+            vivienda=self.vivienda_a,
+            periodo="2020-01",
+            monto="90.00",
+            estado=" pagado ",
+        )
+        pago = Pago.objects.create(
+            factura=factura,
+            metodo="EFECTIVO",
+            monto_pagado="90.00",
+            estado="aprobado",
+        )
+        self.assertEqual(factura.estado, Factura.ESTADO_PAGADA)
+        self.assertEqual(pago.estado, Pago.ESTADO_CONFIRMADO)
+        self.assertTrue(Factura.objects.filter(pk=factura.pk, estado="PAGADA").exists())
+
+        response = self.client.get("/api/finanzas/admin/facturas/", {"estado": "pagado"})
+        self.assertEqual(response.status_code, 200)
+        ids = {item["id"] for item in response.json()}
+        self.assertEqual(ids, {str(factura.id), str(self.factura_pagada.id)})
+
     def test_factura_admin_detalle_and_pdf(self):
         response = self.client.get(
             f"/api/finanzas/admin/facturas/{self.factura_pendiente.id}/"
@@ -249,7 +463,7 @@ class FinanzasAdminInvoiceTests(APITestCase):
         )
         self.assertEqual(pdf_response.status_code, 200)
         self.assertEqual(pdf_response["Content-Type"], "application/pdf")
-        self.assertTrue(pdf_response.content.startswith(b"%PDF"))
+        self.assertTrue(b"".join(pdf_response.streaming_content).startswith(b"%PDF"))
 
     def test_residente_puede_descargar_factura_pdf(self):
         response = self.resident_client.get(
@@ -257,7 +471,7 @@ class FinanzasAdminInvoiceTests(APITestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response["Content-Type"], "application/pdf")
-        self.assertTrue(response.content.startswith(b"%PDF"))
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
 
         otra_factura = self.resident_client.get(
             f"/api/finanzas/facturas/{self.factura_pagada.id}/pdf/"
@@ -1,10 +1,15 @@
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
 import tempfile
 
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.utils import timezone
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 
@@ -14,12 +19,21 @@ from ..models import (
     Factura,
     FacturaDetalle,
     FinanzasCodigoQR,
+    GeneracionFacturasJob,
     MultaAplicada,
+    MultaConfig,
     Residente,
     ResidenteVivienda,
     Usuario,
     Vivienda,
 )
+from ..finanzas.jobs import (
+    _tomar_siguiente_job,
+    encolar_generacion_facturas,
+    procesar_job,
+    procesar_siguiente_job,
+)
+from ..finanzas.views import _generar_facturas_para_periodo
 
 
 class FinanzasConfiguracionTests(APITestCase):
@@ -117,7 +131,18 @@ class FinanzasConfiguracionTests(APITestCase):
             data={"periodo": periodo},
             format="json",
         )
-        self.assertEqual(generar_response.status_code, 200)
+        self.assertEqual(generar_response.status_code, 202)
+        self.assertEqual(generar_response.data["estado"], GeneracionFacturasJob.ESTADO_PENDIENTE)
+        call_command("procesar_generacion_facturas", "--once", stdout=StringIO())
+
+        estado_response = self.client.get(
+            f"/api/finanzas/admin/generar-facturas/{generar_response.data['id']}/"
+        )
+        self.assertEqual(estado_response.status_code, 200)
+        self.assertEqual(estado_response.data["estado"], GeneracionFacturasJob.ESTADO_COMPLETADO)
+        self.assertEqual(estado_response.data["creadas"], 1)
+        self.assertEqual(estado_response.data["procesadas"], 1)
+        self.assertEqual(estado_response.data["eta_segundos"], 0)
         self.assertEqual(Factura.objects.filter(vivienda=self.vivienda, periodo=periodo).count(), 1)
 
         factura = Factura.objects.get(vivienda=self.vivienda, periodo=periodo)
@@ -149,7 +174,11 @@ class FinanzasConfiguracionTests(APITestCase):
             format="json",
         )
 
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
+        call_command("procesar_generacion_facturas", "--once", stdout=StringIO())
+        self.assertEqual(
+            GeneracionFacturasJob.objects.get(pk=response.data["id"]).total_viviendas, 0
+        )
         self.assertFalse(
             Factura.objects.filter(vivienda=self.vivienda, periodo=periodo).exists()
         )
@@ -182,3 +211,141 @@ class FinanzasConfiguracionTests(APITestCase):
                 b"".join(public_response.streaming_content),
                 contenido,
             )
+
+
+class GeneracionFacturasBulkTests(APITestCase):
+    def setUp(self):
+        self.condominio = Condominio.objects.create(nombre="Condominio Sur")
+        ExpensaConfig.objects.create(
+            condominio=self.condominio,
+            bloque="A",
+            monto=Decimal("200.00"),
+            periodicidad=ExpensaConfig.PERIODICIDAD_MENSUAL,
+        )
+        self.multa_config = MultaConfig.objects.create(
+            nombre="Ruido", descripcion="Ruido nocturno", monto=Decimal("40.00")
+        )
+        self.periodo = timezone.localdate().strftime("%Y-%m")
+
+    def _crear_viviendas(self, cantidad, prefijo):
+        for index in range(cantidad):
+            vivienda = Vivienda.objects.create(
+                condominio=self.condominio,
+                codigo_unidad=f"{prefijo}{index}",
+                bloque="A",
+                numero=str(index),
+            )
+            residente = Residente.objects.create(
+                ci=f"{prefijo}-{index}", nombres="Residente", apellidos=str(index)
+            )
+            ResidenteVivienda.objects.create(
+                residente=residente,
+                vivienda=vivienda,
+                fecha_desde=timezone.localdate(),
+            )
+            MultaAplicada.objects.create(
+                vivienda=vivienda,
+                multa_config=self.multa_config,
+                monto=Decimal("40.00"),
+            )
+
+    def test_cantidad_de_consultas_no_depende_de_viviendas(self):
+        self._crear_viviendas(2, "P")
+        with CaptureQueriesContext(connection) as pocas:
+            resumen = _generar_facturas_para_periodo(self.periodo)
+        self.assertEqual(resumen, {"creadas": 2, "actualizadas": 0, "sin_cambios": 0})
+
+        Factura.objects.all().delete()
+        MultaAplicada.objects.update(factura=None, periodo_facturado=None)
+        self._crear_viviendas(8, "M")
+        with CaptureQueriesContext(connection) as muchas:
+            resumen = _generar_facturas_para_periodo(self.periodo)
+        self.assertEqual(resumen, {"creadas": 10, "actualizadas": 0, "sin_cambios": 0})
+        self.assertEqual(len(pocas.captured_queries), len(muchas.captured_queries))
+
+        self.assertEqual(FacturaDetalle.objects.count(), 20)
+        self.assertFalse(MultaAplicada.objects.filter(factura__isnull=True).exists())
+        for factura in Factura.objects.all():
+            self.assertEqual(factura.monto, Decimal("240.00"))
+
+    def test_regenerar_actualiza_pendientes_y_respeta_pagadas(self):
+        self._crear_viviendas(3, "R")
+        _generar_facturas_para_periodo(self.periodo)
+        pagada = Factura.objects.order_by("vivienda__codigo_unidad").first()
+        Factura.objects.filter(pk=pagada.pk).update(estado="PAGADA")
+
+        resumen = _generar_facturas_para_periodo(self.periodo)
+
+        self.assertEqual(resumen, {"creadas": 0, "actualizadas": 2, "sin_cambios": 1})
+        self.assertEqual(Factura.objects.count(), 3)
+        self.assertEqual(FacturaDetalle.objects.filter(factura=pagada).count(), 2)
+        for factura in Factura.objects.exclude(pk=pagada.pk):
+            self.assertEqual(factura.monto, Decimal("200.00"))
+            self.assertEqual(factura.detalles.count(), 1)
+
+    def test_job_procesa_por_bloques_y_acumula_progreso(self):
+        self._crear_viviendas(5, "J")
+        job = encolar_generacion_facturas(self.periodo)
+
+        procesado = procesar_siguiente_job(chunk_size=2)
+
+        self.assertEqual(procesado.pk, job.pk)
+        self.assertEqual(procesado.estado, GeneracionFacturasJob.ESTADO_COMPLETADO)
+        self.assertEqual(procesado.total_viviendas, 5)
+        self.assertEqual(procesado.procesadas, 5)
+        self.assertEqual(procesado.creadas, 5)
+        self.assertEqual(procesado.errores, [])
+        self.assertEqual(Factura.objects.filter(periodo=self.periodo).count(), 5)
+        self.assertIsNone(procesar_siguiente_job(chunk_size=2))
+
+    @override_settings(FINANZAS_GENERACION_TIMEOUT=60)
+    def test_job_abandonado_en_proceso_se_retoma(self):
+        self._crear_viviendas(3, "K")
+        job = encolar_generacion_facturas(self.periodo)
+        hace_un_rato = timezone.now() - timedelta(seconds=30)
+        # Un worker que murió tras el primer bloque.
+        GeneracionFacturasJob.objects.filter(pk=job.pk).update(
+            estado=GeneracionFacturasJob.ESTADO_EN_PROCESO,
+            iniciado_en=hace_un_rato,
+            procesadas=2,
+            creadas=2,
+            actualizado_en=hace_un_rato,
+        )
+        self.assertIsNone(procesar_siguiente_job(chunk_size=2))
+
+        GeneracionFacturasJob.objects.filter(pk=job.pk).update(
+            actualizado_en=timezone.now() - timedelta(seconds=120)
+        )
+        with self.assertLogs("api.finanzas.jobs", "WARNING"):
+            procesado = procesar_siguiente_job(chunk_size=2)
+        self.assertEqual(procesado.pk, job.pk)
+        self.assertEqual(procesado.estado, GeneracionFacturasJob.ESTADO_COMPLETADO)
+        self.assertEqual((procesado.procesadas, procesado.creadas), (3, 3))
+        self.assertEqual(Factura.objects.filter(periodo=self.periodo).count(), 3)
+
+    def test_worker_desplazado_deja_de_actualizar_el_job(self):
+        self._crear_viviendas(2, "D")
+        job = encolar_generacion_facturas(self.periodo)
+        tomado = _tomar_siguiente_job()
+        # Otro worker lo retomó mientras tanto.
+        GeneracionFacturasJob.objects.filter(pk=job.pk).update(
+            iniciado_en=timezone.now() + timedelta(seconds=1)
+        )
+        with self.assertLogs("api.finanzas.jobs", "WARNING"):
+            resultado = procesar_job(tomado, chunk_size=1)
+        self.assertEqual(resultado.estado, GeneracionFacturasJob.ESTADO_EN_PROCESO)
+        self.assertEqual(resultado.total_viviendas, 0)
+
+    def test_post_periodo_invalido_no_encola_job(self):
+        auth_user = User.objects.create_user(username="admin_jobs", password="pass1234")
+        Usuario.objects.create(user=auth_user)
+        self.client.force_authenticate(user=auth_user)
+
+        response = self.client.post(
+            "/api/finanzas/admin/generar-facturas/",
+            data={"periodo": "2024-13"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(GeneracionFacturasJob.objects.exists())
@@ -0,0 +1,406 @@
+import base64
+import io
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageEnhance
+from rest_framework.test import APITestCase
+
+from ..actor import invalidar_actor
+from ..models import RegistroAccesoVehicular, Residente, Rol, Usuario, UsuarioRol, Vehiculo
+from ..security import identificacion, placas
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def _captura(semilla, brillo=1.0, formato="PNG"):
+    """Imagen con bloques al azar; la misma semilla da la misma escena."""
+    azar = random.Random(semilla)
+    imagen = Image.new("RGB", (160, 120), (90, 90, 90))
+    dibujo = ImageDraw.Draw(imagen)
+    for _ in range(12):
+        x, y = azar.randrange(140), azar.randrange(100)
+        color = tuple(azar.randrange(256) for _ in range(3))
+        dibujo.rectangle((x, y, x + azar.randrange(10, 60), y + azar.randrange(10, 40)), fill=color)
+    if brillo != 1.0:
+        imagen = ImageEnhance.Brightness(imagen).enhance(brillo)
+    salida = io.BytesIO()
+    imagen.save(salida, format=formato)
+    mime = "image/png" if formato == "PNG" else "image/jpeg"
+    return f"data:{mime};base64,{base64.b64encode(salida.getvalue()).decode()}"
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PLACAS_RECONOCEDOR="memoria")
+class IdentificarPlacaTests(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        invalidar_actor(todo=True)
+        placas.reiniciar_reconocedor()
+        placas.invalidar_indice()
+        self.addCleanup(placas.reiniciar_reconocedor)
+        self.reconocedor = placas.obtener_reconocedor()
+        user = User.objects.create_user(username="guardia_placas", password="pass1234")
+        usuario = Usuario.objects.create(user=user)
+        UsuarioRol.objects.create(usuario=usuario, rol=Rol.objects.get_or_create(nombre="GUA")[0])
+        self.client.force_authenticate(user=user)
+        self.residente = Residente.objects.create(ci="8801", nombres="Luis", apellidos="Rojas")
+        self.vehiculo = Vehiculo.objects.create(residente=self.residente, placa="1234ABC")
+
+    def _identificar(self, imagen):
+        response = self.client.post(
+            "/api/seguridad/accesos/identificar/", {"image_base64": imagen}, format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def test_solo_la_captura_reenviada_usa_la_cache_y_queda_por_confirmar(self):
+        self.reconocedor.placa = "1234ABC"
+
+        primera = self._identificar(_captura(1))
+        self.assertFalse(primera["desde_cache"])
+        self.assertEqual(primera["registro"]["estado"], RegistroAccesoVehicular.ESTADO_APROBADO)
+
+        # El mismo archivo reenviado no vuelve a llamar, pero no abre el portón solo.
+        repetida = self._identificar(_captura(1))
+        self.assertTrue(repetida["desde_cache"])
+        self.assertTrue(repetida["requiere_confirmacion"])
+        self.assertEqual(repetida["registro"]["estado"], RegistroAccesoVehicular.ESTADO_POR_CONFIRMAR)
+        self.assertEqual(repetida["registro"]["vehiculo"]["placa"], "1234ABC")
+        self.assertEqual(self.reconocedor.llamadas, 1)
+
+        # Una captura casi igual (otro auto en el mismo lugar y con la misma luz) se reconoce de nuevo.
+        self.reconocedor.placa = "9999ZZZ"
+        parecida = self._identificar(_captura(1, brillo=1.05, formato="JPEG"))
+        self.assertFalse(parecida["desde_cache"])
+        self.assertEqual(parecida["registro"]["estado"], RegistroAccesoVehicular.ESTADO_RECHAZADO)
+        self.assertEqual(self.reconocedor.llamadas, 2)
+
+        url = f"/api/seguridad/accesos/{repetida['registro']['id']}/confirmar/"
+        self.assertEqual(self.client.post(url, {}, format="json").status_code, 400)
+        response = self.client.post(url, {"aprobado": True, "comentario": "Visto en cámara"}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["estado"], RegistroAccesoVehicular.ESTADO_APROBADO)
+        self.assertEqual(self.client.post(url, {"aprobado": False}, format="json").status_code, 409)
+
+        with override_settings(PLACAS_CACHE_TTL=0):
+            placas.limpiar_capturas()
+            self.reconocedor.placa = "1234ABC"
+            self._identificar(_captura(2))
+            self._identificar(_captura(2))
+        self.assertEqual(self.reconocedor.llamadas, 4)
+
+    def test_sin_placa_no_se_guarda_en_cache(self):
+        resultado = self._identificar(_captura(3))
+        self.assertEqual(resultado["registro"]["placa_detectada"], "NO_IDENTIFICADA")
+        self.assertFalse(resultado["coincide"])
+        self._identificar(_captura(3))
+        self.assertEqual(self.reconocedor.llamadas, 2)
+
+    def test_coincidencia_tolera_solo_confusiones_del_ocr(self):
+        Vehiculo.objects.create(residente=self.residente, placa="1234ABO")
+        aprobado = RegistroAccesoVehicular.ESTADO_APROBADO
+        rechazado = RegistroAccesoVehicular.ESTADO_RECHAZADO
+        por_confirmar = RegistroAccesoVehicular.ESTADO_POR_CONFIRMAR
+        casos = {
+            "I234ABC": ("1234ABC", 1, aprobado),        # 1 leído como I
+            "1234-abc": ("1234ABC", 0, aprobado),       # guiones y minúsculas no cuentan
+            "1234AB0": ("1234ABO", 1, aprobado),        # O leída como 0
+            "1235ABC": ("1234ABC", 1, por_confirmar),   # 4 y 5 no se confunden: puede ser otro auto
+            "1234ABCD": ("1234ABC", 1, por_confirmar),  # un carácter de más
+            "1234AB8": (None, None, rechazado),         # a una edición de las dos registradas
+            "12ABC": (None, None, rechazado),           # dos ediciones
+        }
+        for semilla, (leida, (esperada, distancia, estado)) in enumerate(casos.items(), start=10):
+            with self.subTest(leida=leida):
+                self.reconocedor.placa = leida
+                resultado = self._identificar(_captura(semilla))
+                self.assertEqual(resultado["distancia"], distancia)
+                vehiculo = resultado["registro"]["vehiculo"]
+                self.assertEqual(vehiculo["placa"] if vehiculo else None, esperada)
+                self.assertEqual(resultado["registro"]["estado"], estado)
+                self.assertEqual(resultado["requiere_confirmacion"], estado == por_confirmar)
+
+    def test_el_indice_se_actualiza_al_cambiar_vehiculos(self):
+        self.reconocedor.placa = "5678XYZ"
+        self.assertFalse(self._identificar(_captura(20))["coincide"])
+
+        Vehiculo.objects.create(residente=self.residente, placa="5678XYZ")
+        self.assertTrue(self._identificar(_captura(21))["coincide"])
+
+        self.vehiculo.delete()
+        self.reconocedor.placa = "1234ABC"
+        self.assertFalse(self._identificar(_captura(22))["coincide"])
+
+    def test_arbol_bk_y_errores_del_reconocedor(self):
+        arbol = placas.ArbolBK(["1234ABC", "1234ABD", "9999ZZZ", "1234ABC"])
+        self.assertEqual(arbol.buscar("1234ABX", 1), [(1, "1234ABC"), (1, "1234ABD")])
+        self.assertEqual(arbol.buscar("9999ZZ", 0), [])
+        self.assertEqual(placas.huella(b"captura"), placas.huella(b"captura"))
+        self.assertNotEqual(placas.huella(b"captura"), placas.huella(b"captura "))
+
+        self.reconocedor.fallar_con = placas.PlateRecognizerConnectionError()
+        response = self.client.post(
+            "/api/seguridad/accesos/identificar/", {"image_base64": _captura(30)}, format="json"
+        )
+        self.assertEqual(response.status_code, 502)
+
+        with override_settings(PLACAS_RECONOCEDOR="platerecognizer", PLATE_RECOGNIZER_TOKEN=""):
+            placas.reiniciar_reconocedor()
+            response = self.client.post(
+                "/api/seguridad/accesos/identificar/", {"image_base64": _captura(31)}, format="json"
+            )
+        self.assertEqual(response.status_code, 503)
+
+
+class _PlateRecognizerLocal(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    conexiones = set()
+    formularios = []
+
+    def do_POST(self):
+        type(self).conexiones.add(self.client_address)
+        cuerpo = self.rfile.read(int(self.headers["Content-Length"]))
+        type(self).formularios.append((self.headers["Authorization"], self.headers["Content-Type"], cuerpo))
+        respuesta = json.dumps({"results": [{"plate": "1234abc", "score": 0.88}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(respuesta)))
+        self.end_headers()
+        self.wfile.write(respuesta)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PLACAS_RECONOCEDOR="memoria", PLACAS_CACHE_TTL=0)
+class IdentificacionAsincronaTests(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        invalidar_actor(todo=True)
+        placas.reiniciar_reconocedor()
+        placas.invalidar_indice()
+        identificacion.reiniciar_pool()
+        self.addCleanup(placas.reiniciar_reconocedor)
+        self.addCleanup(identificacion.reiniciar_pool)
+        self.reconocedor = placas.obtener_reconocedor()
+        user = User.objects.create_user(username="guardia_asincrono", password="pass1234")
+        self.client.force_authenticate(user=user)
+        residente = Residente.objects.create(ci="8802", nombres="Eva", apellidos="Soto")
+        Vehiculo.objects.create(residente=residente, placa="1234ABC")
+
+    def _post(self, imagen, **extra):
+        return self.client.post(
+            "/api/seguridad/accesos/identificar/", {"image_base64": imagen, **extra}, format="json"
+        )
+
+    def test_acepta_la_captura_y_el_resultado_se_consulta_despues(self):
+        self.reconocedor.placa = "1234ABC"
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self._post(_captura(40), asincrono=True)
+        self.assertEqual(response.status_code, 202)
+        # La identificación, las rendiciones de la captura y el resumen por hora.
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(self.reconocedor.llamadas, 0)
+        registro = response.json()["registro"]
+        self.assertEqual(registro["estado"], RegistroAccesoVehicular.ESTADO_PENDIENTE)
+        self.assertTrue(response.json()["url"].endswith(f"/api/seguridad/accesos/{registro['id']}/"))
+
+        # El hilo del pool no ve la transacción del test: se procesa aquí.
+        identificacion.procesar_captura(registro["id"])
+        detalle = self.client.get(f"/api/seguridad/accesos/{registro['id']}/").json()
+        self.assertEqual(detalle["estado"], RegistroAccesoVehicular.ESTADO_APROBADO)
+        self.assertEqual(detalle["vehiculo"]["placa"], "1234ABC")
+        self.assertEqual(detalle["placa_detectada"], "1234ABC")
+
+        # Un error del servicio deja el registro rechazado con el motivo.
+        self.reconocedor.fallar_con = placas.PlateRecognizerConnectionError()
+        with self.captureOnCommitCallbacks():
+            registro_id = self._post(_captura(41), asincrono="true").json()["registro"]["id"]
+        self.assertEqual(identificacion.procesar_pendientes(), 1)
+        registro = RegistroAccesoVehicular.objects.get(pk=registro_id)
+        self.assertEqual(registro.estado, RegistroAccesoVehicular.ESTADO_RECHAZADO)
+        self.assertIn("error", registro.respuesta_api)
+
+    @override_settings(PLACAS_COLA_MAXIMA=0)
+    def test_pool_lleno_rechaza_sin_guardar(self):
+        response = self._post(_captura(42), asincrono=True)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+        self.assertFalse(RegistroAccesoVehicular.objects.exists())
+
+    def test_pool_acota_las_capturas_en_curso(self):
+        pool = identificacion.PoolIdentificacion(workers=1, maximo=2)
+        self.addCleanup(pool.cerrar)
+        liberar = threading.Event()
+        self.assertTrue(pool.enviar(liberar.wait, 5))
+        self.assertTrue(pool.enviar(liberar.wait, 5))
+        self.assertTrue(pool.lleno)
+        self.assertFalse(pool.enviar(liberar.wait, 5))
+        liberar.set()
+        for _ in range(100):
+            if pool.en_curso == 0:
+                break
+            time.sleep(0.01)
+        self.assertEqual(pool.en_curso, 0)
+
+    @override_settings(PLACAS_CIRCUITO_FALLOS=2, PLACAS_CIRCUITO_ENFRIAMIENTO=60)
+    def test_el_circuito_corta_las_llamadas_tras_fallos_seguidos(self):
+        placas.reiniciar_reconocedor()
+        reconocedor = placas.obtener_reconocedor()
+        reconocedor.fallar_con = placas.PlateRecognizerConnectionError()
+        for semilla in (50, 51, 52):
+            self.assertEqual(self._post(_captura(semilla)).status_code, 502)
+        self.assertEqual(reconocedor.llamadas, 2)
+        self.assertTrue(placas.obtener_circuito().abierto)
+
+        # Vencido el enfriamiento pasa una llamada de prueba y el circuito se cierra.
+        placas.obtener_circuito()._abierto_hasta = 0
+        reconocedor.fallar_con = None
+        reconocedor.placa = "1234ABC"
+        self.assertEqual(self._post(_captura(53)).status_code, 201)
+        self.assertFalse(placas.obtener_circuito().abierto)
+        self.assertEqual(reconocedor.llamadas, 3)
+
+    def test_plate_recognizer_reutiliza_la_conexion(self):
+        _PlateRecognizerLocal.conexiones = set()
+        _PlateRecognizerLocal.formularios = []
+        servidor = ThreadingHTTPServer(("127.0.0.1", 0), _PlateRecognizerLocal)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+
+        endpoint = f"http://127.0.0.1:{servidor.server_port}/v1/plate-reader/"
+        with override_settings(
+            PLACAS_RECONOCEDOR="platerecognizer", PLATE_RECOGNIZER_TOKEN="secreto", PLATE_RECOGNIZER_ENDPOINT=endpoint
+        ):
+            placas.reiniciar_reconocedor()
+            for semilla in (60, 61, 62):
+                response = self._post(_captura(semilla))
+                self.assertEqual(response.status_code, 201)
+                self.assertTrue(response.json()["coincide"])
+
+        self.assertEqual(len(_PlateRecognizerLocal.formularios), 3)
+        self.assertEqual(len(_PlateRecognizerLocal.conexiones), 1)
+        autorizacion, tipo, cuerpo = _PlateRecognizerLocal.formularios[0]
+        self.assertEqual(autorizacion, "Token secreto")
+        self.assertTrue(tipo.startswith("multipart/form-data; boundary="))
+        self.assertIn(b'name="upload"; filename="captura.jpg"', cuerpo)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PLACAS_RECONOCEDOR="memoria", IMAGENES_MAX_WORKERS=0)
+class ReclamoCapturasTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("skip_locked requiere PostgreSQL")
+        placas.reiniciar_reconocedor()
+        self.addCleanup(placas.reiniciar_reconocedor)
+        placas.invalidar_indice()
+        placas.obtener_reconocedor().placa = "1234ABC"
+        residente = Residente.objects.create(ci="8803", nombres="Ada", apellidos="Paz")
+        Vehiculo.objects.create(residente=residente, placa="1234ABC")
+        self.reconociendo, self.soltar = threading.Event(), threading.Event()
+        self.en_transaccion = []
+
+    def _registro(self, semilla):
+        contenido = base64.b64decode(_captura(semilla).split(",", 1)[1])
+        registro = RegistroAccesoVehicular(placa_detectada="", estado=RegistroAccesoVehicular.ESTADO_PENDIENTE)
+        registro.imagen.save("captura.png", ContentFile(contenido), save=False)
+        registro.save()
+        return registro
+
+    def _reconocer_lento(self, reconocer):
+        def lento(*args, **kwargs):
+            # Un servicio lento: el hilo queda esperando su respuesta.
+            self.en_transaccion.append(connection.in_atomic_block)
+            self.reconociendo.set()
+            self.soltar.wait(10)
+            return reconocer(*args, **kwargs)
+
+        return lento
+
+    def _procesar_en_hilo(self, registro):
+        resultado = []
+
+        def procesar():
+            try:
+                resultado.append(identificacion.procesar_captura(registro.pk))
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=procesar)
+        hilo.start()
+        self.assertTrue(self.reconociendo.wait(10))
+        return hilo, resultado
+
+    def test_el_servicio_se_llama_fuera_de_la_transaccion_y_no_se_toma_dos_veces(self):
+        registro = self._registro(50)
+        with mock.patch.object(placas, "reconocer", self._reconocer_lento(placas.reconocer)):
+            hilo, resultado = self._procesar_en_hilo(registro)
+            try:
+                self.assertEqual(self.en_transaccion, [False])
+                # La fila no queda bloqueada mientras se espera al servicio.
+                with transaction.atomic():
+                    en_curso = RegistroAccesoVehicular.objects.select_for_update(nowait=True).get(pk=registro.pk)
+                self.assertEqual(en_curso.estado, RegistroAccesoVehicular.ESTADO_PROCESANDO)
+                self.assertIsNotNone(en_curso.reclamado_en)
+                self.assertEqual(identificacion.procesar_pendientes(), 0)
+            finally:
+                self.soltar.set()
+                hilo.join()
+
+        self.assertEqual(resultado[0].pk, registro.pk)
+        registro.refresh_from_db()
+        self.assertEqual(registro.estado, RegistroAccesoVehicular.ESTADO_APROBADO)
+
+    def test_retoma_la_captura_abandonada_y_descarta_el_resultado_viejo(self):
+        registro = self._registro(51)
+        with mock.patch.object(placas, "reconocer", self._reconocer_lento(placas.reconocer)):
+            hilo, resultado = self._procesar_en_hilo(registro)
+            try:
+                # El reclamo vence mientras el servicio responde, y este no lee la placa.
+                RegistroAccesoVehicular.objects.filter(pk=registro.pk).update(
+                    reclamado_en=timezone.now() - timedelta(hours=1)
+                )
+                placas.obtener_reconocedor().placa = None
+                with self.assertLogs("api.security.identificacion", "WARNING") as logs:
+                    self.soltar.set()
+                    hilo.join()
+            finally:
+                self.soltar.set()
+                hilo.join()
+
+        # El hilo original ya no es dueño del reclamo: no guarda su resultado.
+        self.assertEqual(resultado, [None])
+        self.assertIn("retomada por otro proceso", logs.output[0])
+        registro.refresh_from_db()
+        self.assertEqual(registro.estado, RegistroAccesoVehicular.ESTADO_PROCESANDO)
+
+        # El worker retoma el reclamo vencido.
+        placas.obtener_reconocedor().placa = "1234ABC"
+        salida = io.StringIO()
+        with self.assertLogs("api.security.identificacion", "WARNING"):
+            call_command("procesar_capturas_pendientes", "--antiguedad", "0", "--once", stdout=salida)
+        self.assertIn("1 capturas pendientes procesadas", salida.getvalue())
+        registro.refresh_from_db()
+        self.assertEqual(registro.estado, RegistroAccesoVehicular.ESTADO_APROBADO)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..actor import invalidar_actor
+from ..models import (
+    Condominio,
+    ReporteIncidenteSeguridad,
+    Residente,
+    ResidenteVivienda,
+    Rol,
+    Usuario,
+    UsuarioRol,
+    Vivienda,
+)
+from ..security import eventos
+
+
+def _leer_evento(chunk):
+    campos = dict(
+        linea.split(": ", 1) for linea in chunk.decode("utf-8").strip().splitlines()
+    )
+    return campos["id"], campos["event"], json.loads(campos["data"])
+
+
+class IncidentesStreamTests(APITestCase):
+    def setUp(self):
+        invalidar_actor(todo=True)
+        eventos.hub = eventos.HubIncidentes(historial=4)
+        user = User.objects.create_user(username="guardia_sse", password="pass1234")
+        usuario = Usuario.objects.create(user=user)
+        rol, _ = Rol.objects.get_or_create(nombre="GUA")
+        UsuarioRol.objects.create(usuario=usuario, rol=rol, estado=1)
+        self.token = str(RefreshToken.for_user(user).access_token)
+
+        condominio = Condominio.objects.create(nombre="Sol")
+        vivienda = Vivienda.objects.create(
+            condominio=condominio, codigo_unidad="S-1", bloque="A", numero="1"
+        )
+        self.residente = Residente.objects.create(ci="5501", nombres="Eva", apellidos="Luna")
+        ResidenteVivienda.objects.create(
+            residente=self.residente, vivienda=vivienda, fecha_desde=timezone.localdate()
+        )
+        self.incidente = ReporteIncidenteSeguridad.objects.create(
+            residente=self.residente, ubicacion="Portón", descripcion="Ruido"
+        )
+
+    async def _conectar(self, **extra):
+        response = await self.async_client.get(
+            "/api/seguridad/incidentes/stream/", {"token": self.token}, **extra
+        )
+        self.assertEqual(response.status_code, 200)
+        return response, aiter(response.streaming_content)
+
+    async def test_foto_inicial_eventos_y_reanudacion(self):
+        response, stream = await self._conectar()
+        evento_id, nombre, datos = _leer_evento(await anext(stream))
+        self.assertEqual(nombre, "incidents")
+        self.assertEqual(datos["incidents"][0]["residente"]["codigo_vivienda"], "S-1")
+
+        nuevo = await sync_to_async(ReporteIncidenteSeguridad.objects.create)(
+            residente=self.residente, ubicacion="Piscina", es_emergencia=True
+        )
+        nuevo_id = await sync_to_async(eventos.hub.nuevo_id)()
+        await sync_to_async(eventos.emitir_evento)(nuevo_id, nuevo.pk, "creado")
+
+        chunk = await asyncio.wait_for(anext(stream), timeout=2)
+        siguiente_id, _, datos = _leer_evento(chunk)
+        self.assertGreater(int(siguiente_id), int(evento_id))
+        self.assertEqual(datos["incidente_id"], str(nuevo.pk))
+        self.assertEqual(len(datos["incidents"]), 2)
+
+        # Reconectar con Last-Event-ID reenvía solo lo que faltaba.
+        response, stream = await self._conectar(headers={"Last-Event-ID": evento_id})
+        self.assertEqual(_leer_evento(await anext(stream))[0], siguiente_id)
+
+        # Al cortarse la conexión la suscripción se libera.
+        espera = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        espera.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await espera
+        self.assertEqual(len(eventos.hub._suscripciones), 1)  # solo la primera conexión
+
+    async def test_residente_no_puede_abrir_el_stream(self):
+        user = await sync_to_async(User.objects.create_user)(username="vecino", password="x")
+        token = str(RefreshToken.for_user(user).access_token)
+        response = await self.async_client.get("/api/seguridad/incidentes/stream/", {"token": token})
+        self.assertEqual(response.status_code, 403)
+
+    def test_cambios_se_publican_una_vez_para_todas_las_conexiones(self):
+        loop = asyncio.new_event_loop()
+        try:
+            suscripciones = [eventos.hub.suscribir(loop)[0] for _ in range(3)]
+            with self.captureOnCommitCallbacks(execute=True):
+                self.incidente.estado = ReporteIncidenteSeguridad.ESTADO_ATENDIDO
+                self.incidente.save()
+
+            with self.assertNumQueries(0):
+                loop.run_until_complete(asyncio.sleep(0))
+            entregados = [
+                loop.run_until_complete(suscripcion.siguiente(1)) for suscripcion in suscripciones
+            ]
+        finally:
+            loop.close()
+
+        self.assertEqual(len({id(evento) for evento in entregados}), 1)
+        self.assertIn(b'"accion": "actualizado"', entregados[0].mensaje)
@@ -0,0 +1,71 @@
+import re
+import zlib
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import HttpResponse
+from rest_framework.test import APITestCase
+
+from ..models import Usuario
+from ..pdf import DocumentoPDF
+
+
+def _objetos(pdf):
+    return {
+        int(match.group(1)): match.start()
+        for match in re.finditer(rb"(\d+) 0 obj\n", pdf)
+    }
+
+
+class DocumentoPDFTests(APITestCase):
+    def test_pagina_comprime_y_comparte_fuentes(self):
+        documento = DocumentoPDF()
+        documento.add_text("Reporte", font="F2", size=18)
+        for numero in range(120):
+            documento.add_text(f"Renglón {numero} (detalle)", size=11, leading=16)
+        pdf = documento.cerrar()
+
+        self.assertTrue(pdf.startswith(b"%PDF-1.4"))
+        self.assertTrue(pdf.endswith(b"%%EOF"))
+        paginas = re.findall(rb"/Type /Page ", pdf)
+        self.assertGreater(len(paginas), 1)
+        self.assertEqual(len(re.findall(rb"/Type /Font", pdf)), 2)
+        self.assertEqual(len(re.findall(rb"/Count %d" % len(paginas), pdf)), 1)
+
+        stream = re.search(rb"/Filter /FlateDecode >>\nstream\n(.*?)\nendstream", pdf, re.S)
+        contenido = zlib.decompress(stream.group(1))
+        self.assertIn("Renglón 0 \\(detalle\\)".encode("cp1252"), contenido)
+
+        # Cada entrada de la tabla xref apunta al inicio de su objeto.
+        xref = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+        entradas = re.findall(rb"(\d{10}) 00000 n", pdf[xref:])
+        objetos = _objetos(pdf)
+        self.assertEqual(len(entradas), len(objetos))
+        for obj_id, offset in enumerate(entradas, start=1):
+            self.assertEqual(int(offset), objetos[obj_id])
+
+    def test_escribe_directo_en_la_respuesta(self):
+        response = HttpResponse(content_type="application/pdf")
+        documento = DocumentoPDF(response)
+        documento.add_text("Texto largo " * 60, wrap=True)
+        self.assertIsNone(documento.cerrar())
+        self.assertTrue(response.content.startswith(b"%PDF"))
+        self.assertEqual(documento.total_paginas, 1)
+
+    def test_reporte_seguridad_en_pdf(self):
+        auth_user = User.objects.create_user(username="guardia_pdf", password="pass1234")
+        Usuario.objects.create(user=auth_user)
+        self.client.force_authenticate(user=auth_user)
+        response = self.client.get("/api/seguridad/reportes/resumen/pdf/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.streaming)
+        pdf = b"".join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        self.assertTrue(pdf.endswith(b"%%EOF"))
+
+    def test_benchmark_pdf_facturas(self):
+        salida = StringIO()
+        call_command("benchmark_pdf_facturas", "--cantidad", "5", stdout=salida)
+        self.assertIn("5 facturas", salida.getvalue())
@@ -0,0 +1,192 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ..actor import invalidar_actor
+from ..models import Aviso, FCMDevice, PushOutbox, Residente, Rol, Usuario, UsuarioRol
+from ..push import (
+    TransporteFalso,
+    despachar,
+    drenar_outbox,
+    encolar_push,
+    metricas_outbox,
+    TransporteNulo,
+    obtener_transporte,
+    procesar_lote,
+    reiniciar_transporte,
+    tokens_de_usuarios,
+)
+
+
+class DespachadorPushTests(APITestCase):
+    def setUp(self):
+        invalidar_actor(todo=True)
+        self.enviados = []
+
+    def _enviar_lote(self, tokens, titulo, mensaje, data):
+        self.enviados.append(list(tokens))
+        return [
+            (token, None, "UNREGISTERED") if token.endswith("-x") else (token, f"msg-{token}", None)
+            for token in tokens
+        ]
+
+    def test_despacha_en_lotes_de_500_con_resultado_por_token(self):
+        tokens = [f"tok-{i}" for i in range(1200)] + ["tok-muerto-x"]
+
+        resultados = despachar(tokens, "Titulo", "Mensaje", {"id": 1}, enviar_lote=self._enviar_lote)
+
+        self.assertEqual(sorted(len(lote) for lote in self.enviados), [201, 500, 500])
+        self.assertEqual([resultado.token for resultado in resultados], tokens)
+        fallidos = [resultado for resultado in resultados if not resultado.ok]
+        self.assertEqual(fallidos[0].token, "tok-muerto-x")
+        self.assertEqual(fallidos[0].error, "UNREGISTERED")
+        self.assertEqual(resultados[0].message_id, "msg-tok-0")
+
+    def test_un_lote_caido_marca_sus_tokens_sin_frenar_los_demas(self):
+        def enviar_lote(tokens, titulo, mensaje, data):
+            if "tok-0" in tokens:
+                raise ConnectionError("sin red")
+            return [(token, "ok", None) for token in tokens]
+
+        tokens = [f"tok-{i}" for i in range(600)]
+        resultados = despachar(tokens, "Titulo", "Mensaje", enviar_lote=enviar_lote)
+
+        errores = {resultado.error for resultado in resultados[:500]}
+        self.assertEqual(errores, {"ConnectionError"})
+        self.assertTrue(all(resultado.ok for resultado in resultados[500:]))
+
+    def test_publicar_aviso_consulta_tokens_una_vez_y_envia_tras_el_commit(self):
+        admin_user = User.objects.create_user(username="admin_push", password="pass1234")
+        admin = Usuario.objects.create(user=admin_user)
+        rol, _ = Rol.objects.get_or_create(nombre="ADM")
+        UsuarioRol.objects.create(usuario=admin, rol=rol, estado=1)
+
+        for indice in range(5):
+            user = User.objects.create_user(username=f"res_push_{indice}", password="pass1234")
+            usuario = Usuario.objects.create(user=user)
+            Residente.objects.create(
+                ci=f"PUSH{indice}", nombres="Res", apellidos=str(indice), usuario=usuario
+            )
+            FCMDevice.objects.create(usuario=usuario, token=f"token-{indice}-a")
+            FCMDevice.objects.create(usuario=usuario, token=f"token-{indice}-b")
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(tokens_de_usuarios(Usuario.objects.filter(residente__estado=1))), 10)
+
+        aviso = Aviso.objects.create(titulo="Corte de agua", contenido="Mañana", autor_usuario=admin)
+        self.client.force_authenticate(user=admin_user)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(f"/api/avisos/{aviso.id}/publicar/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(PushOutbox.objects.filter(estado=PushOutbox.ESTADO_PENDIENTE).count(), 10)
+
+        response = self.client.get("/api/push/outbox/metricas/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["pendientes"], 10)
+
+
+class PushOutboxTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="res_outbox", password="pass1234")
+        self.usuario = Usuario.objects.create(user=user)
+        FCMDevice.objects.create(usuario=self.usuario, token="tok-ok")
+        FCMDevice.objects.create(usuario=self.usuario, token="tok-muerto")
+        FCMDevice.objects.create(usuario=self.usuario, token="tok-caido")
+
+    def test_clasifica_resultados_y_elimina_tokens_invalidos(self):
+        encolar_push(["tok-ok", "tok-muerto", "tok-caido"], "Pago confirmado", "Gracias", {"pago": 1})
+        encolar_push(["tok-muerto"], "Otro aviso", "Pendiente")
+        transporte = TransporteFalso(errores={"tok-muerto": "UNREGISTERED", "tok-caido": "UNAVAILABLE"})
+
+        resumen = procesar_lote(transporte=transporte)
+
+        self.assertEqual(resumen["enviados"], 1)
+        self.assertEqual(resumen["reintentos"], 1)
+        self.assertEqual(resumen["tokens_eliminados"], 1)
+        self.assertEqual(transporte.tokens_enviados(), ["tok-ok"])
+        self.assertEqual(transporte.enviados[0]["data"], {"pago": "1"})
+        self.assertFalse(FCMDevice.objects.filter(token="tok-muerto").exists())
+        self.assertEqual(
+            PushOutbox.objects.filter(token="tok-muerto", estado=PushOutbox.ESTADO_FALLIDO).count(), 2
+        )
+
+        caido = PushOutbox.objects.get(token="tok-caido")
+        self.assertEqual(caido.estado, PushOutbox.ESTADO_PENDIENTE)
+        self.assertEqual((caido.intentos, caido.ultimo_error), (1, "UNAVAILABLE"))
+        self.assertGreater(caido.proximo_intento, timezone.now())
+
+        metricas = metricas_outbox()
+        self.assertEqual((metricas["pendientes"], metricas["listos"]), (1, 0))
+        self.assertEqual((metricas["enviados"], metricas["fallidos"]), (1, 2))
+        self.assertIsNone(procesar_lote(transporte=transporte))
+
+    @override_settings(PUSH_OUTBOX_MAX_INTENTOS=2)
+    def test_reintenta_con_espera_y_descarta_al_agotar_intentos(self):
+        encolar_push(["tok-caido"], "Aviso", "Texto")
+        sin_red = TransporteFalso(fallar_con=ConnectionError("sin red"))
+
+        esperas = []
+        for _ in range(2):
+            PushOutbox.objects.update(proximo_intento=timezone.now())
+            drenar_outbox(transporte=sin_red)
+            fila = PushOutbox.objects.get()
+            esperas.append((fila.proximo_intento - timezone.now()).total_seconds())
+
+        self.assertEqual(fila.estado, PushOutbox.ESTADO_FALLIDO)
+        self.assertEqual((fila.intentos, fila.ultimo_error), (2, "ConnectionError"))
+        self.assertGreater(esperas[0], 20)
+        self.assertTrue(FCMDevice.objects.filter(token="tok-caido").exists())
+
+    def test_transporte_nulo_deja_las_filas_omitidas(self):
+        encolar_push(["tok-ok", "tok-caido"], "Aviso", "Texto")
+
+        resumen = drenar_outbox(transporte=TransporteNulo())
+
+        self.assertEqual((resumen["enviados"], resumen["omitidos"]), (0, 2))
+        self.assertEqual(
+            set(PushOutbox.objects.values_list("estado", "ultimo_error", "enviado_en")),
+            {(PushOutbox.ESTADO_OMITIDO, "SIN_TRANSPORTE", None)},
+        )
+        self.assertEqual(PushOutbox.objects.filter(intentos__gt=0).count(), 0)
+        metricas = metricas_outbox()
+        self.assertEqual((metricas["pendientes"], metricas["enviados"], metricas["omitidos"]), (0, 0, 2))
+        self.assertEqual(FCMDevice.objects.count(), 3)
+
+
+class TransportePushTests(APITestCase):
+    def tearDown(self):
+        reiniciar_transporte()
+
+    def test_importar_fcm_utils_no_inicializa_firebase(self):
+        entorno = {k: v for k, v in os.environ.items() if k != "FIREBASE_ADMIN_CREDENTIALS"}
+        codigo = (
+            "import sys; import api.fcm_utils as f; "
+            "assert 'firebase_admin' not in sys.modules; assert not f.firebase_configurado()"
+        )
+        resultado = subprocess.run(
+            [sys.executable, "-c", codigo], cwd=settings.BASE_DIR, env=entorno, capture_output=True
+        )
+        self.assertEqual(resultado.returncode, 0, resultado.stderr.decode())
+
+    @override_settings(PUSH_TRANSPORTE="memoria")
+    def test_transporte_configurable_se_crea_una_vez(self):
+        reiniciar_transporte()
+        transporte = obtener_transporte()
+        self.assertIs(obtener_transporte(), transporte)
+
+        resultados = despachar(["tok-1", "tok-2"], "Titulo", "Mensaje")
+        self.assertTrue(all(resultado.ok for resultado in resultados))
+        self.assertEqual(transporte.tokens_enviados(), ["tok-1", "tok-2"])
+
+    @override_settings(PUSH_TRANSPORTE="api.push.TransporteNulo")
+    def test_transporte_por_ruta(self):
+        reiniciar_transporte()
+        self.assertIsInstance(obtener_transporte(), TransporteNulo)
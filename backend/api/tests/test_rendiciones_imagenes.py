@@ -0,0 +1,145 @@
+import io
+import shutil
+import tempfile
+from datetime import date, time
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from api import imagenes
+from api.models import Usuario
+from areas.models import AreaComun, ImagenArea, Reserva
+from mantenimiento.models import Mantenimiento
+from visitantes.models import Visitante
+from visitantes.serializers import VisitanteSerializer
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def _archivo(nombre, tamano, formato="JPEG", modo="RGB"):
+    imagen = Image.new(modo, tamano, (200, 80, 40, 128) if modo == "RGBA" else (200, 80, 40))
+    contenido = io.BytesIO()
+    imagen.save(contenido, formato)
+    return SimpleUploadedFile(nombre, contenido.getvalue(), content_type=f"image/{formato.lower()}")
+
+
+def _abrir(nombre):
+    with default_storage.open(nombre, "rb") as archivo, Image.open(archivo) as imagen:
+        imagen.load()
+        return imagen
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGENES_MAX_WORKERS=0)
+class RendicionesImagenesTests(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        imagenes.reiniciar_pool()
+        self.addCleanup(imagenes.reiniciar_pool)
+        user = User.objects.create(username="vecino_imagenes")
+        self.usuario = Usuario.objects.create(user=user)
+        self.client.force_authenticate(user=user)
+
+    def test_los_listados_devuelven_miniaturas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            area = AreaComun.objects.create(nombre="Quincho", imagen=_archivo("quincho.jpg", (2400, 1600)))
+            ImagenArea.objects.create(area_comun=area, imagen=_archivo("parrilla.jpg", (1600, 2400)))
+
+        miniatura = _abrir(imagenes.nombre_rendicion(area.imagen.name, "miniatura"))
+        self.assertEqual((miniatura.format, miniatura.size), ("WEBP", (320, 213)))
+        self.assertEqual(_abrir(imagenes.nombre_rendicion(area.imagen.name, "media")).size, (1024, 683))
+        self.assertEqual(_abrir(imagenes.nombre_rendicion(area.imagenes.get().imagen.name, "media")).size, (683, 1024))
+
+        listado = self.client.get("/api/areas/").json()[0]
+        self.assertTrue(listado["imagen"].endswith("/media/rendiciones/areas/quincho.jpg.miniatura.webp"))
+        self.assertTrue(listado["imagenes"][0]["imagen"].endswith(".miniatura.webp"))
+        self.assertEqual(set(listado["imagen_rendiciones"]), {"original", "miniatura", "media"})
+        self.assertTrue(listado["imagen_rendiciones"]["original"].endswith("/media/areas/quincho.jpg"))
+
+        detalle = self.client.get(f"/api/areas/{area.id}/").json()
+        self.assertTrue(detalle["imagen"].endswith("/media/areas/quincho.jpg"))
+        detalle = self.client.get(f"/api/areas/{area.id}/", {"rendicion": "media"}).json()
+        self.assertTrue(detalle["imagen"].endswith("quincho.jpg.media.webp"))
+        listado = self.client.get("/api/areas/", {"rendicion": "original"}).json()[0]
+        self.assertTrue(listado["imagen"].endswith("quincho.jpg"))
+
+        Reserva.objects.create(
+            area_comun=area, usuario=self.usuario, fecha=date(2026, 6, 6), hora_inicio=time(10), hora_fin=time(11)
+        )
+        for url in ("/api/reservas/", "/api/reservas/mis_reservas/"):
+            cuerpo = self.client.get(url).json()
+            fila = cuerpo["results"][0] if isinstance(cuerpo, dict) else cuerpo[0]
+            self.assertTrue(fila["area_comun"]["imagen"].endswith(".miniatura.webp"), url)
+
+    def test_sin_rendiciones_se_usa_el_original_y_el_comando_las_completa(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            visitante = Visitante.objects.create(
+                nombre="Ana", ci="123", foto=_archivo("ana.png", (200, 300), formato="PNG", modo="RGBA")
+            )
+            Mantenimiento.objects.create(
+                titulo="Foco", descripcion="-", tipo="correctivo", imagen=_archivo("foco.gif", (10, 10), formato="GIF")
+            )
+
+        datos = VisitanteSerializer(visitante, context={"rendicion": "miniatura"}).data
+        self.assertEqual(datos["foto"], "/media/visitantes/fotos/ana.png")
+        self.assertEqual(datos["foto_rendiciones"]["miniatura"], "/media/visitantes/fotos/ana.png")
+
+        salida = io.StringIO()
+        call_command("generar_rendiciones", "--check", stdout=salida)
+        self.assertIn("2 imágenes sin rendiciones", salida.getvalue())
+        call_command("generar_rendiciones", stdout=io.StringIO())
+
+        # No se agranda y conserva la transparencia.
+        miniatura = _abrir(imagenes.nombre_rendicion(visitante.foto.name, "miniatura"))
+        self.assertEqual((miniatura.size, miniatura.mode), ((200, 300), "RGBA"))
+        datos = VisitanteSerializer(visitante, context={"rendicion": "miniatura"}).data
+        self.assertEqual(datos["foto"], "/media/rendiciones/visitantes/fotos/ana.png.miniatura.webp")
+        salida = io.StringIO()
+        call_command("generar_rendiciones", "--check", stdout=salida)
+        self.assertIn("Todas las imágenes", salida.getvalue())
+
+    def test_originales_que_solo_difieren_en_la_extension(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jpg = AreaComun.objects.create(nombre="Foto JPG", imagen=_archivo("foto.jpg", (2400, 1600)))
+            png = AreaComun.objects.create(
+                nombre="Foto PNG", imagen=_archivo("foto.png", (400, 800), formato="PNG")
+            )
+
+        self.assertEqual(
+            imagenes.nombre_rendicion(jpg.imagen.name, "miniatura"), "rendiciones/areas/foto.jpg.miniatura.webp"
+        )
+        self.assertEqual(_abrir(imagenes.nombre_rendicion(jpg.imagen.name, "miniatura")).size, (320, 213))
+        self.assertEqual(_abrir(imagenes.nombre_rendicion(png.imagen.name, "miniatura")).size, (160, 320))
+
+    @override_settings(IMAGENES_MAX_WORKERS=2, IMAGENES_FORMATO="jpeg", IMAGENES_MINIATURA=100)
+    def test_pool_en_segundo_plano(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            areas = [
+                AreaComun.objects.create(
+                    nombre=f"Área {indice}", imagen=_archivo(f"area_{indice}.png", (800, 400), formato="PNG")
+                )
+                for indice in range(6)
+            ]
+        imagenes.reiniciar_pool()
+
+        for area in areas:
+            self.assertEqual(imagenes.faltantes(area.imagen.name), [])
+            miniatura = _abrir(imagenes.nombre_rendicion(area.imagen.name, "miniatura"))
+            self.assertEqual((miniatura.format, miniatura.size), ("JPEG", (100, 50)))
+
+        # Un archivo que no es imagen no rompe el guardado.
+        with self.assertLogs("api.imagenes", "WARNING"):
+            with self.captureOnCommitCallbacks(execute=True):
+                area = AreaComun.objects.create(
+                    nombre="Rota", imagen=SimpleUploadedFile("rota.jpg", b"no es una imagen", content_type="image/jpeg")
+                )
+            imagenes.reiniciar_pool()
+        self.assertEqual(imagenes.faltantes(area.imagen.name), ["miniatura", "media"])
@@ -0,0 +1,120 @@
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+
+from ..models import (
+    RegistroAccesoVehicular,
+    ReporteIncidenteSeguridad,
+    Residente,
+    ResumenAccesosHora,
+    ResumenIncidentesHora,
+)
+from ..security.resumen import contar, reconstruir_resumen_seguridad
+
+
+def _utc(hora, minuto=0, dia=10):
+    return datetime(2026, 3, dia, hora, minuto, tzinfo=dt_timezone.utc)
+
+
+class ResumenSeguridadTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="guardia_resumen", password="pass1234")
+        self.client.force_authenticate(user=user)
+        self.residente = Residente.objects.create(ci="7701", nombres="Ana", apellidos="Paz")
+
+    def _acceso(self, creado_en, estado=RegistroAccesoVehicular.ESTADO_APROBADO):
+        with self.captureOnCommitCallbacks(execute=True):
+            acceso = RegistroAccesoVehicular.objects.create(placa_detectada="ABC123", estado=estado)
+        RegistroAccesoVehicular.objects.filter(pk=acceso.pk).update(creado_en=creado_en)
+
+    def _incidente(self, creado_en, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            incidente = ReporteIncidenteSeguridad.objects.create(
+                residente=self.residente, ubicacion="Portón", **extra
+            )
+        ReporteIncidenteSeguridad.objects.filter(pk=incidente.pk).update(creado_en=creado_en)
+        return incidente
+
+    def test_ventana_arbitraria_suma_horas_y_cuenta_bordes(self):
+        self._acceso(_utc(10, 20))
+        self._acceso(_utc(10, 40), RegistroAccesoVehicular.ESTADO_RECHAZADO)
+        self._acceso(_utc(11, 5))
+        self._acceso(_utc(11, 50))
+        self._acceso(_utc(13, 10))
+        self._incidente(_utc(11, 30), es_emergencia=True)
+        self._incidente(_utc(12, 59))
+        self._incidente(_utc(13, 30))
+        # ``update`` no dispara señales: se reconstruye desde las tablas de origen.
+        reconstruir_resumen_seguridad()
+        self.assertEqual(ResumenAccesosHora.objects.count(), 3)
+
+        with self.assertNumQueries(2):
+            accesos = contar("accesos", _utc(10, 30), _utc(13, 0))
+        self.assertEqual(accesos, {"total": 3, "aprobados": 2, "rechazados": 1})
+        with self.assertNumQueries(1):
+            self.assertEqual(contar("accesos", _utc(11, 0), _utc(12, 0))["total"], 2)
+        self.assertEqual(contar("accesos", _utc(10, 30), _utc(10, 45))["total"], 1)
+
+        response = self.client.get(
+            "/api/seguridad/reportes/resumen/",
+            {"desde": "2026-03-10T10:30:00Z", "hasta": "2026-03-10T13:00:00Z", "agrupar": "hora"},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["periodo"], "custom")
+        self.assertEqual(data["accesos"]["total"], 3)
+        self.assertEqual(data["incidentes"]["total"], 2)
+        self.assertEqual(data["incidentes"]["emergencias"], 1)
+        self.assertEqual(len(data["incidentes"]["recientes"]), 2)
+        self.assertEqual(
+            [(intervalo["accesos"]["total"], intervalo["incidentes"]["total"]) for intervalo in data["histograma"]],
+            [(2, 0), (2, 1), (0, 1)],
+        )
+
+        response = self.client.get(
+            "/api/seguridad/reportes/resumen/", {"desde": "2026-03-10", "agrupar": "dia"}
+        )
+        self.assertEqual(response.json()["histograma"][0]["accesos"]["total"], 5)
+        self.assertEqual(response.json()["accesos"]["total"], 5)
+
+    def test_las_senales_mantienen_la_hora_actualizada(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            incidente = ReporteIncidenteSeguridad.objects.create(
+                residente=self.residente, ubicacion="Piscina", es_emergencia=True
+            )
+            # La hora se recalcula recién al confirmarse la transacción.
+            self.assertFalse(ResumenIncidentesHora.objects.exists())
+        fila = ResumenIncidentesHora.objects.get()
+        self.assertEqual((fila.total, fila.pendientes, fila.emergencias), (1, 1, 1))
+
+        incidente.estado = ReporteIncidenteSeguridad.ESTADO_ATENDIDO
+        with self.captureOnCommitCallbacks(execute=True):
+            incidente.save()
+        fila.refresh_from_db()
+        self.assertEqual((fila.pendientes, fila.atendidos), (0, 1))
+        self.assertEqual(reconstruir_resumen_seguridad(aplicar=False), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            incidente.delete()
+        self.assertFalse(ResumenIncidentesHora.objects.exists())
+
+        response = self.client.get("/api/seguridad/reportes/resumen/", {"period": "daily"})
+        self.assertEqual(response.json()["incidentes"]["total"], 0)
+
+    def test_reconstruir_detecta_diferencias_y_parametros_invalidos(self):
+        self._acceso(_utc(9, 15))
+        salida = StringIO()
+        call_command("reconstruir_resumen_seguridad", "--check", stdout=salida)
+        # La fila quedó contada en la hora de creación y no en la del ``update``.
+        self.assertIn("4 diferencias", salida.getvalue())
+
+        call_command("reconstruir_resumen_seguridad", stdout=StringIO())
+        self.assertEqual(ResumenAccesosHora.objects.get().hora, _utc(9))
+
+        response = self.client.get("/api/seguridad/reportes/resumen/", {"desde": "ayer"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/seguridad/reportes/resumen/", {"agrupar": "semana"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,99 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ..actor import invalidar_actor
+from ..models import (
+    Condominio,
+    RegistroAccesoVehicular,
+    ReporteIncidenteSeguridad,
+    Residente,
+    ResidenteVivienda,
+    Rol,
+    Usuario,
+    UsuarioRol,
+    Vehiculo,
+    Vivienda,
+)
+
+
+class ListadosSeguridadConsultasTests(APITestCase):
+    """Los listados de seguridad hacen las mismas consultas con 2 o con 12 filas."""
+
+    def setUp(self):
+        invalidar_actor(todo=True)
+        user = User.objects.create_user(username="guardia_listados", password="pass1234")
+        self.guardia = Usuario.objects.create(user=user)
+        rol, _ = Rol.objects.get_or_create(nombre="GUA")
+        UsuarioRol.objects.create(usuario=self.guardia, rol=rol, estado=1)
+        self.client.force_authenticate(user=user)
+        self.condominio = Condominio.objects.create(nombre="Norte")
+        self.creados = 0
+
+    def _agregar_filas(self, cantidad):
+        for _ in range(cantidad):
+            indice = self.creados
+            self.creados += 1
+            vivienda = Vivienda.objects.create(
+                condominio=self.condominio, codigo_unidad=f"N-{indice}", bloque="N", numero=str(indice)
+            )
+            residente = Residente.objects.create(ci=f"L{indice}", nombres="Res", apellidos=str(indice))
+            ResidenteVivienda.objects.create(
+                residente=residente, vivienda=vivienda, fecha_desde=timezone.localdate()
+            )
+            vehiculo = Vehiculo.objects.create(residente=residente, placa=f"LST{indice:03d}")
+            RegistroAccesoVehicular.objects.create(
+                guardia=self.guardia,
+                vehiculo=vehiculo,
+                placa_detectada=vehiculo.placa,
+                estado=RegistroAccesoVehicular.ESTADO_APROBADO,
+            )
+            ReporteIncidenteSeguridad.objects.create(
+                residente=residente, ubicacion="Portón", guardia_asignado=self.guardia
+            )
+
+    def _consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(consultas), response.json()
+
+    def test_consultas_constantes_al_crecer_las_filas(self):
+        for url in ("/api/seguridad/accesos/", "/api/seguridad/incidentes/"):
+            with self.subTest(url=url):
+                self.creados = 0
+                RegistroAccesoVehicular.objects.all().delete()
+                ReporteIncidenteSeguridad.objects.all().delete()
+                Vehiculo.objects.all().delete()
+                Residente.objects.all().delete()
+                Vivienda.objects.all().delete()
+
+                self._agregar_filas(2)
+                self._consultas(url)  # deja resuelto el actor en caché
+                pocas, _ = self._consultas(url)
+                self._agregar_filas(10)
+                muchas, data = self._consultas(url)
+
+                self.assertEqual(len(data), 12)
+                self.assertEqual(pocas, muchas)
+
+    def test_vivienda_activa_en_la_respuesta(self):
+        self._agregar_filas(1)
+        residente = Residente.objects.get()
+        anterior = ResidenteVivienda.objects.get()
+        anterior.fecha_hasta = timezone.localdate()
+        anterior.save()
+        nueva = Vivienda.objects.create(
+            condominio=self.condominio, codigo_unidad="N-NUEVA", bloque="N", numero="99"
+        )
+        ResidenteVivienda.objects.create(
+            residente=residente, vivienda=nueva, fecha_desde=timezone.localdate()
+        )
+
+        _, accesos = self._consultas("/api/seguridad/accesos/")
+        self.assertEqual(accesos[0]["residente"]["vivienda"], "N-NUEVA")
+        self.assertEqual(accesos[0]["vehiculo"]["residente"]["vivienda"]["codigo_unidad"], "N-NUEVA")
+        _, incidentes = self._consultas("/api/seguridad/incidentes/")
+        self.assertEqual(incidentes[0]["residente"]["codigo_vivienda"], "N-NUEVA")
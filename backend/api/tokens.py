@@ -0,0 +1,125 @@
+"""Claims del actor dentro de los JWT.
+
+Los tokens emitidos por ``/api/token/`` llevan ``usuario_id``, ``roles``,
+``residente_id``, ``vivienda_id`` y ``token_version``. Los permisos leen los
+roles del token sin ir a la base de datos; para poder revocarlos, cada
+``Usuario`` tiene un ``token_version`` que se incrementa al cambiar sus roles o
+su vivienda; un token con una versión anterior deja de valer para los chequeos
+por claims (se vuelve a resolver el actor) y el refresh emite claims nuevos.
+
+La versión vigente no se guarda en caché: la autenticación la lee de la base
+una vez por petición (``version_de_peticion``), de modo que una revocación
+vale en todos los procesos desde la petición siguiente.
+"""
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from .actor import resolver_actor, version_de_peticion
+from .models import Residente, ResidenteVivienda, Usuario, UsuarioRol
+
+CLAIM_VERSION = "token_version"
+
+
+def version_vigente(usuario_id):
+    """Versión de token vigente para el usuario."""
+    return (
+        Usuario.objects.filter(pk=usuario_id)
+        .values_list("token_version", flat=True)
+        .first()
+    )
+
+
+def incrementar_version(usuario_id):
+    """Invalida los claims de los tokens ya emitidos para el usuario."""
+    if usuario_id is None:
+        return
+    Usuario.objects.filter(pk=usuario_id).update(token_version=F("token_version") + 1)
+
+
+def claims_de_actor(actor):
+    return {
+        "usuario_id": str(actor.usuario_id) if actor.usuario_id else None,
+        "roles": sorted(actor.roles),
+        "residente_id": str(actor.residente_id) if actor.residente_id else None,
+        "vivienda_id": str(actor.vivienda_id) if actor.vivienda_id else None,
+        CLAIM_VERSION: version_vigente(actor.usuario_id) if actor.usuario_id else None,
+    }
+
+
+def roles_del_token(token, request=None):
+    """Roles del token si sus claims siguen vigentes; ``None`` si hay que resolverlos.
+
+    Con ``request`` la versión vigente es la que la petición ya leyó de la base.
+    """
+    if token is None:
+        return None
+    try:
+        roles = token["roles"]
+        usuario_id = token["usuario_id"]
+        version = token[CLAIM_VERSION]
+    except KeyError:
+        return None
+    if usuario_id is None or version is None:
+        return None
+    vigente = version_de_peticion(request) if request is not None else version_vigente(usuario_id)
+    if vigente != version:
+        return None
+    return frozenset(roles)
+
+
+class TokenActorObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for clave, valor in claims_de_actor(resolver_actor(user)).items():
+            token[clave] = valor
+        return token
+
+
+class TokenActorRefreshSerializer(TokenRefreshSerializer):
+    """Al refrescar, el access token recibe los claims actuales del usuario."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        refresh = self.token_class(data.get("refresh", attrs["refresh"]))
+        user_id = refresh[api_settings.USER_ID_CLAIM]
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None:
+            return data
+
+        access = refresh.access_token
+        for clave, valor in claims_de_actor(resolver_actor(user)).items():
+            access[clave] = valor
+        data["access"] = str(access)
+        return data
+
+
+@receiver(post_save, sender=UsuarioRol)
+@receiver(post_delete, sender=UsuarioRol)
+def _roles_cambiados(sender, instance, **kwargs):
+    incrementar_version(instance.usuario_id)
+
+
+@receiver(post_save, sender=Residente)
+@receiver(post_delete, sender=Residente)
+def _residente_cambiado(sender, instance, **kwargs):
+    incrementar_version(instance.usuario_id)
+
+
+@receiver(post_save, sender=ResidenteVivienda)
+@receiver(post_delete, sender=ResidenteVivienda)
+def _residencia_cambiada(sender, instance, **kwargs):
+    usuario_id = (
+        Residente.objects.filter(pk=instance.residente_id)
+        .values_list("usuario_id", flat=True)
+        .first()
+    )
+    incrementar_version(usuario_id)
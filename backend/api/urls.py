@@ -14,6 +14,7 @@ from .views import (
     perfil,
     cambiar_password,
     registrar_fcm_token,
+    metricas_push_outbox,
 )
 from .security.views import (
     RegistroAccesoVehicularViewSet,
@@ -24,6 +25,7 @@ from .security.views import (
     incidentes_event_stream,
 )
 from .finanzas.views import (
+    busqueda_admin,
     catalogo_multa_detalle,
     catalogo_multas,
     codigo_qr_admin,
@@ -36,7 +38,9 @@ from .finanzas.views import (
     factura_admin_detalle,
     factura_admin_pdf,
     facturas_admin,
+    facturas_admin_pdf_lote,
     generar_facturas_admin,
+    generar_facturas_admin_estado,
     marcar_notificacion_leida,
     lista_facturas,
     multas_aplicadas,
@@ -63,6 +67,8 @@ router.register(r'seguridad/incidentes', ReporteIncidenteSeguridadViewSet, basen
 router.register(r'seguridad/categorias', CategoriaIncidenteSeguridadViewSet, basename='seguridad-categorias')
 
 urlpatterns = [
+    # Antes del router: si no, "stream" se toma como pk del detalle de incidentes.
+    path('seguridad/incidentes/stream/', incidentes_event_stream),
     path('', include(router.urls)),
     path('recuperar-password/', recuperar_password),
     path('reset-password/', reset_password),
@@ -70,15 +76,17 @@ urlpatterns = [
     path('perfil/', perfil),
     path('seguridad/reportes/resumen/', resumen_seguridad),
     path('seguridad/reportes/resumen/pdf/', exportar_resumen_pdf),
-    path('seguridad/incidentes/stream/', incidentes_event_stream),
     path('finanzas/resumen/', resumen_finanzas),
     path('finanzas/admin/resumen/', resumen_finanzas_admin),
+    path('finanzas/admin/busqueda/', busqueda_admin),
     path('finanzas/admin/facturas/', facturas_admin),
+    path('finanzas/admin/facturas/pdf-lote/', facturas_admin_pdf_lote),
     path('finanzas/admin/facturas/<uuid:pk>/', factura_admin_detalle),
     path('finanzas/admin/facturas/<uuid:pk>/pdf/', factura_admin_pdf),
     path('finanzas/admin/facturas/<uuid:pk>/registrar-pago/', registrar_pago_manual),
     path('finanzas/admin/facturas/<uuid:factura_pk>/pagos/<uuid:pago_pk>/resolver/', resolver_pago_revision),
     path('finanzas/admin/generar-facturas/', generar_facturas_admin),
+    path('finanzas/admin/generar-facturas/<uuid:pk>/', generar_facturas_admin_estado),
     path('finanzas/admin/codigo-qr/', codigo_qr_admin),
     path('finanzas/admin/notificaciones/', notificaciones_directas_admin),
     path('finanzas/facturas/', lista_facturas),
@@ -99,4 +107,5 @@ urlpatterns = [
 
 urlpatterns += [
     path('fcm/registrar/', registrar_fcm_token),
+    path('push/outbox/metricas/', metricas_push_outbox),
 ]
@@ -16,7 +16,6 @@ from rest_framework.response import Response
 from .models import (
     Rol,
     Usuario,
-    UsuarioRol,
     Vivienda,
     Residente,
     Vehiculo,
@@ -29,9 +28,12 @@ from .serializers import (
     RolSerializer, UsuarioSerializer, ViviendaSerializer,
     ResidenteSerializer, VehiculoSerializer, AvisoSerializer, CondominioSerializer,
     FCMDeviceSerializer,
+    prefetch_vivienda_activa,
+    relaciones_usuario,
 )
-from .permissions import IsAdmin
-from .fcm_utils import send_fcm_notification
+from .actor import obtener_actor
+from .permissions import IsAdmin, roles_de_peticion
+from .push import metricas_outbox, programar_push
 
 # --- ROLES ---
 class RolViewSet(viewsets.ModelViewSet):
@@ -46,7 +48,7 @@ class RolViewSet(viewsets.ModelViewSet):
 
 # --- USUARIOS ---
 class UsuarioViewSet(viewsets.ModelViewSet):
-    queryset = Usuario.objects.all()
+    queryset = relaciones_usuario(Usuario.objects.all())
     serializer_class = UsuarioSerializer
     permission_classes = [IsAuthenticated]
 
@@ -68,7 +70,7 @@ class ViviendaViewSet(viewsets.ModelViewSet):
 
 # --- RESIDENTES ---
 class ResidenteViewSet(viewsets.ModelViewSet):
-    queryset = Residente.objects.all()
+    queryset = Residente.objects.prefetch_related(prefetch_vivienda_activa())
     serializer_class = ResidenteSerializer
     permission_classes = [IsAuthenticated]
 
@@ -87,7 +89,9 @@ class ResidenteViewSet(viewsets.ModelViewSet):
 
 # --- VEHICULOS ---
 class VehiculoViewSet(viewsets.ModelViewSet):
-    queryset = Vehiculo.objects.all()
+    queryset = Vehiculo.objects.select_related("residente").prefetch_related(
+        prefetch_vivienda_activa("residente")
+    )
     serializer_class = VehiculoSerializer
     permission_classes = [IsAuthenticated]
 
@@ -104,11 +108,10 @@ class AvisoViewSet(viewsets.ModelViewSet):
         return [IsAdmin()]
 
     def get_queryset(self):
-        usuario = self._current_usuario()
-        es_admin = self._usuario_es_admin(usuario)
+        es_admin = "ADM" in roles_de_peticion(self.request)
 
         queryset = (
-            Aviso.objects.select_related("autor_usuario__user")
+            relaciones_usuario(Aviso.objects.all(), "autor_usuario__")
             .order_by(
                 F("fecha_publicacion").desc(nulls_last=True),
                 "-fecha_creacion",
@@ -128,7 +131,7 @@ class AvisoViewSet(viewsets.ModelViewSet):
         return queryset
 
     def perform_create(self, serializer):
-        usuario = self._current_usuario()
+        usuario = obtener_actor(self.request).usuario
         if not usuario:
             raise ValueError("No existe perfil de Usuario vinculado al auth_user actual")
         serializer.save(
@@ -150,43 +153,21 @@ class AvisoViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(aviso)
 
-        for residente in self._residentes_activos_con_usuario():
-            enviar_push_a_usuario(
-                residente.usuario,
-                f"Aviso publicado: {aviso.titulo}",
-                aviso.contenido,
-                data={"tipo": "aviso_publicado", "aviso_id": str(aviso.id)}
-            )
+        programar_push(
+            Usuario.objects.filter(residente__estado=1),
+            f"Aviso publicado: {aviso.titulo}",
+            aviso.contenido,
+            data={"tipo": "aviso_publicado", "aviso_id": str(aviso.id)},
+        )
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def _current_usuario(self):
-        if not self.request.user or not self.request.user.is_authenticated:
-            return None
-        return Usuario.objects.filter(user=self.request.user).first()
-
-    def _usuario_es_admin(self, usuario):
-        if not usuario:
-            return False
-        return UsuarioRol.objects.filter(
-            usuario=usuario,
-            rol__nombre="ADM",
-            estado=1,
-        ).exists()
-
-    def _residentes_activos_con_usuario(self):
-        return (
-            Residente.objects.filter(estado=1, usuario__isnull=False)
-            .select_related("usuario")
-        )
-
 # --- PERFIL ---
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def perfil(request):
-    try:
-        usuario = Usuario.objects.get(user=request.user)
-    except Usuario.DoesNotExist:
+    usuario = obtener_actor(request).usuario
+    if usuario is None:
         return Response({"detail": "Perfil de usuario no encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
     serializer = UsuarioSerializer(usuario)
@@ -425,19 +406,7 @@ def registrar_fcm_token(request):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-def enviar_push_a_usuario(usuario, title, body, data=None):
-    import logging
-    logger = logging.getLogger("fcm")
-    devices = FCMDevice.objects.filter(usuario=usuario)
-    if not devices:
-        print(f"[FCM] Usuario {usuario} no tiene dispositivos FCM registrados.")
-    for device in devices:
-        try:
-            print(f"[FCM] Intentando enviar push a token: {device.token} | title: {title}")
-            logger.info(f"Intentando enviar push a token: {device.token} | title: {title}")
-            response = send_fcm_notification(device.token, title, body, data)
-            print(f"[FCM] Push enviado correctamente a {device.token}: {response}")
-            logger.info(f"Push enviado correctamente a {device.token}: {response}")
-        except Exception as e:
-            print(f"[FCM] Error enviando push a {device.token}: {e}")
-            logger.error(f"Error enviando push a {device.token}: {e}")
+@api_view(["GET"])
+@permission_classes([IsAdmin])
+def metricas_push_outbox(request):
+    return Response(metricas_outbox())
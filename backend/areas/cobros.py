@@ -0,0 +1,186 @@
+"""Facturas y pagos de reservas en lote.
+
+``LoteFacturas`` prepara las facturas de varias reservas con un número fijo de
+consultas: busca la vivienda de todos los usuarios de una vez e inserta las
+facturas con ``bulk_create``. Una reserva con costo que no se puede facturar
+(el usuario no tiene vivienda, o la vivienda ya tiene una factura de reserva
+ese mes) no se aprueba.
+
+``conciliar_pagos`` recorre en lotes las reservas aprobadas con factura y
+marca como pagadas (reserva y factura) las que ya tienen pagos que cubren el
+monto, o cuya factura se saldó por otro camino (por ejemplo, un pago manual
+desde finanzas).
+
+Como las escrituras en lote no disparan señales, ``LoteFacturas.guardar`` y
+``conciliar_pagos`` actualizan por su cuenta el resumen financiero.
+``conciliar_pagos`` también actualiza el resumen de uso de áreas; con
+``LoteFacturas`` lo hace quien guarda las reservas.
+"""
+
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from api.finanzas.resumen import actualizar_resumen_finanzas, buckets_de_factura
+from api.models import Factura, Pago, ResidenteVivienda
+
+from . import uso
+from .models import Reserva
+
+TIPO_FACTURA = "reserva"
+
+
+def _viviendas_por_usuario(usuario_ids):
+    """``{usuario_id: (vivienda_id, condominio_id)}`` con la primera vivienda de cada residente."""
+    viviendas = {}
+    filas = (
+        ResidenteVivienda.objects.filter(residente__usuario_id__in=usuario_ids)
+        .order_by("residente_id", "id")
+        .values_list("residente__usuario_id", "vivienda_id", "vivienda__condominio_id")
+    )
+    for usuario_id, vivienda_id, condominio_id in filas:
+        viviendas.setdefault(usuario_id, (vivienda_id, condominio_id))
+    return viviendas
+
+
+class LoteFacturas:
+    """Facturas de reserva de un grupo de reservas, con un número fijo de consultas.
+
+    Al crearlo busca de una vez la vivienda de cada usuario y los periodos en
+    que esas viviendas ya tienen factura de reserva. ``agregar`` decide en
+    memoria si una reserva se puede facturar y ``guardar`` inserta todas las
+    facturas con ``bulk_create``. Quien llama guarda ``factura`` en las reservas.
+    """
+
+    def __init__(self, reservas):
+        self.facturas = {}
+        self._buckets = set()
+        pendientes = [reserva for reserva in reservas if self._requiere_factura(reserva)]
+        self._viviendas = _viviendas_por_usuario({reserva.usuario_id for reserva in pendientes})
+        self._ocupados = set()
+        if pendientes and self._viviendas:
+            self._ocupados = set(
+                Factura.objects.filter(
+                    tipo=TIPO_FACTURA,
+                    vivienda_id__in={vivienda_id for vivienda_id, _condominio in self._viviendas.values()},
+                    periodo__in={str(reserva.fecha)[:7] for reserva in pendientes},
+                ).values_list("vivienda_id", "periodo")
+            )
+
+    @staticmethod
+    def _requiere_factura(reserva):
+        return not reserva.factura_id and reserva.area_comun.costo
+
+    def agregar(self, reserva):
+        """Prepara la factura de ``reserva``; devuelve el motivo si no se puede facturar.
+
+        Las reservas que ya tienen factura o cuya área no tiene costo no
+        necesitan una y devuelven ``None``.
+        """
+        if not self._requiere_factura(reserva):
+            return None
+        if reserva.usuario_id not in self._viviendas:
+            return "El usuario no tiene una vivienda asociada"
+        vivienda_id, condominio_id = self._viviendas[reserva.usuario_id]
+        periodo = str(reserva.fecha)[:7]  # yyyy-mm
+        # (vivienda, periodo, tipo) es único en Factura.
+        if (vivienda_id, periodo) in self._ocupados:
+            return f"La vivienda ya tiene una factura de reserva en {periodo}"
+        self._ocupados.add((vivienda_id, periodo))
+        factura = Factura(
+            vivienda_id=vivienda_id,
+            periodo=periodo,
+            monto=reserva.area_comun.costo,
+            tipo=TIPO_FACTURA,
+            estado=Factura.ESTADO_PENDIENTE,
+        )
+        self.facturas[reserva.id] = factura
+        reserva.factura = factura
+        self._buckets |= buckets_de_factura(factura, condominio_id)
+        return None
+
+    def guardar(self):
+        """Inserta las facturas agregadas; devuelve ``{reserva_id: factura}``."""
+        if self.facturas:
+            Factura.objects.bulk_create(self.facturas.values())
+            actualizar_resumen_finanzas(self._buckets)
+        return self.facturas
+
+
+def _conciliar_lote(filas):
+    factura_ids = [factura_id for _pk, factura_id, *_resto in filas]
+    pagos = {
+        fila["factura_id"]: fila
+        for fila in Pago.objects.filter(factura_id__in=factura_ids)
+        .exclude(estado=Pago.ESTADO_RECHAZADO)
+        .order_by()
+        .values("factura_id")
+        .annotate(total=Sum("monto_pagado"), ultimo=Max("fecha_pago"))
+    }
+
+    reservas_pagadas, facturas_saldadas = [], []
+    buckets_uso, buckets_finanzas = set(), set()
+    for pk, factura_id, area_id, fecha, monto, estado, vivienda_id, condominio_id, periodo, vencimiento in filas:
+        pago = pagos.get(factura_id)
+        cubierta = pago is not None and pago["total"] >= monto
+        if estado != Factura.ESTADO_PAGADA and not cubierta:
+            continue
+        reservas_pagadas.append(pk)
+        buckets_uso.add((area_id, fecha))
+        if estado == Factura.ESTADO_PAGADA:
+            continue
+        factura = Factura(
+            pk=factura_id,
+            vivienda_id=vivienda_id,
+            periodo=periodo,
+            fecha_vencimiento=vencimiento,
+            estado=Factura.ESTADO_PAGADA,
+            fecha_pago=timezone.localdate(pago["ultimo"]),
+        )
+        facturas_saldadas.append(factura)
+        buckets_finanzas |= buckets_de_factura(factura, condominio_id)
+
+    if facturas_saldadas:
+        Factura.objects.bulk_update(facturas_saldadas, ["estado", "fecha_pago"])
+        actualizar_resumen_finanzas(buckets_finanzas)
+    if reservas_pagadas:
+        Reserva.objects.filter(pk__in=reservas_pagadas, estado="aprobada").update(estado="pagada")
+        uso.actualizar_uso(buckets_uso)
+    return len(reservas_pagadas)
+
+
+def conciliar_pagos(reservas=None, lote=500):
+    """Marca como pagadas las reservas aprobadas cuya factura está cubierta.
+
+    Una factura está cubierta si la suma de sus pagos no rechazados alcanza el
+    monto, o si ya figura como pagada. ``reservas`` limita la revisión a un
+    queryset o a una lista de ids. Procesa de a ``lote`` reservas, cada lote
+    en su propia transacción, y devuelve cuántas se marcaron como pagadas.
+    """
+    candidatas = Reserva.objects.filter(estado="aprobada", factura__isnull=False).exclude(
+        factura__estado=Factura.ESTADO_CANCELADA
+    )
+    if reservas is not None:
+        candidatas = candidatas.filter(pk__in=reservas)
+    candidatas = candidatas.order_by("pk").values_list(
+        "pk",
+        "factura_id",
+        "area_comun_id",
+        "fecha",
+        "factura__monto",
+        "factura__estado",
+        "factura__vivienda_id",
+        "factura__vivienda__condominio_id",
+        "factura__periodo",
+        "factura__fecha_vencimiento",
+    )
+
+    conciliadas, ultimo = 0, None
+    while True:
+        pagina = candidatas.filter(Q(pk__gt=ultimo) if ultimo is not None else Q())[:lote]
+        filas = list(pagina)
+        if not filas:
+            return conciliadas
+        with transaction.atomic():
+            conciliadas += _conciliar_lote(filas)
+        ultimo = filas[-1][0]
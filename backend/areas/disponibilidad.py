@@ -0,0 +1,213 @@
+"""Disponibilidad de áreas comunes.
+
+Para cada ``(área, día)`` se guarda una ``AgendaDia``: las reservas que ocupan
+el área (aprobadas o pagadas), ordenadas por hora de inicio, con el máximo
+acumulado de las horas de fin. Con eso, un solapamiento se resuelve con una
+búsqueda binaria (``bisect``) en lugar de una consulta, y los huecos libres se
+obtienen recorriendo la lista una vez.
+
+Las agendas se cachean por proceso durante ``AREAS_DISPONIBILIDAD_TTL``
+segundos. Las señales de ``Reserva`` invalidan las del área cuando se crea,
+modifica o borra una reserva. Otros procesos se enteran al vencer el TTL, así
+que las escrituras vuelven a verificar contra la base con el área bloqueada
+(``reservas.con_area_bloqueada``), y la restricción de exclusión
+``reserva_sin_solapamiento`` de PostgreSQL queda como última barrera.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from datetime import time as dt_time, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import IntegrityError
+
+from .models import Reserva
+
+ESTADOS_OCUPAN = ("aprobada", "pagada")
+RESTRICCION_SOLAPAMIENTO = "reserva_sin_solapamiento"
+MAX_DIAS = 62
+MAX_ENTRADAS = 4096
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _segundos(hora):
+    return hora.hour * 3600 + hora.minute * 60 + hora.second
+
+
+def _hora(segundos):
+    if segundos >= 24 * 3600:
+        return "24:00"
+    return dt_time(segundos // 3600, segundos % 3600 // 60, segundos % 60).strftime(
+        "%H:%M:%S" if segundos % 60 else "%H:%M"
+    )
+
+
+def _tramo(inicio, fin):
+    return {"hora_inicio": _hora(inicio), "hora_fin": _hora(fin)}
+
+
+class AgendaDia:
+    """Reservas que ocupan un área en un día, en segundos desde las 00:00."""
+
+    def __init__(self, reservas=()):
+        ordenadas = sorted(reservas)
+        self.inicios = [inicio for inicio, _fin, _id in ordenadas]
+        self.fines = [fin for _inicio, fin, _id in ordenadas]
+        self.ids = [reserva_id for _inicio, _fin, reserva_id in ordenadas]
+        # fin_maximo[i] es la mayor hora de fin entre las reservas 0..i: al
+        # retroceder desde el punto de corte se puede parar en cuanto no alcanza.
+        self.fin_maximo = list(accumulate(self.fines, max))
+
+    def solapadas(self, inicio, fin, excluir=None):
+        """Ids de las reservas que se cruzan con ``[inicio, fin)``."""
+        encontradas = []
+        indice = bisect_left(self.inicios, fin) - 1
+        while indice >= 0 and self.fin_maximo[indice] > inicio:
+            if self.fines[indice] > inicio and self.ids[indice] != excluir:
+                encontradas.append(self.ids[indice])
+            indice -= 1
+        return encontradas
+
+    def ocupado(self):
+        """Tramos ocupados, con las reservas contiguas o superpuestas fusionadas."""
+        tramos = []
+        for inicio, fin in zip(self.inicios, self.fines):
+            if tramos and inicio <= tramos[-1][1]:
+                tramos[-1][1] = max(tramos[-1][1], fin)
+            else:
+                tramos.append([inicio, fin])
+        return tramos
+
+    def libre(self, apertura, cierre, duracion=0):
+        """Huecos dentro de ``[apertura, cierre)`` de al menos ``duracion`` segundos."""
+        huecos = []
+        cursor = apertura
+        for inicio, fin in self.ocupado():
+            if fin <= cursor:
+                continue
+            if inicio >= cierre:
+                break
+            if inicio > cursor:
+                huecos.append((cursor, inicio))
+            cursor = max(cursor, fin)
+        if cursor < cierre:
+            huecos.append((cursor, cierre))
+        return [(inicio, fin) for inicio, fin in huecos if fin - inicio >= max(duracion, 1)]
+
+
+def _ttl():
+    return getattr(settings, "AREAS_DISPONIBILIDAD_TTL", 300)
+
+
+def agendas(area_id, desde, hasta, refrescar=False):
+    """``{fecha: AgendaDia}`` de ``desde`` a ``hasta`` (inclusive).
+
+    Los días que no están en caché se cargan con una sola consulta; con
+    ``refrescar`` se cargan todos desde la base.
+    """
+    fechas = [desde + timedelta(days=dias) for dias in range((hasta - desde).days + 1)]
+    ahora = time.monotonic()
+    resultado = {}
+    if not refrescar:
+        with _lock:
+            for fecha in fechas:
+                entrada = _cache.get((area_id, fecha))
+                if entrada and entrada[0] > ahora:
+                    resultado[fecha] = entrada[1]
+
+    faltantes = [fecha for fecha in fechas if fecha not in resultado]
+    if not faltantes:
+        return resultado
+
+    por_dia = {fecha: [] for fecha in faltantes}
+    filas = (
+        Reserva.objects.filter(
+            area_comun_id=area_id,
+            fecha__gte=min(faltantes),
+            fecha__lte=max(faltantes),
+            estado__in=ESTADOS_OCUPAN,
+        )
+        .order_by()
+        .values_list("fecha", "hora_inicio", "hora_fin", "id")
+    )
+    for fecha, hora_inicio, hora_fin, reserva_id in filas:
+        if fecha in por_dia:
+            por_dia[fecha].append((_segundos(hora_inicio), _segundos(hora_fin), reserva_id))
+
+    expira = ahora + _ttl()
+    with _lock:
+        if len(_cache) + len(por_dia) > MAX_ENTRADAS:
+            _cache.clear()
+        for fecha, reservas in por_dia.items():
+            agenda = AgendaDia(reservas)
+            _cache[(area_id, fecha)] = (expira, agenda)
+            resultado[fecha] = agenda
+    return resultado
+
+
+def invalidar(area_id=None):
+    """Descarta las agendas de un área, o todas sin ``area_id``."""
+    with _lock:
+        if area_id is None:
+            _cache.clear()
+            return
+        for clave in [clave for clave in _cache if clave[0] == area_id]:
+            del _cache[clave]
+
+
+def solapadas(area_id, fecha, hora_inicio, hora_fin, excluir=None, refrescar=False):
+    """Ids de reservas aprobadas o pagadas que se cruzan con el horario.
+
+    Con ``refrescar`` se lee la base en lugar de la caché; es lo que corresponde
+    dentro de ``reservas.con_area_bloqueada``.
+    """
+    agenda = agendas(area_id, fecha, fecha, refrescar=refrescar)[fecha]
+    return agenda.solapadas(_segundos(hora_inicio), _segundos(hora_fin), excluir=excluir)
+
+
+def _horario_atencion():
+    apertura = getattr(settings, "AREAS_HORA_APERTURA", "06:00")
+    cierre = getattr(settings, "AREAS_HORA_CIERRE", "23:00")
+    return (
+        _segundos(dt_time.fromisoformat(apertura)),
+        24 * 3600 if cierre == "24:00" else _segundos(dt_time.fromisoformat(cierre)),
+    )
+
+
+def disponibilidad(area_id, desde, hasta, duracion_minutos=0):
+    """Tramos ocupados y libres por día entre ``desde`` y ``hasta`` (inclusive).
+
+    Los libres se limitan al horario ``AREAS_HORA_APERTURA``-``AREAS_HORA_CIERRE``
+    y a huecos de al menos ``duracion_minutos``. Lanza ``ValueError`` si el
+    rango está invertido o supera ``MAX_DIAS``.
+    """
+    if hasta < desde:
+        raise ValueError("'hasta' debe ser posterior o igual a 'desde'.")
+    if (hasta - desde).days + 1 > MAX_DIAS:
+        raise ValueError(f"El rango no puede superar {MAX_DIAS} días.")
+
+    apertura, cierre = _horario_atencion()
+    por_fecha = agendas(area_id, desde, hasta)
+    return [
+        {
+            "fecha": fecha.isoformat(),
+            "ocupado": [_tramo(inicio, fin) for inicio, fin in agenda.ocupado()],
+            "libre": [
+                _tramo(inicio, fin)
+                for inicio, fin in agenda.libre(apertura, cierre, duracion_minutos * 60)
+            ],
+        }
+        for fecha, agenda in sorted(por_fecha.items())
+    ]
+
+
+def es_solapamiento(exc):
+    """Indica si ``exc`` viene de la restricción de exclusión de reservas."""
+    if not isinstance(exc, IntegrityError):
+        return False
+    diag = getattr(exc.__cause__, "diag", None)
+    return getattr(diag, "constraint_name", None) == RESTRICCION_SOLAPAMIENTO
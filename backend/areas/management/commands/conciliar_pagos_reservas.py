@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from areas.cobros import conciliar_pagos
+
+
+class Command(BaseCommand):
+    help = "Marca como pagadas las reservas aprobadas cuyos pagos ya cubren la factura"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=500,
+            help="Reservas revisadas por consulta.",
+        )
+
+    def handle(self, *args, **options):
+        conciliadas = conciliar_pagos(lote=max(options["lote"], 1))
+        if conciliadas:
+            self.stdout.write(self.style.SUCCESS(f"{conciliadas} reservas marcadas como pagadas."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No hay reservas por conciliar."))
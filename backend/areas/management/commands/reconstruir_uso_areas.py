@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from areas.uso import reconstruir_uso
+
+
+class Command(BaseCommand):
+    help = "Recalcula el resumen diario de uso de las áreas comunes desde las reservas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Solo informa las diferencias con lo almacenado, sin escribir.",
+        )
+        parser.add_argument("--desde", help="Primer día a revisar (YYYY-MM-DD).")
+        parser.add_argument("--hasta", help="Último día a revisar (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        rango = {}
+        for nombre in ("desde", "hasta"):
+            if options[nombre]:
+                rango[nombre] = parse_date(options[nombre])
+                if rango[nombre] is None:
+                    raise CommandError(f"--{nombre} debe tener el formato YYYY-MM-DD")
+
+        aplicar = not options["check"]
+        with transaction.atomic():
+            diferencias = reconstruir_uso(aplicar=aplicar, **rango)
+
+        for area_id, fecha, campo, almacenado, calculado in diferencias:
+            self.stdout.write(
+                f"{area_id} {fecha.isoformat()} {campo}: almacenado={almacenado} calculado={calculado}"
+            )
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("El resumen de uso de áreas está al día."))
+        elif aplicar:
+            self.stdout.write(
+                self.style.SUCCESS(f"Resumen reconstruido ({len(diferencias)} diferencias corregidas).")
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"{len(diferencias)} diferencias encontradas.")
+            )
@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from areas.disponibilidad import ESTADOS_OCUPAN
+from areas.models import Reserva
+
+
+class Command(BaseCommand):
+    help = (
+        "Lista las reservas aprobadas o pagadas que se solapan (impiden crear la "
+        "restricción reserva_sin_solapamiento)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--corregir",
+            action="store_true",
+            help="Devuelve a pendiente la reserva más reciente de cada choque.",
+        )
+
+    def handle(self, *args, **options):
+        reservas = (
+            Reserva.objects.filter(estado__in=ESTADOS_OCUPAN)
+            .order_by("area_comun_id", "fecha", "id")
+            .only("id", "area_comun_id", "fecha", "hora_inicio", "hora_fin", "estado")
+        )
+        # Se conservan las reservas en el orden en que se crearon; la que choca
+        # con una ya conservada es la más reciente del par.
+        conservadas = defaultdict(list)
+        solapadas = []
+        for reserva in reservas.iterator():
+            if reserva.hora_fin <= reserva.hora_inicio:
+                continue
+            dia = conservadas[(reserva.area_comun_id, reserva.fecha)]
+            choque = next(
+                (otra for otra in dia if reserva.hora_inicio < otra.hora_fin and otra.hora_inicio < reserva.hora_fin),
+                None,
+            )
+            if choque is None:
+                dia.append(reserva)
+                continue
+            solapadas.append(reserva)
+            self.stdout.write(
+                f"Reserva {reserva.id} ({reserva.estado}) se solapa con {choque.id}: área "
+                f"{reserva.area_comun_id}, {reserva.fecha} {reserva.hora_inicio}-{reserva.hora_fin}"
+            )
+
+        if not solapadas:
+            self.stdout.write(self.style.SUCCESS("No hay reservas solapadas."))
+            return
+        if not options["corregir"]:
+            self.stdout.write(self.style.WARNING(f"{len(solapadas)} reservas solapadas."))
+            return
+
+        with transaction.atomic():
+            for reserva in solapadas:
+                reserva.estado = "pendiente"
+                # Las señales actualizan la caché de disponibilidad y el resumen de uso.
+                reserva.save(update_fields=["estado"])
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(solapadas)} reservas devueltas a pendiente.")
+        )
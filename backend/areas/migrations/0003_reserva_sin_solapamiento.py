@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# Sin btree_gist, la igualdad de área se expresa como solapamiento de rangos
+# de un solo valor: GiST indexa rangos sin extensiones.
+CREAR_RESTRICCION = """
+ALTER TABLE areas_reserva ADD CONSTRAINT reserva_sin_solapamiento EXCLUDE USING gist (
+    int8range(area_comun_id, area_comun_id, '[]') WITH &&,
+    tsrange(fecha + hora_inicio, fecha + hora_fin, '[)') WITH &&
+) WHERE (estado IN ('aprobada', 'pagada') AND hora_fin > hora_inicio)
+"""
+
+SOLAPADAS = """
+SELECT a.id, b.id FROM areas_reserva a
+JOIN areas_reserva b ON b.area_comun_id = a.area_comun_id AND b.fecha = a.fecha AND b.id > a.id
+WHERE a.estado IN ('aprobada', 'pagada') AND b.estado IN ('aprobada', 'pagada')
+  AND a.hora_fin > a.hora_inicio AND b.hora_fin > b.hora_inicio
+  AND a.hora_inicio < b.hora_fin AND b.hora_inicio < a.hora_fin
+ORDER BY a.id, b.id
+LIMIT 20
+"""
+
+
+def crear_restriccion(apps, schema_editor):
+    """Crea la restricción de exclusión si la base es PostgreSQL.
+
+    Si ya hay reservas aprobadas que se solapan la migración falla: la
+    restricción es la garantía principal contra solapamientos y no puede
+    faltar sin que nadie lo note.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(SOLAPADAS)
+        pares = cursor.fetchall()
+        if pares:
+            listado = ", ".join(f"{a}/{b}" for a, b in pares)
+            raise RuntimeError(
+                "No se puede crear reserva_sin_solapamiento: hay reservas aprobadas o pagadas que se "
+                f"solapan (pares de ids: {listado}). Corríjalas antes de migrar; "
+                "'python manage.py revisar_solapamientos' las lista y con --corregir devuelve a "
+                "pendiente la más reciente de cada choque."
+            )
+        cursor.execute(CREAR_RESTRICCION)
+
+
+def eliminar_restriccion(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE areas_reserva DROP CONSTRAINT IF EXISTS reserva_sin_solapamiento")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0002_imagenarea'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_restriccion, eliminar_restriccion),
+    ]
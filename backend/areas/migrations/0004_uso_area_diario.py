@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0003_reserva_sin_solapamiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsoAreaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('reservas', models.PositiveIntegerField(default=0)),
+                ('pendientes', models.PositiveIntegerField(default=0)),
+                ('confirmadas', models.PositiveIntegerField(default=0)),
+                ('rechazadas', models.PositiveIntegerField(default=0)),
+                ('minutos_ocupados', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cobrado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('minutos_por_hora', models.JSONField(default=list)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('area_comun', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uso_diario', to='areas.areacomun')),
+            ],
+            options={
+                'ordering': ('fecha',),
+                'unique_together': {('area_comun', 'fecha')},
+            },
+        ),
+    ]
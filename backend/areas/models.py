@@ -42,3 +42,27 @@ class Reserva(models.Model):
     
 
 
+
+#RESUMEN DIARIO DE USO POR ÁREA
+class UsoAreaDiario(models.Model):
+    """Reservas, ocupación e ingresos de un área en un día, mantenidos de forma incremental."""
+
+    area_comun = models.ForeignKey(AreaComun, on_delete=models.CASCADE, related_name="uso_diario")
+    fecha = models.DateField()
+    reservas = models.PositiveIntegerField(default=0)
+    pendientes = models.PositiveIntegerField(default=0)
+    confirmadas = models.PositiveIntegerField(default=0)
+    rechazadas = models.PositiveIntegerField(default=0)
+    minutos_ocupados = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cobrado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Minutos ocupados en cada hora del día (24 valores, de 00 a 23).
+    minutos_por_hora = models.JSONField(default=list)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("area_comun", "fecha")
+        ordering = ("fecha",)
+
+    def __str__(self):
+        return f"{self.area_comun_id} - {self.fecha}"
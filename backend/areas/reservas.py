@@ -0,0 +1,166 @@
+"""Reservar y aprobar horarios sin carreras.
+
+``con_area_bloqueada(area_id, funcion)`` ejecuta ``funcion`` en una
+transacción que primero toma el advisory lock del área
+(``pg_advisory_xact_lock``). Así, la verificación de solapamiento y la
+escritura de dos peticiones sobre la misma área se ejecutan una después de la
+otra, y la segunda ve lo que guardó la primera. Áreas distintas no se
+bloquean entre sí. El lock se libera al terminar la transacción.
+``con_areas_bloqueadas`` hace lo mismo con varias áreas a la vez (aprobación
+en lote), tomando los locks siempre en el mismo orden.
+
+La espera por el lock está acotada por ``AREAS_RESERVA_LOCK_TIMEOUT``
+(milisegundos). Si vence, o si PostgreSQL aborta la transacción por un
+deadlock, se reintenta hasta ``AREAS_RESERVA_REINTENTOS`` veces con una espera
+aleatoria creciente. Agotados los reintentos se responde 503.
+"""
+
+import random
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from rest_framework.exceptions import APIException
+
+from . import cobros, disponibilidad, uso
+from .disponibilidad import ESTADOS_OCUPAN, AgendaDia, _segundos
+from .models import AreaComun, Reserva
+
+# Primer entero del lock: separa estos locks de otros advisory locks de la base.
+ESPACIO_LOCK = 4101
+# lock_not_available, deadlock_detected, serialization_failure
+CODIGOS_REINTENTABLES = frozenset({"55P03", "40P01", "40001"})
+# Reservas por llamada a aprobar_en_lote.
+MAX_LOTE = 200
+
+
+class AreaOcupada(APIException):
+    status_code = 503
+    default_detail = "Hay muchas reservas en curso para esta área. Intente nuevamente en unos segundos."
+    default_code = "area_ocupada"
+
+
+def _bloquear_areas(area_ids):
+    # Siempre en el mismo orden: dos lotes con áreas en común no se bloquean en cruz.
+    area_ids = sorted(set(area_ids))
+    if connection.vendor != "postgresql":
+        # Otras bases: se intenta un lock de fila del área. En SQLite
+        # select_for_update no bloquea nada y las escrituras se serializan por
+        # el lock de toda la base, así que allí no hay garantía contra
+        # solapamientos concurrentes; el despliegue usa PostgreSQL.
+        list(AreaComun.objects.select_for_update().filter(pk__in=area_ids).order_by("pk").values_list("pk", flat=True))
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('lock_timeout', %s, true)",
+            [f"{getattr(settings, 'AREAS_RESERVA_LOCK_TIMEOUT', 2000)}ms"],
+        )
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, clave) FROM "
+            "(SELECT DISTINCT (unnest(%s::bigint[]) %% 2147483648)::integer AS clave ORDER BY 1) AS claves",
+            [ESPACIO_LOCK, area_ids],
+        )
+
+
+def _reintentable(exc):
+    return getattr(exc.__cause__, "pgcode", None) in CODIGOS_REINTENTABLES
+
+
+def con_area_bloqueada(area_id, funcion):
+    """Ejecuta ``funcion()`` con el área bloqueada y devuelve su resultado.
+
+    Las excepciones de ``funcion`` se propagan tal cual (la transacción se
+    deshace). Si no se obtiene el lock tras los reintentos se lanza
+    ``AreaOcupada``.
+    """
+    return con_areas_bloqueadas([area_id], funcion)
+
+
+def con_areas_bloqueadas(area_ids, funcion):
+    """Como ``con_area_bloqueada``, pero toma los locks de varias áreas en una consulta."""
+    reintentos = getattr(settings, "AREAS_RESERVA_REINTENTOS", 3)
+    for intento in range(reintentos + 1):
+        try:
+            with transaction.atomic():
+                _bloquear_areas(area_ids)
+                return funcion()
+        except OperationalError as exc:
+            if not _reintentable(exc):
+                raise
+            if intento == reintentos:
+                raise AreaOcupada from exc
+            time.sleep(random.uniform(0, 0.05 * 2**intento))
+
+
+def aprobar_en_lote(reserva_ids):
+    """Aprueba las reservas pendientes de ``reserva_ids`` y genera sus facturas.
+
+    Toma los locks de todas las áreas involucradas y resuelve los choques en
+    memoria, en el orden recibido: una reserva que se cruza con otra ya
+    aprobada (o aprobada antes en el mismo lote) queda pendiente, igual que
+    una con costo que no se puede facturar. La cantidad de consultas no
+    depende del tamaño del lote. Devuelve un dict con ``aprobadas``,
+    ``conflictos``, ``omitidas`` (no existen o no están pendientes),
+    ``facturas`` y ``no_facturables``.
+    """
+    reserva_ids = list(dict.fromkeys(reserva_ids))
+    area_ids = set(
+        Reserva.objects.filter(pk__in=reserva_ids, estado="pendiente").values_list("area_comun_id", flat=True)
+    )
+
+    def aprobar():
+        candidatas = {
+            reserva.id: reserva
+            for reserva in Reserva.objects.select_related("area_comun").filter(
+                pk__in=reserva_ids, estado="pendiente", area_comun_id__in=area_ids
+            )
+        }
+        ocupadas = defaultdict(list)
+        confirmadas = Reserva.objects.filter(
+            area_comun_id__in=area_ids,
+            fecha__in={reserva.fecha for reserva in candidatas.values()},
+            estado__in=ESTADOS_OCUPAN,
+        ).values_list("area_comun_id", "fecha", "hora_inicio", "hora_fin", "id")
+        for area_id, fecha, hora_inicio, hora_fin, reserva_id in confirmadas:
+            ocupadas[(area_id, fecha)].append((_segundos(hora_inicio), _segundos(hora_fin), reserva_id))
+
+        lote = cobros.LoteFacturas(candidatas.values())
+        aprobadas, conflictos, no_facturables = [], [], {}
+        for reserva_id in reserva_ids:
+            reserva = candidatas.get(reserva_id)
+            if reserva is None:
+                continue
+            clave = (reserva.area_comun_id, reserva.fecha)
+            inicio, fin = _segundos(reserva.hora_inicio), _segundos(reserva.hora_fin)
+            if AgendaDia(ocupadas[clave]).solapadas(inicio, fin):
+                conflictos.append(reserva_id)
+                continue
+            motivo = lote.agregar(reserva)
+            if motivo:
+                no_facturables[reserva_id] = motivo
+                continue
+            ocupadas[clave].append((inicio, fin, reserva_id))
+            reserva.estado = "aprobada"
+            aprobadas.append(reserva)
+
+        facturas = lote.guardar()
+        if aprobadas:
+            # bulk_update no dispara señales: caché y resumen de uso se actualizan aquí.
+            Reserva.objects.bulk_update(aprobadas, ["estado", "factura"])
+            uso.actualizar_uso({(reserva.area_comun_id, reserva.fecha) for reserva in aprobadas})
+            for area_id in {reserva.area_comun_id for reserva in aprobadas}:
+                disponibilidad.invalidar(area_id)
+        return {
+            "aprobadas": [reserva.id for reserva in aprobadas],
+            "conflictos": conflictos,
+            "omitidas": [reserva_id for reserva_id in reserva_ids if reserva_id not in candidatas],
+            "facturas": [
+                {"reserva": reserva_id, "factura": str(factura.id)} for reserva_id, factura in facturas.items()
+            ],
+            "no_facturables": [
+                {"reserva": reserva_id, "motivo": motivo} for reserva_id, motivo in no_facturables.items()
+            ],
+        }
+
+    return con_areas_bloqueadas(area_ids, aprobar)
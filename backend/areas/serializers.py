@@ -1,21 +1,26 @@
 from rest_framework import serializers
+from . import disponibilidad
 from .models import AreaComun, Reserva, ImagenArea
 from django.contrib.auth.models import User
 from api.models import Factura , Usuario  
+from api.serializers import RendicionesField, RendicionesSerializerMixin
+
+class ImagenAreaSerializer(RendicionesSerializerMixin, serializers.ModelSerializer):
+    imagen_rendiciones = RendicionesField(source='imagen')
 
-class ImagenAreaSerializer(serializers.ModelSerializer):
     class Meta:
         model = ImagenArea
-        fields = ('id', 'imagen')
+        fields = ('id', 'imagen', 'imagen_rendiciones')
 
 
 
-class AreaComunSerializer(serializers.ModelSerializer):
+class AreaComunSerializer(RendicionesSerializerMixin, serializers.ModelSerializer):
     imagenes = ImagenAreaSerializer(many=True, read_only=True)
+    imagen_rendiciones = RendicionesField(source='imagen')
 
     class Meta:
         model = AreaComun
-        fields = ['id', 'nombre', 'descripcion','capacidad', 'costo', 'imagen', 'imagenes']
+        fields = ['id', 'nombre', 'descripcion','capacidad', 'costo', 'imagen', 'imagen_rendiciones', 'imagenes']
 
 class UsuarioSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
@@ -65,19 +70,13 @@ class ReservaSerializer(serializers.ModelSerializer):
         if not area or not fecha or not hora_inicio or not hora_fin:
             raise serializers.ValidationError("Faltan campos obligatorios")
 
-        # Validar conflicto solo con reservas aprobadas
-        reservas_conflictivas = Reserva.objects.filter(
-            area_comun=area,
-            fecha=fecha,
-            estado='aprobada'
-        ).exclude(
-            id=self.instance.id if self.instance else None
-        ).filter(
-            hora_inicio__lt=hora_fin,
-            hora_fin__gt=hora_inicio
-        )
-
-        if reservas_conflictivas.exists():
+        if hora_fin <= hora_inicio:
+            raise serializers.ValidationError("La hora de fin debe ser posterior a la de inicio")
+
+        # Validar conflicto solo con reservas aprobadas o pagadas
+        if disponibilidad.solapadas(
+            area.id, fecha, hora_inicio, hora_fin, excluir=self.instance.id if self.instance else None
+        ):
             raise serializers.ValidationError("El área ya está reservada en ese horario")
 
         return data
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from api import imagenes
+
+from .disponibilidad import invalidar
+from .models import AreaComun, ImagenArea, Reserva
+from .uso import actualizar_uso, bucket_de
+
+imagenes.registrar(AreaComun, "imagen")
+imagenes.registrar(ImagenArea, "imagen")
+
+
+@receiver(pre_save, sender=Reserva)
+def _reserva_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    anterior = Reserva.objects.filter(pk=instance.pk).only("area_comun_id", "fecha").first()
+    instance._uso_buckets_previos = bucket_de(anterior) if anterior else set()
+
+
+@receiver(post_save, sender=Reserva)
+def _reserva_guardada(sender, instance, created, raw=False, **kwargs):
+    # Una edición pudo mover la reserva de área o de día: se descarta todo.
+    invalidar(instance.area_comun_id if created else None)
+    if raw:
+        return
+    buckets = getattr(instance, "_uso_buckets_previos", set())
+    instance._uso_buckets_previos = set()
+    actualizar_uso(buckets | bucket_de(instance))
+
+
+@receiver(post_delete, sender=Reserva)
+def _reserva_eliminada(sender, instance, origin=None, **kwargs):
+    invalidar(instance.area_comun_id)
+    if isinstance(origin, AreaComun):
+        return
+    actualizar_uso(bucket_de(instance))
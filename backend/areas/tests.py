@@ -1,3 +1,558 @@
-from django.test import TestCase
+import importlib
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient, APITestCase
+
+from api.actor import invalidar_actor
+from api.models import Condominio, Factura, Pago, Residente, ResidenteVivienda, Rol, Usuario, UsuarioRol, Vivienda
+
+from . import disponibilidad, reservas, uso
+from .cobros import conciliar_pagos as conciliar_pagos_pendientes
+from .models import AreaComun, Reserva, UsoAreaDiario
+
+
+class DisponibilidadAreaTests(APITestCase):
+    def setUp(self):
+        disponibilidad.invalidar()
+        user = User.objects.create_user(username="vecino_reservas", password="pass1234")
+        self.usuario = Usuario.objects.create(user=user)
+        self.client.force_authenticate(user=user)
+        self.area = AreaComun.objects.create(nombre="Quincho", costo=Decimal("0"))
+        self.otra_area = AreaComun.objects.create(nombre="Piscina")
+
+    def _reserva(self, inicio, fin, estado="aprobada", fecha=date(2026, 5, 4), area=None):
+        return Reserva.objects.create(
+            area_comun=area or self.area,
+            usuario=self.usuario,
+            fecha=fecha,
+            hora_inicio=time(*inicio),
+            hora_fin=time(*fin),
+            estado=estado,
+        )
+
+    def _disponibilidad(self, **params):
+        return self.client.get(f"/api/areas/{self.area.id}/disponibilidad/", params)
+
+    def test_tramos_libres_por_dia_en_una_consulta(self):
+        self._reserva((10, 0), (12, 0))
+        self._reserva((12, 0), (13, 0), estado="pagada")
+        self._reserva((15, 0), (16, 0), estado="pendiente")
+        self._reserva((18, 0), (18, 30))
+        self._reserva((9, 0), (10, 0), fecha=date(2026, 5, 5))
+        self._reserva((6, 0), (23, 0), area=self.otra_area)
+
+        with self.assertNumQueries(1):
+            dias = disponibilidad.disponibilidad(self.area.id, date(2026, 5, 4), date(2026, 5, 6), 60)
+        self.assertEqual([dia["fecha"] for dia in dias], ["2026-05-04", "2026-05-05", "2026-05-06"])
+        self.assertEqual(
+            dias[0]["ocupado"],
+            [{"hora_inicio": "10:00", "hora_fin": "13:00"}, {"hora_inicio": "18:00", "hora_fin": "18:30"}],
+        )
+        self.assertEqual(
+            [(tramo["hora_inicio"], tramo["hora_fin"]) for tramo in dias[0]["libre"]],
+            [("06:00", "10:00"), ("13:00", "18:00"), ("18:30", "23:00")],
+        )
+        self.assertEqual(dias[2]["libre"], [{"hora_inicio": "06:00", "hora_fin": "23:00"}])
+
+        # La segunda vez sale de la caché.
+        with self.assertNumQueries(0):
+            disponibilidad.solapadas(self.area.id, date(2026, 5, 4), time(12, 30), time(18, 15))
+
+        response = self._disponibilidad(desde="2026-05-04", hasta="2026-05-05", duracion=300)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["dias"][0]["libre"], [{"hora_inicio": "13:00", "hora_fin": "18:00"}])
+        self.assertEqual(len(response.json()["dias"]), 2)
+
+        self.assertEqual(self._disponibilidad(desde="2026-05-10", hasta="2026-05-01").status_code, 400)
+        self.assertEqual(self._disponibilidad(desde="2026-01-01", hasta="2026-12-31").status_code, 400)
+        self.assertEqual(self._disponibilidad(desde="mañana").status_code, 400)
+        self.assertEqual(len(self._disponibilidad().json()["dias"]), 7)
+
+    def test_solapadas_con_bisect(self):
+        agenda = disponibilidad.AgendaDia([(0, 100, "a"), (50, 400, "b"), (200, 300, "c"), (500, 600, "d")])
+        self.assertEqual(sorted(agenda.solapadas(350, 520)), ["b", "d"])
+        self.assertEqual(agenda.solapadas(400, 500), [])
+        self.assertEqual(sorted(agenda.solapadas(90, 210, excluir="c")), ["a", "b"])
+        self.assertEqual(agenda.ocupado(), [[0, 400], [500, 600]])
+
+    def test_los_cambios_de_estado_invalidan_la_cache(self):
+        pendiente = self._reserva((10, 0), (12, 0), estado="pendiente")
+        dia = disponibilidad.disponibilidad(self.area.id, date(2026, 5, 4), date(2026, 5, 4))[0]
+        self.assertEqual(dia["ocupado"], [])
+
+        response = self.client.post(f"/api/reservas/{pendiente.id}/cambiar_estado/", {"estado": "aprobada"})
+        self.assertEqual(response.status_code, 200)
+        dia = disponibilidad.disponibilidad(self.area.id, date(2026, 5, 4), date(2026, 5, 4))[0]
+        self.assertEqual(dia["ocupado"], [{"hora_inicio": "10:00", "hora_fin": "12:00"}])
+
+        response = self.client.post(
+            "/api/reservas/",
+            {"area_comun_id": self.area.id, "fecha": "2026-05-04", "hora_inicio": "11:00", "hora_fin": "13:00"},
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/api/reservas/",
+            {"area_comun_id": self.area.id, "fecha": "2026-05-04", "hora_inicio": "14:00", "hora_fin": "13:00"},
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/api/reservas/",
+            {"area_comun_id": self.area.id, "fecha": "2026-05-04", "hora_inicio": "12:00", "hora_fin": "13:00"},
+        )
+        self.assertEqual(response.status_code, 201)
+
+        pendiente.delete()
+        dia = disponibilidad.disponibilidad(self.area.id, date(2026, 5, 4), date(2026, 5, 4))[0]
+        self.assertEqual(dia["ocupado"], [])
+
+    def test_la_base_impide_aprobar_reservas_solapadas(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("La restricción de exclusión es de PostgreSQL")
+        self._reserva((10, 0), (12, 0))
+        with self.assertRaises(IntegrityError) as error, transaction.atomic():
+            self._reserva((11, 0), (13, 0), estado="pagada")
+        self.assertTrue(disponibilidad.es_solapamiento(error.exception))
+
+        # Pendientes, rechazadas y horarios contiguos no chocan.
+        self._reserva((11, 0), (13, 0), estado="pendiente")
+        self._reserva((12, 0), (14, 0))
+        self._reserva((10, 0), (12, 0), area=self.otra_area)
+
+        # Con la caché desactualizada (cambio hecho en otro proceso) la
+        # restricción igual impide la aprobación y la vista responde 409.
+        competidora = self._reserva((13, 0), (15, 0), estado="pendiente")
+        with disponibilidad._lock:
+            disponibilidad._cache[(self.area.id, competidora.fecha)] = (float("inf"), disponibilidad.AgendaDia())
+        response = self.client.post(f"/api/reservas/{competidora.id}/cambiar_estado/", {"estado": "aprobada"})
+        self.assertEqual(response.status_code, 409)
+        competidora.refresh_from_db()
+        self.assertEqual(competidora.estado, "pendiente")
+
+
+    def test_la_migracion_falla_si_ya_hay_solapamientos(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("La restricción de exclusión es de PostgreSQL")
+        migracion = importlib.import_module("areas.migrations.0003_reserva_sin_solapamiento")
+        editor = SimpleNamespace(connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE areas_reserva DROP CONSTRAINT reserva_sin_solapamiento")
+        primera = self._reserva((10, 0), (12, 0))
+        segunda = self._reserva((11, 0), (13, 0), estado="pagada")
+        self._reserva((12, 0), (14, 0), estado="pendiente")
+
+        with self.assertRaisesMessage(RuntimeError, f"{primera.id}/{segunda.id}"):
+            migracion.crear_restriccion(None, editor)
+
+        salida = StringIO()
+        call_command("revisar_solapamientos", stdout=salida)
+        self.assertIn(f"Reserva {segunda.id} (pagada) se solapa con {primera.id}", salida.getvalue())
+        call_command("revisar_solapamientos", "--corregir", stdout=StringIO())
+        segunda.refresh_from_db()
+        self.assertEqual(segunda.estado, "pendiente")
+
+        with connection.cursor() as cursor:
+            # ALTER TABLE no admite claves foráneas diferidas pendientes en la transacción del test.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        migracion.crear_restriccion(None, editor)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._reserva((11, 0), (11, 30))
+
+
+class UsoAreasTests(APITestCase):
+    def setUp(self):
+        disponibilidad.invalidar()
+        user = User.objects.create(username="admin_uso")
+        self.usuario = Usuario.objects.create(user=user)
+        self.client.force_authenticate(user=user)
+        self.quincho = AreaComun.objects.create(nombre="Quincho", costo=Decimal("150"))
+        self.piscina = AreaComun.objects.create(nombre="Piscina")
+        self.condominio = Condominio.objects.create(nombre="Uso")
+
+    def _reserva(self, area, fecha, inicio, fin, estado="aprobada", monto=None):
+        factura = None
+        if monto is not None:
+            # Una vivienda por factura: (vivienda, periodo, tipo) es único.
+            numero = str(Vivienda.objects.count() + 1)
+            vivienda = Vivienda.objects.create(
+                condominio=self.condominio, codigo_unidad=f"u-{numero}", bloque="A", numero=numero
+            )
+            factura = Factura.objects.create(
+                vivienda=vivienda, periodo=str(fecha)[:7], monto=Decimal(monto), tipo="reserva"
+            )
+        return Reserva.objects.create(
+            area_comun=area,
+            usuario=self.usuario,
+            fecha=fecha,
+            hora_inicio=time(*inicio),
+            hora_fin=time(*fin),
+            estado=estado,
+            factura=factura,
+        )
+
+    def _reporte(self, **params):
+        return self.client.get("/api/reservas/reporte_uso/", {"modo": "resumen", **params})
+
+    def test_resumen_por_area_desde_el_uso_diario(self):
+        lunes = date(2026, 3, 2)
+        self._reserva(self.quincho, lunes, (18, 30), (20, 0), estado="pagada", monto="150")
+        self._reserva(self.quincho, lunes, (10, 0), (11, 0), monto="150")
+        self._reserva(self.quincho, lunes, (12, 0), (13, 0), estado="pendiente")
+        self._reserva(self.quincho, date(2026, 3, 3), (19, 0), (21, 0), estado="rechazada")
+        self._reserva(self.quincho, date(2026, 3, 7), (19, 0), (20, 15))
+        self._reserva(self.piscina, lunes, (9, 0), (12, 0))
+        self._reserva(self.piscina, date(2026, 5, 1), (9, 0), (12, 0))
+
+        dia = UsoAreaDiario.objects.get(area_comun=self.quincho, fecha=lunes)
+        self.assertEqual((dia.reservas, dia.pendientes, dia.confirmadas), (3, 1, 2))
+        self.assertEqual(dia.minutos_ocupados, 150)
+        self.assertEqual((dia.ingresos, dia.cobrado), (Decimal("300"), Decimal("150")))
+        self.assertEqual((dia.minutos_por_hora[10], dia.minutos_por_hora[18], dia.minutos_por_hora[19]), (60, 30, 60))
+
+        with self.assertNumQueries(1):
+            informe = uso.reporte(date(2026, 3, 1), date(2026, 3, 31))
+        self.assertEqual([area["area"] for area in informe["areas"]], ["Piscina", "Quincho"])
+        quincho = informe["areas"][1]
+        self.assertEqual(
+            {campo: quincho[campo] for campo in ("reservas", "pendientes", "confirmadas", "rechazadas")},
+            {"reservas": 5, "pendientes": 1, "confirmadas": 3, "rechazadas": 1},
+        )
+        self.assertEqual(quincho["horas_ocupadas"], 3.75)
+        self.assertEqual((quincho["ingresos"], quincho["cobrado"]), ("300.00", "150.00"))
+        self.assertEqual(quincho["hora_pico"], "19:00")
+        self.assertEqual(quincho["minutos_por_hora"][19], 120)
+        self.assertEqual(quincho["mapa_calor"]["lunes"][18], 30)
+        self.assertEqual(quincho["mapa_calor"]["sábado"][20], 15)
+        # 31 días de 06:00 a 23:00.
+        self.assertEqual(quincho["ocupacion"], round(225 * 100 / (31 * 17 * 60), 2))
+        self.assertEqual(informe["totales"]["reservas"], 6)
+        self.assertEqual(informe["totales"]["hora_pico"], "10:00")
+
+        response = self._reporte(fecha_inicio="2026-03-01", fecha_fin="2026-05-31", area_id=self.piscina.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([area["area_id"] for area in response.json()["areas"]], [self.piscina.id])
+        self.assertEqual(response.json()["areas"][0]["horas_ocupadas"], 6.0)
+        self.assertNotIn("usuario", str(response.json()))
+
+        self.assertEqual(self._reporte(fecha_inicio="2026-04-01", fecha_fin="2026-03-01").status_code, 400)
+        self.assertEqual(self._reporte(fecha_inicio="marzo").status_code, 400)
+        self.assertEqual(self._reporte(area_id="x").status_code, 400)
+        self.assertEqual(self._reporte().status_code, 200)
+        # Sin modo se mantiene el listado de reservas.
+        self.assertEqual(len(self.client.get("/api/reservas/reporte_uso/").json()), 7)
+
+    def test_los_cambios_de_reserva_actualizan_solo_sus_dias(self):
+        reserva = self._reserva(self.piscina, date(2026, 3, 2), (10, 0), (12, 0), estado="pendiente")
+        self.assertEqual(UsoAreaDiario.objects.get(fecha=date(2026, 3, 2)).confirmadas, 0)
+
+        response = self.client.post(f"/api/reservas/{reserva.id}/cambiar_estado/", {"estado": "aprobada"})
+        self.assertEqual(response.status_code, 200)
+        dia = UsoAreaDiario.objects.get(fecha=date(2026, 3, 2))
+        self.assertEqual((dia.confirmadas, dia.minutos_ocupados), (1, 120))
+
+        reserva.refresh_from_db()
+        reserva.fecha = date(2026, 3, 9)
+        reserva.save()
+        self.assertEqual(UsoAreaDiario.objects.get(fecha=date(2026, 3, 2)).reservas, 0)
+        self.assertEqual(UsoAreaDiario.objects.get(fecha=date(2026, 3, 9)).minutos_ocupados, 120)
+
+        reserva.delete()
+        self.assertEqual(UsoAreaDiario.objects.get(fecha=date(2026, 3, 9)).reservas, 0)
+
+        self._reserva(self.quincho, date(2026, 3, 2), (9, 0), (10, 0))
+        self.quincho.delete()
+        self.assertFalse(UsoAreaDiario.objects.filter(area_comun_id__isnull=True).exists())
+
+    def test_comando_reconstruye_el_rango(self):
+        marzo = self._reserva(self.quincho, date(2026, 3, 2), (10, 0), (12, 0))
+        self._reserva(self.quincho, date(2026, 4, 2), (10, 0), (11, 0))
+        UsoAreaDiario.objects.all().delete()
+        # update() no dispara señales.
+        Reserva.objects.filter(pk=marzo.pk).update(hora_fin=time(13, 0))
+        UsoAreaDiario.objects.create(area_comun=self.piscina, fecha=date(2026, 3, 20), reservas=4)
+
+        self.assertEqual(uso.reconstruir_uso(aplicar=False, desde=date(2026, 3, 1), hasta=date(2026, 3, 31))[0][2], "reservas")
+        call_command("reconstruir_uso_areas", "--desde", "2026-03-01", "--hasta", "2026-03-31", stdout=StringIO())
+        self.assertEqual(
+            list(UsoAreaDiario.objects.values_list("fecha", "minutos_ocupados")), [(date(2026, 3, 2), 180)]
+        )
+
+        salida = StringIO()
+        call_command("reconstruir_uso_areas", "--check", stdout=salida)
+        self.assertIn("diferencias encontradas", salida.getvalue())
+        call_command("reconstruir_uso_areas", stdout=StringIO())
+        self.assertEqual(uso.reconstruir_uso(aplicar=False), [])
+        self.assertEqual(UsoAreaDiario.objects.count(), 2)
+
+
+class AprobacionLoteTests(APITestCase):
+    def setUp(self):
+        disponibilidad.invalidar()
+        invalidar_actor(todo=True)
+        admin = User.objects.create(username="admin_lote")
+        self.admin = Usuario.objects.create(user=admin)
+        UsuarioRol.objects.create(usuario=self.admin, rol=Rol.objects.get_or_create(nombre="ADM")[0])
+        self.client.force_authenticate(user=admin)
+        self.salon = AreaComun.objects.create(nombre="Salón", costo=Decimal("200"))
+        self.cancha = AreaComun.objects.create(nombre="Cancha", costo=Decimal("50"))
+        condominio = Condominio.objects.create(nombre="Lote")
+        self.vecinos = []
+        for indice in range(24):
+            usuario = Usuario.objects.create(user=User.objects.create(username=f"vecino_lote_{indice}"))
+            vivienda = Vivienda.objects.create(
+                condominio=condominio, codigo_unidad=f"l-{indice}", bloque="L", numero=str(indice)
+            )
+            residente = Residente.objects.create(
+                ci=f"ci-{indice}", nombres="Vecino", apellidos=str(indice), usuario=usuario
+            )
+            ResidenteVivienda.objects.create(residente=residente, vivienda=vivienda, fecha_desde=date(2024, 1, 1))
+            self.vecinos.append(usuario)
+        self.sin_vivienda = Usuario.objects.create(user=User.objects.create(username="sin_vivienda"))
+
+    def _reserva(self, usuario, area, fecha, inicio, fin, estado="pendiente"):
+        return Reserva.objects.create(
+            area_comun=area,
+            usuario=usuario,
+            fecha=fecha,
+            hora_inicio=time(inicio),
+            hora_fin=time(fin),
+            estado=estado,
+        )
+
+    def _fin_de_semana(self, cantidad, desde=0):
+        """Una reserva pendiente sin choques por vecino: salón el sábado, cancha el domingo."""
+        return [
+            self._reserva(
+                self.vecinos[indice],
+                self.salon if indice % 2 else self.cancha,
+                date(2026, 6, 6 + indice % 2),
+                8 + indice // 2,
+                9 + indice // 2,
+            ).id
+            for indice in range(desde, desde + cantidad)
+        ]
+
+    def _aprobar(self, ids):
+        return self.client.post("/api/reservas/aprobar_lote/", {"reservas": ids}, format="json")
+
+    def test_aprueba_y_factura_en_consultas_constantes(self):
+        # Resuelve el actor del administrador antes de medir.
+        self._aprobar([999999])
+        ids = self._fin_de_semana(4)
+        with CaptureQueriesContext(connection) as pocas:
+            response = self._aprobar(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["aprobadas"]), 4)
+
+        ids = self._fin_de_semana(20, desde=4)
+        with CaptureQueriesContext(connection) as muchas:
+            response = self._aprobar(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(muchas), len(pocas))
+
+        resultado = response.json()
+        self.assertEqual(resultado["aprobadas"], ids)
+        self.assertEqual(len(resultado["facturas"]), 20)
+        self.assertEqual(Factura.objects.filter(tipo="reserva").count(), 24)
+        reserva = Reserva.objects.select_related("factura").get(pk=ids[0])
+        self.assertEqual((reserva.estado, reserva.factura.monto), ("aprobada", Decimal("50")))
+        self.assertEqual(reserva.factura.vivienda.codigo_unidad, "l-4")
+        dia = UsoAreaDiario.objects.get(area_comun=self.salon, fecha=date(2026, 6, 7))
+        self.assertEqual((dia.confirmadas, dia.ingresos), (12, Decimal("2400")))
+        # La caché de disponibilidad ya ve las aprobaciones.
+        self.assertTrue(disponibilidad.solapadas(self.salon.id, date(2026, 6, 7), time(9, 30), time(9, 45)))
+
+    def test_choques_omitidas_y_no_facturables(self):
+        self._reserva(self.vecinos[0], self.salon, date(2026, 6, 6), 10, 12, estado="aprobada")
+        choca_con_aprobada = self._reserva(self.vecinos[1], self.salon, date(2026, 6, 6), 11, 13)
+        primera = self._reserva(self.vecinos[2], self.salon, date(2026, 6, 6), 14, 16)
+        choca_en_lote = self._reserva(self.vecinos[3], self.salon, date(2026, 6, 6), 15, 17)
+        segunda_del_mes = self._reserva(self.vecinos[2], self.salon, date(2026, 6, 20), 14, 16)
+        sin_vivienda = self._reserva(self.sin_vivienda, self.salon, date(2026, 6, 21), 14, 16)
+        rechazada = self._reserva(self.vecinos[4], self.salon, date(2026, 6, 6), 18, 19, estado="rechazada")
+
+        ids = [
+            choca_con_aprobada.id, primera.id, choca_en_lote.id, segunda_del_mes.id, sin_vivienda.id, rechazada.id, 999999
+        ]
+        resultado = self._aprobar(ids).json()
+        self.assertEqual(resultado["aprobadas"], [primera.id])
+        self.assertEqual(resultado["conflictos"], [choca_con_aprobada.id, choca_en_lote.id])
+        self.assertEqual(resultado["omitidas"], [rechazada.id, 999999])
+        self.assertEqual([fila["reserva"] for fila in resultado["facturas"]], [primera.id])
+        # Sin factura no se aprueban: quedan pendientes con el motivo.
+        self.assertEqual(
+            [fila["reserva"] for fila in resultado["no_facturables"]], [segunda_del_mes.id, sin_vivienda.id]
+        )
+        self.assertEqual(
+            set(Reserva.objects.filter(pk__in=[choca_en_lote.id, segunda_del_mes.id, sin_vivienda.id]).values_list("estado", flat=True)),
+            {"pendiente"},
+        )
+
+        # La aprobación individual tampoco aprueba sin facturar.
+        response = self.client.post(f"/api/reservas/{segunda_del_mes.id}/cambiar_estado/", {"estado": "aprobada"})
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("2026-06", response.json()["error"])
+        segunda_del_mes.refresh_from_db()
+        self.assertEqual((segunda_del_mes.estado, segunda_del_mes.factura_id), ("pendiente", None))
+
+        self.assertEqual(self._aprobar([]).status_code, 400)
+        self.assertEqual(self._aprobar(["uno"]).status_code, 400)
+        self.assertEqual(self._aprobar(list(range(reservas.MAX_LOTE + 1))).status_code, 400)
+
+        # Solo un administrador aprueba en lote.
+        self.client.force_authenticate(user=self.vecinos[5].user)
+        self.assertEqual(self._aprobar([choca_en_lote.id]).status_code, 403)
+
+    def test_conciliacion_de_pagos_en_lotes(self):
+        ids = self._fin_de_semana(6)
+        self._aprobar(ids)
+        facturas = {
+            reserva.id: reserva.factura for reserva in Reserva.objects.select_related("factura").filter(pk__in=ids)
+        }
+
+        def pagar(reserva_id, monto, estado=Pago.ESTADO_CONFIRMADO):
+            Pago.objects.create(factura=facturas[reserva_id], metodo="QR", monto_pagado=Decimal(monto), estado=estado)
+
+        pagar(ids[0], "50")  # cubre la factura de la cancha
+        pagar(ids[1], "150")  # parcial
+        pagar(ids[2], "20")
+        pagar(ids[2], "30")  # dos pagos que suman el total
+        pagar(ids[3], "200", estado=Pago.ESTADO_RECHAZADO)
+        Factura.objects.filter(pk=facturas[ids[4]].pk).update(estado=Factura.ESTADO_PAGADA)
+
+        salida = StringIO()
+        call_command("conciliar_pagos_reservas", "--lote", "2", stdout=salida)
+        self.assertIn("3 reservas", salida.getvalue())
+        estados = dict(Reserva.objects.filter(pk__in=ids).values_list("id", "estado"))
+        self.assertEqual(
+            [estados[reserva_id] for reserva_id in ids],
+            ["pagada", "aprobada", "pagada", "aprobada", "pagada", "aprobada"],
+        )
+        factura = Factura.objects.get(pk=facturas[ids[2]].pk)
+        self.assertEqual((factura.estado, factura.fecha_pago), (Factura.ESTADO_PAGADA, timezone.localdate()))
+        self.assertEqual(UsoAreaDiario.objects.get(area_comun=self.cancha).cobrado, Decimal("150"))
+        self.assertEqual(uso.reconstruir_uso(aplicar=False), [])
+
+        # registrar_pago usa la misma conciliación: el segundo pago completa la factura.
+        response = self.client.post(f"/api/reservas/{ids[1]}/registrar_pago/", {"monto": "50", "metodo": "QR"})
+        self.assertEqual(response.json()["estado_reserva"], "pagada")
+        self.assertEqual(conciliar_pagos_pendientes(), 0)
+
+
+class ReservasConcurrentesTests(TransactionTestCase):
+    """Cientos de reservas y aprobaciones simultáneas no dejan horarios solapados."""
+
+    INTENTOS = 300
+    HILOS = 16
+
+    def setUp(self):
+        disponibilidad.invalidar()
+        self.users = []
+        for indice in range(self.HILOS):
+            user = User.objects.create_user(username=f"vecino_{indice}", password="pass1234")
+            Usuario.objects.create(user=user)
+            self.users.append(user)
+        self.areas = [AreaComun.objects.create(nombre=nombre) for nombre in ("Piscina", "Quincho")]
+        self.fecha = date(2026, 1, 10)
+
+    def _sin_restriccion(self):
+        """Quita la restricción de exclusión durante el test: el que debe impedir los solapes es el lock."""
+        if connection.vendor != "postgresql":
+            return
+        migracion = importlib.import_module("areas.migrations.0003_reserva_sin_solapamiento")
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE areas_reserva DROP CONSTRAINT IF EXISTS reserva_sin_solapamiento")
+
+        def restaurar():
+            Reserva.objects.all().delete()
+            with connection.cursor() as cursor:
+                cursor.execute(migracion.CREAR_RESTRICCION)
+
+        self.addCleanup(restaurar)
+
+    def _reservar_y_aprobar(self, intento):
+        azar = random.Random(intento)
+        client = APIClient()
+        client.force_authenticate(user=self.users[intento % self.HILOS])
+        inicio = azar.randrange(8, 21)
+        try:
+            response = client.post(
+                "/api/reservas/",
+                {
+                    "area_comun_id": azar.choice(self.areas).id,
+                    "fecha": self.fecha.isoformat(),
+                    "hora_inicio": f"{inicio:02d}:00",
+                    "hora_fin": f"{inicio + azar.randrange(1, 3):02d}:00",
+                },
+            )
+            if response.status_code != 201:
+                return f"reservar {response.status_code}"
+            response = client.post(
+                f"/api/reservas/{response.json()['id']}/cambiar_estado/", {"estado": "aprobada"}
+            )
+            return f"aprobar {response.status_code}"
+        finally:
+            connection.close()
+
+    def test_sin_solapamientos_bajo_carga(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("El advisory lock es de PostgreSQL")
+        self._sin_restriccion()
+
+        with ThreadPoolExecutor(max_workers=self.HILOS) as pool:
+            resultados = Counter(pool.map(self._reservar_y_aprobar, range(self.INTENTOS)))
+
+        self.assertEqual(sum(resultados.values()), self.INTENTOS)
+        self.assertEqual(set(resultados) - {"reservar 400", "aprobar 200", "aprobar 409"}, set())
+        self.assertGreater(resultados["aprobar 200"], 0)
+
+        for area in self.areas:
+            aprobadas = list(
+                Reserva.objects.filter(area_comun=area, estado__in=disponibilidad.ESTADOS_OCUPAN)
+                .order_by("hora_inicio")
+                .values_list("hora_inicio", "hora_fin")
+            )
+            for anterior, siguiente in zip(aprobadas, aprobadas[1:]):
+                self.assertLessEqual(anterior[1], siguiente[0], f"Solapamiento en {area}: {anterior} y {siguiente}")
+        self.assertEqual(
+            Reserva.objects.filter(estado="aprobada").count(), resultados["aprobar 200"]
+        )
+
+    @override_settings(AREAS_RESERVA_LOCK_TIMEOUT=50, AREAS_RESERVA_REINTENTOS=1)
+    def test_lock_ocupado_reintenta_y_responde_503(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("El advisory lock es de PostgreSQL")
+        area = self.areas[0]
+        tomado, soltar = threading.Event(), threading.Event()
+
+        def retener():
+            try:
+                reservas.con_area_bloqueada(area.id, lambda: (tomado.set(), soltar.wait(5)))
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=retener)
+        hilo.start()
+        self.addCleanup(hilo.join)
+        self.addCleanup(soltar.set)
+        self.assertTrue(tomado.wait(5))
+
+        with self.assertRaises(reservas.AreaOcupada):
+            reservas.con_area_bloqueada(area.id, lambda: "reservado")
+        # Otra área no espera.
+        self.assertEqual(reservas.con_area_bloqueada(self.areas[1].id, lambda: "reservado"), "reservado")
+        soltar.set()
+        hilo.join()
+        self.assertEqual(reservas.con_area_bloqueada(area.id, lambda: "reservado"), "reservado")
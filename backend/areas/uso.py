@@ -0,0 +1,246 @@
+"""Resumen diario de uso de las áreas comunes.
+
+Cada fila de ``UsoAreaDiario`` guarda, para un área y un día:
+
+* ``reservas`` / ``pendientes`` / ``confirmadas`` / ``rechazadas``: reservas de
+  ese día por estado (``confirmadas`` son las aprobadas o pagadas).
+* ``minutos_ocupados`` y ``minutos_por_hora``: tiempo ocupado por las reservas
+  confirmadas, en total y repartido en las 24 horas del día.
+* ``ingresos`` / ``cobrado``: monto de las facturas de las reservas
+  confirmadas, y de las pagadas.
+
+Cuando se guarda o elimina una reserva solo se recalcula su día (y el
+anterior, si la edición la movió). ``reporte`` arma el informe de uso de un
+rango con una sola consulta sobre esta tabla.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Q
+
+from .disponibilidad import ESTADOS_OCUPAN, _horario_atencion, _segundos
+from .models import Reserva, UsoAreaDiario
+
+CAMPOS_CONTEO = ("reservas", "pendientes", "confirmadas", "rechazadas", "minutos_ocupados")
+CAMPOS_MONTO = ("ingresos", "cobrado")
+CAMPOS_USO = (*CAMPOS_CONTEO, *CAMPOS_MONTO, "minutos_por_hora")
+DIAS_SEMANA = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+
+
+def bucket_de(reserva):
+    """Par ``(area_id, fecha)`` al que aporta la reserva."""
+    if not reserva.area_comun_id or not reserva.fecha:
+        return set()
+    return {(reserva.area_comun_id, reserva.fecha)}
+
+
+def _valores_vacios():
+    return {
+        "reservas": 0,
+        "pendientes": 0,
+        "confirmadas": 0,
+        "rechazadas": 0,
+        "minutos_ocupados": 0,
+        "ingresos": Decimal("0"),
+        "cobrado": Decimal("0"),
+        "minutos_por_hora": [0] * 24,
+    }
+
+
+def _segundos_por_hora(inicio, fin):
+    """Reparte ``[inicio, fin)`` (segundos desde las 00:00) en las horas del día."""
+    for hora in range(inicio // 3600, min((fin + 3599) // 3600, 24)):
+        yield hora, min(fin, (hora + 1) * 3600) - max(inicio, hora * 3600)
+
+
+def calcular_uso(buckets=None):
+    """Calcula el uso desde las reservas.
+
+    Si ``buckets`` es ``None`` se calcula todo el histórico; en otro caso solo
+    los pares ``(area_id, fecha)`` indicados. Devuelve un dict
+    ``{(area_id, fecha): {campo: valor}}``.
+    """
+    reservas = Reserva.objects.order_by()
+    if buckets is not None:
+        if not buckets:
+            return {}
+        fechas_por_area = defaultdict(set)
+        for area_id, fecha in buckets:
+            fechas_por_area[area_id].add(fecha)
+        filtro = Q()
+        for area_id, fechas in fechas_por_area.items():
+            filtro |= Q(area_comun_id=area_id, fecha__in=fechas)
+        reservas = reservas.filter(filtro)
+    return _calcular(reservas, buckets or ())
+
+
+def _calcular(reservas, buckets=()):
+    resultado = defaultdict(_valores_vacios)
+    segundos_por_hora = defaultdict(lambda: [0] * 24)
+    for bucket in buckets:
+        resultado[bucket]
+
+    filas = reservas.values_list(
+        "area_comun_id", "fecha", "hora_inicio", "hora_fin", "estado", "factura__monto"
+    )
+    for area_id, fecha, hora_inicio, hora_fin, estado, monto in filas.iterator():
+        clave = (area_id, fecha)
+        valores = resultado[clave]
+        valores["reservas"] += 1
+        if estado == "pendiente":
+            valores["pendientes"] += 1
+        elif estado == "rechazada":
+            valores["rechazadas"] += 1
+        if estado not in ESTADOS_OCUPAN:
+            continue
+        valores["confirmadas"] += 1
+        valores["ingresos"] += monto or Decimal("0")
+        if estado == "pagada":
+            valores["cobrado"] += monto or Decimal("0")
+        horas = segundos_por_hora[clave]
+        for hora, segundos in _segundos_por_hora(_segundos(hora_inicio), _segundos(hora_fin)):
+            horas[hora] += segundos
+
+    for clave, horas in segundos_por_hora.items():
+        resultado[clave]["minutos_por_hora"] = [segundos // 60 for segundos in horas]
+        resultado[clave]["minutos_ocupados"] = sum(horas) // 60
+    return dict(resultado)
+
+
+def _guardar(valores_por_bucket):
+    filas = [
+        UsoAreaDiario(area_comun_id=area_id, fecha=fecha, **valores)
+        for (area_id, fecha), valores in valores_por_bucket.items()
+    ]
+    if filas:
+        UsoAreaDiario.objects.bulk_create(
+            filas,
+            update_conflicts=True,
+            unique_fields=["area_comun", "fecha"],
+            update_fields=[*CAMPOS_USO, "actualizado_en"],
+        )
+
+
+def actualizar_uso(buckets):
+    """Recalcula y persiste solo los días indicados."""
+    buckets = {bucket for bucket in buckets if bucket[0] and bucket[1]}
+    if not buckets:
+        return
+    _guardar(calcular_uso(buckets))
+
+
+def _distintos(campo, almacenado, calculado):
+    if campo in CAMPOS_MONTO:
+        return Decimal(almacenado) != Decimal(calculado)
+    return almacenado != calculado
+
+
+def reconstruir_uso(aplicar=True, desde=None, hasta=None):
+    """Recalcula el uso y devuelve las diferencias con lo almacenado.
+
+    Cada diferencia es ``(area_id, fecha, campo, almacenado, calculado)``. Con
+    ``desde``/``hasta`` solo se revisan esos días. Con ``aplicar`` se
+    reemplazan las filas revisadas por lo calculado.
+    """
+    reservas = Reserva.objects.order_by()
+    almacenadas = UsoAreaDiario.objects.order_by()
+    if desde:
+        reservas = reservas.filter(fecha__gte=desde)
+        almacenadas = almacenadas.filter(fecha__gte=desde)
+    if hasta:
+        reservas = reservas.filter(fecha__lte=hasta)
+        almacenadas = almacenadas.filter(fecha__lte=hasta)
+
+    calculado = _calcular(reservas)
+    filas = {(fila.area_comun_id, fila.fecha): fila for fila in almacenadas}
+    almacenado = {
+        clave: {campo: getattr(fila, campo) for campo in CAMPOS_USO} for clave, fila in filas.items()
+    }
+
+    diferencias = []
+    for clave in sorted(set(calculado) | set(almacenado)):
+        esperado = calculado.get(clave, _valores_vacios())
+        actual = almacenado.get(clave, _valores_vacios())
+        for campo in CAMPOS_USO:
+            if _distintos(campo, actual[campo], esperado[campo]):
+                diferencias.append((clave[0], clave[1], campo, actual[campo], esperado[campo]))
+
+    if aplicar:
+        obsoletas = [fila.pk for clave, fila in filas.items() if clave not in calculado]
+        if obsoletas:
+            UsoAreaDiario.objects.filter(pk__in=obsoletas).delete()
+        _guardar(calculado)
+
+    return diferencias
+
+
+class _Acumulado:
+    def __init__(self):
+        self.conteos = dict.fromkeys(CAMPOS_CONTEO, 0)
+        self.montos = dict.fromkeys(CAMPOS_MONTO, Decimal("0"))
+        # Minutos ocupados por día de la semana (lunes = 0) y hora.
+        self.mapa_calor = [[0] * 24 for _dia in DIAS_SEMANA]
+
+    def sumar(self, fecha, fila):
+        for campo in CAMPOS_CONTEO:
+            self.conteos[campo] += fila[campo]
+        for campo in CAMPOS_MONTO:
+            self.montos[campo] += fila[campo]
+        horas = self.mapa_calor[fecha.weekday()]
+        for hora, minutos in enumerate(fila["minutos_por_hora"] or ()):
+            horas[hora] += minutos
+
+    def como_dict(self, minutos_disponibles):
+        por_hora = [sum(horas) for horas in zip(*self.mapa_calor)]
+        pico = max(range(24), key=por_hora.__getitem__)
+        minutos = self.conteos["minutos_ocupados"]
+        return {
+            "reservas": self.conteos["reservas"],
+            "pendientes": self.conteos["pendientes"],
+            "confirmadas": self.conteos["confirmadas"],
+            "rechazadas": self.conteos["rechazadas"],
+            "horas_ocupadas": round(minutos / 60, 2),
+            "ocupacion": round(minutos * 100 / minutos_disponibles, 2) if minutos_disponibles else 0.0,
+            "ingresos": f"{self.montos['ingresos']:.2f}",
+            "cobrado": f"{self.montos['cobrado']:.2f}",
+            "hora_pico": f"{pico:02d}:00" if por_hora[pico] else None,
+            "minutos_por_hora": por_hora,
+            "mapa_calor": dict(zip(DIAS_SEMANA, self.mapa_calor)),
+        }
+
+
+def reporte(desde, hasta, area_id=None):
+    """Uso por área entre ``desde`` y ``hasta`` (inclusive), con totales.
+
+    ``ocupacion`` es el porcentaje del horario ``AREAS_HORA_APERTURA``-
+    ``AREAS_HORA_CIERRE`` ocupado por reservas confirmadas en el rango.
+    Lanza ``ValueError`` si el rango está invertido.
+    """
+    if hasta < desde:
+        raise ValueError("'fecha_fin' debe ser posterior o igual a 'fecha_inicio'.")
+
+    filas = UsoAreaDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta).order_by()
+    if area_id:
+        filas = filas.filter(area_comun_id=area_id)
+
+    nombres = {}
+    por_area = defaultdict(_Acumulado)
+    total = _Acumulado()
+    for fila in filas.values("area_comun_id", "area_comun__nombre", "fecha", *CAMPOS_USO):
+        nombres[fila["area_comun_id"]] = fila["area_comun__nombre"]
+        por_area[fila["area_comun_id"]].sumar(fila["fecha"], fila)
+        total.sumar(fila["fecha"], fila)
+
+    apertura, cierre = _horario_atencion()
+    minutos_por_area = ((hasta - desde) // timedelta(days=1) + 1) * max(cierre - apertura, 0) // 60
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "areas": [
+            {"area_id": area, "area": nombres[area], **acumulado.como_dict(minutos_por_area)}
+            for area, acumulado in sorted(por_area.items(), key=lambda item: nombres[item[0]])
+        ],
+        "totales": total.como_dict(minutos_por_area * len(por_area)),
+    }
@@ -1,55 +1,68 @@
-from rest_framework import viewsets, permissions, status
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import viewsets, permissions, serializers, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.pagination import PageNumberPagination
+from . import cobros, disponibilidad, reservas, uso
 from .models import AreaComun, Reserva
 from .serializers import AreaComunSerializer, ReservaSerializer
-from api.models import Factura, Pago, Usuario, ResidenteVivienda, Residente
+from api import imagenes
+from api.actor import obtener_actor
+from api.models import Pago
+from api.permissions import IsAdmin
 
 # 🔹 Áreas comunes
-class AreaComunViewSet(viewsets.ModelViewSet):
-    queryset = AreaComun.objects.all()
+class AreaComunViewSet(imagenes.RendicionesMixin, viewsets.ModelViewSet):
+    queryset = AreaComun.objects.prefetch_related("imagenes")
     serializer_class = AreaComunSerializer
     permission_classes = [permissions.AllowAny]
 
+    # Tramos libres y ocupados por día: ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD&duracion=<minutos>
+    @action(detail=True, methods=['get'])
+    def disponibilidad(self, request, pk=None):
+        area = self.get_object()
+        desde_param = request.query_params.get('desde')
+        hasta_param = request.query_params.get('hasta')
+        desde = parse_date(desde_param) if desde_param else timezone.localdate()
+        if desde is None:
+            return Response({"error": "'desde' debe tener el formato YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        hasta = parse_date(hasta_param) if hasta_param else desde + timedelta(days=6)
+        if hasta is None:
+            return Response({"error": "'hasta' debe tener el formato YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            duracion = int(request.query_params.get('duracion') or 0)
+            if duracion < 0:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "'duracion' debe ser una cantidad de minutos"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            dias = disponibilidad.disponibilidad(area.id, desde, hasta, duracion)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"area_id": area.id, "desde": desde, "hasta": hasta, "dias": dias})
+
 # 🔹 Paginación para reservas
 class ReservaPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 50
 
-# 🔹 Función para generar factura
-def generar_factura_reserva(reserva):
-    if reserva.factura or not reserva.area_comun.costo:
-        return None
-
-    # 1. Buscar el Residente vinculado al usuario de la reserva
-    residente = Residente.objects.filter(usuario=reserva.usuario).first()
-
-    # 2. Buscar la relación ResidenteVivienda
-    residente_vivienda = None
-    if residente:
-        residente_vivienda = ResidenteVivienda.objects.filter(residente=residente).first()
-
-    # 3. Crear la factura (solo si hay relación con vivienda)
-    factura = Factura.objects.create(
-        vivienda=residente_vivienda.vivienda if residente_vivienda else None,
-        periodo=str(reserva.fecha)[:7],  # yyyy-mm
-        monto=reserva.area_comun.costo,
-        tipo="reserva",
-        estado="PENDIENTE"
+# Lo que lee ReservaSerializer: usuario, factura y área con sus imágenes.
+def reservas_con_relaciones():
+    return Reserva.objects.select_related("usuario__user", "factura", "area_comun").prefetch_related(
+        "area_comun__imagenes"
     )
 
-    # 4. Asociar la factura a la reserva
-    reserva.factura = factura
-    reserva.save(update_fields=["factura"])
-
-    return factura
-
 # 🔹 ViewSet de reservas corregido
-class ReservaViewSet(viewsets.ModelViewSet):
-    queryset = Reserva.objects.all()
+class ReservaViewSet(imagenes.RendicionesMixin, viewsets.ModelViewSet):
+    queryset = reservas_con_relaciones()
+    acciones_listado = ("list", "mis_reservas", "reporte_uso")
     serializer_class = ReservaSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -57,12 +70,44 @@ class ReservaViewSet(viewsets.ModelViewSet):
     filterset_fields = ["fecha", "estado", "area_comun"]
 
     def perform_create(self, serializer):
-        # Obtener el objeto Usuario relacionado con request.user
-        try:
-            usuario_obj = Usuario.objects.get(user=self.request.user)
-        except Usuario.DoesNotExist:
+        usuario_obj = obtener_actor(self.request).usuario
+        if usuario_obj is None:
             raise serializers.ValidationError("El usuario no tiene un perfil Usuario asociado")
-        serializer.save(usuario=usuario_obj)
+
+        datos = serializer.validated_data
+
+        def reservar():
+            # validate() usó la caché; con el área bloqueada se confirma contra la base.
+            if disponibilidad.solapadas(
+                datos['area_comun'].id, datos['fecha'], datos['hora_inicio'], datos['hora_fin'], refrescar=True
+            ):
+                raise serializers.ValidationError("El área ya está reservada en ese horario")
+            serializer.save(usuario=usuario_obj)
+
+        reservas.con_area_bloqueada(datos['area_comun'].id, reservar)
+
+    def perform_update(self, serializer):
+        datos = serializer.validated_data
+        reserva = serializer.instance
+
+        def actualizar():
+            if datos.get('estado', reserva.estado) in disponibilidad.ESTADOS_OCUPAN and disponibilidad.solapadas(
+                datos['area_comun'].id,
+                datos['fecha'],
+                datos['hora_inicio'],
+                datos['hora_fin'],
+                excluir=reserva.id,
+                refrescar=True,
+            ):
+                raise serializers.ValidationError("El área ya está reservada en ese horario")
+            serializer.save()
+
+        try:
+            reservas.con_area_bloqueada(datos['area_comun'].id, actualizar)
+        except IntegrityError as exc:
+            if not disponibilidad.es_solapamiento(exc):
+                raise
+            raise serializers.ValidationError("El área ya está reservada en ese horario")
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def cambiar_estado(self, request, pk=None):
@@ -70,12 +115,40 @@ class ReservaViewSet(viewsets.ModelViewSet):
         nuevo_estado = request.data.get('estado')
         if nuevo_estado not in ['aprobada', 'rechazada']:
             return Response({"error": "Estado inválido"}, status=status.HTTP_400_BAD_REQUEST)
-        reserva.estado = nuevo_estado
-        reserva.save()
-        if nuevo_estado == 'aprobada':
-            factura = generar_factura_reserva(reserva)
-            if factura:
-                return Response({"mensaje": "Reserva aprobada y factura generada", "factura_id": str(factura.id)})
+
+        def guardar():
+            # Con el área bloqueada, dos aprobaciones del mismo horario no pueden pasar a la vez.
+            if nuevo_estado == 'aprobada' and disponibilidad.solapadas(
+                reserva.area_comun_id, reserva.fecha, reserva.hora_inicio, reserva.hora_fin,
+                excluir=reserva.id, refrescar=True,
+            ):
+                return False, None, None
+            factura = None
+            if nuevo_estado == 'aprobada':
+                # Misma lógica que la aprobación en lote (areas/cobros.py), con una sola reserva.
+                lote = cobros.LoteFacturas([reserva])
+                motivo = lote.agregar(reserva)
+                if motivo:
+                    return True, None, motivo
+                factura = lote.guardar().get(reserva.id)
+            reserva.estado = nuevo_estado
+            reserva.save()
+            return True, factura, None
+
+        try:
+            guardada, factura, motivo = reservas.con_area_bloqueada(reserva.area_comun_id, guardar)
+        except IntegrityError as exc:
+            # Aprobación hecha por otro camino: la restricción de exclusión lo impide.
+            if not disponibilidad.es_solapamiento(exc):
+                raise
+            guardada, factura, motivo = False, None, None
+        if not guardada:
+            return Response({"error": "El área ya está reservada en ese horario"}, status=status.HTTP_409_CONFLICT)
+        if motivo:
+            # Sin factura no se aprueba: la reserva sigue pendiente.
+            return Response({"error": f"No se puede aprobar la reserva: {motivo}"}, status=status.HTTP_409_CONFLICT)
+        if factura:
+            return Response({"mensaje": "Reserva aprobada y factura generada", "factura_id": str(factura.id)})
         return Response({"mensaje": f"Reserva {nuevo_estado}"})
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
@@ -91,46 +164,80 @@ class ReservaViewSet(viewsets.ModelViewSet):
         if not monto or not metodo:
             return Response({"error": "Faltan datos de pago"}, status=status.HTTP_400_BAD_REQUEST)
 
-        pago = Pago.objects.create(
-            factura=reserva.factura,
-            metodo=metodo,
-            monto_pagado=monto,
-            referencia_externa=referencia,
-            registrado_por=Usuario.objects.get(user=request.user)
-        )
-
-        if pago.monto_pagado >= reserva.factura.monto:
-            reserva.estado = 'pagada'
-            reserva.factura.estado = 'PAGADO'
-            reserva.factura.fecha_pago = pago.fecha_pago
-            reserva.factura.save()
-            reserva.save()
+        with transaction.atomic():
+            pago = Pago.objects.create(
+                factura=reserva.factura,
+                metodo=metodo,
+                monto_pagado=monto,
+                referencia_externa=referencia,
+                registrado_por=obtener_actor(request).usuario,
+            )
+            # Si los pagos de la factura ya cubren el monto, reserva y factura quedan pagadas.
+            cobros.conciliar_pagos([reserva.id])
+        reserva.refresh_from_db(fields=["estado"])
 
         return Response({"mensaje": "Pago registrado", "pago_id": str(pago.id), "estado_reserva": reserva.estado})
 
+    # 🔹 Aprobación en lote: {"reservas": [id, ...]}
+    @action(detail=False, methods=['post'], permission_classes=[IsAdmin])
+    def aprobar_lote(self, request):
+        ids = request.data.get('reservas')
+        if not isinstance(ids, list) or not ids:
+            return Response({"error": "'reservas' debe ser una lista de ids"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > reservas.MAX_LOTE:
+            return Response(
+                {"error": f"No se pueden aprobar más de {reservas.MAX_LOTE} reservas a la vez"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            ids = [int(reserva_id) for reserva_id in ids]
+        except (TypeError, ValueError):
+            return Response({"error": "'reservas' debe ser una lista de ids"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resultado = reservas.aprobar_en_lote(ids)
+        except IntegrityError as exc:
+            # Una aprobación hecha fuera del lock: la restricción de exclusión lo impide.
+            if not disponibilidad.es_solapamiento(exc):
+                raise
+            return Response({"error": "El área ya está reservada en ese horario"}, status=status.HTTP_409_CONFLICT)
+        return Response(resultado)
+
+    # ?modo=resumen devuelve los totales por área desde UsoAreaDiario en lugar de cada reserva.
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def reporte_uso(self, request):
         area_id = request.query_params.get('area_id')
         fecha_inicio = request.query_params.get('fecha_inicio')
         fecha_fin = request.query_params.get('fecha_fin')
 
-        reservas = Reserva.objects.all()
+        if request.query_params.get('modo') == 'resumen':
+            hasta = parse_date(fecha_fin) if fecha_fin else timezone.localdate()
+            desde = parse_date(fecha_inicio) if fecha_inicio else (hasta and hasta - timedelta(days=29))
+            if desde is None or hasta is None:
+                return Response({"error": "Las fechas deben tener el formato YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+            if area_id and not area_id.isdigit():
+                return Response({"error": "'area_id' inválido"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                return Response(uso.reporte(desde, hasta, area_id=area_id))
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        reservas = reservas_con_relaciones()
         if area_id:
             reservas = reservas.filter(area_comun_id=area_id)
         if fecha_inicio and fecha_fin:
             reservas = reservas.filter(fecha__gte=fecha_inicio, fecha__lte=fecha_fin)
 
-        serializer = ReservaSerializer(reservas, many=True)
+        serializer = self.get_serializer(reservas, many=True)
         return Response(serializer.data)
 
     # 🔹 Mis reservas
     @action(detail=False, methods=['get'], url_path='mis_reservas')
     def mis_reservas(self, request):
-        try:
-            usuario_obj = Usuario.objects.get(user=request.user)
-        except Usuario.DoesNotExist:
+        usuario_obj = obtener_actor(request).usuario
+        if usuario_obj is None:
             return Response({"error": "El usuario no tiene un perfil Usuario asociado"}, status=status.HTTP_400_BAD_REQUEST)
 
-        reservas = Reserva.objects.filter(usuario=usuario_obj).order_by('-fecha', '-hora_inicio')
+        reservas = reservas_con_relaciones().filter(usuario=usuario_obj).order_by('-fecha', '-hora_inicio')
         serializer = self.get_serializer(reservas, many=True)
         return Response(serializer.data)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Los settings desactivan las conexiones persistentes bajo ASGI.
+os.environ.setdefault('DJANGO_ASGI', '1')
 
 application = get_asgi_application()
@@ -71,9 +71,14 @@ TEMPLATES = [
 WSGI_APPLICATION = 'core.wsgi.application'
 
 # Database
+# Bajo ASGI el código síncrono de cada petición corre en un hilo propio: una
+# conexión persistente quedaría abierta por cada hilo, así que se cierran al
+# terminar la petición. core/asgi.py define DJANGO_ASGI.
+CONN_MAX_AGE = 0 if os.environ.get("DJANGO_ASGI") == "1" else 600
+
 # En local usará postgres con tus datos, en producción Railway usa DATABASE_URL
 DATABASES = {
-    "default":dj_database_url.parse(os.environ.get('DATABASE_URL', ''), conn_max_age=600) if os.environ.get('DATABASE_URL') else {
+    "default":dj_database_url.parse(os.environ.get('DATABASE_URL', ''), conn_max_age=CONN_MAX_AGE) if os.environ.get('DATABASE_URL') else {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": "condominio",
         "USER": "postgres",
@@ -119,7 +124,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.actor.ActorJWTAuthentication',
     ],
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend"
@@ -129,6 +134,8 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
+    "TOKEN_OBTAIN_SERIALIZER": "api.tokens.TokenActorObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.tokens.TokenActorRefreshSerializer",
 }
 
 # ⚡ CORS (para React en Vercel y desarrollo local)
@@ -254,6 +261,25 @@ PLATE_RECOGNIZER_ENDPOINT = os.environ.get(
     "PLATE_RECOGNIZER_ENDPOINT",
     "https://api.platerecognizer.com/v1/plate-reader/",
 ).strip()
+# "platerecognizer", "memoria" o ruta a una clase
+PLACAS_RECONOCEDOR = os.environ.get("PLACAS_RECONOCEDOR", "platerecognizer")
+# Segundos durante los que una captura reenviada idéntica reutiliza el resultado
+PLACAS_CACHE_TTL = int(os.environ.get("PLACAS_CACHE_TTL", 30))
+# Ediciones toleradas al comparar la placa leída con las registradas
+PLACAS_DISTANCIA_MAXIMA = int(os.environ.get("PLACAS_DISTANCIA_MAXIMA", 1))
+PLACAS_INDICE_TTL = int(os.environ.get("PLACAS_INDICE_TTL", 300))
+# Timeouts (s) y circuito ante fallos de conexión seguidos
+PLATE_RECOGNIZER_TIMEOUT_CONEXION = float(os.environ.get("PLATE_RECOGNIZER_TIMEOUT_CONEXION", 5))
+PLATE_RECOGNIZER_TIMEOUT = float(os.environ.get("PLATE_RECOGNIZER_TIMEOUT", 20))
+PLACAS_CIRCUITO_FALLOS = int(os.environ.get("PLACAS_CIRCUITO_FALLOS", 5))
+PLACAS_CIRCUITO_ENFRIAMIENTO = int(os.environ.get("PLACAS_CIRCUITO_ENFRIAMIENTO", 30))
+# Identificación asíncrona: hilos (y conexiones HTTP) y capturas en curso
+PLACAS_MAX_WORKERS = int(os.environ.get("PLACAS_MAX_WORKERS", 4))
+PLACAS_COLA_MAXIMA = int(os.environ.get("PLACAS_COLA_MAXIMA", 32))
+# Segundos entre pasadas del worker que retoma capturas pendientes
+PLACAS_PENDIENTES_INTERVALO = float(os.environ.get("PLACAS_PENDIENTES_INTERVALO", 30))
+# Segundos sin resultado tras los que una captura en proceso se da por abandonada
+PLACAS_RECLAMO_TIMEOUT = int(os.environ.get("PLACAS_RECLAMO_TIMEOUT", 120))
 
 
 
@@ -261,3 +287,51 @@ PLATE_RECOGNIZER_ENDPOINT = os.environ.get(
 
 FINANZAS_QR_FALLBACK_URL = os.environ.get("FINANZAS_QR_FALLBACK_URL", "").strip()
 
+# Finanzas - generación de facturas en segundo plano
+FINANZAS_GENERACION_CHUNK = int(os.environ.get("FINANZAS_GENERACION_CHUNK", 500))
+FINANZAS_GENERACION_INTERVALO = float(os.environ.get("FINANZAS_GENERACION_INTERVALO", 5))
+# Segundos sin progreso tras los que un job EN_PROCESO se considera abandonado
+FINANZAS_GENERACION_TIMEOUT = int(os.environ.get("FINANZAS_GENERACION_TIMEOUT", 900))
+
+
+# Finanzas - listado de facturas del administrador
+FINANZAS_FACTURAS_PAGE_SIZE = int(os.environ.get("FINANZAS_FACTURAS_PAGE_SIZE", 50))
+FINANZAS_FACTURAS_MAX_PAGE_SIZE = int(os.environ.get("FINANZAS_FACTURAS_MAX_PAGE_SIZE", 500))
+FINANZAS_EXPORT_CHUNK = int(os.environ.get("FINANZAS_EXPORT_CHUNK", 2000))
+
+# Caché del actor (usuario, roles, vivienda) por proceso
+ACTOR_CACHE_TTL = int(os.environ.get("ACTOR_CACHE_TTL", 60))
+
+# Envío de notificaciones push
+PUSH_MAX_WORKERS = int(os.environ.get("PUSH_MAX_WORKERS", 4))
+PUSH_OUTBOX_LOTE = int(os.environ.get("PUSH_OUTBOX_LOTE", 500))
+PUSH_OUTBOX_MAX_INTENTOS = int(os.environ.get("PUSH_OUTBOX_MAX_INTENTOS", 6))
+PUSH_OUTBOX_BACKOFF_BASE = int(os.environ.get("PUSH_OUTBOX_BACKOFF_BASE", 30))
+PUSH_OUTBOX_BACKOFF_MAX = int(os.environ.get("PUSH_OUTBOX_BACKOFF_MAX", 3600))
+PUSH_OUTBOX_RESERVA = int(os.environ.get("PUSH_OUTBOX_RESERVA", 120))
+PUSH_OUTBOX_INTERVALO = float(os.environ.get("PUSH_OUTBOX_INTERVALO", 5))
+# "fcm", "memoria", "nulo" o ruta a una clase; vacío = fcm si hay credenciales
+PUSH_TRANSPORTE = os.environ.get("PUSH_TRANSPORTE", "")
+
+# Stream SSE de incidentes
+SEGURIDAD_SSE_KEEPALIVE = int(os.environ.get("SEGURIDAD_SSE_KEEPALIVE", 15))
+SEGURIDAD_SSE_HISTORIAL = int(os.environ.get("SEGURIDAD_SSE_HISTORIAL", 256))
+SEGURIDAD_SSE_COLA = int(os.environ.get("SEGURIDAD_SSE_COLA", 100))
+# Reparte los eventos entre procesos con LISTEN/NOTIFY (solo PostgreSQL)
+SEGURIDAD_SSE_NOTIFY = os.environ.get("SEGURIDAD_SSE_NOTIFY", "False") == "True"
+
+# Áreas comunes - disponibilidad
+AREAS_DISPONIBILIDAD_TTL = int(os.environ.get("AREAS_DISPONIBILIDAD_TTL", 300))
+AREAS_HORA_APERTURA = os.environ.get("AREAS_HORA_APERTURA", "06:00")
+AREAS_HORA_CIERRE = os.environ.get("AREAS_HORA_CIERRE", "23:00")
+# Lock por área al reservar: espera máxima (ms) y reintentos
+AREAS_RESERVA_LOCK_TIMEOUT = int(os.environ.get("AREAS_RESERVA_LOCK_TIMEOUT", 2000))
+AREAS_RESERVA_REINTENTOS = int(os.environ.get("AREAS_RESERVA_REINTENTOS", 3))
+
+# Rendiciones de imágenes (miniatura y media) generadas al subir
+IMAGENES_FORMATO = os.environ.get("IMAGENES_FORMATO", "webp")
+IMAGENES_CALIDAD = int(os.environ.get("IMAGENES_CALIDAD", 80))
+IMAGENES_MINIATURA = int(os.environ.get("IMAGENES_MINIATURA", 320))
+IMAGENES_MEDIA = int(os.environ.get("IMAGENES_MEDIA", 1024))
+# Hilos que generan las rendiciones; 0 las genera en el proceso que guarda
+IMAGENES_MAX_WORKERS = int(os.environ.get("IMAGENES_MAX_WORKERS", 2))
@@ -3,7 +3,7 @@ from .models import Mantenimiento
 from areas.models import AreaComun
 from areas.serializers import AreaComunSerializer
 from api.models import Usuario
-from api.models import ResidenteVivienda
+from api.serializers import ImagenRendicionField, RendicionesField, vivienda_activa
 
 class MantenimientoSerializer(serializers.ModelSerializer):
     area_comun = AreaComunSerializer(read_only=True)
@@ -15,7 +15,8 @@ class MantenimientoSerializer(serializers.ModelSerializer):
         allow_null=True
     )
 
-    imagen = serializers.ImageField(required=False, allow_null=True)
+    imagen = ImagenRendicionField(required=False, allow_null=True)
+    imagen_rendiciones = RendicionesField(source='imagen')
     residente_name = serializers.CharField(source="residente.user.username", read_only=True)
     responsable_name = serializers.CharField(source="responsable.user.username", read_only=True)
 
@@ -38,17 +39,16 @@ class MantenimientoSerializer(serializers.ModelSerializer):
         vivienda_actual = serializers.SerializerMethodField()
 
         def get_vivienda_actual(self, residente):
-            # Buscar la vivienda actual (fecha_hasta es null)
-            try:
-                rv = ResidenteVivienda.objects.get(residente=residente, fecha_hasta__isnull=True)
-                vivienda = rv.vivienda
-                return {
-                    "codigo_unidad": vivienda.codigo_unidad,
-                    "bloque": vivienda.bloque,
-                    "numero": vivienda.numero
-                }
-            except ResidenteVivienda.DoesNotExist:
+            # Vivienda actual (fecha_hasta es null); precargada por la vista
+            rv = vivienda_activa(residente)
+            if rv is None:
                 return None
+            vivienda = rv.vivienda
+            return {
+                "codigo_unidad": vivienda.codigo_unidad,
+                "bloque": vivienda.bloque,
+                "numero": vivienda.numero
+            }
 
     residente_data = serializers.SerializerMethodField()
 
@@ -60,7 +60,7 @@ class MantenimientoSerializer(serializers.ModelSerializer):
             'residente', 'residente_name', 'residente_data',
             'responsable', 'responsable_name',
             'area_comun', 'area_comun_id',
-            'costo', 'imagen',
+            'costo', 'imagen', 'imagen_rendiciones',
         ]
         read_only_fields = ['residente', 'residente_name', 'responsable_name', 'fecha_solicitud']
 
@@ -0,0 +1,5 @@
+from api import imagenes
+
+from .models import Mantenimiento
+
+imagenes.registrar(Mantenimiento, "imagen")
@@ -4,6 +4,8 @@ from rest_framework.pagination import PageNumberPagination
 from .models import Mantenimiento, Usuario
 from .serializers import MantenimientoSerializer
 from .filters import MantenimientoFilter
+from api import imagenes
+from api.serializers import prefetch_vivienda_activa
 from django_filters.rest_framework import DjangoFilterBackend
 # =======================
 # Paginación para Mantenimiento
@@ -16,8 +18,11 @@ class MantenimientoPagination(PageNumberPagination):
 # =======================
 # ViewSet para Mantenimiento
 # =======================
-class MantenimientoViewSet(viewsets.ModelViewSet):
-    queryset = Mantenimiento.objects.all()
+class MantenimientoViewSet(imagenes.RendicionesMixin, viewsets.ModelViewSet):
+    # Lo que lee MantenimientoSerializer, para no consultar por fila
+    queryset = Mantenimiento.objects.select_related(
+        'residente__user', 'residente__residente', 'responsable__user', 'area_comun'
+    ).prefetch_related('area_comun__imagenes', prefetch_vivienda_activa('residente__residente'))
     serializer_class = MantenimientoSerializer
     pagination_class = MantenimientoPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter] 
@@ -41,7 +46,7 @@ class ResponsableSerializer(serializers.ModelSerializer):
 # ViewSet solo lectura para Responsables (Mantenimiento)
 # =======================
 class ResponsableViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Usuario.objects.filter(
+    queryset = Usuario.objects.select_related('user').filter(
         usuariorol__rol__nombre='MAN',  # filtra solo los usuarios con rol de mantenimiento
         usuariorol__estado=1
     ).distinct()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class VisitantesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'visitantes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
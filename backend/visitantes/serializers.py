@@ -1,16 +1,20 @@
 from rest_framework import serializers
 from .models import Visitante, HistorialVisita
-from api.models import Residente, ResidenteVivienda
+from api.serializers import RendicionesField, RendicionesSerializerMixin, vivienda_activa
 
 
-class VisitanteSerializer(serializers.ModelSerializer):
+class VisitanteSerializer(RendicionesSerializerMixin, serializers.ModelSerializer):
+    foto_rendiciones = RendicionesField(source='foto')
+
     class Meta:
         model = Visitante
         fields = '__all__'
 
 
-class HistorialVisitaSerializer(serializers.ModelSerializer):
+class HistorialVisitaSerializer(RendicionesSerializerMixin, serializers.ModelSerializer):
     visitante = VisitanteSerializer(read_only=True)
+    foto_ingreso_rendiciones = RendicionesField(source='foto_ingreso')
+    foto_salida_rendiciones = RendicionesField(source='foto_salida')
     residente = serializers.StringRelatedField(read_only=True)
     residente_info = serializers.SerializerMethodField()
     fecha_registro = serializers.DateTimeField(format="%d/%m/%Y %H:%M", read_only=True)
@@ -32,22 +36,14 @@ class HistorialVisitaSerializer(serializers.ModelSerializer):
         if not obj.residente:
             return None
 
-        try:
-            # Obtener la instancia de Residente a partir del usuario relacionado
-            residente_obj = Residente.objects.get(usuario=obj.residente)
-
-            # Obtener la vivienda asociada
-            try:
-                residente_vivienda = ResidenteVivienda.objects.get(residente=residente_obj)
-                vivienda_nombre = residente_vivienda.vivienda.codigo_unidad
-            except ResidenteVivienda.DoesNotExist:
-                vivienda_nombre = None
-
-            return {
-                "nombre_completo": f"{residente_obj.nombres} {residente_obj.apellidos}",
-                "apartamento": vivienda_nombre,
-                "telefono": residente_obj.telefono
-            }
-
-        except Residente.DoesNotExist:
+        # Residente del usuario (viene con select_related desde la vista)
+        residente_obj = getattr(obj.residente, 'residente', None)
+        if residente_obj is None:
             return None
+
+        residente_vivienda = vivienda_activa(residente_obj)
+        return {
+            "nombre_completo": f"{residente_obj.nombres} {residente_obj.apellidos}",
+            "apartamento": residente_vivienda.vivienda.codigo_unidad if residente_vivienda else None,
+            "telefono": residente_obj.telefono
+        }
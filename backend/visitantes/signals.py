@@ -0,0 +1,6 @@
+from api import imagenes
+
+from .models import HistorialVisita, Visitante
+
+imagenes.registrar(Visitante, "foto")
+imagenes.registrar(HistorialVisita, "foto_ingreso", "foto_salida")
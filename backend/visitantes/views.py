@@ -7,10 +7,12 @@ from django_filters import rest_framework as filters
 
 from .models import Visitante, HistorialVisita
 from .serializers import VisitanteSerializer, HistorialVisitaSerializer
-from api.models import Usuario, UsuarioRol
+from api import imagenes
+from api.actor import obtener_actor
+from api.serializers import prefetch_vivienda_activa
 
 
-class HistorialVisitaViewSet(viewsets.ModelViewSet):
+class HistorialVisitaViewSet(imagenes.RendicionesMixin, viewsets.ModelViewSet):
     serializer_class = HistorialVisitaSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -30,18 +32,22 @@ class HistorialVisitaViewSet(viewsets.ModelViewSet):
         if not user or not user.is_authenticated:
             return HistorialVisita.objects.none()
 
+        # Lo que leen VisitanteSerializer y get_residente_info, sin consultas por fila.
+        historial = HistorialVisita.objects.select_related(
+            'visitante', 'residente__user', 'residente__residente'
+        ).prefetch_related(prefetch_vivienda_activa('residente__residente'))
+
         if user.is_staff or user.is_superuser:
-            return HistorialVisita.objects.all().order_by('-fecha_registro')
+            return historial.order_by('-fecha_registro')
 
-        try:
-            usuario = Usuario.objects.select_related('user').get(user=user)
-        except Usuario.DoesNotExist:
+        actor = obtener_actor(self.request)
+        if actor.usuario is None:
             return HistorialVisita.objects.none()
 
-        if UsuarioRol.objects.filter(usuario=usuario, rol__nombre__in=['ADM', 'GUA'], estado=1).exists():
-            return HistorialVisita.objects.all().order_by('-fecha_registro')
+        if actor.tiene_rol('ADM', 'GUA'):
+            return historial.order_by('-fecha_registro')
 
-        return HistorialVisita.objects.filter(residente=usuario).order_by('-fecha_registro')
+        return historial.filter(residente=actor.usuario).order_by('-fecha_registro')
 
     def perform_create(self, serializer):
         data = self.request.data
@@ -59,10 +65,9 @@ class HistorialVisitaViewSet(viewsets.ModelViewSet):
         )
 
         # Asegurarse de asignar residente
-        if isinstance(self.request.user, Usuario):
-            residente = self.request.user
-        else:
-            residente = Usuario.objects.get(user=self.request.user)
+        residente = obtener_actor(self.request).usuario
+        if residente is None:
+            raise serializers.ValidationError({"detail": "El usuario no tiene un perfil Usuario asociado."})
 
         serializer.save(visitante=visitante, residente=residente, motivo=motivo)
 